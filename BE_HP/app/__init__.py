@@ -1,44 +1,73 @@
 from flask import Flask
 from flask_cors import CORS
 import atexit
-from app.config import Config, SWAGGER_CONFIG, SWAGGER_TEMPLATE
+from app.config import Config, MLConfig, SWAGGER_CONFIG, SWAGGER_TEMPLATE
 from app.database import mongo
 from flasgger import Swagger
 from app.route import register_blueprints
 from .extensions import get_db, init_indexes, jwt, limiter, socketio
 from .error import register_error_handlers
+from .instrumentation import init_instrumentation
+from .realtime import init_realtime
 from .scheduler.app_scheduler import app_scheduler
 
-def create_app():
+ROLES = ("all", "web", "worker")
+
+def create_app(role=None):
+    """role: web (API + scheduler enqueue job) | worker (chỉ chạy job) | all (web + worker thread)"""
+    role = role or Config.APP_ROLE
+    if role not in ROLES:
+        raise ValueError(f"APP_ROLE không hợp lệ: {role} (chọn {', '.join(ROLES)})")
+
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config["APP_ROLE"] = role
     
-    CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
+    CORS(app, supports_credentials=True, resources={r"/*": {"origins": "*"}}, expose_headers=["X-Query-Count", "Server-Timing"])
 
     register_blueprints(app)
     jwt.init_app(app)
     limiter.init_app(app)
     mongo.init_app(app)
 
-    socketio.init_app(app, cors_allowed_origins="*")
+    socketio.init_app(app, cors_allowed_origins="*", message_queue=Config.SOCKETIO_MESSAGE_QUEUE)
+    init_realtime(app)
+    from . import websocket  # noqa: F401  đăng ký handler socket.io
     register_error_handlers(app)
+    init_instrumentation(app)
 
     with app.app_context():
         db = get_db()
         init_indexes(db)
         
-        app_scheduler.set_app(app)
-        
-        try:
-            app_scheduler.start_scheduler()
-        except Exception as e:
-            print(f"Không thể khởi động app scheduler: {e}")
+        if role != "worker":
+            app_scheduler.set_app(app)
+            
+            try:
+                app_scheduler.start_scheduler()
+            except Exception as e:
+                print(f"Không thể khởi động app scheduler: {e}")
+
+    worker = None
+    if role == "all":
+        from .jobs.worker import start_worker_thread
+        worker = start_worker_thread(app)
+
+    if MLConfig.MEASUREMENT_CACHE_ENABLED:
+        from .utils.measurement_cache import start_cache_warmup
+        start_cache_warmup(app)
+
+    if MLConfig.ONLINE_SCORER_WARM_START and role != "worker":
+        from .ml.lstm_autoencoder.online import start_warmup
+        start_warmup(app)
 
     # for rule in app.url_map.iter_rules():
     #     print("ROUTE:", rule.endpoint, rule.rule, rule.methods)
     Swagger(app, config=SWAGGER_CONFIG, template=SWAGGER_TEMPLATE)
     
     def shutdown_scheduler():
+        if worker is not None:
+            worker.stop()
         try:
             app_scheduler.stop_scheduler()
         except Exception:
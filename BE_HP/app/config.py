@@ -5,6 +5,10 @@ from datetime import timedelta
 class Config: 
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/mydatabase')
     MONGO_DB  = os.getenv("MONGO_DB", "Nuoc_HP")
+    # Một MongoClient dùng chung cho cả process; với gevent mỗi greenlet giữ một connection khi query
+    # nên pool cần >= số request đồng thời mong muốn, chờ quá timeout thì báo lỗi thay vì treo
+    MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
     SECRET_KEY = os.getenv("SECRET_KEY", "change-me")
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "change-me-jwt")
     JSON_SORT_KEYS = False
@@ -18,6 +22,44 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     JWT_COOKIE_CSRF_PROTECT = False  # Tắt CSRF protection cho cookies
+    # Chu kỳ (giây) mỗi worker đọc thêm token bị thu hồi từ revoked_tokens; worker khác thấy logout chậm tối đa chừng này
+    TOKEN_REVOCATION_REFRESH_SECONDS = float(os.getenv("TOKEN_REVOCATION_REFRESH_SECONDS", "5"))
+    # Flask-Limiter đọc trực tiếp từ app.config; chỉ tắt khi load test (scripts.loadtest)
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "true").lower() == "true"
+
+    # Vai trò process: web (API + scheduler chỉ enqueue job) | worker (chỉ chạy job) | all (web + worker thread trong cùng process)
+    APP_ROLE = os.getenv("APP_ROLE", "all").lower()
+    # Lease mặc định (giây) của job; worker gia hạn bằng heartbeat, hết lease thì worker khác claim lại
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+    # Backoff chạy lại job lỗi: base * 2^(attempts-1) giây
+    JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", "60"))
+    # Chu kỳ (giây) worker kiểm tra hàng đợi khi không có job
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+
+    # Metric theo request (route, status, wall time, số lệnh/thời gian Mongo, bytes) cho /metrics và header Server-Timing
+    REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "true").lower() == "true"
+    # Request chậm hơn mức này (ms) được ghi ra log; REQUEST_DEBUG_QUERIES ghi kèm danh sách lệnh Mongo
+    REQUEST_SLOW_MS = float(os.getenv("REQUEST_SLOW_MS", "1000"))
+    REQUEST_DEBUG_QUERIES = os.getenv("REQUEST_DEBUG_QUERIES", "false").lower() == "true"
+    # Bearer token cho Prometheus scrape /metrics; không có token thì chỉ JWT của admin xem được
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+    # /meters/viewport: zoom nhỏ hơn VIEWPORT_CLUSTER_MAX_ZOOM và nhiều hơn VIEWPORT_MAX_POINTS meter trong khung
+    # thì gom cụm theo lưới ô VIEWPORT_CLUSTER_PX pixel
+    VIEWPORT_CLUSTER_MAX_ZOOM = int(os.getenv("VIEWPORT_CLUSTER_MAX_ZOOM", "14"))
+    VIEWPORT_MAX_POINTS = int(os.getenv("VIEWPORT_MAX_POINTS", "300"))
+    VIEWPORT_CLUSTER_PX = int(os.getenv("VIEWPORT_CLUSTER_PX", "60"))
+
+    # Tìm kiếm có xếp hạng chỉ chấm điểm tối đa N document khớp (ít nhất đủ cho trang đang xem)
+    SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+
+    # Hub realtime (app/realtime.py): gom event socket.io theo room, mỗi REALTIME_FLUSH_MS gửi một frame
+    REALTIME_ENABLED = os.getenv("REALTIME_ENABLED", "true").lower() == "true"
+    REALTIME_FLUSH_MS = int(os.getenv("REALTIME_FLUSH_MS", "500"))
+    # Số event tối đa chờ gửi mỗi room (log, reading); vượt thì bỏ event cũ nhất
+    REALTIME_MAX_PENDING = int(os.getenv("REALTIME_MAX_PENDING", "200"))
+    # Message queue socket.io (vd redis://localhost:6379/0) để worker chạy process riêng publish được tới client
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
 
 class MLConfig: 
     BASE_DIR = os.path.dirname(__file__)
@@ -38,6 +80,75 @@ class MLConfig:
         'use_act': os.getenv("LSTMAE_USE_ACT", "true").lower() == "true",
     }
 
+    # Backend inference LSTMAE: eager | torchscript | onnx (artifact export bằng scripts/export_lstmae.py)
+    LSTM_AE_BACKEND = os.getenv("LSTM_AE_BACKEND", "eager")
+    # Dynamic int8 quantization cho backend eager (CPU); kiểm tra trước bằng scripts/lstmae_quant_gate.py
+    LSTM_AE_QUANTIZE = os.getenv("LSTMAE_QUANTIZE", "false").lower() == "true"
+    # Số thread intra-op của ONNX Runtime (0 = mặc định của runtime)
+    LSTM_AE_ORT_THREADS = int(os.getenv("LSTM_AE_ORT_THREADS", "0"))
+    # Sai lệch tối đa cho phép của reconstruction error so với eager (đơn vị đã chuẩn hoá)
+    LSTM_AE_PARITY_TOL = float(os.getenv("LSTM_AE_PARITY_TOL", "1e-4"))
+
+    # Online scorer (/predictions/make_prediction): nạp buffer lúc khởi động từ N giờ dữ liệu gần nhất
+    ONLINE_SCORER_WARM_START = os.getenv("ONLINE_SCORER_WARM_START", "true").lower() == "true"
+    ONLINE_WARM_HOURS = int(os.getenv("ONLINE_WARM_HOURS", "3"))
+    # Khoảng trống lớn hơn mức này giữa hai reading thì buffer được nạp lại từ DB
+    ONLINE_MAX_GAP_MINUTES = int(os.getenv("ONLINE_MAX_GAP_MINUTES", "30"))
+    ONLINE_THRESHOLD_REFRESH_SECONDS = int(os.getenv("ONLINE_THRESHOLD_REFRESH_SECONDS", "300"))
+
+    # Micro-batching cho online scorer: gom request đồng thời tối đa N item hoặc chờ tối đa X ms
+    LSTMAE_BATCH_ENABLED = os.getenv("LSTMAE_BATCH_ENABLED", "true").lower() == "true"
+    LSTMAE_BATCH_MAX_SIZE = int(os.getenv("LSTMAE_BATCH_MAX_SIZE", "64"))
+    LSTMAE_BATCH_MAX_WAIT_MS = float(os.getenv("LSTMAE_BATCH_MAX_WAIT_MS", "5"))
+    # Số native thread chạy inference khi server chạy gevent đã monkey patch (utils.offload.run_cpu_bound)
+    CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", "4"))
+
+    # Ngưỡng LSTM-AE tăng dần: mỗi đêm chỉ tính summary của ngày mới rồi gộp cửa sổ HISTORICAL_DATA_DAYS ngày
+    LSTMAE_THRESHOLD_INCREMENTAL = os.getenv("LSTMAE_THRESHOLD_INCREMENTAL", "true").lower() == "true"
+    # Số centroid tối đa của quantile summary (dưới mức này percentile là chính xác)
+    LSTMAE_SKETCH_MAX_SIZE = int(os.getenv("LSTMAE_SKETCH_MAX_SIZE", "2048"))
+    # Sai lệch tương đối cho phép giữa ngưỡng tăng dần và tính lại toàn bộ (scripts/check_lstmae_thresholds.py)
+    LSTMAE_THRESHOLD_TOL = float(os.getenv("LSTMAE_THRESHOLD_TOL", "0.05"))
+
+    # Layout lưu measurements: documents (mỗi reading một document) | buckets (một document/meter/ngày)
+    # Đổi layout cần migrate dữ liệu cũ: scripts.migrate_measurement_store
+    MEASUREMENT_STORE = os.getenv("MEASUREMENT_STORE", "documents")
+    # Cache trong process các reading gần đây (ring buffer NumPy theo meter) cho dashboard/ML/online scoring
+    MEASUREMENT_CACHE_ENABLED = os.getenv("MEASUREMENT_CACHE_ENABLED", "true").lower() == "true"
+    # Số ngày gần nhất giữ trong cache (>= LSTM_WINDOW_CONTEXT + 1 để fine-tune LSTM đọc từ cache)
+    MEASUREMENT_CACHE_DAYS = int(os.getenv("MEASUREMENT_CACHE_DAYS", "5"))
+    # Giới hạn bộ nhớ: số meter tối đa và tổng MB cho ring buffer (lấy giới hạn chặt hơn)
+    MEASUREMENT_CACHE_MAX_METERS = int(os.getenv("MEASUREMENT_CACHE_MAX_METERS", "2000"))
+    MEASUREMENT_CACHE_MAX_MB = int(os.getenv("MEASUREMENT_CACHE_MAX_MB", "64"))
+    # Meter không có reading mới và không được đọc trong số giờ này bị loại khỏi cache
+    MEASUREMENT_CACHE_IDLE_HOURS = int(os.getenv("MEASUREMENT_CACHE_IDLE_HOURS", "48"))
+    # Chu kỳ (giây) đọc bù reading do process khác ghi vào MongoDB
+    MEASUREMENT_CACHE_REFRESH_SECONDS = int(os.getenv("MEASUREMENT_CACHE_REFRESH_SECONDS", "60"))
+    # Rollup giờ/ngày của meter_measurements, cập nhật khi crawler ingest (dựng lại: scripts.rebuild_rollups)
+    MEASUREMENT_ROLLUPS_ENABLED = os.getenv("MEASUREMENT_ROLLUPS_ENABLED", "true").lower() == "true"
+    # LSTM đọc trung bình ngày và eligibility đếm điểm từ rollup ngày thay vì dữ liệu thô
+    # (chỉ bật sau khi đã chạy scripts.rebuild_rollups cho cửa sổ lịch sử)
+    ML_USE_ROLLUPS = os.getenv("ML_USE_ROLLUPS", "false").lower() == "true"
+
+    # Fine-tune LSTM theo từng meter: 1 = chạy tuần tự trong process hiện tại,
+    # > 1 = phân phối meter cho N worker process, 0 = dùng toàn bộ số core
+    LSTM_WORKERS = int(os.getenv("LSTM_WORKERS", "1"))
+    # Số thread intra/inter-op của TensorFlow trong mỗi worker (tránh oversubscription)
+    LSTM_WORKER_TF_THREADS = int(os.getenv("LSTM_WORKER_TF_THREADS", "1"))
+
+    # Model registry: chu kỳ (giây) kiểm tra file weights thay đổi để hot-reload
+    MODEL_RELOAD_CHECK_SECONDS = int(os.getenv("MODEL_RELOAD_CHECK_SECONDS", "30"))
+
+    # Chọn meter cho ML: số meter mỗi shard (giới hạn bộ nhớ mỗi lượt đọc dữ liệu)
+    ML_SHARD_SIZE = int(os.getenv("ML_SHARD_SIZE", "50"))
+    # Một ngày được tính là có dữ liệu khi có ít nhất số điểm này (10 phút/điểm => 144 điểm/ngày)
+    ML_MIN_POINTS_PER_DAY = int(os.getenv("ML_MIN_POINTS_PER_DAY", "72"))
+    # Số ngày có dữ liệu tối thiểu trong cửa sổ lịch sử để meter đủ điều kiện
+    ML_ELIGIBILITY = {
+        'lstm': {'min_days': int(os.getenv("LSTM_MIN_HISTORY_DAYS", "4"))},
+        'lstm_autoencoder': {'min_days': int(os.getenv("LSTMAE_MIN_HISTORY_DAYS", "7"))},
+    }
+
 SWAGGER_CONFIG = {
     "headers": [], 
     "specs": [
@@ -2,23 +2,31 @@ from datetime import datetime, timedelta
 import time
 import os
 from .crawler import api_client
-from ..extensions import get_db
 from ..models.log_schemas import LogType
 from ..routes.logs.log_utils import insert_log
 from ..utils.common import find_meterid_by_metername
+from ..utils.rollups import update_rollups_for_measurements
+from ..utils.measurement_store import get_measurement_store
+from ..config import MLConfig
+from ..realtime import realtime_hub
+
+_active_lstm_predictor = None
+
+def cancel_running_predictions():
+    """Huỷ lượt LSTM fine-tune đang chạy (dùng khi dừng scheduler/process)"""
+    predictor = _active_lstm_predictor
+    if predictor is not None:
+        predictor.cancel()
+        return True
+    return False
 
 def run_lstmae_prediction_after_crawl():
+    """Returns: dict kết quả predict (truthy) hoặc False nếu thất bại"""
     try:
-        from ..ml.lstm_autoencoder.predict import LSTMAEPredictor
-        from ..config import MLConfig
-        
-        
-        predictor = LSTMAEPredictor(
-            historical_context=MLConfig.HISTORICAL_DATA_DAYS,
-            config=MLConfig.LSTM_AE_CONFIG,
-            model_path=MLConfig.LSTM_AE_MODEL_PATH,
-            debug=False  
-        )
+        from ..ml.lstm_autoencoder.predict import init_predictor
+
+        # Predictor dùng chung trong process; weights lấy từ model registry
+        predictor = init_predictor()
         
         result = predictor.predict()
         
@@ -30,16 +38,20 @@ def run_lstmae_prediction_after_crawl():
             
             insert_log(
                 f"LSTM-AE Prediction hoàn tất: {total_data} historical data, {today_data} today data, "
-                f"{predictions_count} predictions generated, {predictions_saved} predictions saved",
+                f"{predictions_count} predictions generated, {predictions_saved} predictions saved "
+                f"({result.get('predictions_inserted', 0)} mới, {result.get('predictions_updated', 0)} ghi đè) "
+                f"({result.get('meters_processed', 0)} meter / {result.get('shards', 0)} shard)",
                 LogType.INFO
             )
+            if result.get('resumed'):
+                insert_log("LSTM-AE Prediction tiếp tục từ checkpoint của lượt chạy bị gián đoạn", LogType.WARNING)
             
             if predictions_saved > 0:
                 insert_log(f"Đã lưu {predictions_saved} LSTM-AE predictions vào database", LogType.INFO)
             else:
                 insert_log("Không có LSTM-AE predictions mới để lưu", LogType.WARNING)
                 
-            return True
+            return result
         else:
             insert_log("LSTM-AE Prediction thất bại - không có kết quả trả về", LogType.ERROR)
             return False
@@ -49,18 +61,17 @@ def run_lstmae_prediction_after_crawl():
         return False
 
 def run_lstm_prediction_after_crawl():
+    global _active_lstm_predictor
     try:
-        from ..ml.lstm.predict import LSTM_Predictor
-        from ..config import MLConfig
-        
-        predictor = LSTM_Predictor(
-            historical_context=getattr(MLConfig, 'LSTM_WINDOW_CONTEXT', 4),
-            model_path=getattr(MLConfig, 'LSTM_MODEL_PATH', None),
-            scaler_path=getattr(MLConfig, 'SCALER_LSTM_MODEL_PATH', None),
-            debug=False  # Tắt debug để tránh lỗi encoding
-        )
+        from ..ml.lstm.predict import init_predictor
+
+        predictor = init_predictor()
         
-        result = predictor.predict()
+        _active_lstm_predictor = predictor
+        try:
+            result = predictor.predict()
+        finally:
+            _active_lstm_predictor = None
         
         if result:
             total_data = result['total_data_points']
@@ -70,16 +81,26 @@ def run_lstm_prediction_after_crawl():
             
             insert_log(
                 f"LSTM Prediction hoàn tất: {total_data} historical data, {today_data} today data, "
-                f"{predictions_count} predictions generated, {predictions_saved} predictions saved",
+                f"{predictions_count} predictions generated, {predictions_saved} predictions saved "
+                f"({result.get('predictions_inserted', 0)} mới, {result.get('predictions_updated', 0)} ghi đè) "
+                f"({result.get('meters_processed', 0)} meter / {result.get('shards', 0)} shard, "
+                f"{result.get('workers', 1)} worker)",
                 LogType.INFO
             )
+            if result.get('resumed'):
+                insert_log("LSTM Prediction tiếp tục từ checkpoint của lượt chạy bị gián đoạn", LogType.WARNING)
+
+            if result.get('failed_meters'):
+                insert_log(f"LSTM fine-tune thất bại cho các meter: {', '.join(result['failed_meters'])}", LogType.WARNING)
+            if result.get('cancelled'):
+                insert_log("LSTM Prediction đã bị huỷ giữa chừng, chỉ lưu các meter đã hoàn tất", LogType.WARNING)
             
             if predictions_saved > 0:
                 insert_log(f"Đã lưu {predictions_saved} LSTM predictions vào database", LogType.INFO)
             else:
                 insert_log("Không có LSTM predictions mới để lưu", LogType.WARNING)
                 
-            return True
+            return result
         else:
             insert_log("LSTM Prediction thất bại - không có kết quả trả về", LogType.ERROR)
             return False
@@ -103,7 +124,39 @@ def run_prediction_after_crawl():
         insert_log("Cả hai predictions đều thất bại", LogType.ERROR)
         return False
 
-def crawl_measurements_data(): 
+def check_api_health():
+    try:
+        import requests
+
+        base_url = os.getenv('DATA_API_URL', 'https://dhxdapi.capnuochaiphong.com.vn')
+
+        login_url = f"{base_url}/api/user/login"
+        response = requests.head(login_url, timeout=10)
+
+        if response.status_code in [200, 400, 401, 405]:
+            insert_log(f"API health check passed: {response.status_code} in {response.elapsed.total_seconds()*1000:.0f}ms", LogType.INFO)
+            return True
+        else:
+            insert_log(f"API health check failed: status {response.status_code}", LogType.WARNING)
+            return False
+
+    except requests.exceptions.Timeout:
+        insert_log("API health check timeout - API may be slow", LogType.WARNING)
+        return False
+    except requests.exceptions.ConnectionError:
+        insert_log("API health check connection error - API may be down", LogType.ERROR)
+        return False
+    except Exception as e:
+        insert_log(f"API health check error: {str(e)}", LogType.WARNING)
+        return False
+
+def crawl_measurements_data(run_predictions=True):
+    """
+    Crawl và lưu measurements của ngày hiện tại.
+
+    run_predictions=False khi chạy từ job queue: các stage prediction được enqueue thành job riêng.
+    Trả về False nếu crawl được nhưng lưu thất bại.
+    """
     import time
     max_retries = 3
     retry_delays = [60, 120, 300]
@@ -130,11 +183,14 @@ def crawl_measurements_data():
                 insert_log(f"Đã crawl được {len(data)} bản ghi dữ liệu measurements", LogType.INFO)
                 save_success = save_measurements_data(data)
                 
-                if save_success:
+                if not save_success:
+                    if run_predictions:
+                        insert_log("Bỏ qua prediction do lưu dữ liệu thất bại", LogType.WARNING)
+                    return False
+
+                if run_predictions:
                     insert_log("Bắt đầu chạy prediction sau khi crawl xong", LogType.INFO)
                     run_prediction_after_crawl()
-                else:
-                    insert_log("Bỏ qua prediction do lưu dữ liệu thất bại", LogType.WARNING)
                     
                 return data
             else:
@@ -180,7 +236,6 @@ def save_measurements_data(data):
         return False
     
     try:
-        db = get_db()
         docs = []
         saved_count = 0
         error_count = 0
@@ -244,11 +299,21 @@ def save_measurements_data(data):
                 continue
         
         if docs:
-            for doc in docs:
-                db.meter_measurements.insert_one(doc)
-                saved_count += 1
+            saved_count = get_measurement_store().insert(docs)
+            realtime_hub.publish_readings(docs)
                 
             insert_log(f"Đã lưu {saved_count} bản ghi measurements. Lỗi: {error_count}", LogType.INFO)
+
+            if MLConfig.MEASUREMENT_ROLLUPS_ENABLED:
+                try:
+                    rollup = update_rollups_for_measurements(docs)
+                    insert_log(
+                        f"Đã cập nhật rollup measurements: {rollup['hourly']} giờ, {rollup['daily']} ngày",
+                        LogType.INFO
+                    )
+                except Exception as e:
+                    # Rollup có thể dựng lại bằng scripts.rebuild_rollups nên không chặn prediction
+                    insert_log(f"Lỗi khi cập nhật rollup measurements: {str(e)}", LogType.WARNING)
             return True
         else:
             insert_log(f"Không có bản ghi hợp lệ để lưu. Lỗi: {error_count}", LogType.WARNING)
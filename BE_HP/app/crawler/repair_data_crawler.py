@@ -5,6 +5,7 @@ from ..extensions import get_db
 from ..models.log_schemas import LogType
 from ..routes.logs.log_utils import insert_log
 from ..utils.common import find_meterid_by_metername
+from ..utils.search import document_search_fields
 
 def crawl_repair_data(): 
     max_retries = 3
@@ -134,6 +135,7 @@ def save_repair_data(data):
                     "replacement_type": replacement_type,
                     "replacement_location": replacement_location,
                 }
+                doc.update(document_search_fields("meter_repairs", doc))
                 
                 docs.append(doc)
                 
@@ -1,4 +1,7 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING
+import os
+import threading
+from pymongo import MongoClient, ASCENDING, DESCENDING, GEOSPHERE
+from pymongo.errors import DuplicateKeyError
 from flask import current_app, g
 from flask_jwt_extended import JWTManager
 from flask_limiter import Limiter
@@ -12,10 +15,40 @@ limiter = Limiter(
     default_limits=["20000 per day", "600 per hour"]
 )
 
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_mongo_client(uri=None):
+    """
+    MongoClient dùng chung theo (pid, uri): pool connection được tái sử dụng giữa các request
+    thay vì mở client mới mỗi request. Process con sau fork tạo client riêng (MongoClient không fork-safe).
+    """
+    uri = uri or current_app.config["MONGO_URI"]
+    key = (os.getpid(), uri)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                config = current_app.config
+                # Listener luôn gắn: stage pipeline vẫn đo thời gian Mongo khi tắt REQUEST_METRICS_ENABLED,
+                # không có request/stage nào đang đo thì chỉ tốn một lần đọc contextvar
+                from .instrumentation import command_listener
+                listeners = [command_listener]
+                client = MongoClient(
+                    uri,
+                    maxPoolSize=config.get("MONGO_MAX_POOL_SIZE", 100),
+                    waitQueueTimeoutMS=config.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000),
+                    event_listeners=listeners,
+                )
+                _clients[key] = client
+    return client
+
+
 def get_db():
     if "mongo_client" not in g:
-        uri = current_app.config["MONGO_URI"]
-        g.mongo_client = MongoClient(uri)
+        g.mongo_client = get_mongo_client()
     client = g.mongo_client
     dbname = current_app.config["MONGO_DB"]
     return client[dbname]
@@ -27,12 +60,31 @@ def init_indexes(db):
     db.users.create_index([("username", ASCENDING)], unique=True, name="uniq_user_username")
     db.roles.create_index([("role_name", ASCENDING)], unique=True, name="uniq_role_name")
 
+    # Job queue (worker crawl/ML)
+    db.jobs.create_index([("active_key", ASCENDING)], unique=True, sparse=True, name="uniq_job_active_key")
+    db.jobs.create_index([("status", ASCENDING), ("run_at", ASCENDING)], name="idx_job_status_run_at")
+    db.jobs.create_index([("status", ASCENDING), ("lease_until", ASCENDING)], name="idx_job_status_lease")
+    db.jobs.create_index([("created_at", DESCENDING)], name="idx_job_created")
+    # Lịch sử pipeline run (mới nhất trước, so sánh regression theo started_at)
+    db.pipeline_runs.create_index([("started_at", DESCENDING)], name="idx_pipeline_run_started")
+    # JWT bị thu hồi (_id = jti): tự xoá khi token hết hạn, worker đọc tăng dần theo revoked_at
+    db.revoked_tokens.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0, name="ttl_revoked_expires")
+    db.revoked_tokens.create_index([("revoked_at", ASCENDING)], name="idx_revoked_at")
+
     # Company–Branch–Meter
     db.companies.create_index([("name", ASCENDING)], unique=True, name="uniq_company_name")
     db.branches.create_index([("company_id", ASCENDING)], name="idx_branch_company")
     db.branches.create_index([("name", ASCENDING)], name="idx_branch_name")
     db.meters.create_index([("branch_id", ASCENDING)], name="idx_meter_branch")
     db.meters.create_index([("meter_name", ASCENDING)], name="idx_meter_name")
+    # Toạ độ GeoJSON cho /meters/viewport; meter cũ chỉ có longitude/latitude: chạy scripts/backfill_meter_location.py
+    db.meters.create_index([("location", GEOSPHERE)], name="idx_meter_location")
+    # Tìm kiếm không dấu (app/utils/search.py): edge n-gram của meter_name / nội dung repair
+    db.meters.create_index([("search_terms", ASCENDING)], name="idx_meter_search")
+    db.meter_repairs.create_index([("search_terms", ASCENDING)], name="idx_repair_search")
+    # backfill_search_fields (chạy một lần lúc run.py khởi động) tìm document có search_v cũ bằng index
+    db.meters.create_index([("search_v", ASCENDING)], name="idx_meter_search_v")
+    db.meter_repairs.create_index([("search_v", ASCENDING)], name="idx_repair_search_v")
 
     # User–Meter (n–n)
     db.user_meter.create_index([("user_id", ASCENDING)], name="idx_um_user")
@@ -45,27 +97,55 @@ def init_indexes(db):
 
     # Meter data
     db.meter_manual_thresholds.create_index([("meter_id", ASCENDING), ("set_time", DESCENDING)], name="idx_thresh_meter_time")
+    # Một threshold cho mỗi (meter, ngày)
+    _ensure_unique_index(db.meter_manual_thresholds, [("meter_id", ASCENDING), ("set_time", ASCENDING)], "uniq_thresh_meter_day")
     db.meter_consumptions.create_index([("meter_id", ASCENDING), ("recording_date", DESCENDING)], name="idx_consume_meter_month")
     db.meter_repairs.create_index([("meter_id", ASCENDING), ("repair_time", DESCENDING)], name="idx_repair_meter_time")
     db.meter_measurements.create_index([("meter_id", ASCENDING), ("measurement_time", DESCENDING)], name="idx_meas_meter_time")
+    db.meter_measurements.create_index([("measurement_time", ASCENDING)], name="idx_meas_time")
+    # Measurement cache đọc bù theo thời điểm ghi (ingested_at)
+    db.meter_measurements.create_index([("ingested_at", ASCENDING)], name="idx_meas_ingested")
+    db.meter_measurement_buckets.create_index([("meter_id", ASCENDING), ("day", ASCENDING)], unique=True, name="uniq_meas_bucket_meter_day")
+    db.meter_measurement_buckets.create_index([("day", ASCENDING)], name="idx_meas_bucket_day")
+    db.meter_measurement_buckets.create_index([("ingested_at", ASCENDING)], name="idx_meas_bucket_ingested")
+    db.meter_measurements_hourly.create_index([("meter_id", ASCENDING), ("hour", ASCENDING)], unique=True, name="uniq_meas_hourly_meter_hour")
+    db.meter_measurements_daily.create_index([("meter_id", ASCENDING), ("day", ASCENDING)], unique=True, name="uniq_meas_daily_meter_day")
+    db.meter_measurements_daily.create_index([("day", ASCENDING)], name="idx_meas_daily_day")
 
     # AI & Prediction & Alert
     db.ai_models.create_index([("name", ASCENDING)], unique=True, name="uniq_model_name")
     db.predictions.create_index([("meter_id", ASCENDING), ("prediction_time", DESCENDING)], name="idx_pred_meter_time")
     db.predictions.create_index([("model_id", ASCENDING)], name="idx_pred_model")
+    # Khoá upsert của prediction batch: chạy lại pipeline không nhân bản prediction
+    _ensure_unique_index(db.predictions, [("meter_id", ASCENDING), ("model_id", ASCENDING), ("prediction_time", ASCENDING)], "uniq_pred_meter_model_time")
+    db.ml_meter_eligibility.create_index([("meter_id", ASCENDING), ("model", ASCENDING)], unique=True, name="uniq_elig_meter_model")
+    db.lstmae_thresholds.create_index([("meter_id", ASCENDING)], unique=True, name="uniq_lstmae_thresh_meter")
+    db.lstmae_daily_stats.create_index([("meter_id", ASCENDING), ("day", ASCENDING)], unique=True, name="uniq_lstmae_daily_meter_day")
+    db.lstmae_daily_stats.create_index([("day", ASCENDING)], name="idx_lstmae_daily_day")
+    db.ml_meter_eligibility.create_index([("model", ASCENDING), ("eligible", ASCENDING), ("meter_id", ASCENDING)], name="idx_elig_model_meter")
     db.roles.create_index([("role_name", ASCENDING)], unique=True, name="uniq_role_name")
 
 
+def _ensure_unique_index(coll, keys, name):
+    """Tạo unique index; dữ liệu cũ trùng khoá thì dừng khởi động, dọn bằng scripts/dedupe_unique_keys.py"""
+    try:
+        coll.create_index(keys, unique=True, name=name)
+    except DuplicateKeyError as e:
+        raise RuntimeError(
+            f"{coll.name} có document trùng khoá {name}; chạy `python -m scripts.dedupe_unique_keys --dry-run` "
+            f"để xem và `python -m scripts.dedupe_unique_keys` để xoá bản cũ"
+        ) from e
+
+
 def close_db(e=None):
-    client = g.pop("mongo_client", None)
-    if client:
-        client.close()
+    # Client dùng chung cho cả process nên chỉ bỏ tham chiếu, không đóng pool
+    g.pop("mongo_client", None)
 
-TOKEN_BLOCKLIST = set()
 socketio = SocketIO()
 
 
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    return jti in TOKEN_BLOCKLIST
\ No newline at end of file
+    from .utils.token_revocation import revoked_tokens
+
+    return revoked_tokens.is_revoked(jwt_payload.get("jti"))
\ No newline at end of file
@@ -0,0 +1,232 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Flask, request, g
+from pymongo import monitoring
+
+from .config import Config
+from .ml.batching import Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Thống kê Mongo của request hiện tại; contextvar nên tách riêng theo thread/greenlet
+_current = ContextVar("request_mongo_stats", default=None)
+# Thời gian chạy model của stage pipeline hiện tại (xem jobs.pipeline_runs)
+_model_time = ContextVar("pipeline_model_time", default=None)
+
+
+class RequestStats:
+    __slots__ = ("count", "duration_s", "commands")
+
+    def __init__(self, keep_commands=False):
+        self.count = 0
+        self.duration_s = 0.0
+        # (command, collection, ms) khi bật REQUEST_DEBUG_QUERIES
+        self.commands = [] if keep_commands else None
+
+
+class ModelTime:
+    __slots__ = ("seconds",)
+
+    def __init__(self):
+        self.seconds = 0.0
+
+
+def current_stats():
+    """RequestStats đang nhận lệnh Mongo của context hiện tại (request hoặc stage pipeline); None nếu không đo"""
+    return _current.get()
+
+
+def model_time():
+    """ModelTime của stage pipeline đang chạy; None nếu không đo"""
+    return _model_time.get()
+
+
+def bind_stats(stats, model=None):
+    """
+    Cộng lệnh Mongo (và model_timer nếu có model) của context hiện tại vào stats cho tới khi
+    unbind_stats(token). Không phụ thuộc REQUEST_METRICS_ENABLED.
+    """
+    return _current.set(stats), (_model_time.set(model) if model is not None else None)
+
+
+def unbind_stats(token):
+    mongo_token, model_token = token
+    if model_token is not None:
+        _model_time.reset(model_token)
+    _current.reset(mongo_token)
+
+
+@contextmanager
+def model_timer():
+    """Cộng thời gian inference/fine-tune vào stage pipeline đang chạy (không có stage thì bỏ qua)"""
+    holder = _model_time.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if holder is not None:
+            holder.seconds += time.perf_counter() - started
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Cộng số lệnh và thời gian Mongo vào request đang chạy (không có request thì bỏ qua)"""
+
+    def __init__(self):
+        self._targets = {}
+
+    def started(self, event):
+        stats = _current.get()
+        if stats is not None and stats.commands is not None:
+            collection = event.command.get(event.command_name)
+            self._targets[(event.connection_id, event.request_id)] = (
+                collection if isinstance(collection, str) else None
+            )
+
+    def _finish(self, event):
+        stats = _current.get()
+        collection = self._targets.pop((event.connection_id, event.request_id), None)
+        if stats is None:
+            return
+        duration = event.duration_micros / 1e6
+        stats.count += 1
+        stats.duration_s += duration
+        if stats.commands is not None:
+            stats.commands.append((event.command_name, collection, round(duration * 1000, 2)))
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+command_listener = MongoCommandListener()
+
+
+class _RouteMetrics:
+    __slots__ = ("requests", "mongo_commands", "mongo_seconds", "response_bytes", "latency", "queries")
+
+    def __init__(self):
+        self.requests = {}
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.response_bytes = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+
+
+class RequestMetrics:
+    """Metric theo (method, route) trong process hiện tại, xuất dạng Prometheus text"""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def observe(self, method, route, status, wall_s, stats, response_bytes):
+        key = (method, route)
+        with self._lock:
+            metrics = self._routes.get(key)
+            if metrics is None:
+                metrics = self._routes[key] = _RouteMetrics()
+            metrics.requests[status] = metrics.requests.get(status, 0) + 1
+            metrics.mongo_commands += stats.count
+            metrics.mongo_seconds += stats.duration_s
+            metrics.response_bytes += response_bytes
+        metrics.latency.observe(wall_s)
+        metrics.queries.observe(stats.count)
+
+    def render(self):
+        with self._lock:
+            routes = sorted(self._routes.items())
+
+        def labels(method, route, **extra):
+            pairs = {"method": method, "route": route, **extra}
+            return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+        lines = [
+            "# HELP http_requests_total Số request theo route và status",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route), m in routes:
+            for status, count in sorted(m.requests.items()):
+                lines.append(f"http_requests_total{{{labels(method, route, status=status)}}} {count}")
+
+        for name, help_text, attr in (
+            ("http_request_mongo_commands_total", "Số lệnh MongoDB do request phát ra", "mongo_commands"),
+            ("http_request_mongo_seconds_total", "Tổng thời gian lệnh MongoDB của request", "mongo_seconds"),
+            ("http_response_bytes_total", "Tổng số byte response đã serialize", "response_bytes"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (method, route), m in routes:
+                lines.append(f"{name}{{{labels(method, route)}}} {getattr(m, attr)}")
+
+        for name, help_text, attr in (
+            ("http_request_duration_seconds", "Wall time của request", "latency"),
+            ("http_request_mongo_commands", "Số lệnh MongoDB mỗi request", "queries"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (method, route), m in routes:
+                snapshot = getattr(m, attr).snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    lines.append(f"{name}_bucket{{{labels(method, route, le=bound)}}} {count}")
+                lines.append(f"{name}_sum{{{labels(method, route)}}} {snapshot['sum']}")
+                lines.append(f"{name}_count{{{labels(method, route)}}} {snapshot['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_metrics = RequestMetrics()
+
+
+def _response_bytes(response):
+    if response.content_length is not None:
+        return response.content_length
+    if response.is_streamed:
+        return 0
+    return len(response.get_data())
+
+
+def init_instrumentation(app: Flask):
+    """Đo route, status, wall time, số lệnh/thời gian Mongo và kích thước response của mọi request"""
+    if not Config.REQUEST_METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics_started = time.perf_counter()
+        g._metrics_token = _current.set(RequestStats(keep_commands=Config.REQUEST_DEBUG_QUERIES))
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        started = g.pop("_metrics_started", None)
+        token = g.pop("_metrics_token", None)
+        if started is None or token is None:
+            return response
+        stats = _current.get()
+        _current.reset(token)
+
+        wall_s = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        request_metrics.observe(request.method, route, response.status_code, wall_s, stats, _response_bytes(response))
+
+        response.headers["X-Query-Count"] = str(stats.count)
+        response.headers["Server-Timing"] = (
+            f'db;dur={stats.duration_s * 1000:.1f};desc="{stats.count} queries", '
+            f"app;dur={max(wall_s - stats.duration_s, 0) * 1000:.1f}, "
+            f"total;dur={wall_s * 1000:.1f}"
+        )
+
+        if wall_s * 1000 >= Config.REQUEST_SLOW_MS:
+            print(f"Slow request {request.method} {request.path} {response.status_code}: "
+                  f"{wall_s * 1000:.0f}ms, {stats.count} query ({stats.duration_s * 1000:.0f}ms)")
+            for command, collection, ms in stats.commands or []:
+                print(f"    {command} {collection or ''} {ms}ms")
+        return response
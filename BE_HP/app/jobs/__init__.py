@@ -0,0 +1,3 @@
+from .queue import JobQueue, job_queue, enqueue, QUEUED, RUNNING, SUCCEEDED, FAILED
+from .tasks import TASKS, task
+from .pipeline_runs import StageRecorder, new_run_id, list_runs, find_regressions
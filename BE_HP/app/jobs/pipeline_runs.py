@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import resource
+import threading
+import statistics
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from ..extensions import get_db
+from ..instrumentation import RequestStats, ModelTime, bind_stats, unbind_stats
+
+PIPELINE_RUN_COLLECTION = "pipeline_runs"
+
+STAGE_RUNNING = "running"
+STAGE_SUCCEEDED = "succeeded"
+STAGE_FAILED = "failed"
+STAGE_RELEASED = "released"
+
+# Chỉ số của stage được so với các lượt chạy trước khi tìm regression
+STAGE_METRICS = ("duration_s", "mongo_s", "model_s", "cpu_s", "peak_rss_mb", "records_in", "records_out")
+
+
+def new_run_id():
+    return str(ObjectId())
+
+
+def run_id_for(job):
+    """Job do scheduler/crawl enqueue mang args.run_id; job lẻ (admin enqueue) là một run riêng"""
+    return (job.get("args") or {}).get("run_id") or str(job["_id"])
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_rss_mb(who=resource.RUSAGE_SELF):
+    """Đỉnh RSS (MB) của process (hoặc process con với RUSAGE_CHILDREN) từ lúc khởi động"""
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024
+
+
+class _RssSampler(threading.Thread):
+    """Lấy mẫu RSS hiện tại trong lúc stage chạy (ru_maxrss là đỉnh của cả đời process)"""
+
+    def __init__(self, interval=0.5):
+        super().__init__(name="pipeline-rss", daemon=True)
+        self.interval = interval
+        self.peak = _rss_mb()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            rss = _rss_mb()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self._done.set()
+        self.join(timeout=1)
+        rss = _rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+        return self.peak
+
+
+class StageRecorder:
+    """
+    Ghi một stage (một job) vào document pipeline_runs của run: start/end, duration, records
+    in/out (từ result của task), thời gian Mongo (CommandListener),
+    thời gian model (model_timer), CPU (process + process con như pool LSTM) và peak RSS.
+
+    Mongo/model time chỉ tính trong thread chạy task vì contextvar không sang thread khác.
+    """
+
+    def __init__(self, job, worker_id, db=None):
+        self.job = job
+        self.worker_id = worker_id
+        self.run_id = run_id_for(job)
+        self._db = db
+        self._sampler = None
+
+    @property
+    def col(self):
+        return (self._db if self._db is not None else get_db())[PIPELINE_RUN_COLLECTION]
+
+    def start(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.mongo = RequestStats()
+        self.model = ModelTime()
+        self._stats_token = bind_stats(self.mongo, self.model)
+        self._sampler = _RssSampler()
+        self._sampler.start()
+
+        args = self.job.get("args") or {}
+        try:
+            self.col.update_one(
+                {"_id": self.run_id},
+                {
+                    "$setOnInsert": {
+                        "created_at": self.started_at,
+                        "trigger": args.get("trigger", "manual"),
+                    },
+                    "$min": {"started_at": self.started_at},
+                    "$set": {f"stages.{self.job['task']}": {
+                        "status": STAGE_RUNNING,
+                        "job_id": self.job["_id"],
+                        "attempt": self.job.get("attempts", 1),
+                        "worker_id": self.worker_id,
+                        "started_at": self.started_at,
+                    }},
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            print(f"Không ghi được pipeline run {self.run_id}: {e}")
+        return self
+
+    def finish(self, status, result=None, error=None):
+        if self._sampler is None:
+            return
+        finished_at = datetime.now(timezone.utc)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        cpu_children = (children.ru_utime - self._children.ru_utime) + (children.ru_stime - self._children.ru_stime)
+        peak = self._sampler.stop()
+        self._sampler = None
+        unbind_stats(self._stats_token)
+
+        result = result if isinstance(result, dict) else {}
+        stage = {
+            "status": status,
+            "job_id": self.job["_id"],
+            "attempt": self.job.get("attempts", 1),
+            "worker_id": self.worker_id,
+            "started_at": self.started_at,
+            "finished_at": finished_at,
+            "duration_s": round(time.perf_counter() - self._wall, 3),
+            "records_in": result.get("records_in"),
+            "records_out": result.get("records_out"),
+            "mongo_s": round(self.mongo.duration_s, 3),
+            "mongo_commands": self.mongo.count,
+            "model_s": round(self.model.seconds, 3),
+            # process_time gồm cả thread khác của process (web khi APP_ROLE=all)
+            "cpu_s": round(time.process_time() - self._cpu + cpu_children, 3),
+            "peak_rss_mb": round(peak if peak is not None else max_rss_mb(), 1),
+            "children_peak_rss_mb": round(max_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            "error": error,
+        }
+        try:
+            self.col.update_one(
+                {"_id": self.run_id},
+                {
+                    "$set": {f"stages.{self.job['task']}": stage},
+                    "$max": {"finished_at": finished_at},
+                },
+            )
+        except Exception as e:
+            print(f"Không ghi được stage {self.job['task']} của pipeline run {self.run_id}: {e}")
+
+
+def run_status(run):
+    statuses = [stage.get("status") for stage in (run.get("stages") or {}).values()]
+    if STAGE_RUNNING in statuses or STAGE_RELEASED in statuses:
+        return STAGE_RUNNING
+    if STAGE_FAILED in statuses:
+        return STAGE_FAILED
+    return STAGE_SUCCEEDED
+
+
+def list_runs(limit=30, stage=None, db=None):
+    query = {f"stages.{stage}": {"$exists": True}} if stage else {}
+    col = (db if db is not None else get_db())[PIPELINE_RUN_COLLECTION]
+    return list(col.find(query).sort("started_at", -1).limit(limit))
+
+
+def find_regressions(run_id=None, window=10, factor=1.5, min_seconds=5.0, db=None):
+    """
+    So từng stage của run (mặc định run mới nhất) với median của tối đa `window` lượt thành
+    công trước đó. Stage bị coi là regression khi duration > factor * median và chậm hơn
+    median ít nhất min_seconds; kèm duration/record để phân biệt chậm do fleet lớn lên.
+
+    Returns:
+        dict | None: {run_id, started_at, stages: [...]}, None nếu không có run
+    """
+    col = (db if db is not None else get_db())[PIPELINE_RUN_COLLECTION]
+    run = col.find_one({"_id": run_id}) if run_id else next(iter(col.find().sort("started_at", -1).limit(1)), None)
+    if run is None:
+        return None
+
+    stages = []
+    for name, stage in sorted((run.get("stages") or {}).items()):
+        if stage.get("status") != STAGE_SUCCEEDED or stage.get("duration_s") is None:
+            continue
+        previous = list(col.find(
+            {f"stages.{name}.status": STAGE_SUCCEEDED, "started_at": {"$lt": run["started_at"]}},
+            {f"stages.{name}": 1},
+        ).sort("started_at", -1).limit(window))
+        if not previous:
+            continue
+
+        baseline = {}
+        for metric in STAGE_METRICS:
+            values = [p["stages"][name].get(metric) for p in previous]
+            values = [v for v in values if v is not None]
+            baseline[metric] = statistics.median(values) if values else None
+
+        duration, base_duration = stage["duration_s"], baseline["duration_s"]
+        ratio = duration / base_duration if base_duration else None
+        per_record = _per_record(duration, stage.get("records_in"))
+        base_per_record = _per_record(base_duration, baseline["records_in"])
+        stages.append({
+            "stage": name,
+            "current": {metric: stage.get(metric) for metric in STAGE_METRICS},
+            "baseline": baseline,
+            "baseline_runs": len(previous),
+            "ratio": round(ratio, 2) if ratio is not None else None,
+            "seconds_per_record": per_record,
+            "baseline_seconds_per_record": base_per_record,
+            "regressed": bool(ratio and ratio > factor and duration - base_duration >= min_seconds),
+        })
+
+    return {"run_id": run["_id"], "started_at": run.get("started_at"), "stages": stages}
+
+
+def _per_record(seconds, records):
+    return round(seconds / records, 6) if seconds is not None and records else None
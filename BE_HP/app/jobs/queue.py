@@ -0,0 +1,167 @@
+import socket
+import os
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from ..extensions import get_db
+from ..config import Config
+
+JOB_COLLECTION = "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """
+    Hàng đợi job lưu trong MongoDB (collection jobs).
+
+    Worker claim job bằng find_one_and_update nên mỗi job chỉ một worker nhận; job giữ
+    lease (lease_until) và được gia hạn bằng heartbeat. Worker chết thì lease hết hạn và
+    job được worker khác claim lại. Job lỗi được chạy lại với backoff tới max_attempts.
+
+    dedupe_key chỉ cho phép một job queued/running với cùng key (active_key là unique
+    sparse index, bị gỡ khi job kết thúc), dùng để nhiều web process cùng enqueue job
+    theo lịch mà chỉ chạy một lần.
+    """
+
+    def __init__(self, db=None):
+        self._db = db
+
+    @property
+    def col(self):
+        return (self._db if self._db is not None else get_db())[JOB_COLLECTION]
+
+    def enqueue(self, task, args=None, run_at=None, max_attempts=None, lease_seconds=None,
+                dedupe_key=None, parent_id=None):
+        """
+        Returns:
+            ObjectId | None: id job mới, None nếu đã có job active cùng dedupe_key
+        """
+        from .tasks import TASKS
+
+        spec = TASKS.get(task)
+        if spec is None:
+            raise ValueError(f"Task không tồn tại: {task}")
+
+        now = datetime.now(timezone.utc)
+        doc = {
+            "task": task,
+            "args": args or {},
+            "status": QUEUED,
+            "run_at": run_at or now,
+            "attempts": 0,
+            "max_attempts": max_attempts or spec.max_attempts,
+            "lease_seconds": lease_seconds or spec.lease_seconds,
+            "created_at": now,
+            "parent_id": parent_id,
+        }
+        if dedupe_key:
+            doc["dedupe_key"] = dedupe_key
+            doc["active_key"] = dedupe_key
+
+        try:
+            return self.col.insert_one(doc).inserted_id
+        except DuplicateKeyError:
+            return None
+
+    def claim(self, worker_id, tasks=None):
+        """Nhận job đến hạn (hoặc job running đã hết lease) có run_at sớm nhất"""
+        now = datetime.now(timezone.utc)
+        query = {"$or": [
+            {"status": QUEUED, "run_at": {"$lte": now}},
+            {"status": RUNNING, "lease_until": {"$lt": now}},
+        ]}
+        if tasks:
+            query["task"] = {"$in": list(tasks)}
+
+        job = self.col.find_one_and_update(
+            query,
+            {
+                # Lease mặc định đặt ngay khi claim để không worker nào khác claim được trong lúc chỉnh lease theo task
+                "$set": {"status": RUNNING, "worker_id": worker_id, "started_at": now, "heartbeat_at": now,
+                         "lease_until": now + timedelta(seconds=Config.JOB_LEASE_SECONDS)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            return None
+
+        lease_until = now + timedelta(seconds=job.get("lease_seconds") or Config.JOB_LEASE_SECONDS)
+        self.col.update_one({"_id": job["_id"], "worker_id": worker_id}, {"$set": {"lease_until": lease_until}})
+        job["lease_until"] = lease_until
+        return job
+
+    def heartbeat(self, job, worker_id):
+        """Gia hạn lease; False nếu job đã bị worker khác claim lại"""
+        now = datetime.now(timezone.utc)
+        result = self.col.update_one(
+            {"_id": job["_id"], "worker_id": worker_id, "status": RUNNING},
+            {"$set": {
+                "heartbeat_at": now,
+                "lease_until": now + timedelta(seconds=job.get("lease_seconds") or Config.JOB_LEASE_SECONDS),
+            }},
+        )
+        # Cùng mili giây với lần ghi trước thì update không đổi gì (modified_count = 0) nhưng job vẫn của worker này
+        return result.matched_count == 1
+
+    def complete(self, job, worker_id, result=None):
+        now = datetime.now(timezone.utc)
+        return self.col.update_one(
+            {"_id": job["_id"], "worker_id": worker_id},
+            {"$set": {"status": SUCCEEDED, "finished_at": now, "result": result, "error": None},
+             "$unset": {"active_key": "", "lease_until": ""}},
+        ).modified_count == 1
+
+    def fail(self, job, worker_id, error):
+        """Đưa job về queued với backoff, hoặc đánh dấu failed khi hết lượt thử"""
+        now = datetime.now(timezone.utc)
+        if job["attempts"] < job["max_attempts"]:
+            delay = Config.JOB_RETRY_BASE_SECONDS * (2 ** (job["attempts"] - 1))
+            update = {
+                "$set": {"status": QUEUED, "run_at": now + timedelta(seconds=delay), "error": error},
+                "$unset": {"lease_until": "", "worker_id": ""},
+            }
+        else:
+            update = {
+                "$set": {"status": FAILED, "finished_at": now, "error": error},
+                "$unset": {"active_key": "", "lease_until": ""},
+            }
+        return self.col.update_one({"_id": job["_id"], "worker_id": worker_id}, update).modified_count == 1
+
+    def release(self, job, worker_id):
+        """Trả job về hàng đợi ngay (worker dừng giữa chừng), không tính là một lượt thử"""
+        return self.col.update_one(
+            {"_id": job["_id"], "worker_id": worker_id, "status": RUNNING},
+            {"$set": {"status": QUEUED, "run_at": datetime.now(timezone.utc)},
+             "$inc": {"attempts": -1},
+             "$unset": {"lease_until": "", "worker_id": ""}},
+        ).modified_count == 1
+
+    def list(self, status=None, task=None, limit=50):
+        query = {}
+        if status:
+            query["status"] = status
+        if task:
+            query["task"] = task
+        return list(self.col.find(query).sort("created_at", -1).limit(limit))
+
+    def get(self, job_id):
+        return self.col.find_one({"_id": job_id})
+
+
+job_queue = JobQueue()
+
+
+def enqueue(task, **kwargs):
+    return job_queue.enqueue(task, **kwargs)
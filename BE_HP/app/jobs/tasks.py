@@ -0,0 +1,108 @@
+from collections import namedtuple
+from datetime import datetime
+
+from ..models.log_schemas import LogType
+from ..routes.logs.log_utils import insert_log
+from .pipeline_runs import run_id_for
+
+TaskSpec = namedtuple("TaskSpec", ["name", "fn", "max_attempts", "lease_seconds"])
+
+TASKS = {}
+
+
+def task(name, max_attempts=3, lease_seconds=300):
+    """Đăng ký task cho job queue; task lỗi thì raise để được chạy lại"""
+    def decorator(fn):
+        TASKS[name] = TaskSpec(name, fn, max_attempts, lease_seconds)
+        return fn
+    return decorator
+
+
+def _daily_key(name):
+    return f"{name}:{datetime.now().strftime('%Y-%m-%d')}"
+
+
+def _child_args(job):
+    """Job con thuộc cùng pipeline run với job cha"""
+    return {"run_id": run_id_for(job), "trigger": (job.get("args") or {}).get("trigger", "manual")}
+
+
+@task("crawl_measurements", max_attempts=3, lease_seconds=600)
+def crawl_measurements(job, queue):
+    """Crawl measurements rồi enqueue LSTM-AE và LSTM nếu lưu được dữ liệu mới"""
+    from ..crawler.meter_measurements_crawler import crawl_measurements_data, check_api_health
+
+    if not check_api_health():
+        raise RuntimeError("API health check failed")
+
+    data = crawl_measurements_data(run_predictions=False)
+    if data is None:
+        raise RuntimeError("Crawl measurements thất bại")
+    if data is False:
+        insert_log("Bỏ qua prediction do lưu dữ liệu thất bại", LogType.WARNING)
+        return {"records": 0, "records_in": 0, "records_out": 0, "predictions_enqueued": False}
+
+    if data:
+        # Mỗi stage ML là một job riêng để retry/resume độc lập
+        for name in ("predict_lstmae", "predict_lstm"):
+            queue.enqueue(name, args=_child_args(job), dedupe_key=_daily_key(name), parent_id=job["_id"])
+    return {"records": len(data), "records_in": len(data), "records_out": len(data),
+            "predictions_enqueued": bool(data)}
+
+
+@task("crawl_repairs", max_attempts=3, lease_seconds=600)
+def crawl_repairs(job, queue):
+    from ..crawler.repair_data_crawler import crawl_repair_data
+
+    data = crawl_repair_data()
+    if data is None:
+        raise RuntimeError("Crawl repairs thất bại")
+    return {"records": len(data), "records_in": len(data), "records_out": len(data)}
+
+
+@task("predict_lstmae", max_attempts=3, lease_seconds=900)
+def predict_lstmae(job, queue):
+    # Lượt chạy lại tiếp tục từ RunCheckpoint nên retry không làm lại các shard đã xong
+    from ..crawler.meter_measurements_crawler import run_lstmae_prediction_after_crawl
+
+    result = run_lstmae_prediction_after_crawl()
+    if not result:
+        raise RuntimeError("LSTM-AE prediction thất bại")
+    return _prediction_summary(result)
+
+
+@task("predict_lstm", max_attempts=3, lease_seconds=900)
+def predict_lstm(job, queue):
+    from ..crawler.meter_measurements_crawler import run_lstm_prediction_after_crawl
+
+    result = run_lstm_prediction_after_crawl()
+    if not result:
+        raise RuntimeError("LSTM prediction thất bại")
+    if result.get("cancelled"):
+        # Bị huỷ khi worker dừng: raise để worker trả job về hàng đợi (release) thay vì complete;
+        # lượt sau tiếp tục các shard còn lại từ checkpoint
+        raise RuntimeError("LSTM prediction bị huỷ giữa chừng")
+    return _prediction_summary(result)
+
+
+def _prediction_summary(result):
+    return {
+        "records_in": result.get("total_data_points", 0) + result.get("today_data_points", 0),
+        "records_out": result.get("predictions_saved", 0),
+        "meters_processed": result.get("meters_processed", 0),
+        "predictions_inserted": result.get("predictions_inserted", 0),
+        "predictions_updated": result.get("predictions_updated", 0),
+    }
+
+
+@task("daily_thresholds", max_attempts=3, lease_seconds=600)
+def daily_thresholds(job, queue):
+    from ..routes.meter.meter_utils import create_daily_thresholds_for_all_meters
+
+    result = create_daily_thresholds_for_all_meters()
+    insert_log(
+        f"Đã tạo threshold tự động: {result['success_count']} thành công, {result['error_count']} lỗi",
+        LogType.INFO
+    )
+    return {"success_count": result["success_count"], "error_count": result["error_count"],
+            "records_in": result["success_count"] + result["error_count"], "records_out": result["success_count"]}
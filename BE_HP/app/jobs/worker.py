@@ -0,0 +1,133 @@
+"""
+Worker chạy job từ hàng đợi jobs (crawl, LSTM-AE, LSTM, threshold) ngoài web process.
+
+    APP_ROLE=worker python -m app.jobs.worker --tasks predict_lstm predict_lstmae
+"""
+import time
+import signal
+import argparse
+import threading
+import traceback
+
+from ..config import Config
+from ..models.log_schemas import LogType
+from ..routes.logs.log_utils import insert_log
+from .queue import job_queue, default_worker_id
+from .pipeline_runs import StageRecorder, STAGE_SUCCEEDED, STAGE_FAILED, STAGE_RELEASED
+from .tasks import TASKS
+
+
+class Worker:
+    def __init__(self, app, tasks=None, worker_id=None, poll_seconds=None, queue=None):
+        self.app = app
+        self.tasks = list(tasks) if tasks else None
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_seconds = poll_seconds if poll_seconds is not None else Config.JOB_POLL_SECONDS
+        self.queue = queue or job_queue
+        self.current_job = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Dừng vòng lặp; job đang chạy được huỷ và trả về hàng đợi"""
+        self._stop.set()
+        if self.current_job is not None:
+            from ..crawler.meter_measurements_crawler import cancel_running_predictions
+            cancel_running_predictions()
+
+    def _heartbeat(self, job, done):
+        interval = max(1.0, (job.get("lease_seconds") or Config.JOB_LEASE_SECONDS) / 3)
+        while not done.wait(interval):
+            with self.app.app_context():
+                if not self.queue.heartbeat(job, self.worker_id):
+                    insert_log(f"Job {job['_id']} ({job['task']}) đã mất lease", LogType.WARNING)
+                    return
+
+    def run_job(self, job):
+        spec = TASKS.get(job["task"])
+        if spec is None:
+            self.queue.fail(job, self.worker_id, f"Task không tồn tại: {job['task']}")
+            return
+
+        if job["attempts"] > job["max_attempts"]:
+            # Job bị claim lại sau khi worker trước chết quá nhiều lần
+            self.queue.fail(job, self.worker_id, "Vượt quá số lần thử (lease hết hạn)")
+            return
+
+        insert_log(f"Worker {self.worker_id} bắt đầu job {job['task']} (lần {job['attempts']}/{job['max_attempts']})", LogType.INFO)
+        self.current_job = job
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        started = time.perf_counter()
+        stage = StageRecorder(job, self.worker_id).start()
+        try:
+            result = spec.fn(job, self.queue)
+        except Exception as e:
+            done.set()
+            if self._stop.is_set():
+                stage.finish(STAGE_RELEASED, error=str(e))
+                self.queue.release(job, self.worker_id)
+                insert_log(f"Job {job['task']} bị dừng, đã trả về hàng đợi", LogType.WARNING)
+                return
+            stage.finish(STAGE_FAILED, error=str(e))
+            insert_log(f"Job {job['task']} lỗi: {str(e)}", LogType.ERROR)
+            self.queue.fail(job, self.worker_id, f"{e}\n{traceback.format_exc(limit=5)}")
+            return
+        finally:
+            done.set()
+            heartbeat.join(timeout=1)
+            self.current_job = None
+
+        stage.finish(STAGE_SUCCEEDED, result=result)
+        self.queue.complete(job, self.worker_id, result)
+        insert_log(f"Job {job['task']} hoàn thành trong {time.perf_counter() - started:.1f}s", LogType.INFO)
+
+    def run_once(self):
+        """Claim và chạy một job; False nếu hàng đợi trống"""
+        with self.app.app_context():
+            job = self.queue.claim(self.worker_id, self.tasks)
+            if job is None:
+                return False
+            self.run_job(job)
+            return True
+
+    def run_forever(self):
+        insert_log(f"Worker {self.worker_id} khởi động (tasks: {', '.join(self.tasks or TASKS)})", LogType.INFO)
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"Worker {self.worker_id} lỗi khi xử lý hàng đợi: {e}")
+            self._stop.wait(self.poll_seconds)
+
+
+def start_worker_thread(app, tasks=None):
+    """Worker chạy trong thread nền của web process (APP_ROLE=all)"""
+    worker = Worker(app, tasks)
+    thread = threading.Thread(target=worker.run_forever, name="job-worker", daemon=True)
+    thread.start()
+    return worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker chạy job crawl/ML từ hàng đợi")
+    parser.add_argument("--tasks", nargs="+", choices=sorted(TASKS), default=None, help="Chỉ nhận các task này")
+    parser.add_argument("--poll", type=float, default=None, help="Chu kỳ kiểm tra hàng đợi (giây)")
+    args = parser.parse_args()
+
+    from .. import create_app
+    app = create_app(role="worker")
+    worker = Worker(app, args.tasks, poll_seconds=args.poll)
+
+    def handle_signal(signum, frame):
+        print(f"Nhận signal {signum}, dừng worker...")
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1 @@
-from .lstm_autoencoder import predictor as lstm_autoencoder_predictor
-from .lstm import predictor as lstm_predictor
+from .registry import model_registry, get_lstmae_model, get_lstm_base_model
@@ -0,0 +1,184 @@
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from ..utils.offload import run_cpu_bound
+
+
+def _gevent_hub_without_patch():
+    """
+    True khi đang chạy trong gevent nhưng threading chưa bị monkey patch.
+
+    Khi đó Future.result() sẽ chặn cả OS thread (và mọi greenlet khác), nên caller phải
+    chờ trên primitive của gevent để các request đồng thời còn kịp vào hàng đợi.
+    """
+    if "gevent" not in sys.modules:
+        return False
+    try:
+        from gevent import monkey
+        from gevent._hub_local import get_hub_if_exists
+        if monkey.is_module_patched("threading"):
+            return False
+        # Chỉ thread đang chạy hub (thread phục vụ request của pywsgi) mới có hub
+        return get_hub_if_exists() is not None
+    except Exception:
+        return False
+
+
+class Histogram:
+    """Histogram bucket cố định (kiểu Prometheus, giá trị tích luỹ)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    return
+            self._counts[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = cumulative + self._counts[-1]
+            return {
+                "count": self._count,
+                "sum": self._sum,
+                "mean": self._sum / self._count if self._count else 0.0,
+                "buckets": buckets,
+            }
+
+
+class MicroBatcher:
+    """
+    Gom các request chấm điểm đồng thời thành một forward pass.
+
+    Worker thread lấy item đầu tiên rồi chờ thêm tối đa max_wait_ms hoặc tới khi đủ
+    max_batch_size, gọi batch_fn(items) một lần và trả kết quả về Future của từng caller.
+
+    Usage:
+        batcher = MicroBatcher(lambda items: [...], max_batch_size=64, max_wait_ms=5)
+        result = batcher.call(item)
+    """
+
+    def __init__(self, batch_fn, max_batch_size=64, max_wait_ms=5.0, name="micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.queue_depth = Histogram((0, 1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.batch_size = Histogram((1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+        self.wait_ms = Histogram((0.5, 1, 2, 5, 10, 25, 50, 100, 250))
+        self.batches = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Đưa item vào hàng đợi, trả về concurrent.futures.Future"""
+        self._ensure_started()
+        future = Future()
+        self.queue_depth.observe(self._queue.qsize())
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def call(self, item, timeout=None):
+        """submit() rồi chờ kết quả; an toàn khi chạy trong greenlet của gevent"""
+        future = self.submit(item)
+        if _gevent_hub_without_patch():
+            from gevent import Timeout, get_hub
+            from gevent.hub import Waiter
+            # Async watcher nhận send() từ batch thread và đánh thức greenlet này qua loop của hub
+            hub = get_hub()
+            watcher = hub.loop.async_()
+            waiter = Waiter(hub)
+            watcher.start(waiter.switch, None)
+            try:
+                future.add_done_callback(lambda _: watcher.send())
+                with Timeout(timeout, False):
+                    waiter.get()
+            finally:
+                watcher.close()
+            return future.result(timeout=0)
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.wait_ms.observe((started - enqueued) * 1000)
+            self.batch_size.observe(len(batch))
+            self.batches += 1
+
+            futures = [f for _, f, _ in batch]
+            try:
+                # Khi gevent đã patch, vòng lặp này là greenlet: forward pass chạy trên native thread pool
+                results = list(run_cpu_bound(self.batch_fn, [item for item, _, _ in batch]))
+            except Exception as e:
+                self.errors += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            if len(results) < len(futures):
+                # Thiếu kết quả thì báo lỗi cho caller còn lại thay vì để call(timeout=None) treo mãi
+                self.errors += 1
+                error = RuntimeError(
+                    f"{self.name}: batch_fn trả về {len(results)} kết quả cho {len(futures)} item"
+                )
+                for future in futures[len(results):]:
+                    future.set_exception(error)
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "pending": self._queue.qsize(),
+            "batches": self.batches,
+            "errors": self.errors,
+            "queue_depth": self.queue_depth.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
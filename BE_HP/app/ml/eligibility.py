@@ -0,0 +1,201 @@
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+
+from ..extensions import get_db
+from ..config import MLConfig
+from ..utils.rollups import DAILY_COLLECTION
+from ..utils.measurement_store import get_measurement_store
+
+ELIGIBILITY_COLLECTION = "ml_meter_eligibility"
+CHECKPOINT_COLLECTION = "ml_run_checkpoints"
+
+
+def refresh_eligibility(model_name, start_time, end_time, min_days=None, min_points_per_day=None):
+    """
+    Tính lại danh sách meter đủ điều kiện chạy model trong khoảng [start_time, end_time].
+
+    Meter đủ điều kiện khi không bị tắt thủ công (meters.ml_enabled != False) và có
+    ít nhất min_days ngày, mỗi ngày >= min_points_per_day điểm instant_flow.
+    Kết quả lưu vào ml_meter_eligibility theo (meter_id, model).
+
+    Returns:
+        dict: eligible, ineligible, disabled
+    """
+    db = get_db()
+    requirements = MLConfig.ML_ELIGIBILITY.get(model_name, {})
+    min_days = min_days if min_days is not None else requirements.get("min_days", 1)
+    if min_points_per_day is None:
+        min_points_per_day = requirements.get("min_points_per_day", MLConfig.ML_MIN_POINTS_PER_DAY)
+
+    if MLConfig.ML_USE_ROLLUPS:
+        # Rollup ngày đã có sẵn số điểm instant_flow của từng ngày
+        coverage = {doc["_id"]: doc for doc in db[DAILY_COLLECTION].aggregate([
+            {"$match": {"day": {"$gte": start_time, "$lte": end_time}}},
+            {"$group": {
+                "_id": "$meter_id",
+                "points": {"$sum": "$flow_count"},
+                "days": {"$sum": {"$cond": [{"$gte": ["$flow_count", min_points_per_day]}, 1, 0]}},
+            }},
+        ], allowDiskUse=True)}
+    else:
+        coverage = get_measurement_store().coverage(start_time, end_time, min_points_per_day)
+
+    now = datetime.now(timezone.utc)
+    ops = []
+    stats = {"eligible": 0, "ineligible": 0, "disabled": 0}
+
+    for meter in db.meters.find({}, {"meter_name": 1, "ml_enabled": 1}):
+        meter_cov = coverage.get(meter["_id"], {})
+        days = meter_cov.get("days", 0)
+        enabled = meter.get("ml_enabled", True) is not False
+
+        if not enabled:
+            reason = "disabled"
+            stats["disabled"] += 1
+        elif days < min_days:
+            reason = "insufficient_data"
+            stats["ineligible"] += 1
+        else:
+            reason = None
+            stats["eligible"] += 1
+
+        ops.append(UpdateOne(
+            {"meter_id": meter["_id"], "model": model_name},
+            {"$set": {
+                "meter_name": meter.get("meter_name"),
+                "eligible": reason is None,
+                "reason": reason,
+                "days_with_data": days,
+                "points": meter_cov.get("points", 0),
+                "window_start": start_time,
+                "window_end": end_time,
+                "updated_at": now,
+            }},
+            upsert=True,
+        ))
+
+        if len(ops) >= 1000:
+            db[ELIGIBILITY_COLLECTION].bulk_write(ops, ordered=False)
+            ops = []
+
+    if ops:
+        db[ELIGIBILITY_COLLECTION].bulk_write(ops, ordered=False)
+
+    return stats
+
+
+def eligible_meter_ids(model_name):
+    """Danh sách _id của meter đủ điều kiện (chỉ id, bộ nhớ nhỏ kể cả khi có hàng nghìn meter)"""
+    db = get_db()
+    cursor = db[ELIGIBILITY_COLLECTION].find(
+        {"model": model_name, "eligible": True}, {"meter_id": 1}
+    ).sort("meter_id", 1)
+    return [doc["meter_id"] for doc in cursor]
+
+
+def iter_eligible_meter_shards(model_name, shard_size=None, after_meter_id=None):
+    """
+    Duyệt meter đủ điều kiện theo từng shard cố định, sắp xếp theo meter_id.
+
+    Mỗi shard là một query riêng (phân trang theo meter_id) nên không giữ cursor
+    mở trong lúc xử lý shard lâu.
+
+    Yields:
+        list[dict]: [{'meter_id': ObjectId, 'meter_name': str}, ...]
+    """
+    db = get_db()
+    shard_size = shard_size or MLConfig.ML_SHARD_SIZE
+    last_id = after_meter_id
+
+    while True:
+        query = {"model": model_name, "eligible": True}
+        if last_id is not None:
+            query["meter_id"] = {"$gt": last_id}
+
+        shard = [
+            {"meter_id": doc["meter_id"], "meter_name": doc.get("meter_name")}
+            for doc in db[ELIGIBILITY_COLLECTION]
+            .find(query, {"meter_id": 1, "meter_name": 1})
+            .sort("meter_id", 1)
+            .limit(shard_size)
+        ]
+        if not shard:
+            return
+
+        yield shard
+
+        if len(shard) < shard_size:
+            return
+        last_id = shard[-1]["meter_id"]
+
+
+class RunCheckpoint:
+    """
+    Checkpoint tiến độ một lượt predict theo ngày: lưu meter_id cuối của shard đã xong.
+
+    Nếu process chết giữa chừng, lượt chạy lại trong cùng ngày tiếp tục từ shard kế tiếp.
+    Lượt đã completed thì chạy lại từ đầu (chạy thủ công lần hai).
+    """
+
+    def __init__(self, model_name, run_date=None):
+        self.model_name = model_name
+        self.run_date = run_date or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        self.key = f"{model_name}:{self.run_date}"
+
+    def _col(self):
+        return get_db()[CHECKPOINT_COLLECTION]
+
+    def start(self):
+        """
+        Bắt đầu hoặc tiếp tục lượt chạy.
+
+        Returns:
+            tuple: (last_meter_id hoặc None, resumed: bool)
+        """
+        now = datetime.now(timezone.utc)
+        doc = self._col().find_one({"_id": self.key})
+
+        if doc and doc.get("status") == "running" and doc.get("last_meter_id") is not None:
+            self._col().update_one(
+                {"_id": self.key},
+                {"$set": {"resumed_at": now, "updated_at": now}, "$inc": {"resume_count": 1}},
+            )
+            return doc["last_meter_id"], True
+
+        self._col().replace_one(
+            {"_id": self.key},
+            {
+                "_id": self.key,
+                "model": self.model_name,
+                "run_date": self.run_date,
+                "status": "running",
+                "last_meter_id": None,
+                "shards_done": 0,
+                "meters_done": 0,
+                "predictions_saved": 0,
+                "started_at": now,
+                "updated_at": now,
+            },
+            upsert=True,
+        )
+        return None, False
+
+    def advance(self, last_meter_id, meters_done, predictions_saved):
+        """Ghi nhận một shard đã xử lý và lưu DB xong"""
+        self._col().update_one(
+            {"_id": self.key},
+            {
+                "$set": {"last_meter_id": last_meter_id, "updated_at": datetime.now(timezone.utc)},
+                "$inc": {
+                    "shards_done": 1,
+                    "meters_done": meters_done,
+                    "predictions_saved": predictions_saved,
+                },
+            },
+        )
+
+    def complete(self):
+        self._col().update_one(
+            {"_id": self.key},
+            {"$set": {"status": "completed", "updated_at": datetime.now(timezone.utc)}},
+        )
@@ -1,3 +1 @@
 from .predict import init_predictor
-
-predictor = init_predictor()
\ No newline at end of file
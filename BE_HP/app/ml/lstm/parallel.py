@@ -0,0 +1,174 @@
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Biến môi trường giới hạn thread cho TensorFlow/BLAS trong worker.
+# Phải có sẵn trong môi trường lúc spawn vì worker import keras trước khi chạy initializer.
+_THREAD_ENV_VARS = (
+    "TF_NUM_INTRAOP_THREADS",
+    "TF_NUM_INTEROP_THREADS",
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+)
+
+_worker_predictor = None
+
+
+def resolve_workers(workers):
+    if workers is None or workers < 0:
+        return 1
+    if workers == 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _init_worker(model_path, historical_context, tf_threads):
+    """Chạy một lần trong mỗi worker: pin thread TF và load base model."""
+    global _worker_predictor
+
+    try:
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(tf_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(tf_threads)
+    except Exception:
+        # Runtime TF đã khởi tạo: giới hạn đã được áp dụng qua biến môi trường
+        pass
+
+    from .predict import LSTM_Predictor
+    _worker_predictor = LSTM_Predictor(
+        historical_context=historical_context,
+        model_path=model_path,
+        debug=False
+    )
+    # Load base model ngay trong initializer thay vì ở meter đầu tiên
+    _worker_predictor.base_model
+
+
+def _run_meter(meter_name, meter_historical, meter_today):
+    return _worker_predictor.predict_single_meter(meter_name, meter_historical, meter_today)
+
+
+class _pinned_thread_env:
+    def __init__(self, tf_threads):
+        self.tf_threads = str(tf_threads)
+        self._saved = {}
+
+    def __enter__(self):
+        for name in _THREAD_ENV_VARS:
+            self._saved[name] = os.environ.get(name)
+            os.environ[name] = self.tf_threads
+        return self
+
+    def __exit__(self, *exc):
+        for name, value in self._saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        return False
+
+
+class MeterWorkerPool:
+    """
+    Pool N process dùng chung cho cả lượt predict (mỗi worker chỉ load base model một lần).
+    Worker chết giữa chừng (OOM, segfault) làm hỏng cả pool: các meter chưa xong của shard đó
+    bị tính là failed và pool được tạo lại ở lần run kế tiếp.
+
+    Usage:
+        with MeterWorkerPool(model_path, 4, workers=4) as pool:
+            result = pool.run(jobs, cancel_event)
+    """
+
+    def __init__(self, model_path, historical_context, workers, tf_threads=1, debug=False):
+        self.model_path = model_path
+        self.historical_context = historical_context
+        self.workers = resolve_workers(workers)
+        self.tf_threads = tf_threads
+        self.debug = debug
+        self._env = _pinned_thread_env(tf_threads)
+        self._executor = None
+        self._broken = False
+        self.restarts = 0
+
+    def _start(self):
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),  # TensorFlow không an toàn với fork
+            initializer=_init_worker,
+            initargs=(self.model_path, self.historical_context, self.tf_threads),
+        )
+        self._broken = False
+
+    def _restart(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._start()
+        self.restarts += 1
+
+    def __enter__(self):
+        self._env.__enter__()
+        self._start()
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self._executor is not None:
+                # Meter đang chạy dở sẽ hoàn tất, meter chưa bắt đầu bị huỷ
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+        finally:
+            self._env.__exit__(*exc)
+        return False
+
+    def run(self, jobs, cancel_event=None):
+        """
+        Fine-tune và predict từng meter trên pool.
+
+        Args:
+            jobs: list (meter_name, meter_historical, meter_today)
+            cancel_event: threading.Event, khi set thì huỷ các meter chưa chạy
+
+        Returns:
+            dict: predictions (gom về process cha để ghi DB một lần), failed_meters, cancelled
+        """
+        predictions = []
+        failed_meters = []
+        cancelled = False
+
+        if self._broken:
+            self._restart()
+
+        pending = {}
+        for i, (meter_name, meter_historical, meter_today) in enumerate(jobs):
+            try:
+                future = self._executor.submit(_run_meter, meter_name, meter_historical, meter_today)
+            except BrokenProcessPool:
+                self._broken = True
+                failed_meters.extend(job[0] for job in jobs[i:])
+                break
+            pending[future] = meter_name
+
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                cancelled = True
+                for future in pending:
+                    future.cancel()
+                break
+
+            done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+            for future in done:
+                meter_name = pending.pop(future)
+                try:
+                    predictions.extend(future.result())
+                except BrokenProcessPool as e:
+                    failed_meters.append(meter_name)
+                    if not self._broken:
+                        print(f"Worker pool bị hỏng khi xử lý meter {meter_name}, sẽ tạo lại pool: {e}")
+                    self._broken = True
+                except Exception as e:
+                    failed_meters.append(meter_name)
+                    if self.debug:
+                        print(f"Lỗi fine-tune meter {meter_name} trong worker: {e}")
+
+        return {'predictions': predictions, 'failed_meters': failed_meters, 'cancelled': cancelled}
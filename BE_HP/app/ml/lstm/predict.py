@@ -1,55 +1,42 @@
 import os
-import pandas as pd
 import numpy as np
-from keras.models import load_model, clone_model
+from keras.models import clone_model
 from keras.optimizers import Adam
 from sklearn.preprocessing import MinMaxScaler
 from datetime import datetime, timedelta, timezone, date
 import pickle
+import threading
+from contextlib import ExitStack
 
-from ...extensions import get_db
-from ...utils import to_object_id
 from ...utils.ml_utils import preprocess_data_lstm
+from ...utils.rollups import find_daily
+from ...utils.measurement_store import get_measurement_store
 from ...config import MLConfig
+from ..registry import get_lstm_base_model
+from ..prediction_writer import upsert_predictions, deferred_status_publish
+from ...instrumentation import model_timer
+from ..eligibility import refresh_eligibility, iter_eligible_meter_shards, RunCheckpoint
+from .parallel import MeterWorkerPool, resolve_workers
 
-ok_meters = [
-    'DU LỄ 1',
-    'DU LỄ 2',
-    'DU LỄ 3',
-    'DU LỄ 4',
-    'TÂN VIÊN 1',
-    'TÂN VIÊN 2',
-    'TÂN VIÊN 3',
-]
+MODEL_NAME = 'lstm'
 
 class LSTM_Predictor:
-    def __init__(self, historical_context=None, model_path=None, scaler_path=None, debug=True):
+    def __init__(self, historical_context=None, model_path=None, scaler_path=None, debug=True, workers=1, tf_threads=1):
         default_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pretrained_weights', 'base_lstm_model.h5'))
 
         self.historical_context = historical_context or 4
         self.model_path = model_path or default_path
         self.debug = debug
-        self.base_model = None
         self.scaler = MinMaxScaler()
-        
-        self._load_base_model()
+        self.workers = workers
+        self.tf_threads = tf_threads
+        self._cancel_event = threading.Event()
+
+    @property
+    def base_model(self):
+        """Base model dùng chung qua model registry (load lười, tự reload khi file đổi)"""
+        return get_lstm_base_model(self.model_path)
 
-    def _load_base_model(self):
-        try:
-            if os.path.exists(self.model_path):
-                self.base_model = load_model(self.model_path)
-                if self.debug:
-                    print(f"Model loaded from {self.model_path}")
-            else:
-                if self.debug:
-                    print(f"Model not found at {self.model_path}")
-                return False
-        except Exception as e:
-            if self.debug:
-                print(f"Error loading model: {e}")
-            return False
-        return True
-    
     def prepare_data(self, values, look_back):
         X = []
         for i in range(len(values) - look_back + 1):
@@ -109,32 +96,38 @@ class LSTM_Predictor:
         end_time = now
         return start_time, end_time
     
-    def fetch_meter_data(self, start_time, end_time):
-        db = get_db()
+    def fetch_meter_data(self, start_time, end_time, meters):
+        """Lấy measurements của một shard meter bằng một query duy nhất"""
+        if not meters:
+            return []
+
+        names = {m['meter_id']: m['meter_name'] for m in meters}
+        rows = get_measurement_store().find(names.keys(), start_time, end_time)
+
         all_meter_data = []
-        
-        for meter_name in ok_meters:
-            meter = db.meters.find_one({"meter_name": meter_name})
-            if not meter:
-                continue
-                
-            meter_id = meter["_id"]
-            
-            measurements = list(db.meter_measurements.find({
-                "meter_id": meter_id,
-                "measurement_time": {
-                    "$gte": start_time,
-                    "$lte": end_time
-                }
-            }).sort("measurement_time", 1))
-            
-            for measurement in measurements:
-                measurement['meter_name'] = meter_name
-                measurement['meter_id'] = str(meter_id)
-                all_meter_data.append(measurement)
-        
+        for measurement in rows:
+            meter_id = measurement['meter_id']
+            measurement['meter_name'] = names[meter_id]
+            measurement['meter_id'] = str(meter_id)
+            all_meter_data.append(measurement)
+
         return all_meter_data
 
+    def fetch_meter_daily(self, start_time, end_time, meters):
+        """Lấy rollup ngày (sum/count instant_flow) của một shard meter thay cho dữ liệu thô"""
+        if not meters:
+            return []
+
+        names = {m['meter_id']: m['meter_name'] for m in meters}
+        rows = find_daily(
+            names.keys(), start_time, end_time,
+            projection={"_id": 0, "meter_id": 1, "day": 1, "flow_sum": 1, "flow_count": 1},
+        )
+        for row in rows:
+            row['meter_name'] = names[row['meter_id']]
+            row['meter_id'] = str(row['meter_id'])
+        return rows
+
     def fine_tune_model(self, meter_data, scaler):
         daily_averages, dates, _ = preprocess_data_lstm(
             meter_data, 
@@ -145,8 +138,9 @@ class LSTM_Predictor:
         X_ft = self.prepare_data(daily_averages, self.historical_context)
         y_ft = daily_averages[self.historical_context - 1:]
         
-        model = clone_model(self.base_model)
-        model.set_weights(self.base_model.get_weights())
+        base_model = self.base_model
+        model = clone_model(base_model)
+        model.set_weights(base_model.get_weights())
         model.compile(
             optimizer=Adam(learning_rate=1e-4), 
             loss='mse'
@@ -207,27 +201,9 @@ class LSTM_Predictor:
             return []
 
     def save_predictions_to_db(self, predictions):
-        if not predictions:
-            return 0
-            
-        db = get_db()
-        
-        lstm_model = db.ai_models.find_one({"name": "lstm"})
-        if not lstm_model:
-            lstm_model = {
-                "name": "lstm",
-                "_id": to_object_id()
-            }
-            db.ai_models.insert_one(lstm_model)
-        
-        model_id = lstm_model["_id"]
-        
-        prediction_docs = []
-        for pred in predictions:
-            meter = db.meters.find_one({"meter_name": pred['meter_name']})
-            if not meter:
-                continue
-            
+        """Upsert prediction của lượt chạy; trả về {inserted, updated, skipped}"""
+        rows = []
+        for pred in predictions or []:
             if pred['NN_level'] in ['NNcao', 'NNTB']:
                 label = 'leak'
             else:
@@ -240,49 +216,162 @@ class LSTM_Predictor:
             else:
                 prediction_time = datetime.combine(pred['date'], datetime.min.time())
             
-            prediction_docs.append({
-                "meter_id": meter["_id"],
-                "model_id": model_id,
+            rows.append({
+                "meter_name": pred['meter_name'],
                 "prediction_time": prediction_time,
                 "predicted_label": label,
                 "confidence": pred['NN_level'],
                 "recorded_instant_flow": pred['avg_instant_flow'],
             })
         
-        if prediction_docs:
-            result = db.predictions.insert_many(prediction_docs)
-            return len(result.inserted_ids)
-            
-        return 0
+        return upsert_predictions(MODEL_NAME, rows)
+
+    def predict_single_meter(self, meter_name, meter_historical, today_data=None):
+        _scaler = MinMaxScaler()
+        model, daily_averages, dates = self.fine_tune_model(meter_historical, _scaler)
+        return self.predict_meter(meter_name, model, _scaler, daily_averages, dates, today_data)
+
+    def cancel(self):
+        """Yêu cầu dừng lượt predict đang chạy; các meter chưa xử lý sẽ bị bỏ qua"""
+        self._cancel_event.set()
+
+    def _group_by_meter(self, meter_data):
+        grouped = {}
+        for item in meter_data:
+            if 'flow_sum' in item:
+                row = {
+                    'meter_name': item['meter_name'],
+                    'day': item['day'],
+                    'flow_sum': item['flow_sum'],
+                    'flow_count': item['flow_count'],
+                }
+            else:
+                row = {
+                    'meter_name': item['meter_name'],
+                    'measurement_time': item.get('measurement_time'),
+                    'instant_flow': item.get('instant_flow'),
+                }
+            grouped.setdefault(item['meter_name'], []).append(row)
+        return grouped
+
+    def _predict_serial(self, jobs):
+        predictions = []
+        failed_meters = []
+        for meter_name, meter_historical, meter_today in jobs:
+            if self._cancel_event.is_set():
+                return {'predictions': predictions, 'failed_meters': failed_meters, 'cancelled': True}
+            try:
+                predictions.extend(self.predict_single_meter(meter_name, meter_historical, meter_today))
+            except Exception as e:
+                failed_meters.append(meter_name)
+                if self.debug:
+                    print(f"Lỗi fine-tune meter {meter_name}: {e}")
+        return {'predictions': predictions, 'failed_meters': failed_meters, 'cancelled': False}
+
+    def _build_jobs(self, meters, start_time, end_time, today_start, today_end):
+        if MLConfig.ML_USE_ROLLUPS:
+            # Một rollup/ngày thay cho ~144 measurement/ngày; fine-tune chỉ cần trung bình ngày
+            meter_data = self.fetch_meter_daily(start_time, end_time, meters)
+        else:
+            meter_data = self.fetch_meter_data(start_time, end_time, meters)
+        today_meter_data = self.fetch_meter_data(today_start, today_end, meters)
+
+        historical_by_meter = self._group_by_meter(meter_data)
+        today_by_meter = self._group_by_meter(today_meter_data)
+
+        jobs = []
+        for meter in meters:
+            meter_historical = historical_by_meter.get(meter['meter_name'])
+            if not meter_historical:
+                continue
+            jobs.append((meter['meter_name'], meter_historical, today_by_meter.get(meter['meter_name'], [])))
+
+        # Với rollup, đếm số measurement mà các rollup đại diện
+        historical_count = sum(item.get('flow_count', 1) for item in meter_data)
+        return jobs, historical_count, len(today_meter_data)
 
     def predict(self):
+        self._cancel_event.clear()
+
         start_time, end_time = self.get_time_range()
-        all_meter_data = self.fetch_meter_data(start_time, end_time)
-        
         today_start, today_end = self.get_today_time_range()
-        today_meter_data = self.fetch_meter_data(today_start, today_end)
-        
-        all_predictions = []
-        df_historical = pd.DataFrame(all_meter_data)
-        for meter_name in ok_meters:
-            meter_historical = df_historical[df_historical['meter_name'] == meter_name].to_dict('records')
-            
-            if not meter_historical:
-                continue
 
-            _scaler = MinMaxScaler()
-            model, daily_averages, dates = self.fine_tune_model(meter_historical, _scaler)
-            
-            predictions = self.predict_meter(meter_name, model, _scaler, daily_averages, dates, today_meter_data)
-            all_predictions.extend(predictions)
-        
-        saved_count = self.save_predictions_to_db(all_predictions)
-        
+        checkpoint = RunCheckpoint(MODEL_NAME)
+        resume_after, resumed = checkpoint.start()
+        if not resumed:
+            refresh_eligibility(MODEL_NAME, start_time, end_time)
+
+        workers = resolve_workers(self.workers)
+        pool = None
+        totals = {
+            'total_data_points': 0,
+            'today_data_points': 0,
+            'predictions_count': 0,
+            'predictions_saved': 0,
+            'predictions_inserted': 0,
+            'predictions_updated': 0,
+            'meters_processed': 0,
+            'shards': 0,
+        }
+        failed_meters = []
+        cancelled = False
+
+        with ExitStack() as stack:
+            # Status realtime publish một lần sau mọi shard
+            stack.enter_context(deferred_status_publish())
+            for meters in iter_eligible_meter_shards(MODEL_NAME, after_meter_id=resume_after):
+                if self._cancel_event.is_set():
+                    cancelled = True
+                    break
+
+                jobs, historical_count, today_count = self._build_jobs(
+                    meters, start_time, end_time, today_start, today_end
+                )
+
+                if workers > 1 and len(jobs) > 1:
+                    if pool is None:
+                        # Pool tạo một lần và dùng lại cho mọi shard
+                        pool = stack.enter_context(MeterWorkerPool(
+                            self.model_path,
+                            self.historical_context,
+                            workers=workers,
+                            tf_threads=self.tf_threads,
+                            debug=self.debug,
+                        ))
+                    with model_timer():
+                        run_result = pool.run(jobs, cancel_event=self._cancel_event)
+                else:
+                    with model_timer():
+                        run_result = self._predict_serial(jobs)
+
+                saved = self.save_predictions_to_db(run_result['predictions'])
+                saved_count = saved['inserted'] + saved['updated']
+                failed_meters.extend(run_result['failed_meters'])
+
+                totals['total_data_points'] += historical_count
+                totals['today_data_points'] += today_count
+                totals['predictions_count'] += len(run_result['predictions'])
+                totals['predictions_saved'] += saved_count
+                totals['predictions_inserted'] += saved['inserted']
+                totals['predictions_updated'] += saved['updated']
+
+                if run_result['cancelled']:
+                    # Shard dở dang không được checkpoint: lượt sau chạy lại toàn bộ shard này
+                    cancelled = True
+                    break
+
+                totals['meters_processed'] += len(meters)
+                totals['shards'] += 1
+                checkpoint.advance(meters[-1]['meter_id'], len(meters), saved_count)
+            else:
+                checkpoint.complete()
+
         return {
-            'total_data_points': len(all_meter_data),
-            'today_data_points': len(today_meter_data),
-            'predictions_count': len(all_predictions),
-            'predictions_saved': saved_count,
+            **totals,
+            'resumed': resumed,
+            'workers': workers,
+            'failed_meters': failed_meters,
+            'cancelled': cancelled,
             'time_range': {
                 'historical_start': start_time.isoformat(),
                 'historical_end': end_time.isoformat(),
@@ -291,14 +380,15 @@ class LSTM_Predictor:
             }
         }
 
-
 def get_predictor():
     from ...config import MLConfig
     return LSTM_Predictor(
         historical_context=getattr(MLConfig, 'LSTM_WINDOW_CONTEXT', 4), 
         model_path=getattr(MLConfig, 'LSTM_MODEL_PATH', None), 
         scaler_path=getattr(MLConfig, 'SCALER_LSTM_MODEL_PATH', None),
-        debug=False
+        debug=False,
+        workers=getattr(MLConfig, 'LSTM_WORKERS', 1),
+        tf_threads=getattr(MLConfig, 'LSTM_WORKER_TF_THREADS', 1)
     )
 
 predictor = None
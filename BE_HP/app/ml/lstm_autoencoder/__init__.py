@@ -1 +0,0 @@
-from .predict import predictor
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+import copy
+import numpy as np
+import torch
+
+from ...config import MLConfig
+from ..registry import model_registry, get_lstmae_model
+
+BACKENDS = ("eager", "torchscript", "onnx")
+
+_ARTIFACT_SUFFIX = {
+    "torchscript": ".torchscript.pt",
+    "onnx": ".onnx",
+}
+
+
+def artifact_path(model_path, backend):
+    """Artifact export nằm cạnh file .pth: lstm_ae.pth -> lstm_ae.torchscript.pt / lstm_ae.onnx"""
+    base, _ = os.path.splitext(model_path)
+    return base + _ARTIFACT_SUFFIX[backend]
+
+
+class EagerBackend:
+    """Chạy trực tiếp nn.Module (PyTorch eager)"""
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model
+        self.device = next(model.parameters()).device
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            x = torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32)).to(self.device)
+            return self.model(x).cpu().numpy()
+
+
+class TorchScriptBackend:
+    name = "torchscript"
+
+    def __init__(self, path):
+        self.path = path
+        self.module = torch.jit.load(path, map_location="cpu")
+        self.module.eval()
+
+    def __call__(self, batch):
+        with torch.inference_mode():
+            x = torch.from_numpy(np.ascontiguousarray(batch, dtype=np.float32))
+            return self.module(x).numpy()
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path, intra_op_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("Backend onnx cần cài onnxruntime") from e
+
+        self.path = path
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = MLConfig.LSTM_AE_ORT_THREADS if intra_op_threads is None else intra_op_threads
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        x = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: x})[0]
+
+
+def _export_ready_copy(model):
+    export_model = copy.deepcopy(model).cpu().float()
+    export_model.eval()
+    return export_model
+
+
+def export_torchscript(model, out_path, seq_len=None):
+    seq_len = seq_len or model.seq_len
+    example = torch.rand(1, seq_len, model.input_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(_export_ready_copy(model), example)
+    traced = torch.jit.freeze(traced)
+    traced.save(out_path)
+    return out_path
+
+
+def export_onnx(model, out_path, seq_len=None, opset=17):
+    seq_len = seq_len or model.seq_len
+    example = torch.rand(1, seq_len, model.input_size)
+    torch.onnx.export(
+        _export_ready_copy(model),
+        (example,),
+        out_path,
+        input_names=["sequences"],
+        output_names=["reconstructed"],
+        dynamic_axes={"sequences": {0: "batch"}, "reconstructed": {0: "batch"}},
+        opset_version=opset,
+    )
+    return out_path
+
+
+EXPORTERS = {
+    "torchscript": export_torchscript,
+    "onnx": export_onnx,
+}
+
+
+def reconstruction_errors(backend, sequences, batch_size=1024):
+    """Max |x - x̂| của từng window (đơn vị đã chuẩn hoá), chạy theo batch"""
+    sequences = np.asarray(sequences, dtype=np.float32)
+    errors = []
+    for i in range(0, len(sequences), batch_size):
+        batch = sequences[i:i + batch_size]
+        recon = backend(batch)
+        errors.append(np.max(np.abs(batch - recon), axis=(1, 2)))
+    return np.concatenate(errors) if errors else np.empty(0)
+
+
+def check_parity(reference, candidate, sequences, tolerance=None):
+    """
+    So sánh reconstruction error của backend candidate với eager.
+
+    Returns:
+        dict: max_abs_diff, mean_abs_diff, windows, tolerance, passed
+    """
+    tolerance = MLConfig.LSTM_AE_PARITY_TOL if tolerance is None else tolerance
+    ref_err = reconstruction_errors(reference, sequences)
+    cand_err = reconstruction_errors(candidate, sequences)
+    diff = np.abs(ref_err - cand_err)
+
+    return {
+        "windows": int(len(diff)),
+        "max_abs_diff": float(diff.max()) if len(diff) else 0.0,
+        "mean_abs_diff": float(diff.mean()) if len(diff) else 0.0,
+        "tolerance": tolerance,
+        "passed": bool(len(diff) == 0 or diff.max() <= tolerance),
+    }
+
+
+def _file_bytes(backend):
+    return os.path.getsize(backend.path)
+
+
+def get_lstmae_backend(backend=None, model_path=None, config=None):
+    """
+    Backend inference cho LSTMAE, cache trong model registry.
+
+    eager trả về chính nn.Module; torchscript/onnx trả về callable numpy -> numpy
+    và raise FileNotFoundError nếu chưa export artifact.
+    """
+    backend = (backend or MLConfig.LSTM_AE_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend LSTMAE không hợp lệ: {backend}")
+
+    model_path = model_path or MLConfig.LSTM_AE_MODEL_PATH
+    if backend == "eager":
+        return get_lstmae_model(model_path, config)
+
+    loader = TorchScriptBackend if backend == "torchscript" else OnnxBackend
+    name = f"lstm_autoencoder:{backend}"
+    model_registry.register(name, artifact_path(model_path, backend), loader, _file_bytes)
+    return model_registry.get(name)
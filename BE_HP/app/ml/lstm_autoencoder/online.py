@@ -0,0 +1,302 @@
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from pymongo import UpdateOne
+
+from ...extensions import get_db
+from ...config import MLConfig
+from ...utils.bson import to_object_id, oid_str
+from ...utils.ml_utils import reconstruct, classify_lstmae
+from ...utils.measurement_store import get_measurement_store
+from ...utils.offload import run_cpu_bound
+from ..batching import MicroBatcher
+
+THRESHOLD_COLLECTION = "lstmae_thresholds"
+STATE_COLLECTION = "ml_model_state"
+SCALER_STATE_ID = "lstm_autoencoder:scaler"
+
+
+def save_thresholds(thresholds_by_meter_id):
+    """
+    Lưu ngưỡng per-meter do lượt predict hằng đêm tính ra.
+
+    Args:
+        thresholds_by_meter_id: {meter_id: {'mnf': float, 'mae_thresholds': {...}}}
+    """
+    if not thresholds_by_meter_id:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    ops = []
+    for meter_id, t in thresholds_by_meter_id.items():
+        mnf = float(t['mnf']) if not isinstance(t['mnf'], dict) else float('nan')
+        mae = t['mae_thresholds']
+        ops.append(UpdateOne(
+            {"meter_id": to_object_id(meter_id)},
+            {"$set": {
+                "mnf": mnf,
+                "mnf_threshold": mnf * 1.2,
+                "mae_low_threshold": float(mae['mae_low_threshold']),
+                "mae_high_threshold": float(mae['mae_high_threshold']),
+                "updated_at": now,
+            }},
+            upsert=True,
+        ))
+
+    get_db()[THRESHOLD_COLLECTION].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def save_scaler_state(scaler):
+    get_db()[STATE_COLLECTION].update_one(
+        {"_id": SCALER_STATE_ID},
+        {"$set": {
+            "data_min": float(scaler.data_min_[0]),
+            "data_max": float(scaler.data_max_[0]),
+            "updated_at": datetime.now(timezone.utc),
+        }},
+        upsert=True,
+    )
+
+
+class OnlineScorer:
+    """
+    Chấm điểm từng reading ngay khi SCADA đẩy lên.
+
+    Mỗi meter giữ ring buffer seq_len giá trị gần nhất; mỗi reading mới tạo một window
+    và được reconstruct bằng LSTMAE (lấy từ model registry), so với ngưỡng per-meter
+    do job hằng đêm lưu trong lstmae_thresholds. Ngưỡng và scaler được nạp vào bộ nhớ
+    và làm mới định kỳ nên tra cứu là O(1).
+    """
+
+    def __init__(self, seq_len=None, backend=None):
+        self.seq_len = seq_len or MLConfig.LSTM_AE_CONFIG['seq_len']
+        self.backend = backend
+        self.max_gap = timedelta(minutes=MLConfig.ONLINE_MAX_GAP_MINUTES)
+        self.refresh_seconds = MLConfig.ONLINE_THRESHOLD_REFRESH_SECONDS
+
+        self._lock = threading.Lock()
+        self._buffers = {}      # meter_id -> deque[(measurement_time, flow)]
+        self._thresholds = {}   # meter_id -> dict ngưỡng
+        self._scale = None      # (data_min, data_max)
+        self._state_loaded_at = 0.0
+
+        self._batcher = None
+        if MLConfig.LSTMAE_BATCH_ENABLED:
+            self._batcher = MicroBatcher(
+                self._score_items,
+                max_batch_size=MLConfig.LSTMAE_BATCH_MAX_SIZE,
+                max_wait_ms=MLConfig.LSTMAE_BATCH_MAX_WAIT_MS,
+                name="lstmae-online-batcher",
+            )
+
+    # ----- state -----
+
+    def refresh_state(self, force=False):
+        """Nạp lại ngưỡng và scaler từ MongoDB (tối đa mỗi refresh_seconds)"""
+        if not force and time.monotonic() - self._state_loaded_at < self.refresh_seconds:
+            return
+
+        db = get_db()
+        thresholds = {
+            oid_str(doc["meter_id"]): doc
+            for doc in db[THRESHOLD_COLLECTION].find({}, {"_id": 0})
+        }
+        scaler_doc = db[STATE_COLLECTION].find_one({"_id": SCALER_STATE_ID})
+
+        with self._lock:
+            self._thresholds = thresholds
+            if scaler_doc:
+                self._scale = (scaler_doc["data_min"], scaler_doc["data_max"])
+            self._state_loaded_at = time.monotonic()
+
+    def warm_start(self, hours=None):
+        """
+        Nạp ring buffer cho mọi meter từ meter_measurements gần nhất bằng một aggregation.
+        Chỉ đọc DB; model được load lười ở lần chấm điểm đầu tiên.
+        """
+        hours = hours or MLConfig.ONLINE_WARM_HOURS
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+
+        self.refresh_state(force=True)
+
+        stages = [
+            {"$match": {"instant_flow": {"$ne": None}}},
+            {"$sort": {"meter_id": 1, "measurement_time": 1}},
+            {"$group": {
+                "_id": "$meter_id",
+                "times": {"$push": "$measurement_time"},
+                "flows": {"$push": "$instant_flow"},
+            }},
+            {"$project": {
+                "times": {"$slice": ["$times", -self.seq_len]},
+                "flows": {"$slice": ["$flows", -self.seq_len]},
+            }},
+        ]
+
+        buffers = {}
+        rows = get_measurement_store().aggregate_rows(None, since, datetime.now(timezone.utc), stages)
+        for doc in rows:
+            buf = deque(maxlen=self.seq_len)
+            for t, f in zip(doc["times"], doc["flows"]):
+                buf.append((self._aware(t), float(f)))
+            buffers[oid_str(doc["_id"])] = buf
+
+        with self._lock:
+            buffers.update(self._buffers)  # reading đến trong lúc warm-up được giữ nguyên
+            self._buffers = buffers
+
+        return len(buffers)
+
+    def _fill_from_db(self, meter_id, before):
+        """Nạp buffer của một meter (cold/gap) từ seq_len - 1 measurements gần nhất"""
+        docs = get_measurement_store().find(
+            [to_object_id(meter_id)], before - self.max_gap * self.seq_len, before, end_exclusive=True
+        )
+        rows = [
+            (self._aware(d["measurement_time"]), float(d["instant_flow"]))
+            for d in docs if d.get("instant_flow") is not None
+        ]
+        return deque(rows[-(self.seq_len - 1):], maxlen=self.seq_len)
+
+    @staticmethod
+    def _aware(t):
+        return t if t.tzinfo else t.replace(tzinfo=timezone.utc)
+
+    def observe(self, meter_id, flow, measurement_time=None):
+        """
+        Thêm reading vào buffer của meter.
+
+        Returns:
+            list[float] | None: window seq_len giá trị (đơn vị gốc) nếu đủ dữ liệu
+        """
+        meter_id = oid_str(meter_id)
+        measurement_time = self._aware(measurement_time or datetime.now(timezone.utc))
+
+        with self._lock:
+            buf = self._buffers.get(meter_id)
+            stale = buf is None or (len(buf) > 0 and measurement_time - buf[-1][0] > self.max_gap)
+
+        if stale:
+            buf = self._fill_from_db(meter_id, measurement_time)
+
+        with self._lock:
+            if stale:
+                self._buffers[meter_id] = buf
+            buf = self._buffers[meter_id]
+            buf.append((measurement_time, float(flow)))
+            if len(buf) < self.seq_len:
+                return None
+            return [f for _, f in buf]
+
+    # ----- scoring -----
+
+    def _normalize(self, values):
+        data_min, data_max = self._scale
+        scale = (data_max - data_min) or 1.0
+        return (np.asarray(values, dtype=np.float32) - data_min) / scale
+
+    def _denormalize(self, values):
+        data_min, data_max = self._scale
+        scale = (data_max - data_min) or 1.0
+        return np.asarray(values) * scale + data_min
+
+    def score_windows(self, meter_ids, windows):
+        """
+        Chấm điểm nhiều window trong một forward pass.
+
+        Returns:
+            list[tuple]: (is_anomaly, confidence, reconstruction_error, threshold, reconstructed_flow)
+        """
+        if self._scale is None:
+            raise RuntimeError("Chưa có scaler LSTM-AE (cần chạy predict LSTM-AE hằng đêm ít nhất một lần)")
+
+        from .backends import get_lstmae_backend  # torch chỉ nạp khi chấm điểm lần đầu
+
+        model = get_lstmae_backend(self.backend)
+        batch = self._normalize(windows)[:, :, np.newaxis]
+        recon = self._denormalize(reconstruct(model, batch))
+
+        results = []
+        for meter_id, window, recon_window in zip(meter_ids, windows, recon):
+            t = self._thresholds.get(oid_str(meter_id))
+            original = np.asarray(window, dtype=np.float64)[:, np.newaxis]
+            reconstructed_flow = float(recon_window[-1, 0])
+
+            if t is None:
+                max_mae = float(np.max(np.abs(original - recon_window)))
+                results.append((False, "none", max_mae, 0.0, reconstructed_flow))
+                continue
+
+            pred = classify_lstmae(
+                original, recon_window,
+                mnf=t["mnf"],
+                mnf_threshold=t["mnf_threshold"],
+                mae_low_threshold=t["mae_low_threshold"],
+                mae_high_threshold=t["mae_high_threshold"],
+            )
+            results.append((
+                pred["status"] == "leak",
+                pred["confidence"] or "none",
+                float(pred["max_mae"]),
+                float(t["mae_high_threshold"]),
+                reconstructed_flow,
+            ))
+
+        return results
+
+    def _score_items(self, items):
+        return self.score_windows([meter_id for meter_id, _ in items], [window for _, window in items])
+
+    def score(self, meter_id, flow, measurement_time=None):
+        """Chấm điểm một reading; trả về cùng bộ giá trị với API make_prediction"""
+        self.refresh_state()
+        window = self.observe(meter_id, flow, measurement_time)
+        if window is None:
+            # Chưa đủ seq_len reading liên tiếp để tạo window
+            return False, "insufficient_data", 0.0, 0.0, float(flow)
+        if self._batcher is not None:
+            # Gom với các request đồng thời khác thành một forward pass
+            return self._batcher.call((meter_id, window))
+        return run_cpu_bound(self.score_windows, [meter_id], [window])[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "meters_buffered": len(self._buffers),
+                "meters_with_thresholds": len(self._thresholds),
+                "scaler_loaded": self._scale is not None,
+                "seq_len": self.seq_len,
+                "batcher": self._batcher.stats() if self._batcher is not None else None,
+            }
+
+
+_scorer = None
+_scorer_lock = threading.Lock()
+
+
+def get_online_scorer():
+    global _scorer
+    if _scorer is None:
+        with _scorer_lock:
+            if _scorer is None:
+                _scorer = OnlineScorer()
+    return _scorer
+
+
+def start_warmup(app):
+    """Warm-load buffer ở background khi khởi động để không chặn startup"""
+    def _run():
+        with app.app_context():
+            try:
+                count = get_online_scorer().warm_start()
+                print(f"Online scorer: đã nạp buffer cho {count} meter")
+            except Exception as e:
+                print(f"Online scorer warm-up thất bại: {e}")
+
+    thread = threading.Thread(target=_run, name="online-scorer-warmup", daemon=True)
+    thread.start()
+    return thread
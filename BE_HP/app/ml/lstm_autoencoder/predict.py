@@ -6,28 +6,25 @@ from datetime import datetime, timedelta, timezone
 import os
 import joblib
 
-from ...extensions import get_db
-from ...utils import to_object_id
-from ...utils.ml_utils import preprocess_data_with_dates_json, calculate_mnf, get_mae_threshold, fit_global_scaler_with_data, predict_lstmae
+from ...utils.measurement_store import get_measurement_store
+from ...utils.ml_utils import preprocess_data_with_dates_json, calculate_mnf, get_mae_threshold, fit_global_scaler_with_data, predict_lstmae_batch
 from ...config import MLConfig
+from .backends import get_lstmae_backend
+from .online import save_thresholds, save_scaler_state
+from .threshold_state import window_days, update_daily_stats, merge_thresholds, prune_daily_stats
+from ..prediction_writer import upsert_predictions, deferred_status_publish
+from ...instrumentation import model_timer
+from ..eligibility import refresh_eligibility, eligible_meter_ids, iter_eligible_meter_shards, RunCheckpoint
 try:
     from .lstm_autoencoder import LSTMAE
 except ImportError as e:
     print(f"Warning: Could not import LSTMAE model: {e}")
     LSTMAE = None
 
-ok_meters = [
-    'DU LỄ 1',
-    'DU LỄ 2',
-    'DU LỄ 3',
-    'DU LỄ 4',
-    'TÂN VIÊN 1',
-    'TÂN VIÊN 2',
-    'TÂN VIÊN 3',
-  ]
+MODEL_NAME = 'lstm_autoencoder'
 
 class LSTMAEPredictor:
-    def __init__(self, historical_context=None, model_path=None, config=None, debug=False):
+    def __init__(self, historical_context=None, model_path=None, config=None, debug=False, backend=None):
         default_path = os.path.abspath(os.path.join(os.path.dirname(__file__), 'pretrained_weights', 'lstm_ae.pth'))
         self.historical_context = historical_context
         self.model_path = model_path or default_path
@@ -40,27 +37,34 @@ class LSTMAEPredictor:
             'use_act': True
         }
         self.debug = debug
+        self.backend = (backend or MLConfig.LSTM_AE_BACKEND).lower()
         self.model = None
         self.scaler = MinMaxScaler()
         self.threshold = None
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
     def load_model(self):
+        """Lấy model từ model registry (load một lần mỗi process, tự reload khi file đổi)"""
         if LSTMAE is None:
             print("Không tìm thấy lớp LSTM-AutoEncoder!")
             return False
 
-        self.model = LSTMAE(**self.config)
-        if os.path.exists(self.model_path):
-            self.model.load_state_dict(torch.load(self.model_path, map_location=self.device))
-            if self.debug:
-                print(f"Đã tải mô hình từ {self.model_path}")
-        else:
-            print(f"Model file not found: {self.model_path}")
-            return False
-            
-        self.model.to(self.device)
-        self.model.eval()
+        try:
+            self.model = get_lstmae_backend(self.backend, self.model_path, self.config)
+        except (FileNotFoundError, ImportError) as e:
+            if self.backend == "eager":
+                print(f"Model file not found: {self.model_path}")
+                return False
+            # Chưa export artifact / thiếu runtime: quay về eager thay vì dừng pipeline
+            print(f"Không dùng được backend {self.backend} ({e}), chuyển sang eager")
+            try:
+                self.model = get_lstmae_backend("eager", self.model_path, self.config)
+            except FileNotFoundError:
+                print(f"Model file not found: {self.model_path}")
+                return False
+
+        if self.debug:
+            print(f"Đã lấy model (backend {self.backend}) từ {self.model_path}")
         return True
 
     def prepare_data(self, data, seq_len=6, fit_scaler=False):
@@ -81,7 +85,8 @@ class LSTMAEPredictor:
             df = pd.DataFrame(meter_data_or_all_data)
             mnf = calculate_mnf(df, timestamp_col='measurement_time')
             seqs, _ = self.prepare_data(meter_data_or_all_data, seq_len=self.config['seq_len'])
-            mae_thresholds = get_mae_threshold(self.model, self.scaler, seqs)
+            with model_timer():
+                mae_thresholds = get_mae_threshold(self.model, self.scaler, seqs)
             return mnf, mae_thresholds
         else:
             if not meter_data_or_all_data:
@@ -90,7 +95,7 @@ class LSTMAEPredictor:
             df = pd.DataFrame(meter_data_or_all_data)
             thresholds = {}
             
-            for meter_name in ok_meters:
+            for meter_name in df['meter_name'].unique():
                 meter_data = df[df['meter_name'] == meter_name].to_dict('records')
                 
                 if len(meter_data) > 0:
@@ -124,37 +129,50 @@ class LSTMAEPredictor:
         end_time = now
         return start_time, end_time
 
-    def fetch_meter_data(self, start_time, end_time):
-        db = get_db()
+    def fetch_meter_data(self, start_time, end_time, meters):
+        """Lấy measurements của một shard meter bằng một query duy nhất"""
+        if not meters:
+            return []
+
+        names = {m['meter_id']: m['meter_name'] for m in meters}
+        rows = get_measurement_store().find(names.keys(), start_time, end_time)
+
         all_meter_data = []
-        
-        for meter_name in ok_meters:
-            meter = db.meters.find_one({"meter_name": meter_name})
-            if not meter:
-                if self.debug:
-                    print(f"Không tìm thấy meter: {meter_name}")
-                continue
-                
-            meter_id = meter["_id"]
-            
-            measurements = list(db.meter_measurements.find({
-                "meter_id": meter_id,
-                "measurement_time": {
-                    "$gte": start_time,
-                    "$lte": end_time
-                }
-            }).sort("measurement_time", 1))
-            
-            if self.debug:
-                print(f"Meter {meter_name}: {len(measurements)} measurements")
-            
-            for measurement in measurements:
-                measurement['meter_name'] = meter_name
-                measurement['meter_id'] = str(meter_id)
-                all_meter_data.append(measurement)
-        
+        for measurement in rows:
+            meter_id = measurement['meter_id']
+            measurement['meter_name'] = names[meter_id]
+            measurement['meter_id'] = str(meter_id)
+            all_meter_data.append(measurement)
+
+        if self.debug:
+            print(f"Shard {len(meters)} meters: {len(all_meter_data)} measurements")
+
         return all_meter_data
 
+    def fit_global_scaler_from_db(self, meter_ids, start_time, end_time):
+        """
+        Fit scaler toàn cục bằng min/max tính trong MongoDB thay vì load toàn bộ dữ liệu.
+
+        MinMaxScaler chỉ phụ thuộc min và max nên fit trên [[min], [max]] cho kết quả
+        giống hệt fit trên toàn bộ instant_flow của các meter đủ điều kiện.
+        """
+        if not meter_ids:
+            return False
+
+        stats = get_measurement_store().flow_stats(meter_ids, start_time, end_time)
+
+        if not stats or stats['count'] == 0:
+            return False
+
+        self.scaler = MinMaxScaler()
+        self.scaler.fit(np.array([[float(stats['min'])], [float(stats['max'])]]))
+
+        if self.debug:
+            print(f"Đã fit scaler với {stats['count']} điểm dữ liệu")
+            print(f"Scaler min: {self.scaler.data_min_[0]:.4f}, max: {self.scaler.data_max_[0]:.4f}")
+
+        return True
+
     def fit_global_scaler(self, all_meter_data):
         if not all_meter_data:
             return False
@@ -180,7 +198,7 @@ class LSTMAEPredictor:
         predictions = []
         df = pd.DataFrame(all_meter_data)
         
-        for meter_name in ok_meters:
+        for meter_name in df['meter_name'].unique():
             if meter_name not in thresholds:
                 continue
                 
@@ -194,18 +212,20 @@ class LSTMAEPredictor:
                 mae_thresholds = meter_thresholds['mae_thresholds']
                 
                 seqs, seq_dates = self.prepare_data(meter_data, seq_len=self.config['seq_len'])
-                
-                for i, (seq, seq_date) in enumerate(zip(seqs, seq_dates)):
-                    pred_result = predict_lstmae(
+
+                # Một forward pass cho mọi window của meter thay vì từng window
+                with model_timer():
+                    pred_results = predict_lstmae_batch(
                         model=self.model,
-                        smp=seq,
+                        sequences=seqs,
                         mnf=mnf,
                         mnf_threshold=mae_thresholds.get('mnf_threshold', mnf * 1.2), 
                         scaler=self.scaler,
-                        mae_low_threshold=mae_thresholds.get('low', 0.02),
-                        mae_high_threshold=mae_thresholds.get('high', 0.1)
+                        mae_low_threshold=mae_thresholds.get('mae_low_threshold', 0.02),
+                        mae_high_threshold=mae_thresholds.get('mae_high_threshold', 0.1)
                     )
-                    
+                
+                for pred_result, seq_date in zip(pred_results, seq_dates):
                     predictions.append({
                         'meter_name': meter_name,
                         'prediction_time': seq_date,
@@ -224,87 +244,99 @@ class LSTMAEPredictor:
         return predictions
     
     def save_predictions_to_db(self, predictions):
-        if not predictions:
-            return 0
-            
-        db = get_db()
-        lstm_ae_model = db.ai_models.find_one({"name": "lstm_autoencoder"})
-        if not lstm_ae_model:
-            lstm_ae_model = {
-                "name": "lstm_autoencoder",
-                "_id": to_object_id()
-            }
-            db.ai_models.insert_one(lstm_ae_model)
-        
-        model_id = lstm_ae_model["_id"]
-        
-        prediction_docs = []
-        for pred in predictions:
-            meter = db.meters.find_one({"meter_name": pred['meter_name']})
-            if not meter:
-                continue
-                
-            prediction_docs.append({
-                "meter_id": meter["_id"],
-                "model_id": model_id,
+        """Upsert prediction của lượt chạy; trả về {inserted, updated, skipped}"""
+        rows = [
+            {
+                "meter_name": pred['meter_name'],
                 "prediction_time": pred['prediction_time'],
                 "predicted_label": pred['status'],
                 "confidence": pred['confidence'],
                 "recorded_instant_flow": float(pred['avg_instant_flow'])
-            })
-        
-        if prediction_docs:
-            result = db.predictions.insert_many(prediction_docs)
-            return len(result.inserted_ids)
-        
-        return 0
+            }
+            for pred in predictions or []
+        ]
+        return upsert_predictions(MODEL_NAME, rows)
 
     def predict(self):
         try:
-            if self.model is None:
-                if not self.load_model():
-                    print("Không thể load model")
-                    return None
+            # Luôn hỏi registry để nhận bản weights mới nhất nếu file đã đổi
+            if not self.load_model():
+                print("Không thể load model")
+                return None
             
             start_time, end_time = self.get_time_range()
-            all_meter_data = self.fetch_meter_data(start_time, end_time)
-            
-            if not self.fit_global_scaler(all_meter_data):
+            today_start, today_end = self.get_today_time_range()
+
+            checkpoint = RunCheckpoint(MODEL_NAME)
+            resume_after, resumed = checkpoint.start()
+            if not resumed:
+                refresh_eligibility(MODEL_NAME, start_time, end_time)
+
+            # Scaler toàn cục luôn fit trên mọi meter đủ điều kiện (kể cả khi resume)
+            # để các shard dùng chung một thang đo
+            if not self.fit_global_scaler_from_db(eligible_meter_ids(MODEL_NAME), start_time, end_time):
                 print("Không thể fit scaler")
                 return None
-            
-            thresholds = self.calculate_threshold(all_meter_data, single_meter=False)
-            
-            today_start, today_end = self.get_today_time_range()
-            today_meter_data = self.fetch_meter_data(today_start, today_end)
-            
-            if not today_meter_data:
+            save_scaler_state(self.scaler)
+
+            totals = {
+                'total_data_points': 0,
+                'today_data_points': 0,
+                'predictions_count': 0,
+                'predictions_saved': 0,
+                'predictions_inserted': 0,
+                'predictions_updated': 0,
+                'thresholds_count': 0,
+                'meters_processed': 0,
+                'shards': 0,
+            }
+
+            incremental = MLConfig.LSTMAE_THRESHOLD_INCREMENTAL
+            days = window_days(end_time, self.historical_context)
+            if incremental:
+                prune_daily_stats(days)
+
+            # Status realtime publish một lần sau mọi shard
+            with deferred_status_publish():
+                for meters in iter_eligible_meter_shards(MODEL_NAME, after_meter_id=resume_after):
+                    if incremental:
+                        # Chỉ tính summary cho ngày mới rồi gộp với các ngày đã lưu
+                        daily = update_daily_stats(self, meters, days, end_time)
+                        thresholds = merge_thresholds(meters, days)
+                        totals['total_data_points'] += daily['data_points']
+                    else:
+                        all_meter_data = self.fetch_meter_data(start_time, end_time, meters)
+                        thresholds = self.calculate_threshold(all_meter_data, single_meter=False)
+                        totals['total_data_points'] += len(all_meter_data)
+                        del all_meter_data
+
+                    ids_by_name = {m['meter_name']: m['meter_id'] for m in meters}
+                    save_thresholds({ids_by_name[name]: t for name, t in thresholds.items() if name in ids_by_name})
+
+                    today_meter_data = self.fetch_meter_data(today_start, today_end, meters)
+                    predictions = self.predict_today_data(today_meter_data, thresholds)
+                    saved = self.save_predictions_to_db(predictions)
+                    saved_count = saved['inserted'] + saved['updated']
+
+                    totals['today_data_points'] += len(today_meter_data)
+                    totals['predictions_count'] += len(predictions)
+                    totals['predictions_saved'] += saved_count
+                    totals['predictions_inserted'] += saved['inserted']
+                    totals['predictions_updated'] += saved['updated']
+                    totals['thresholds_count'] += len(thresholds)
+                    totals['meters_processed'] += len(meters)
+                    totals['shards'] += 1
+                    checkpoint.advance(meters[-1]['meter_id'], len(meters), saved_count)
+
+            checkpoint.complete()
+
+            if totals['today_data_points'] == 0:
                 print("Không có dữ liệu ngày hôm nay để predict")
-                return {
-                    'total_data_points': len(all_meter_data),
-                    'today_data_points': 0,
-                    'scaler_fitted': True,
-                    'thresholds': thresholds,
-                    'predictions_saved': 0,
-                    'time_range': {
-                        'historical_start': start_time.isoformat(),
-                        'historical_end': end_time.isoformat(),
-                        'today_start': today_start.isoformat(),
-                        'today_end': today_end.isoformat()
-                    }
-                }
-            
-            predictions = self.predict_today_data(today_meter_data, thresholds)
-            
-            saved_count = self.save_predictions_to_db(predictions)
             
             return {
-                'total_data_points': len(all_meter_data),
-                'today_data_points': len(today_meter_data),
-                'predictions_count': len(predictions),
-                'predictions_saved': saved_count,
+                **totals,
+                'resumed': resumed,
                 'scaler_fitted': True,
-                'thresholds': thresholds,
                 'time_range': {
                     'historical_start': start_time.isoformat(),
                     'historical_end': end_time.isoformat(),
@@ -327,7 +359,8 @@ def get_predictor():
         historical_context=MLConfig.HISTORICAL_DATA_DAYS, 
         config=MLConfig.LSTM_AE_CONFIG, 
         model_path=MLConfig.LSTM_AE_MODEL_PATH, 
-        debug=False
+        debug=False,
+        backend=MLConfig.LSTM_AE_BACKEND
     )
 
 predictor = None
@@ -0,0 +1,161 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from pymongo import UpdateOne
+
+from ...extensions import get_db
+from ...config import MLConfig
+from ...utils.ml_utils import reconstruct
+from ...instrumentation import model_timer
+from ..quantile_sketch import QuantileSummary
+
+DAILY_COLLECTION = "lstmae_daily_stats"
+
+# Khung giờ đêm tính MNF, giống mặc định của calculate_mnf
+NIGHT_START_HOUR = 1
+NIGHT_END_HOUR = 4
+MNF_MIN_POINTS = max(1, int((NIGHT_END_HOUR - NIGHT_START_HOUR) * 60 / 10 * 0.5))
+
+
+def window_days(end_time, days):
+    """Danh sách ngày 'YYYY-MM-DD' của cửa sổ trượt, kết thúc tại end_time (hôm qua)"""
+    last = end_time.date()
+    return [(last - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days - 1, -1, -1)]
+
+
+def _day_key(t):
+    return t.strftime('%Y-%m-%d')
+
+
+def _daily_summary(predictor, rows):
+    """Reconstruction error (đơn vị lưu lượng) của các window và night flow trong một ngày của một meter"""
+    max_size = MLConfig.LSTMAE_SKETCH_MAX_SIZE
+    errors = np.empty(0)
+    night = [
+        float(r['instant_flow']) for r in rows
+        if r.get('instant_flow') is not None
+        and NIGHT_START_HOUR <= r['measurement_time'].hour < NIGHT_END_HOUR
+    ]
+
+    if rows:
+        seqs, _ = predictor.prepare_data(rows, seq_len=predictor.config['seq_len'])
+        if len(seqs):
+            with model_timer():
+                recon = reconstruct(predictor.model, seqs)
+            scale = predictor.scaler.data_max_[0] - predictor.scaler.data_min_[0]
+            # inverse_transform tuyến tính nên |x - x̂| gốc = |x - x̂| chuẩn hoá * (max - min)
+            errors = np.max(np.abs(seqs - recon), axis=(1, 2)) * scale
+
+    return {
+        "mae": QuantileSummary(errors, max_size=max_size).to_doc(),
+        "night": QuantileSummary(night, max_size=max_size).to_doc(),
+        "windows": int(len(errors)),
+        "night_points": len(night),
+    }
+
+
+def update_daily_stats(predictor, meters, days, end_time):
+    """
+    Tính summary cho các ngày (meter, day) chưa có trong cửa sổ; thường chỉ là ngày hôm qua.
+
+    Meter được gom theo ngày thiếu sớm nhất để mỗi nhóm chỉ cần một query $in. Ngày chưa có
+    measurement thì không lưu summary (dữ liệu có thể về muộn), lần chạy sau tính lại.
+
+    Returns:
+        dict: computed (số meter-day mới), data_points (số measurement đã đọc)
+    """
+    db = get_db()
+    ids = [m['meter_id'] for m in meters]
+    existing = {
+        (doc['meter_id'], doc['day'])
+        for doc in db[DAILY_COLLECTION].find(
+            # Summary rỗng do phiên bản cũ ghi vẫn coi là thiếu
+            {"meter_id": {"$in": ids}, "day": {"$in": days},
+             "$or": [{"windows": {"$gt": 0}}, {"night_points": {"$gt": 0}}]},
+            {"meter_id": 1, "day": 1},
+        )
+    }
+
+    missing = {m['meter_id']: [d for d in days if (m['meter_id'], d) not in existing] for m in meters}
+    groups = defaultdict(list)
+    for m in meters:
+        if missing[m['meter_id']]:
+            groups[missing[m['meter_id']][0]].append(m)
+
+    now = datetime.now(timezone.utc)
+    computed = 0
+    data_points = 0
+
+    for first_day, group in groups.items():
+        start = datetime.strptime(first_day, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        rows = predictor.fetch_meter_data(start, end_time, group)
+        data_points += len(rows)
+
+        by_meter_day = defaultdict(list)
+        for r in rows:
+            by_meter_day[(r['meter_id'], _day_key(r['measurement_time']))].append(r)
+        del rows
+
+        ops = []
+        for m in group:
+            for day in missing[m['meter_id']]:
+                day_rows = by_meter_day.pop((str(m['meter_id']), day), None)
+                if not day_rows:
+                    continue
+                summary = _daily_summary(predictor, day_rows)
+                ops.append(UpdateOne(
+                    {"meter_id": m['meter_id'], "day": day},
+                    {"$set": {**summary, "updated_at": now}},
+                    upsert=True,
+                ))
+        if ops:
+            db[DAILY_COLLECTION].bulk_write(ops, ordered=False)
+            computed += len(ops)
+
+    return {"computed": computed, "data_points": data_points}
+
+
+def merge_thresholds(meters, days):
+    """
+    Gộp summary theo ngày trong cửa sổ thành ngưỡng của từng meter.
+
+    Returns:
+        dict: {meter_name: {'mnf': float, 'mae_thresholds': {...}, 'windows': int}}
+              cùng dạng với LSTMAEPredictor.calculate_threshold
+    """
+    max_size = MLConfig.LSTMAE_SKETCH_MAX_SIZE
+    ids = [m['meter_id'] for m in meters]
+    mae_by_meter = defaultdict(list)
+    night_by_meter = defaultdict(list)
+
+    for doc in get_db()[DAILY_COLLECTION].find(
+        {"meter_id": {"$in": ids}, "day": {"$gte": days[0], "$lte": days[-1]}},
+        {"meter_id": 1, "mae": 1, "night": 1},
+    ):
+        mae_by_meter[doc['meter_id']].append(QuantileSummary.from_doc(doc.get('mae'), max_size))
+        night_by_meter[doc['meter_id']].append(QuantileSummary.from_doc(doc.get('night'), max_size))
+
+    thresholds = {}
+    for m in meters:
+        mae = QuantileSummary.merge_all(mae_by_meter.get(m['meter_id'], []), max_size)
+        if mae.count == 0:
+            continue
+        night = QuantileSummary.merge_all(night_by_meter.get(m['meter_id'], []), max_size)
+        mnf = night.quantile(50) if night.count >= MNF_MIN_POINTS else np.nan
+
+        thresholds[m['meter_name']] = {
+            'mnf': mnf,
+            'mae_thresholds': {
+                'mae_low_threshold': mae.quantile(20),
+                'mae_high_threshold': mae.quantile(80),
+            },
+            'windows': int(mae.count),
+        }
+
+    return thresholds
+
+
+def prune_daily_stats(days):
+    """Xoá summary đã trượt khỏi cửa sổ"""
+    return get_db()[DAILY_COLLECTION].delete_many({"day": {"$lt": days[0]}}).deleted_count
@@ -0,0 +1,108 @@
+import threading
+from contextlib import contextmanager
+
+from pymongo import UpdateOne, ReturnDocument
+
+from ..extensions import get_db
+from ..realtime import publish_meter_statuses
+
+# Số meter mỗi lần tính status để publish (query $in)
+STATUS_PUBLISH_CHUNK = 1000
+
+_deferred = threading.local()
+
+
+def get_or_create_model_id(name):
+    """_id của ai_models theo name; tạo nếu chưa có (uniq_model_name nên an toàn khi chạy song song)"""
+    model = get_db().ai_models.find_one_and_update(
+        {"name": name},
+        {"$setOnInsert": {"name": name}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return model["_id"]
+
+
+def resolve_meter_ids(meter_names):
+    """{meter_name: _id} bằng một query cho cả batch"""
+    names = list({name for name in meter_names if name})
+    if not names:
+        return {}
+    return {
+        doc["meter_name"]: doc["_id"]
+        for doc in get_db().meters.find({"meter_name": {"$in": names}}, {"meter_name": 1})
+    }
+
+
+def publish_statuses(meter_ids):
+    """Publish status realtime của các meter vừa có prediction; lỗi chỉ được log"""
+    meter_ids = list(meter_ids)
+    try:
+        for i in range(0, len(meter_ids), STATUS_PUBLISH_CHUNK):
+            publish_meter_statuses(get_db(), meter_ids[i:i + STATUS_PUBLISH_CHUNK])
+    except Exception as e:
+        # Realtime chỉ là kênh đẩy; client vẫn lấy được status qua REST
+        print(f"Không publish được status realtime: {e}")
+
+
+@contextmanager
+def deferred_status_publish():
+    """
+    Trong khối with, upsert_predictions chỉ gom meter_id; status được tính và publish một lần
+    khi thoát khối (kể cả khi lỗi/huỷ) thay vì thêm một aggregate predictions mỗi shard.
+    """
+    meter_ids = set()
+    _deferred.meter_ids = meter_ids
+    try:
+        yield meter_ids
+    finally:
+        _deferred.meter_ids = None
+        if meter_ids:
+            publish_statuses(meter_ids)
+
+
+def upsert_predictions(model_name, rows):
+    """
+    Ghi prediction idempotent: upsert theo (meter_id, model_id, prediction_time) bằng một
+    bulk_write không thứ tự, nên chạy lại pipeline (retry, test/all, scheduler chạy trùng)
+    chỉ ghi đè chứ không nhân bản prediction.
+
+    Args:
+        rows: list dict có meter_name, prediction_time và các field còn lại của document
+
+    Returns:
+        dict: {inserted, updated, skipped} (skipped = meter_name không tồn tại)
+    """
+    if not rows:
+        return {"inserted": 0, "updated": 0, "skipped": 0}
+
+    model_id = get_or_create_model_id(model_name)
+    meter_ids = resolve_meter_ids(row["meter_name"] for row in rows)
+
+    ops = {}
+    skipped = 0
+    for row in rows:
+        meter_id = meter_ids.get(row["meter_name"])
+        if meter_id is None:
+            skipped += 1
+            continue
+        key = (meter_id, row["prediction_time"])
+        fields = {k: v for k, v in row.items() if k not in ("meter_name", "prediction_time")}
+        # Cùng khoá trong một batch: giữ bản cuối như khi ghi tuần tự
+        ops[key] = UpdateOne(
+            {"meter_id": meter_id, "model_id": model_id, "prediction_time": row["prediction_time"]},
+            {"$set": fields},
+            upsert=True,
+        )
+
+    if not ops:
+        return {"inserted": 0, "updated": 0, "skipped": skipped}
+
+    result = get_db().predictions.bulk_write(list(ops.values()), ordered=False)
+    written = {meter_id for meter_id, _ in ops}
+    pending = getattr(_deferred, "meter_ids", None)
+    if pending is not None:
+        pending.update(written)
+    else:
+        publish_statuses(written)
+    return {"inserted": result.upserted_count, "updated": result.matched_count, "skipped": skipped}
@@ -0,0 +1,84 @@
+import numpy as np
+
+
+class QuantileSummary:
+    """
+    Quantile summary gộp được (mergeable), lưu dạng centroid (value, weight) đã sắp xếp.
+
+    Khi số centroid <= max_size thì summary là chính xác: với trọng số đơn vị, quantile()
+    trả về đúng np.percentile(values, q) (nội suy tuyến tính). Vượt max_size thì các cặp
+    centroid kề nhau được gộp (trung bình có trọng số), sai số rank không quá
+    max_weight / total_weight.
+
+    Ngưỡng LSTM-AE chỉ có ~24 window/meter/ngày nên trong thực tế summary 40 ngày vẫn chính xác.
+    """
+
+    def __init__(self, values=None, weights=None, max_size=2048):
+        self.max_size = max_size
+        values = np.asarray(values if values is not None else [], dtype=np.float64)
+        weights = np.ones_like(values) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        keep = ~np.isnan(values)
+        order = np.argsort(values[keep], kind="mergesort")
+        self.values = values[keep][order]
+        self.weights = weights[keep][order]
+        self._compress()
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    @property
+    def exact(self):
+        return bool(np.all(self.weights == 1.0))
+
+    def _compress(self):
+        while len(self.values) > self.max_size:
+            n = len(self.values) - (len(self.values) % 2)
+            v, w = self.values[:n], self.weights[:n]
+            pair_w = w[0::2] + w[1::2]
+            pair_v = (v[0::2] * w[0::2] + v[1::2] * w[1::2]) / pair_w
+            self.values = np.concatenate([pair_v, self.values[n:]])
+            self.weights = np.concatenate([pair_w, self.weights[n:]])
+
+    def merge(self, other):
+        return QuantileSummary(
+            np.concatenate([self.values, other.values]),
+            np.concatenate([self.weights, other.weights]),
+            max_size=max(self.max_size, other.max_size),
+        )
+
+    @classmethod
+    def merge_all(cls, summaries, max_size=2048):
+        summaries = list(summaries)
+        if not summaries:
+            return cls(max_size=max_size)
+        return cls(
+            np.concatenate([s.values for s in summaries]),
+            np.concatenate([s.weights for s in summaries]),
+            max_size=max_size,
+        )
+
+    def quantile(self, q):
+        """q theo phần trăm (0-100), giống np.percentile"""
+        if len(self.values) == 0:
+            return float("nan")
+        if self.exact:
+            return float(np.percentile(self.values, q))
+
+        total = self.weights.sum()
+        # Tâm rank của từng centroid; trọng số đơn vị cho ra 0..n-1 như np.percentile
+        centers = np.cumsum(self.weights) - self.weights / 2.0 - 0.5
+        return float(np.interp(q / 100.0 * (total - 1), centers, self.values))
+
+    def to_doc(self):
+        doc = {"v": self.values.tolist()}
+        if not self.exact:
+            doc["w"] = self.weights.tolist()
+        return doc
+
+    @classmethod
+    def from_doc(cls, doc, max_size=2048):
+        if not doc:
+            return cls(max_size=max_size)
+        return cls(doc.get("v", []), doc.get("w"), max_size=max_size)
@@ -0,0 +1,230 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime, timezone
+
+from ..config import MLConfig
+
+
+def _file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _ModelEntry:
+    def __init__(self, name, path, loader, sizer, key):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.sizer = sizer
+        self.key = key
+        self.lock = threading.Lock()
+
+        self.model = None
+        self.sha256 = None
+        self.mtime = None
+        self.file_size = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.memory_bytes = None
+        self.load_count = 0
+        self.last_checked = 0.0
+        self.last_error = None
+
+    def info(self):
+        return {
+            "name": self.name,
+            "path": self.path,
+            "loaded": self.model is not None,
+            "version": self.sha256[:12] if self.sha256 else None,
+            "sha256": self.sha256,
+            "file_size": self.file_size,
+            "file_mtime": datetime.fromtimestamp(self.mtime, timezone.utc).isoformat() if self.mtime else None,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "load_seconds": round(self.load_seconds, 4) if self.load_seconds is not None else None,
+            "memory_bytes": self.memory_bytes,
+            "load_count": self.load_count,
+            "last_error": self.last_error,
+        }
+
+
+class ModelRegistry:
+    """
+    Cache model ở mức process: load lười một lần, dùng chung cho scheduler và API.
+
+    Mỗi lần get() (tối đa một lần mỗi check_interval giây) kiểm tra mtime/size của file;
+    nếu đổi thì so sha256 và chỉ load lại khi nội dung thực sự khác. Model cũ vẫn được
+    dùng nếu load bản mới thất bại.
+    """
+
+    def __init__(self, check_interval=None):
+        self.check_interval = MLConfig.MODEL_RELOAD_CHECK_SECONDS if check_interval is None else check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path, loader, sizer=None, key=None):
+        """
+        Đăng ký model. key mô tả tham số mà loader dùng ngoài path (vd config kiến trúc) vì loader
+        thường là closure tạo mới mỗi lần gọi. Gọi lại với cùng path và key là no-op (giữ model đã
+        load); path hoặc key khác thì thay entry, lần get() sau load lại.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.path != path or entry.key != key:
+                self._entries[name] = _ModelEntry(name, path, loader, sizer, key)
+
+    def get(self, name):
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Model chưa được đăng ký: {name}")
+
+        if entry.model is None:
+            with entry.lock:
+                if entry.model is None:
+                    self._load(entry)
+            return entry.model
+
+        now = time.monotonic()
+        if now - entry.last_checked >= self.check_interval:
+            with entry.lock:
+                if now - entry.last_checked >= self.check_interval:
+                    entry.last_checked = now
+                    if self._changed_on_disk(entry):
+                        try:
+                            self._load(entry)
+                        except Exception as e:
+                            entry.last_error = f"Reload thất bại, giữ bản cũ: {e}"
+
+        return entry.model
+
+    def reload(self, name, force=False):
+        """Kiểm tra file ngay (bỏ qua check_interval); force=True thì load lại vô điều kiện"""
+        entry = self._entries[name]
+        with entry.lock:
+            entry.last_checked = time.monotonic()
+            if force or entry.model is None or self._changed_on_disk(entry):
+                self._load(entry)
+                return True
+        return False
+
+    def info(self, name=None):
+        if name is not None:
+            return self._entries[name].info()
+        return {n: e.info() for n, e in self._entries.items()}
+
+    def _changed_on_disk(self, entry):
+        try:
+            st = os.stat(entry.path)
+        except OSError:
+            # File bị xoá/đang được ghi: giữ model hiện tại
+            return False
+
+        if st.st_mtime == entry.mtime and st.st_size == entry.file_size:
+            return False
+
+        sha = _file_sha256(entry.path)
+        if sha == entry.sha256:
+            # Chỉ touch file, nội dung không đổi
+            entry.mtime, entry.file_size = st.st_mtime, st.st_size
+            return False
+        return True
+
+    def _load(self, entry):
+        if not os.path.exists(entry.path):
+            entry.last_error = f"Model file not found: {entry.path}"
+            raise FileNotFoundError(entry.last_error)
+
+        st = os.stat(entry.path)
+        sha = _file_sha256(entry.path)
+
+        started = time.perf_counter()
+        model = entry.loader(entry.path)
+        load_seconds = time.perf_counter() - started
+
+        entry.model = model
+        entry.sha256 = sha
+        entry.mtime, entry.file_size = st.st_mtime, st.st_size
+        entry.loaded_at = datetime.now(timezone.utc)
+        entry.load_seconds = load_seconds
+        entry.memory_bytes = entry.sizer(model) if entry.sizer else None
+        entry.load_count += 1
+        entry.last_checked = time.monotonic()
+        entry.last_error = None
+
+
+model_registry = ModelRegistry()
+
+
+def _torch_model_bytes(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return int(sum(t.numel() * t.element_size() for t in tensors))
+
+
+def _keras_model_bytes(model):
+    return int(sum(w.nbytes for w in model.get_weights()))
+
+
+def _torch_state_bytes(model):
+    # Module quantized giữ weights trong packed params (không nằm trong parameters())
+    import io
+    import torch
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def get_lstmae_model(model_path=None, config=None, quantize=None):
+    """
+    LSTMAE đã load (eval mode) từ registry.
+
+    quantize=True: dynamic int8 quantization (nn.LSTM, nn.Linear) áp dụng một lần lúc load,
+    chỉ chạy trên CPU. Bản fp32 và int8 là hai entry riêng trong registry.
+    """
+    model_path = model_path or MLConfig.LSTM_AE_MODEL_PATH
+    config = dict(config or MLConfig.LSTM_AE_CONFIG)
+    quantize = MLConfig.LSTM_AE_QUANTIZE if quantize is None else quantize
+
+    def _load(path):
+        import torch
+        from .lstm_autoencoder.lstm_autoencoder import LSTMAE
+
+        if quantize:
+            device = torch.device('cpu')
+        else:
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        model = LSTMAE(**config)
+        model.load_state_dict(torch.load(path, map_location=device))
+        model.to(device)
+        model.eval()
+
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8
+            )
+            model.eval()
+        return model
+
+    key = tuple(sorted(config.items()))
+    if quantize:
+        model_registry.register("lstm_autoencoder:int8", model_path, _load, _torch_state_bytes, key=key)
+        return model_registry.get("lstm_autoencoder:int8")
+
+    model_registry.register("lstm_autoencoder", model_path, _load, _torch_model_bytes, key=key)
+    return model_registry.get("lstm_autoencoder")
+
+
+def get_lstm_base_model(model_path=None):
+    """Base model LSTM (Keras) từ registry; fine-tune luôn clone từ model này"""
+    model_path = model_path or MLConfig.LSTM_MODEL_PATH
+
+    def _load(path):
+        from keras.models import load_model
+        return load_model(path)
+
+    model_registry.register("lstm", model_path, _load, _keras_model_bytes)
+    return model_registry.get("lstm")
@@ -6,6 +6,8 @@ class MeterCreate(BaseModel):
     branch_name: Optional[str] = None
     meter_name: str = Field(min_length=1, max_length=200)
     installation_time: Optional[datetime] = None
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
 
 class MeterUpdate(BaseModel):
     branch_name: Optional[str] = None
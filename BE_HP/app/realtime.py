@@ -0,0 +1,232 @@
+"""
+Hub broadcast realtime qua socket.io: event được gom theo room và gửi thành một frame
+mỗi REALTIME_FLUSH_MS thay vì một emit mỗi event.
+
+Room / event:
+    admins          "logs"          log mới; quá REALTIME_MAX_PENDING thì bỏ log cũ nhất và báo `dropped`
+    meters          "meter_status"  delta status của mọi meter (admin, company_manager)
+    branch:<id>     "meter_status"  delta status các meter của branch (branch_manager)
+    meter:<id>      "meter_flow"    reading mới của một meter; quá hạn mức thì kèm `summary` phần bị bỏ
+
+Status chỉ gửi meter có (status, confidence, prediction_time) khác lần gửi trước, client lấy
+snapshot ban đầu bằng REST rồi áp delta. Worker chạy process riêng chỉ publish được khi
+có SOCKETIO_MESSAGE_QUEUE (socket.io gửi qua message queue tới process web).
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+from .config import Config
+from .extensions import socketio
+
+LOG_ROOM = "admins"
+METERS_ROOM = "meters"
+
+
+def branch_room(branch_id):
+    return f"branch:{branch_id}"
+
+
+def meter_room(meter_id):
+    return f"meter:{meter_id}"
+
+
+def _iso(t):
+    return t.isoformat() if hasattr(t, "isoformat") else t
+
+
+class _Flow:
+    """Reading chờ gửi của một meter"""
+    __slots__ = ("readings", "total", "min_flow", "max_flow")
+
+    def __init__(self, cap):
+        self.readings = deque(maxlen=cap)
+        self.total = 0
+        self.min_flow = None
+        self.max_flow = None
+
+    def add(self, t, flow, pressure):
+        self.readings.append([_iso(t), flow, pressure])
+        self.total += 1
+        if flow is not None:
+            self.min_flow = flow if self.min_flow is None else min(self.min_flow, flow)
+            self.max_flow = flow if self.max_flow is None else max(self.max_flow, flow)
+
+
+class RealtimeHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._logs = deque()
+        self._logs_dropped = 0
+        self._status = {}            # meter_id -> (state, rooms) chờ gửi
+        self._sent_status = {}       # meter_id -> state đã gửi gần nhất
+        self._flow = {}              # meter_id -> _Flow
+        self._listeners = defaultdict(int)
+        self._seq = defaultdict(int)
+        self._task = None
+        self.enabled = False
+        self.track_listeners = True
+        self.interval = Config.REALTIME_FLUSH_MS / 1000
+        self.max_pending = Config.REALTIME_MAX_PENDING
+        self.counters = defaultdict(int)
+
+    def configure(self, enabled, track_listeners):
+        self.enabled = enabled
+        # Có message queue thì room có thể nằm ở process khác nên không lọc theo listener
+        self.track_listeners = track_listeners
+
+    # ---------- Listener (chỉ để bỏ qua meter:<id> không ai theo dõi) ----------
+    def listen(self, room):
+        with self._lock:
+            self._listeners[room] += 1
+
+    def unlisten(self, room):
+        with self._lock:
+            if self._listeners.get(room, 0) <= 1:
+                self._listeners.pop(room, None)
+            else:
+                self._listeners[room] -= 1
+
+    def _watched(self, room):
+        return not self.track_listeners or self._listeners.get(room, 0) > 0
+
+    # ---------- Publish ----------
+    def publish_log(self, payload):
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._logs) >= self.max_pending:
+                self._logs.popleft()
+                self._logs_dropped += 1
+            self._logs.append(payload)
+            self.counters["published"] += 1
+        self._ensure_started()
+
+    def publish_status(self, meter_id, branch_id, status, confidence=None, prediction_time=None):
+        if not self.enabled:
+            return
+        meter_id = str(meter_id)
+        state = (status, confidence, _iso(prediction_time))
+        rooms = (METERS_ROOM, branch_room(branch_id)) if branch_id else (METERS_ROOM,)
+        with self._lock:
+            # Cùng meter trong một chu kỳ: chỉ giữ trạng thái cuối
+            self._status[meter_id] = (state, rooms)
+            self.counters["published"] += 1
+        self._ensure_started()
+
+    def publish_readings(self, docs):
+        """docs: measurement document (meter_id, measurement_time, instant_flow, instant_pressure)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for doc in docs:
+                meter_id = str(doc["meter_id"])
+                if not self._watched(meter_room(meter_id)):
+                    continue
+                flow = self._flow.get(meter_id)
+                if flow is None:
+                    flow = self._flow[meter_id] = _Flow(self.max_pending)
+                flow.add(doc["measurement_time"], doc.get("instant_flow"), doc.get("instant_pressure"))
+                self.counters["published"] += 1
+        self._ensure_started()
+
+    # ---------- Flush ----------
+    def _frames(self):
+        with self._lock:
+            logs, dropped = list(self._logs), self._logs_dropped
+            self._logs.clear()
+            self._logs_dropped = 0
+            status, self._status = self._status, {}
+            flows, self._flow = self._flow, {}
+
+        frames = []
+        if logs:
+            frames.append(("logs", LOG_ROOM, {"items": logs, "dropped": dropped}))
+
+        changes = defaultdict(dict)
+        for meter_id, (state, rooms) in status.items():
+            if self._sent_status.get(meter_id) == state:
+                continue
+            self._sent_status[meter_id] = state
+            status_value, confidence, prediction_time = state
+            for room in rooms:
+                changes[room][meter_id] = {
+                    "status": status_value, "confidence": confidence, "prediction_time": prediction_time,
+                }
+        frames += [("meter_status", room, {"changes": items}) for room, items in changes.items()]
+
+        for meter_id, flow in flows.items():
+            payload = {"meter_id": meter_id, "readings": list(flow.readings)}
+            if flow.total > len(flow.readings):
+                payload["summary"] = {
+                    "count": flow.total, "dropped": flow.total - len(flow.readings),
+                    "min_flow": flow.min_flow, "max_flow": flow.max_flow,
+                }
+            frames.append(("meter_flow", meter_room(meter_id), payload))
+        return frames
+
+    def flush(self):
+        """Gửi các frame đang chờ; trả về số frame đã gửi"""
+        frames = self._frames()
+        for event, room, payload in frames:
+            self._seq[room] += 1
+            try:
+                socketio.emit(event, {"room": room, "seq": self._seq[room], **payload}, room=room)
+                self.counters["frames"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Realtime: lỗi gửi frame {event} tới {room}: {e}")
+        return len(frames)
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Realtime: lỗi flush: {e}")
+            # Flush chậm (nhiều client/room) thì chu kỳ sau gom được nhiều event hơn
+            time.sleep(max(self.interval - (time.monotonic() - started), 0.01))
+
+    def _ensure_started(self):
+        # Thread thật thay vì socketio.start_background_task: với async_mode gevent mà không monkey patch,
+        # greenlet nằm trên hub của thread publish đầu tiên (vd. main thread của job worker đang chặn ở
+        # threading.Event.wait) nên không bao giờ được chạy. Khi GEVENT_PATCH=true thread là greenlet.
+        if self._task is None:
+            with self._lock:
+                if self._task is None:
+                    self._task = threading.Thread(target=self._run, name="realtime-flush", daemon=True)
+                    self._task.start()
+
+    def render(self):
+        lines = []
+        for name, help_text, key in (
+            ("realtime_events_published_total", "Số event được publish vào hub", "published"),
+            ("realtime_frames_sent_total", "Số frame socket.io đã gửi", "frames"),
+            ("realtime_frame_errors_total", "Số frame gửi lỗi", "errors"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter", f"{name} {self.counters[key]}"]
+        return "\n".join(lines) + "\n"
+
+
+realtime_hub = RealtimeHub()
+
+
+def init_realtime(app):
+    role = app.config.get("APP_ROLE", Config.APP_ROLE)
+    realtime_hub.configure(
+        enabled=Config.REALTIME_ENABLED and (role != "worker" or bool(Config.SOCKETIO_MESSAGE_QUEUE)),
+        track_listeners=not Config.SOCKETIO_MESSAGE_QUEUE,
+    )
+
+
+def publish_meter_statuses(db, meter_ids):
+    """Tính lại status (cùng luật với get_my_meters) của các meter vừa có prediction và publish"""
+    if not realtime_hub.enabled or not meter_ids:
+        return
+    from .routes.meter.meter_utils import meter_statuses
+
+    meter_ids = list(meter_ids)
+    branches = {m["_id"]: m.get("branch_id") for m in db.meters.find({"_id": {"$in": meter_ids}}, {"branch_id": 1})}
+    for meter_id, (status, confidence, prediction_time) in meter_statuses(db, meter_ids).items():
+        realtime_hub.publish_status(meter_id, branches.get(meter_id), status, confidence, prediction_time)
@@ -8,6 +8,8 @@ from .routes.predictions.predictions_routes import pred_bp
 from .routes.logs.logs_routes import logs_bp
 from .routes.repair.repair_routes import repair_bp
 from .routes.crawler.crawler_routes import crawler_bp
+from .routes.jobs.jobs_routes import jobs_bp
+from .routes.metrics.metrics_routes import metrics_bp
 
 main_bp = Blueprint('main', __name__)
 
@@ -21,3 +23,5 @@ def register_blueprints(app):
     app.register_blueprint(logs_bp, url_prefix='/api/v1/logs')
     app.register_blueprint(repair_bp, url_prefix='/api/v1/repairs')
     app.register_blueprint(crawler_bp, url_prefix='/api/v1/crawler')
+    app.register_blueprint(jobs_bp, url_prefix='/api/v1/jobs')
+    app.register_blueprint(metrics_bp)
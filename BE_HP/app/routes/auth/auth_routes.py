@@ -10,7 +10,7 @@ from ...models.auth_schemas import LoginIn
 from .auth_utils import validate_login
 from ...error import BadRequest
 from ...utils import json_ok, get_swagger_path
-from ...extensions import TOKEN_BLOCKLIST
+from ...utils.token_revocation import revoked_tokens
 from ...routes.logs.log_utils import insert_log
 from ...models.log_schemas import LogType
 from ...utils.logging import log_api
@@ -134,13 +134,12 @@ def refresh():
 @swag_from(get_swagger_path('auth/logout.yml'))
 def logout():
     uid = None
-    jti = None
     try:
         uid = get_jwt_identity()
-        jti = get_jwt().get("jti")
+        token = get_jwt()
 
-        if jti:
-            TOKEN_BLOCKLIST.add(jti)
+        if token:
+            revoked_tokens.revoke(token)
 
         response = make_response(jsonify({
             "msg": "Logout thành công",
@@ -5,10 +5,8 @@ from ...require import require_role
 from ...models.log_schemas import LogType
 from ...routes.logs.log_utils import insert_log
 from ...utils import get_swagger_path
-from ...crawler.meter_measurements_crawler import crawl_measurements_data
-from ...crawler.repair_data_crawler import crawl_repair_data
-import threading
-from flask import current_app
+from ...jobs.queue import job_queue
+from ...jobs.pipeline_runs import new_run_id
 
 crawler_bp = Blueprint("crawler", __name__)
 
@@ -19,28 +17,15 @@ crawler_bp = Blueprint("crawler", __name__)
 def test_all_crawling():
     """Test crawl tất cả dữ liệu"""
     try:
-        app = current_app._get_current_object()  # Lấy app instance
-        
-        def run_job():
-            with app.app_context():
-                try:
-                    insert_log("Bắt đầu crawl trong thread", LogType.INFO)
-                    measurements_result = crawl_measurements_data()
-                    insert_log(f"Crawl measurements hoàn thành", LogType.INFO)
-                    
-                    repairs_result = crawl_repair_data()
-                    insert_log(f"Crawl repairs hoàn thành", LogType.INFO)
-                    
-                    insert_log("Hoàn thành tất cả crawl jobs", LogType.INFO)
-                except Exception as e:
-                    insert_log(f"Lỗi trong thread crawl: {str(e)}", LogType.ERROR)
-                
-        thread = threading.Thread(target=run_job)
-        thread.daemon = True
-        thread.start()
+        # Enqueue job cho worker thay vì chạy crawl/ML trong web process
+        jobs = {}
+        args = {"run_id": new_run_id(), "trigger": "manual"}
+        for task in ("crawl_measurements", "crawl_repairs"):
+            job_id = job_queue.enqueue(task, args=args, dedupe_key=f"manual:{task}")
+            jobs[task] = str(job_id) if job_id else None
         
         insert_log("Đã kích hoạt test crawl tất cả dữ liệu", LogType.INFO)
-        return jsonify({"message": "Đã kích hoạt test crawl tất cả dữ liệu"}), 200
+        return jsonify({"message": "Đã kích hoạt test crawl tất cả dữ liệu", "jobs": jobs}), 200
     except Exception as e:
         insert_log(f"Lỗi khi test crawl all: {str(e)}", LogType.ERROR)
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,77 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from flasgger import swag_from
+
+from ...require import require_role
+from ...models.log_schemas import LogType
+from ...routes.logs.log_utils import insert_log
+from ...utils import get_swagger_path
+from .jobs_utils import list_jobs, enqueue_job, list_pipeline_runs, pipeline_regressions, STATUSES
+
+jobs_bp = Blueprint("jobs", __name__)
+
+
+@jobs_bp.get("/all")
+@swag_from(get_swagger_path('jobs/list.yml'))
+@jwt_required()
+@require_role("admin")
+def get_jobs():
+    status = request.args.get("status")
+    if status and status not in STATUSES:
+        return jsonify({"error": f"status phải là một trong {', '.join(STATUSES)}"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", 50)), 1), 500)
+    except ValueError:
+        return jsonify({"error": "limit phải là số nguyên"}), 400
+    return jsonify(list_jobs(status=status, task=request.args.get("task"), limit=limit)), 200
+
+
+@jobs_bp.post("/add")
+@swag_from(get_swagger_path('jobs/enqueue.yml'))
+@jwt_required()
+@require_role("admin")
+def create_job():
+    body = request.get_json(silent=True) or {}
+    task = body.get("task")
+    if not task:
+        return jsonify({"error": "Thiếu task"}), 400
+
+    job_id, error = enqueue_job(task, args=body.get("args"), dedupe_key=body.get("dedupe_key"))
+    if error:
+        return jsonify({"error": error}), 400
+    if job_id is None:
+        return jsonify({"error": "Đã có job cùng dedupe_key đang chờ hoặc đang chạy"}), 409
+
+    insert_log(f"Đã enqueue job {task} thủ công", LogType.INFO)
+    return jsonify({"id": str(job_id), "task": task}), 201
+
+
+@jobs_bp.get("/runs")
+@swag_from(get_swagger_path('jobs/runs.yml'))
+@jwt_required()
+@require_role("admin")
+def get_pipeline_runs():
+    try:
+        limit = min(max(int(request.args.get("limit", 30)), 1), 365)
+    except ValueError:
+        return jsonify({"error": "limit phải là số nguyên"}), 400
+    return jsonify(list_pipeline_runs(stage=request.args.get("stage"), limit=limit)), 200
+
+
+@jobs_bp.get("/runs/regressions")
+@swag_from(get_swagger_path('jobs/regressions.yml'))
+@jwt_required()
+@require_role("admin")
+def get_pipeline_regressions():
+    try:
+        window = min(max(int(request.args.get("window", 10)), 1), 100)
+        factor = float(request.args.get("factor", 1.5))
+        min_seconds = float(request.args.get("min_seconds", 5))
+    except ValueError:
+        return jsonify({"error": "window, factor, min_seconds phải là số"}), 400
+
+    report = pipeline_regressions(run_id=request.args.get("run_id"), window=window,
+                                  factor=factor, min_seconds=min_seconds)
+    if report is None:
+        return jsonify({"error": "Không tìm thấy pipeline run"}), 404
+    return jsonify(report), 200
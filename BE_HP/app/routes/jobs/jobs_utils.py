@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from ...jobs.queue import job_queue, QUEUED, RUNNING, SUCCEEDED, FAILED
+from ...jobs.tasks import TASKS
+from ...jobs.pipeline_runs import list_runs, find_regressions, run_status
+
+STATUSES = (QUEUED, RUNNING, SUCCEEDED, FAILED)
+
+
+def _iso(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def serialize_job(job: dict) -> dict:
+    return {
+        "id": str(job["_id"]),
+        "task": job.get("task"),
+        "args": job.get("args") or {},
+        "status": job.get("status"),
+        "attempts": job.get("attempts", 0),
+        "max_attempts": job.get("max_attempts"),
+        "dedupe_key": job.get("dedupe_key"),
+        "parent_id": str(job["parent_id"]) if job.get("parent_id") else None,
+        "worker_id": job.get("worker_id"),
+        "run_at": _iso(job.get("run_at")),
+        "created_at": _iso(job.get("created_at")),
+        "started_at": _iso(job.get("started_at")),
+        "heartbeat_at": _iso(job.get("heartbeat_at")),
+        "finished_at": _iso(job.get("finished_at")),
+        "result": job.get("result"),
+        "error": job.get("error"),
+    }
+
+
+def list_jobs(status=None, task=None, limit=50) -> list:
+    return [serialize_job(job) for job in job_queue.list(status=status, task=task, limit=limit)]
+
+
+def enqueue_job(task: str, args=None, dedupe_key=None):
+    """Returns: (job_id | None, error | None)"""
+    if task not in TASKS:
+        return None, f"Task không hợp lệ: {task} (chọn {', '.join(sorted(TASKS))})"
+    return job_queue.enqueue(task, args=args, dedupe_key=dedupe_key), None
+
+
+def _serialize_stage(stage: dict) -> dict:
+    return {
+        **{k: _iso(v) for k, v in stage.items() if k != "job_id"},
+        "job_id": str(stage["job_id"]) if stage.get("job_id") else None,
+    }
+
+
+def serialize_run(run: dict) -> dict:
+    started, finished = run.get("started_at"), run.get("finished_at")
+    return {
+        "id": run["_id"],
+        "trigger": run.get("trigger"),
+        "status": run_status(run),
+        "started_at": _iso(started),
+        "finished_at": _iso(finished),
+        "duration_s": round((finished - started).total_seconds(), 3) if started and finished else None,
+        "stages": {name: _serialize_stage(stage) for name, stage in (run.get("stages") or {}).items()},
+    }
+
+
+def list_pipeline_runs(stage=None, limit=30) -> list:
+    return [serialize_run(run) for run in list_runs(limit=limit, stage=stage)]
+
+
+def pipeline_regressions(run_id=None, window=10, factor=1.5, min_seconds=5.0):
+    report = find_regressions(run_id=run_id, window=window, factor=factor, min_seconds=min_seconds)
+    if report is not None:
+        report["started_at"] = _iso(report["started_at"])
+    return report
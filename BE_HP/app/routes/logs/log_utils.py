@@ -1,6 +1,6 @@
 from ...models.log_schemas import Log, LogType
 from ...utils import get_db, find_by_id
-from ...extensions import socketio
+from ...realtime import realtime_hub
 import datetime
 
 COL = 'logs'
@@ -41,9 +41,7 @@ def insert_log(message: str, log_type: LogType = LogType.INFO, user_id: str | No
         "source": doc.get("source") if doc.get("source") else None,
     }
 
-    try:
-        socketio.emit("log", payload, room="admins")
-    except Exception:
-        pass
+    # Hub gom log thành frame "logs" gửi room admins
+    realtime_hub.publish_log(payload)
 
     return payload
\ No newline at end of file
@@ -3,19 +3,16 @@ from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List, Optional
 
 from ...utils import find_by_id, oid as _oid
-from ...extensions import get_db
-
-COL = "meter_measurements"
+from ...utils.measurement_store import get_measurement_store
+from ...utils.measurement_cache import get_measurement_cache
+from ...config import MLConfig
+from ...utils.rollups import RESOLUTIONS, find_hourly, find_daily, hour_start, day_start
 
 def get_latest_flow(mid: str) -> dict:
     if not find_by_id(mid, 'meters'):
         raise NotFound("Meter not found")
     
-    db = get_db()
-    doc = db[COL].find_one(
-        {"meter_id": _oid(mid)},
-        sort=[("measurement_time", -1)]
-    )
+    doc = get_measurement_store().latest(_oid(mid))
     if not doc:
         raise NotFound("No measurements for this meter")
     
@@ -33,14 +30,10 @@ def get_daily_flow(mid: str, date_str: str) -> dict:
     except ValueError:
         raise BadRequest("Invalid date format, expected YYYY-MM-DD")
     
-    db = get_db()
     start = day.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
     end   = start + timedelta(days=1)
 
-    cur = db[COL].find(
-        {"meter_id": _oid(mid), "measurement_time": {"$gte": start, "$lt": end}},
-        sort=[("measurement_time", 1)]
-    )
+    cur = get_measurement_store().find([_oid(mid)], start, end, end_exclusive=True)
 
     items = []
     for d in cur:
@@ -51,4 +44,41 @@ def get_daily_flow(mid: str, date_str: str) -> dict:
         })
 
 
-    return {"items": items}
\ No newline at end of file
+    return {"items": items}
+
+
+def bucket_start(dt: datetime, resolution: str) -> datetime:
+    if resolution == "hourly":
+        return hour_start(dt)
+    if resolution == "daily":
+        return day_start(dt)
+    return dt
+
+
+def get_flow_rollups(meter_oid, start_dt: datetime, end_dt: datetime, resolution: str) -> List[Dict[str, Any]]:
+    """Rollup giờ/ngày của meter, gồm cả bucket chứa start_dt"""
+    if resolution not in RESOLUTIONS or resolution == "raw":
+        raise BadRequest(f"Invalid resolution, expected one of {', '.join(RESOLUTIONS)}")
+
+    if resolution == "hourly":
+        docs, key = find_hourly(meter_oid, start_dt, end_dt), "hour"
+    else:
+        docs, key = find_daily([meter_oid], day_start(start_dt), end_dt), "day"
+
+    return [
+        {
+            "time": d[key],
+            "flow": d.get("flow_avg"),
+            "flow_min": d.get("flow_min"),
+            "flow_max": d.get("flow_max"),
+            "points": d.get("flow_count", 0),
+        }
+        for d in docs
+    ]
+
+
+def get_cache_stats() -> dict:
+    """Trạng thái measurement cache của process hiện tại (hit rate, bộ nhớ, eviction)"""
+    if not MLConfig.MEASUREMENT_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_measurement_cache().stats()}
@@ -2,7 +2,9 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 
 from ...require import require_role
-from .measurement_utils import get_latest_flow, get_daily_flow
+from .measurement_utils import get_latest_flow, get_daily_flow, get_flow_rollups, bucket_start, get_cache_stats
+from ...utils.rollups import RESOLUTIONS
+from ...utils.measurement_store import get_measurement_store
 from ...utils import get_swagger_path
 from flasgger import swag_from
 from ...extensions import get_db
@@ -12,6 +14,14 @@ from datetime import datetime, timedelta, timezone
 m_bp = Blueprint("measurements", __name__)
 
 
+@m_bp.get("/cache/stats")
+@swag_from(get_swagger_path('measurements/cache_stats.yml'))
+@jwt_required()
+@require_role("admin")
+def measurement_cache_stats():
+    return jsonify(get_cache_stats()), 200
+
+
 @m_bp.get("/<mid>/instant-flow")
 @swag_from(get_swagger_path('measurements/instant_flow.yml'))
 @jwt_required()
@@ -42,8 +52,12 @@ def measurements_range(mid):
         hours = int(request.args.get('hours', 4))
     except Exception:
         return jsonify({"error": "Invalid 'hours' parameter"}), 400
+    resolution = request.args.get('resolution', 'raw')
+    if resolution not in RESOLUTIONS:
+        return jsonify({"error": "Invalid 'resolution' parameter"}), 400
 
     db = get_db()
+    store = get_measurement_store()
     try:
         meter_oid = to_object_id(mid)
         
@@ -51,17 +65,18 @@ def measurements_range(mid):
         meter_doc = db.meters.find_one({"_id": meter_oid})
         meter_name = meter_doc.get("meter_name", f"Meter {mid}") if meter_doc else f"Meter {mid}"
         
-        latest_doc = list(db.meter_measurements.find({"meter_id": meter_oid}).sort("measurement_time", -1).limit(1))
-        mt = latest_doc[0]['measurement_time']
+        latest_doc = store.latest(meter_oid)
+        mt = latest_doc['measurement_time']
         if isinstance(mt, str):
             end_dt = datetime.fromisoformat(mt.replace('Z', '+00:00'))
         else:
             end_dt = mt
         start_dt = end_dt - timedelta(hours=hours)
-        docs = list(db.meter_measurements.find({
-            "meter_id": meter_oid,
-            "measurement_time": {"$gte": start_dt, "$lte": end_dt}
-        }).sort("measurement_time", 1))
+        if resolution == 'raw':
+            docs = store.find([meter_oid], start_dt, end_dt)
+        else:
+            # Đọc rollup giờ/ngày thay vì toàn bộ measurement thô
+            buckets = get_flow_rollups(meter_oid, start_dt, end_dt, resolution)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -69,17 +84,31 @@ def measurements_range(mid):
     def fmt(dt):
         return dt.strftime('%d-%m-%Y - %H:%M')
 
-    response = {
-        "meter_id": mid,
-        "meter_name": meter_name,
-        "start": fmt(start_dt),
-        "end": fmt(end_dt),
-        "items": [
+    if resolution == 'raw':
+        items = [
             {
                 "timestamp": fmt(d.get('measurement_time')),
                 "flow": d.get('instant_flow')
             } for d in docs
         ]
+    else:
+        items = [
+            {
+                "timestamp": fmt(b['time']),
+                "flow": b['flow'],
+                "flow_min": b['flow_min'],
+                "flow_max": b['flow_max'],
+                "points": b['points']
+            } for b in buckets
+        ]
+
+    response = {
+        "meter_id": mid,
+        "meter_name": meter_name,
+        "resolution": resolution,
+        "start": fmt(start_dt),
+        "end": fmt(end_dt),
+        "items": items
     }
     return jsonify(response), 200
 
@@ -93,8 +122,12 @@ def measurements_range_with_predictions(mid):
         hours = int(request.args.get('hours', 4))
     except Exception:
         return jsonify({"error": "Invalid 'hours' parameter"}), 400
+    resolution = request.args.get('resolution', 'raw')
+    if resolution not in RESOLUTIONS:
+        return jsonify({"error": "Invalid 'resolution' parameter"}), 400
 
     db = get_db()
+    store = get_measurement_store()
     try:
         meter_oid = to_object_id(mid)
         
@@ -102,22 +135,26 @@ def measurements_range_with_predictions(mid):
         meter_doc = db.meters.find_one({"_id": meter_oid})
         meter_name = meter_doc.get("meter_name", f"Meter {mid}") if meter_doc else f"Meter {mid}"
         
-        latest_doc = list(db.meter_measurements.find({"meter_id": meter_oid}).sort("measurement_time", -1).limit(1))
-        mt = latest_doc[0]['measurement_time']
+        latest_doc = store.latest(meter_oid)
+        mt = latest_doc['measurement_time']
         if isinstance(mt, str):
             end_dt = datetime.fromisoformat(mt.replace('Z', '+00:00'))
         else:
             end_dt = mt
        
         start_dt = end_dt - timedelta(hours=hours)
-        docs = list(db.meter_measurements.find({
-            "meter_id": meter_oid,
-            "measurement_time": {"$gte": start_dt, "$lte": end_dt}
-        }).sort("measurement_time", 1))
+        if resolution == 'raw':
+            docs = store.find([meter_oid], start_dt, end_dt)
+        else:
+            docs = [
+                {"measurement_time": b['time'], "instant_flow": b['flow'],
+                 "flow_min": b['flow_min'], "flow_max": b['flow_max'], "points": b['points']}
+                for b in get_flow_rollups(meter_oid, start_dt, end_dt, resolution)
+            ]
 
         preds_cursor = db.predictions.find({
             "meter_id": meter_oid,
-            "prediction_time": {"$gte": start_dt, "$lte": end_dt}
+            "prediction_time": {"$gte": bucket_start(start_dt, resolution), "$lte": end_dt}
         })
         preds = [p for p in preds_cursor]
     except Exception as e:
@@ -131,11 +168,15 @@ def measurements_range_with_predictions(mid):
         pt = p.get('prediction_time')
         if not pt:
             continue
-        key = fmt(pt)
+        key = fmt(bucket_start(pt, resolution))
         existing = pred_map.get(key)
         # Không so sánh confidence nữa vì là string, chỉ lấy prediction mới nhất
         if not existing:
             pred_map[key] = p
+        elif (resolution != 'raw' and existing.get('predicted_label', 'normal') == 'normal'
+              and p.get('predicted_label', 'normal') != 'normal'):
+            # Một bucket giờ/ngày bị đánh dấu bất thường nếu có bất kỳ prediction bất thường nào
+            pred_map[key] = p
 
     items = []
     for d in docs:
@@ -144,6 +185,8 @@ def measurements_range_with_predictions(mid):
             "timestamp": ts,
             "flow": d.get('instant_flow')
         }
+        if resolution != 'raw':
+            base.update({"flow_min": d['flow_min'], "flow_max": d['flow_max'], "points": d['points']})
         p = pred_map.get(ts)
         if p:
             # predictions seeded may store the measured flow under different keys
@@ -177,6 +220,7 @@ def measurements_range_with_predictions(mid):
     response = {
         "meter_id": mid,
         "meter_name": meter_name,
+        "resolution": resolution,
         "start": fmt(start_dt),
         "end": fmt(end_dt),
         "items": items
@@ -4,9 +4,10 @@ from flask_jwt_extended import get_jwt, jwt_required,get_jwt_identity
 from ...extensions import get_db
 from ...require import require_role
 from ...models.meter_schema import MeterCreate, MeterOut
-from .meter_utils import create_meter_admin_only, get_meters_list, list_meters, remove_meter, calculate_meter_status_and_confidence, get_detailed_prediction_with_status, get_detailed_predictions_with_status, add_threshold_to_meter
+from .meter_utils import create_meter_admin_only, get_meters_list, list_meters, remove_meter, calculate_meter_status_and_confidence, get_detailed_prediction_with_status, get_detailed_predictions_with_status, add_threshold_to_meter, set_meter_ml_enabled, meters_in_viewport
 from ...error import BadRequest
 from ...utils import json_ok, created, parse_pagination, get_swagger_path
+from ...utils.measurement_store import get_measurement_store
 import traceback
 from flasgger import swag_from
 
@@ -134,6 +135,16 @@ def remove(mid):
     else:
         return jsonify({"success": False, "error": {"code": "NOT_FOUND", "message": "Not found"}}), 404
 
+@meter_bp.patch("/ml_enabled/<string:mid>")
+@swag_from(get_swagger_path('meter/ml_enabled.yml'))
+@jwt_required()
+@require_role("admin")
+def update_ml_enabled(mid):
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get("ml_enabled"), bool):
+        raise BadRequest("ml_enabled must be a boolean")
+    return json_ok(set_meter_ml_enabled(mid, data["ml_enabled"]))
+
 @meter_bp.get("/get_all_with_status")
 @swag_from(get_swagger_path('meter/get_all_with_status.yml'))
 @jwt_required()
@@ -143,6 +154,27 @@ def list_meters_with_status():
     items = get_meters_list(date_str)
     return jsonify({"items": items}), 200
 
+@meter_bp.get("/viewport")
+@swag_from(get_swagger_path('meter/viewport.yml'))
+@jwt_required()
+@require_role("admin", "company_manager", "branch_manager")
+def viewport():
+    try:
+        bbox = tuple(float(v) for v in request.args.get("bbox", "").split(","))
+        zoom = int(request.args.get("zoom", ""))
+    except ValueError:
+        raise BadRequest("bbox (min_lng,min_lat,max_lng,max_lat) and zoom are required")
+    if len(bbox) != 4:
+        raise BadRequest("bbox must be min_lng,min_lat,max_lng,max_lat")
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise BadRequest("bbox out of range")
+    if max_lng - min_lng < 1e-6 or max_lat - min_lat < 1e-6:
+        raise BadRequest("bbox is degenerate")
+    if not 0 <= zoom <= 22:
+        raise BadRequest("zoom must be between 0 and 22")
+    return json_ok(meters_in_viewport(bbox, zoom))
+
 @meter_bp.get("/get_my_meters")
 @swag_from(get_swagger_path('meter/get_my_meters.yml'))
 @jwt_required()
@@ -175,13 +207,12 @@ def get_my_meters():
                 "threshold_value": threshold_doc["threshold_value"],
             }
 
-        measurement_doc = db.meter_measurements.find_one(
-            {"meter_id": x["_id"]}, sort=[("measurement_time", -1)]
-        )
+        measurement_doc = get_measurement_store().latest(x["_id"])
         measurement = None
         if measurement_doc:
             measurement = {
-                "id": str(measurement_doc["_id"]),
+                # Reading đọc từ measurement cache / bucket không có _id riêng
+                "id": str(measurement_doc["_id"]) if measurement_doc.get("_id") is not None else None,
                 "meter_id": str(measurement_doc["meter_id"]),
                 "measurement_time": measurement_doc["measurement_time"],
                 "instant_flow": measurement_doc["instant_flow"],
@@ -6,11 +6,15 @@ from typing import Any, Dict, List, Optional, Tuple
 from zoneinfo import ZoneInfo
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
 from ...models.meter_schema import MeterCreate, MeterOut
 from werkzeug.exceptions import BadRequest, Conflict, Forbidden
 from ...utils import role_name as _role_name, find_branch_by_name, oid_str, get_user_scope, to_object_id
 from ...extensions import get_db
+from ...utils.search import SEARCH_PROJECTION, search_fields, search_filter, ranked_pipeline
+from ...config import Config
 
 COL = "meters"
 
@@ -38,8 +42,9 @@ def list_meter_paginated(page:int, page_size:int, branch_ids: Optional[list[str]
     flt: Dict[str, Any] = {}
     if branch_ids:
         flt["branch_id"] = {"$in": [to_object_id(x) for x in branch_ids]}
-    if q:
-        flt["meter_name"] = {"$regex": q, "$options": "i"}
+    search = search_filter(q) if q else None
+    if search:
+        flt.update(search)
 
     srt = [("_id",1)]
     if sort:
@@ -47,7 +52,11 @@ def list_meter_paginated(page:int, page_size:int, branch_ids: Optional[list[str]
         srt = [(field, direc)]
 
     skip = (page-1) * page_size
-    cur = db[COL].find(flt).sort(srt).skip(skip).limit(page_size+1)
+    if search and not sort:
+        # Không chỉ định sort: xếp theo độ khớp
+        cur = db[COL].aggregate(ranked_pipeline(flt, q, skip, page_size+1))
+    else:
+        cur = db[COL].find(flt, SEARCH_PROJECTION).sort(srt).skip(skip).limit(page_size+1)
 
     out = []
     for d in cur:
@@ -68,7 +77,8 @@ def list_meters(page:int, page_size:int, q: Optional[str], sort: Optional[str]):
     # admin: không giới hạn
     return list_meter_paginated(page, page_size, None, q, sort)
 
-def insert_meter(branch_id: ObjectId, meter_name: str, installation_time: Optional[datetime]) -> Dict[str, Any]:
+def insert_meter(branch_id: ObjectId, meter_name: str, installation_time: Optional[datetime],
+                 longitude: Optional[float] = None, latitude: Optional[float] = None) -> Dict[str, Any]:
     db = get_db()
     meter_id = _meter_id_from_name(meter_name)
 
@@ -80,7 +90,13 @@ def insert_meter(branch_id: ObjectId, meter_name: str, installation_time: Option
         "meter_id": meter_id,
         "meter_name": meter_name.strip(),
         "installation_time": installation_time or datetime.now(timezone.utc),
+        "longitude": longitude,
+        "latitude": latitude,
     }
+    location = meter_location(longitude, latitude)
+    if location:
+        doc["location"] = location
+    doc.update(search_fields(doc["meter_name"]))
     try:
         res = db[COL].insert_one(doc)
     except errors.DuplicateKeyError as e:
@@ -93,6 +109,8 @@ def insert_meter(branch_id: ObjectId, meter_name: str, installation_time: Option
         "meter_id": meter_id,
         "meter_name": doc["meter_name"],
         "installation_time": doc["installation_time"].isoformat(),
+        "longitude": longitude,
+        "latitude": latitude,
     }
 
 def create_meter_admin_only(data: MeterCreate) -> MeterOut:
@@ -103,7 +121,7 @@ def create_meter_admin_only(data: MeterCreate) -> MeterOut:
     if exists_meter(_meter_id_from_name(data.meter_name)):
         raise Conflict(f"Meter '{data.meter_name}' already exists")
 
-    doc = insert_meter(branch["_id"], data.meter_name, data.installation_time)
+    doc = insert_meter(branch["_id"], data.meter_name, data.installation_time, data.longitude, data.latitude)
     doc["branch_name"] = branch["name"]
     return MeterOut(**doc)
 
@@ -176,6 +194,127 @@ def get_meters_list(date_str: str | None = None):
     return result
 
 
+def meter_location(longitude, latitude) -> Optional[Dict[str, Any]]:
+    """GeoJSON Point cho index 2dsphere; None nếu thiếu hoặc sai toạ độ"""
+    try:
+        lng, lat = float(longitude), float(latitude)
+    except (TypeError, ValueError):
+        return None
+    if lng != lng or lat != lat or not (-180 <= lng <= 180 and -90 <= lat <= 90):
+        return None
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def _scope_filter() -> Dict[str, Any]:
+    company_id, branch_id, role_id, role_name = get_user_scope()
+    if branch_id:
+        return {"branch_id": to_object_id(branch_id)}
+    if company_id:
+        return {"branch_id": {"$in": [to_object_id(b) for b in _branch_ids_in_company(company_id)]}}
+    return {}
+
+
+# 2dsphere coi cạnh polygon là đường trắc địa: chia bbox thành các dải hẹp và thêm đỉnh dọc cạnh trên/dưới
+# để polygon bám theo vĩ tuyến; cực bị cắt vì mọi kinh độ ở đó trùng một điểm (đỉnh trùng -> lỗi)
+_VIEWPORT_MAX_SPAN = 90
+_VIEWPORT_EDGE_STEP = 1.0
+_VIEWPORT_MAX_LAT = 89.5
+
+
+def _viewport_location_filter(min_lng, min_lat, max_lng, max_lat) -> Optional[Dict[str, Any]]:
+    """Filter $geoWithin cho bbox (min_lng < max_lng, không vắt qua kinh tuyến 180); None nếu khung rỗng sau khi cắt cực"""
+    min_lat, max_lat = max(min_lat, -_VIEWPORT_MAX_LAT), min(max_lat, _VIEWPORT_MAX_LAT)
+    if min_lat >= max_lat:
+        return None
+
+    chunks = max(1, int(-(-(max_lng - min_lng) // _VIEWPORT_MAX_SPAN)))
+    width = (max_lng - min_lng) / chunks
+    polygons = []
+    for i in range(chunks):
+        west = min_lng + i * width
+        east = max_lng if i == chunks - 1 else west + width
+        steps = max(1, int(-(-(east - west) // _VIEWPORT_EDGE_STEP)))
+        bottom = [[west + (east - west) * k / steps, min_lat] for k in range(steps + 1)]
+        top = [[east - (east - west) * k / steps, max_lat] for k in range(steps + 1)]
+        ring = bottom + top + [[west, min_lat]]
+        polygons.append({"location": {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}})
+    return polygons[0] if len(polygons) == 1 else {"$or": polygons}
+
+
+def meters_in_viewport(bbox: Tuple[float, float, float, float], zoom: int) -> Dict[str, Any]:
+    """
+    Meter trong khung nhìn bbox = (min_lng, min_lat, max_lng, max_lat) theo phạm vi user.
+
+    zoom >= VIEWPORT_CLUSTER_MAX_ZOOM hoặc không quá VIEWPORT_MAX_POINTS meter: trả từng meter kèm status;
+    còn lại gom theo lưới ô VIEWPORT_CLUSTER_PX pixel ở mức zoom đó ngay trong MongoDB, status chỉ tính
+    cho các ô có một meter.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    db = get_db()
+    body = {"bbox": list(bbox), "zoom": zoom}
+    location = _viewport_location_filter(min_lng, min_lat, max_lng, max_lat)
+    if not location:
+        return {**body, "total": 0, "mode": "meters", "meters": [], "clusters": []}
+    flt = {**_scope_filter(), **location}
+
+    def meters_out(meters):
+        statuses = meter_statuses(db, [m["_id"] for m in meters]) if meters else {}
+        out = []
+        for m in meters:
+            lng, lat = m["location"]["coordinates"]
+            status, confidence, prediction_time = statuses.get(m["_id"], ("unknown", "unknown", None))
+            out.append({
+                "id": oid_str(m["_id"]),
+                "meter_name": m.get("meter_name"),
+                "branch_id": oid_str(m["branch_id"]) if m.get("branch_id") else None,
+                "longitude": lng,
+                "latitude": lat,
+                "status": status,
+                "confidence": confidence,
+                "prediction_time": prediction_time,
+            })
+        return out
+
+    # Đếm dừng ở VIEWPORT_MAX_POINTS + 1: chỉ cần biết khung có vượt ngưỡng hay không
+    if zoom >= Config.VIEWPORT_CLUSTER_MAX_ZOOM or \
+            db[COL].count_documents(flt, limit=Config.VIEWPORT_MAX_POINTS + 1) <= Config.VIEWPORT_MAX_POINTS:
+        meters = list(db[COL].find(flt, {"meter_name": 1, "branch_id": 1, "location": 1}))
+        return {**body, "total": len(meters), "mode": "meters", "meters": meters_out(meters), "clusters": []}
+
+    # Ô lưới theo độ (tile 256px phủ 360/2^zoom độ kinh), neo theo gốc toạ độ để cụm không đổi khi kéo bản đồ
+    cell = 360 / (2 ** zoom) * Config.VIEWPORT_CLUSTER_PX / 256
+    lng = {"$arrayElemAt": ["$location.coordinates", 0]}
+    lat = {"$arrayElemAt": ["$location.coordinates", 1]}
+    cells = list(db[COL].aggregate([
+        {"$match": flt},
+        {"$project": {"meter_name": 1, "branch_id": 1, "location": 1, "lng": lng, "lat": lat}},
+        {"$group": {
+            "_id": {"x": {"$floor": {"$divide": ["$lng", cell]}}, "y": {"$floor": {"$divide": ["$lat", cell]}}},
+            "count": {"$sum": 1},
+            "longitude": {"$avg": "$lng"},
+            "latitude": {"$avg": "$lat"},
+            "min_lng": {"$min": "$lng"},
+            "min_lat": {"$min": "$lat"},
+            "max_lng": {"$max": "$lng"},
+            "max_lat": {"$max": "$lat"},
+            "meter": {"$first": {"_id": "$_id", "meter_name": "$meter_name", "branch_id": "$branch_id", "location": "$location"}},
+        }},
+    ]))
+
+    singles = meters_out([c["meter"] for c in cells if c["count"] == 1])
+    clusters = [
+        {
+            "longitude": c["longitude"],
+            "latitude": c["latitude"],
+            "count": c["count"],
+            "bbox": [c["min_lng"], c["min_lat"], c["max_lng"], c["max_lat"]],
+        }
+        for c in cells if c["count"] > 1
+    ]
+    total = sum(c["count"] for c in cells)
+    return {**body, "total": total, "mode": "clusters", "meters": singles, "clusters": clusters}
+
+
 def remove_meter(mid: str):
     company_id, branch_id, role_id, role_name = get_user_scope()
     cur = get(mid)
@@ -204,8 +343,14 @@ def remove_meter(mid: str):
             "meter_consumptions",
             "meter_repairs",
             "meter_measurements",
+            "meter_measurement_buckets",
+            "meter_measurements_hourly",
+            "meter_measurements_daily",
             "alerts",
             "user_meter",
+            "ml_meter_eligibility",
+            "lstmae_thresholds",
+            "lstmae_daily_stats",
         ]
         for col in related_cols:
             try:
@@ -254,44 +399,81 @@ def calculate_meter_status_and_confidence(db, meter_id):
             if p["prediction_time"] == latest_time
         ]
         
-        normal_predictions = []
-        anomaly_predictions = []
-        
-        for pred in same_time_predictions:
-            label = pred.get("predicted_label", "unknown")
-            if label == "normal":
-                normal_predictions.append(pred)
-            elif label in ["leak", "anomaly"]:
-                anomaly_predictions.append(pred)
-        
-        if len(normal_predictions) > 0 and len(anomaly_predictions) > 0:
-            # Trường hợp xung đột: có cả normal và anomaly
-            return "anomaly", "NNTB"
-            
-        elif len(anomaly_predictions) > 0:
-            best_pred = _find_highest_confidence_prediction(anomaly_predictions)
-            confidence = str(best_pred.get("confidence", "unknown")) if best_pred else "unknown"
-            return "anomaly", confidence
-            
-        elif len(normal_predictions) > 0:
-            confidence = str(normal_predictions[0].get("confidence", "unknown"))
-            return "normal", confidence
-            
-        else:
-            first_pred = same_time_predictions[0]
-            label = first_pred.get("predicted_label", "unknown")
-            confidence = str(first_pred.get("confidence", "unknown"))
-            
-            if label == "lost":
-                return "lost", confidence
-            else:
-                return "unknown", confidence
-                
+        return _status_from_predictions(same_time_predictions)
+
     except Exception as e:
         print(f"Error calculating meter status: {e}")
         return "unknown", "unknown"
 
 
+def _status_from_predictions(same_time_predictions):
+    """(status, confidence) từ các prediction cùng prediction_time mới nhất của một meter"""
+    normal_predictions = []
+    anomaly_predictions = []
+    
+    for pred in same_time_predictions:
+        label = pred.get("predicted_label", "unknown")
+        if label == "normal":
+            normal_predictions.append(pred)
+        elif label in ["leak", "anomaly"]:
+            anomaly_predictions.append(pred)
+    
+    if len(normal_predictions) > 0 and len(anomaly_predictions) > 0:
+        # Trường hợp xung đột: có cả normal và anomaly
+        return "anomaly", "NNTB"
+        
+    elif len(anomaly_predictions) > 0:
+        best_pred = _find_highest_confidence_prediction(anomaly_predictions)
+        confidence = str(best_pred.get("confidence", "unknown")) if best_pred else "unknown"
+        return "anomaly", confidence
+        
+    elif len(normal_predictions) > 0:
+        confidence = str(normal_predictions[0].get("confidence", "unknown"))
+        return "normal", confidence
+        
+    else:
+        first_pred = same_time_predictions[0]
+        label = first_pred.get("predicted_label", "unknown")
+        confidence = str(first_pred.get("confidence", "unknown"))
+        
+        if label == "lost":
+            return "lost", confidence
+        else:
+            return "unknown", confidence
+
+
+def meter_statuses(db, meter_ids):
+    """
+    Status của nhiều meter với 2 query (cùng luật với calculate_meter_status_and_confidence)
+
+    Returns:
+        dict: {meter_id: (status, confidence, prediction_time)}; meter chưa có prediction bị bỏ qua
+    """
+    latest = {
+        doc["_id"]: doc["prediction_time"]
+        for doc in db.predictions.aggregate([
+            {"$match": {"meter_id": {"$in": list(meter_ids)}}},
+            {"$sort": {"meter_id": 1, "prediction_time": -1}},
+            {"$group": {"_id": "$meter_id", "prediction_time": {"$first": "$prediction_time"}}},
+        ])
+    }
+    if not latest:
+        return {}
+
+    groups = {}
+    for pred in db.predictions.find({
+        "meter_id": {"$in": list(latest)},
+        "prediction_time": {"$in": list(set(latest.values()))},
+    }):
+        if latest.get(pred["meter_id"]) == pred["prediction_time"]:
+            groups.setdefault(pred["meter_id"], []).append(pred)
+
+    return {
+        meter_id: (*_status_from_predictions(preds), latest[meter_id])
+        for meter_id, preds in groups.items()
+    }
+
+
 def get_detailed_prediction_with_status(db, meter_id):
     """
     Lấy thông tin prediction chi tiết với status được tính toán
@@ -525,14 +707,11 @@ def add_threshold_to_meter(meter_id: str, threshold_value: Optional[float] = Non
     }
     
     try:
-        today_threshold = get_threshold_by_date(meter_id, today_str)
-        if today_threshold:
-            result = db.meter_manual_thresholds.update_one(
-                {"_id": today_threshold["_id"]},
-                {"$set": {"threshold_value": float(threshold_value)}}
-            )
-        else: 
-            result = db.meter_manual_thresholds.insert_one(threshold_doc)
+        db.meter_manual_thresholds.update_one(
+            {"meter_id": meter_oid, "set_time": today_str},
+            {"$set": {"threshold_value": float(threshold_value)}},
+            upsert=True
+        )
 
         return {
             "meter_id": meter_id,
@@ -544,55 +723,69 @@ def add_threshold_to_meter(meter_id: str, threshold_value: Optional[float] = Non
     except Exception as e:
         raise BadRequest(f"Failed to create threshold: {str(e)}")
 
+def set_meter_ml_enabled(meter_id: str, enabled: bool) -> Dict[str, Any]:
+    """Bật/tắt meter khỏi pipeline ML; áp dụng từ lượt predict kế tiếp"""
+    db = get_db()
+    meter_oid = to_object_id(meter_id)
+
+    result = db.meters.update_one({"_id": meter_oid}, {"$set": {"ml_enabled": bool(enabled)}})
+    if result.matched_count != 1:
+        raise BadRequest("Meter not found")
+
+    if not enabled:
+        # Loại ngay khỏi các shard còn lại của lượt đang chạy
+        db.ml_meter_eligibility.update_many(
+            {"meter_id": meter_oid},
+            {"$set": {"eligible": False, "reason": "disabled"}}
+        )
+
+    eligibility = {
+        doc["model"]: {"eligible": doc.get("eligible", False), "reason": doc.get("reason")}
+        for doc in db.ml_meter_eligibility.find({"meter_id": meter_oid})
+    }
+    return {"meter_id": meter_id, "ml_enabled": bool(enabled), "eligibility": eligibility}
+
 def create_daily_thresholds_for_all_meters():
+    """
+    Tạo threshold hôm nay cho mọi meter chưa có, lấy giá trị gần nhất tới hôm qua (không có thì 0.0).
+
+    Một aggregation lấy giá trị gần nhất của mọi meter và một bulk upsert không thứ tự theo
+    (meter_id, set_time) nên số round trip không phụ thuộc số meter. $setOnInsert giữ nguyên
+    threshold hôm nay đã đặt tay.
+    """
     db = get_db()
     
+    vn = ZoneInfo("Asia/Ho_Chi_Minh")
+    today_str = datetime.now(vn).strftime('%Y-%m-%d')
+
+    latest_values = {
+        doc["_id"]: doc["threshold_value"]
+        for doc in db.meter_manual_thresholds.aggregate([
+            {"$match": {"set_time": {"$lt": today_str}}},
+            {"$sort": {"meter_id": 1, "set_time": -1}},
+            {"$group": {"_id": "$meter_id", "threshold_value": {"$first": "$threshold_value"}}},
+        ], allowDiskUse=True)
+    }
+
+    ops = [
+        UpdateOne(
+            {"meter_id": meter["_id"], "set_time": today_str},
+            {"$setOnInsert": {"threshold_value": float(latest_values.get(meter["_id"]) or 0.0)}},
+            upsert=True,
+        )
+        for meter in db.meters.find({}, {"_id": 1})
+    ]
+    if not ops:
+        return {"success_count": 0, "error_count": 0}
+
     try:
-        meters = list(db.meters.find({}))
-        success_count = 0
-        error_count = 0
-        
-        vn = ZoneInfo("Asia/Ho_Chi_Minh")
-        today = datetime.now(vn)
-        today_str = today.strftime('%Y-%m-%d')
-        yesterday = today - timedelta(days=1)
-        yesterday_str = yesterday.strftime('%Y-%m-%d')
-        
-        for meter in meters:
-            try:
-                meter_id = str(meter["_id"])
-                meter_oid = meter["_id"]
-                
-                existing_threshold = get_threshold_by_date(meter_id, today_str)
-                
-                if not existing_threshold:
-                    yesterday_threshold = get_threshold_by_date(meter_id, yesterday_str)
-                    
-                    if yesterday_threshold:
-                        threshold_value = yesterday_threshold["threshold_value"]
-                    else:
-                        latest_threshold = db.meter_manual_thresholds.find_one({
-                            "meter_id": meter_oid
-                        }, sort=[("set_time", -1)])
-                        
-                        threshold_value = latest_threshold["threshold_value"] if latest_threshold else 0.0
-                    
-                    threshold_doc = {
-                        "meter_id": meter_oid,
-                        "threshold_value": float(threshold_value),
-                        "set_time": today_str,
-                    }
-                    
-                    db.meter_manual_thresholds.insert_one(threshold_doc)
-                    success_count += 1
-
-            except Exception as e:
-                error_count += 1
-        
-        return {"success_count": success_count, "error_count": error_count}
-        
-    except Exception as e:
-        raise
+        result = db.meter_manual_thresholds.bulk_write(ops, ordered=False)
+        return {"success_count": result.upserted_count, "error_count": 0}
+    except BulkWriteError as e:
+        # Trùng khoá do process khác vừa tạo cùng threshold: không phải lỗi thật
+        details = e.details
+        errors = [err for err in details.get("writeErrors", []) if err.get("code") != 11000]
+        return {"success_count": details.get("nUpserted", 0), "error_count": len(errors)}
 
 def get_threshold_by_date(meter_id: str, date_str: str):
     """Lấy giá trị ngưỡng cho meter tại ngày cụ thể"""
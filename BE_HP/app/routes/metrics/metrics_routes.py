@@ -0,0 +1,41 @@
+import hmac
+
+from flask import Blueprint, Response, request, jsonify
+from flasgger import swag_from
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from ...config import Config
+from ...instrumentation import request_metrics
+from ...require import load_user_for_role_check
+from ...realtime import realtime_hub
+from ...utils import get_swagger_path
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def _authorized():
+    """None nếu được xem metric (đúng METRICS_TOKEN hoặc JWT của admin), ngược lại (lỗi, status)"""
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if Config.METRICS_TOKEN and hmac.compare_digest(supplied.encode(), Config.METRICS_TOKEN.encode()):
+        return None
+    try:
+        verify_jwt_in_request()
+    except (JWTExtendedException, PyJWTError):
+        return "Unauthorized", 401
+    user = load_user_for_role_check(get_jwt_identity())
+    if not user or user.get("role_name") != "admin":
+        return "Forbidden", 403
+    return None
+
+
+@metrics_bp.get("/metrics")
+@swag_from(get_swagger_path('metrics/metrics.yml'))
+def prometheus_metrics():
+    """Metric request của process hiện tại theo định dạng Prometheus text"""
+    denied = _authorized()
+    if denied:
+        error, status = denied
+        return jsonify({"error": error}), status
+    return Response(request_metrics.render() + realtime_hub.render(), mimetype="text/plain; version=0.0.4")
@@ -3,7 +3,6 @@ from ...extensions import get_db
 from ..logs.logs_routes import insert_log
 from ...models.log_schemas import LogType
 from ...utils import to_object_id, oid_str
-from ...ml import lstm_autoencoder_predictor 
 
 from datetime import datetime
 
@@ -15,12 +14,22 @@ def get_model_id_by_name(model_name: str):
         return model["_id"]
     return None
 
+def get_loaded_models_info():
+    from ...ml import model_registry
+    return model_registry.info()
+
+def get_online_scorer_stats():
+    from ...ml.lstm_autoencoder.online import get_online_scorer
+    return get_online_scorer().stats()
+
 def make_prediction_and_save(meter_id, flow, model_name):
 
+    from ...ml.lstm_autoencoder.online import get_online_scorer
+
     db = get_db()
 
-    is_anomaly, confidence, reconstruction_error, threshold, reconstructed_flow = lstm_autoencoder_predictor.predict_one(
-        oid_str(meter_id), flow
+    is_anomaly, confidence, reconstruction_error, threshold, reconstructed_flow = get_online_scorer().score(
+        oid_str(meter_id), float(flow)
     )
 
     model_id = get_model_id_by_name(model_name)
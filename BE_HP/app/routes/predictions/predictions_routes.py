@@ -4,7 +4,7 @@ from flask_jwt_extended import jwt_required
 from app.require import require_role
 from ...extensions import get_db
 from ...utils import get_swagger_path, oid_str, find_by_id
-from .prediction_utils import get_model_id_by_name, make_prediction_and_save
+from .prediction_utils import get_model_id_by_name, make_prediction_and_save, get_loaded_models_info, get_online_scorer_stats
 from flasgger import swag_from
 from ..logs.logs_routes import insert_log
 from ...models.log_schemas import LogType
@@ -89,6 +89,24 @@ def make_prediction():
         return jsonify({"error": str(e)}), 500
 
 
+@pred_bp.get("/models")
+@swag_from(get_swagger_path('predictions/models.yml'))
+@jwt_required()
+@require_role("admin")
+def get_models():
+    """Thông tin model đang cache trong process: version, thời gian load, bộ nhớ"""
+    return jsonify({"models": get_loaded_models_info()}), 200
+
+
+@pred_bp.get("/online/stats")
+@swag_from(get_swagger_path('predictions/online_stats.yml'))
+@jwt_required()
+@require_role("admin")
+def get_online_stats():
+    """Trạng thái online scorer và histogram của micro-batcher"""
+    return jsonify(get_online_scorer_stats()), 200
+
+
 @pred_bp.get("/get_lstm_autoencoder_predictions/<string:meter_id>")
 @jwt_required()
 @require_role("branch_manager", "company_manager", "admin")
@@ -5,6 +5,7 @@ from ...extensions import get_db
 from ...require import require_role
 from ...error import BadRequest
 from ...utils import json_ok, parse_pagination, get_swagger_path
+from ...utils.search import SEARCH_PROJECTION, search_filter, ranked_pipeline
 from flasgger import swag_from
 import traceback
 
@@ -23,23 +24,21 @@ def list_repairs():
         sort = request.args.get("sort")
 
         db = get_db()
-        query = {}
-        if q:
-            query["$or"] = [
-                {"leak_reason": {"$regex": q, "$options": "i"}},
-                {"replacement_location": {"$regex": q, "$options": "i"}},
-                {"replacement_type": {"$regex": q, "$options": "i"}},
-            ]
-
-        cursor = db["meter_repairs"].find(query)
-
-        if sort:
-            sort_key = sort.lstrip("-")
-            direction = -1 if sort.startswith("-") else 1
-            cursor = cursor.sort(sort_key, direction)
-
-        # Pagination
-        items = list(cursor.skip((page - 1) * page_size).limit(page_size + 1))
+        query = search_filter(q) if q else None
+
+        if query and not sort:
+            # Không chỉ định sort: xếp theo độ khớp
+            items = list(db["meter_repairs"].aggregate(ranked_pipeline(query, q, (page - 1) * page_size, page_size + 1)))
+        else:
+            cursor = db["meter_repairs"].find(query or {}, SEARCH_PROJECTION)
+
+            if sort:
+                sort_key = sort.lstrip("-")
+                direction = -1 if sort.startswith("-") else 1
+                cursor = cursor.sort(sort_key, direction)
+
+            # Pagination
+            items = list(cursor.skip((page - 1) * page_size).limit(page_size + 1))
         has_next = len(items) > page_size
         items = items[:page_size]
 
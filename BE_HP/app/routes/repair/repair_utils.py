@@ -12,6 +12,7 @@ from ...utils import (
     to_object_id,
 )
 from ...extensions import get_db
+from ...utils.search import SEARCH_PROJECTION, search_filter
 
 COL = "meter_repairs"
 
@@ -26,45 +27,6 @@ def get(rid: str) -> Optional[Dict[str, Any]]:
     return d
 
 
-def list_repair_paginated(
-    page: int, page_size: int, q: Optional[str], sort: Optional[str]
-) -> Tuple[List[Dict[str, Any]], bool]:
-    """Lấy danh sách repairs phân trang"""
-    db = get_db()
-    flt: Dict[str, Any] = {}
-
-    if q:
-        flt["$or"] = [
-            {"leak_reason": {"$regex": q, "$options": "i"}},
-            {"leak_fix": {"$regex": q, "$options": "i"}},
-            {"replacement_location": {"$regex": q, "$options": "i"}},
-            {"replacement_type": {"$regex": q, "$options": "i"}},
-        ]
-
-    srt = [("_id", 1)]
-    if sort:
-        field = sort.lstrip("-")
-        direc = -1 if sort.startswith("-") else 1
-        srt = [(field, direc)]
-
-    skip = (page - 1) * page_size
-    cur = db[COL].find(flt).sort(srt).skip(skip).limit(page_size + 1)
-
-    out = []
-    for d in cur:
-        d["id"] = oid_str(d.pop("_id"))
-        if d.get("meter_id"):
-            d["meter_id"] = oid_str(d["meter_id"])
-        out.append(d)
-
-    has_next = len(out) > page_size
-    if has_next:
-        out = out[:page_size]
-    return out, has_next
-
-
-from bson import ObjectId
-
 def list_repair_paginated(
     page: int,
     page_size: int,
@@ -75,13 +37,9 @@ def list_repair_paginated(
     db = get_db()
     flt: Dict[str, Any] = base_filter.copy() if base_filter else {}
 
-    if q:
-        flt["$or"] = [
-            {"leak_reason": {"$regex": q, "$options": "i"}},
-            {"leak_fix": {"$regex": q, "$options": "i"}},
-            {"replacement_location": {"$regex": q, "$options": "i"}},
-            {"replacement_type": {"$regex": q, "$options": "i"}},
-        ]
+    search = search_filter(q) if q else None
+    if search:
+        flt.update(search)
 
     srt = [("_id", 1)]
     if sort:
@@ -90,7 +48,7 @@ def list_repair_paginated(
         srt = [(field, direc)]
 
     skip = (page - 1) * page_size
-    cur = db[COL].find(flt).sort(srt).skip(skip).limit(page_size + 1)
+    cur = db[COL].find(flt, SEARCH_PROJECTION).sort(srt).skip(skip).limit(page_size + 1)
 
     out = []
     for d in cur:
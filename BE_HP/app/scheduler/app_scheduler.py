@@ -1,20 +1,21 @@
-import time
-import threading
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
 try:
     from apscheduler.schedulers.background import BackgroundScheduler
     from apscheduler.triggers.cron import CronTrigger
     SCHEDULER_AVAILABLE = True
 except ImportError:
     SCHEDULER_AVAILABLE = False
-from ..extensions import get_db
 from ..models.log_schemas import LogType
 from ..routes.logs.log_utils import insert_log
-from ..crawler.meter_measurements_crawler import crawl_measurements_data
-from ..crawler.repair_data_crawler import crawl_repair_data
-from ..routes.meter.meter_utils import create_daily_thresholds_for_all_meters
+from ..crawler.meter_measurements_crawler import cancel_running_predictions
+from ..jobs.queue import job_queue
+from ..jobs.pipeline_runs import new_run_id
 
 class AppScheduler:
+    """
+    Cron trong web process chỉ enqueue job vào hàng đợi jobs; worker (APP_ROLE=worker/all)
+    claim và chạy. dedupe_key theo ngày nên nhiều web process cùng kích hoạt chỉ tạo một job.
+    """
     def __init__(self):
         if SCHEDULER_AVAILABLE:
             self.scheduler = BackgroundScheduler()
@@ -25,136 +26,36 @@ class AppScheduler:
         
     def set_app(self, app):
         self.app = app
-        
-    def crawl_all_data_with_lock(self):
-        if self.app:
-            with self.app.app_context():
-                self._crawl_all_data_with_lock()
-        else:
-            self._crawl_all_data_with_lock()
-    
-    def _crawl_all_data_with_lock(self):
-        db = get_db()
-        lock_collection = db["scheduler_locks"]
-        
-        now = datetime.now(timezone.utc)
-        expires = now + timedelta(hours=2)
-        
-        try:
-            result = lock_collection.find_one_and_update(
-                {"job_name": "daily_crawl_job", "expires": {"$lt": now}},
-                {"$set": {"locked_at": now, "expires": expires, "status": "running"}},
-                upsert=True
-            )
-            
-            if not result:
-                try:
-                    lock_collection.insert_one({
-                        "job_name": "daily_crawl_job",
-                        "locked_at": now,
-                        "expires": expires,
-                        "status": "running"
-                    })
-                except Exception:
-                    insert_log("Một process khác đang chạy crawl job", LogType.INFO)
-                    return
-            
-            self._execute_crawling_sequence()
-            insert_log("Scheduled crawl hoàn thành", LogType.INFO)
-            
-            lock_collection.delete_one({"job_name": "daily_crawl_job"})
-            
-        except Exception as e:
-            insert_log(f"Lỗi khi thực hiện crawl job: {str(e)}", LogType.ERROR)
-            lock_collection.delete_one({"job_name": "daily_crawl_job"})
-    
-    def _execute_crawling_sequence(self):
-        try:            
-            if not self._check_api_health():
-                insert_log("API health check failed, skip crawling", LogType.WARNING)
-                return
-            
-            measurements_result = crawl_measurements_data()
-            insert_log(f"Scheduled crawl measurements hoàn thành", LogType.INFO)
-            
-            repairs_result = crawl_repair_data() 
-            insert_log(f"Scheduled crawl repairs hoàn thành", LogType.INFO)
-                        
-        except Exception as e:
-            insert_log(f"Lỗi trong scheduled crawling sequence: {str(e)}", LogType.ERROR)
-            raise
-    
-    def _check_api_health(self):
-        try:
-            import requests
-            import os
-            
-            base_url = os.getenv('DATA_API_URL', 'https://dhxdapi.capnuochaiphong.com.vn')
-            
-            login_url = f"{base_url}/api/user/login"
-            response = requests.head(login_url, timeout=10)
-            
-            if response.status_code in [200, 400, 401, 405]:
-                insert_log(f"API health check passed: {response.status_code} in {response.elapsed.total_seconds()*1000:.0f}ms", LogType.INFO)
-                return True
-            else:
-                insert_log(f"API health check failed: status {response.status_code}", LogType.WARNING)
-                return False
-                
-        except requests.exceptions.Timeout:
-            insert_log("API health check timeout - API may be slow", LogType.WARNING)
-            return False
-        except requests.exceptions.ConnectionError:
-            insert_log("API health check connection error - API may be down", LogType.ERROR)  
-            return False
-        except Exception as e:
-            insert_log(f"API health check error: {str(e)}", LogType.WARNING)
-            return False
-    
-    def create_daily_thresholds_with_lock(self):
+
+    def enqueue_daily(self, *tasks):
         if self.app:
             with self.app.app_context():
-                self._create_daily_thresholds_with_lock()
-        else:
-            self._create_daily_thresholds_with_lock()
-    
-    def _create_daily_thresholds_with_lock(self):
-        db = get_db()
-        lock_collection = db["scheduler_locks"]
-        
-        now = datetime.now(timezone.utc)
-        expires = now + timedelta(hours=1)
-        
-        try:
-            result = lock_collection.find_one_and_update(
-                {"job_name": "daily_threshold_job", "expires": {"$lt": now}},
-                {"$set": {"locked_at": now, "expires": expires, "status": "running"}},
-                upsert=True
-            )
-            
-            if not result:
-                try:
-                    lock_collection.insert_one({
-                        "job_name": "daily_threshold_job",
-                        "locked_at": now,
-                        "expires": expires,
-                        "status": "running"
-                    })
-                except Exception:
-                    insert_log("Một process khác đang chạy threshold job", LogType.INFO)
-                    return
-            
+                return self._enqueue_daily(tasks)
+        return self._enqueue_daily(tasks)
+
+    def _enqueue_daily(self, tasks):
+        day = datetime.now().strftime('%Y-%m-%d')
+        # Các job cùng lượt kích hoạt ghi stage vào cùng một document pipeline_runs
+        args = {"run_id": new_run_id(), "trigger": "schedule"}
+        job_ids = {}
+        for task in tasks:
             try:
-                result = create_daily_thresholds_for_all_meters()
-                insert_log(f"Đã tạo threshold tự động: {result['success_count']} thành công, {result['error_count']} lỗi", LogType.INFO)
+                job_id = job_queue.enqueue(task, args=args, dedupe_key=f"{task}:{day}")
+                if job_id is None:
+                    insert_log(f"Job {task} ngày {day} đã có trong hàng đợi", LogType.INFO)
+                else:
+                    insert_log(f"Đã enqueue job {task}", LogType.INFO)
+                job_ids[task] = job_id
             except Exception as e:
-                insert_log(f"Lỗi khi tạo threshold tự động: {str(e)}", LogType.ERROR)
-            
-            lock_collection.delete_one({"job_name": "daily_threshold_job"})
-            
-        except Exception as e:
-            insert_log(f"Lỗi khi thực hiện threshold job: {str(e)}", LogType.ERROR)
-            lock_collection.delete_one({"job_name": "daily_threshold_job"})
+                insert_log(f"Lỗi khi enqueue job {task}: {str(e)}", LogType.ERROR)
+        return job_ids
+
+    def enqueue_crawl_jobs(self):
+        # crawl_measurements tự enqueue predict_lstmae/predict_lstm khi lưu được dữ liệu mới
+        return self.enqueue_daily("crawl_measurements", "crawl_repairs")
+
+    def enqueue_threshold_job(self):
+        return self.enqueue_daily("daily_thresholds")
     
     def start_scheduler(self):
         if not SCHEDULER_AVAILABLE:
@@ -167,7 +68,7 @@ class AppScheduler:
         
         try:
             self.scheduler.add_job(
-                self.crawl_all_data_with_lock,
+                self.enqueue_crawl_jobs,
                 trigger=CronTrigger(hour=6, minute=30),
                 id='daily_crawl_job',
                 name=f'Crawl dữ liệu hàng ngày',
@@ -175,7 +76,7 @@ class AppScheduler:
             )
             
             self.scheduler.add_job(
-                self.create_daily_thresholds_with_lock,
+                self.enqueue_threshold_job,
                 trigger=CronTrigger(hour=23, minute=50),
                 id='daily_threshold_job',
                 name='Tạo threshold hàng ngày',
@@ -184,7 +85,7 @@ class AppScheduler:
             
             self.scheduler.start()
             self.is_running = True
-            insert_log("Đã khởi động scheduler với crawl job (6:30 AM) và threshold job (23:50)", LogType.INFO)
+            insert_log("Đã khởi động scheduler enqueue crawl job (6:30 AM) và threshold job (23:50)", LogType.INFO)
             
         except Exception as e:
             insert_log(f"Lỗi khi khởi động scheduler: {str(e)}", LogType.ERROR)
@@ -192,6 +93,7 @@ class AppScheduler:
     def stop_scheduler(self):
       
         if self.scheduler.running:
+            cancel_running_predictions()
             self.scheduler.shutdown()
             self.is_running = False
             insert_log("Đã dừng scheduler", LogType.INFO)
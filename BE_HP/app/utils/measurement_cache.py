@@ -0,0 +1,351 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from ..config import MLConfig
+from .measurement_store import utc_naive
+
+_NAT = np.datetime64("NaT", "ms")
+# Đọc lùi mốc ingest một khoảng để không sót reading do lệch đồng hồ / ghi đang dở giữa các process
+_INGEST_OVERLAP = timedelta(seconds=30)
+
+
+def _to_ms(t):
+    return np.datetime64(utc_naive(t), "ms")
+
+
+def _value(v):
+    return np.nan if v is None else float(v)
+
+
+class _Ring:
+    """Ring buffer cố định của một meter: thời gian (datetime64[ms], UTC), flow, pressure"""
+    __slots__ = ("times", "flows", "pressures", "head", "size", "covered_from", "last_access")
+
+    def __init__(self, capacity, covered_from):
+        self.times = np.full(capacity, _NAT, dtype="datetime64[ms]")
+        self.flows = np.full(capacity, np.nan)
+        self.pressures = np.full(capacity, np.nan)
+        self.head = 0               # vị trí ghi tiếp theo
+        self.size = 0
+        self.covered_from = covered_from  # cache có đủ dữ liệu của meter từ mốc này
+        self.last_access = time.monotonic()
+
+    @property
+    def capacity(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.flows.nbytes + self.pressures.nbytes
+
+    def ordered(self):
+        if self.size < self.capacity:
+            return self.times[:self.size], self.flows[:self.size], self.pressures[:self.size]
+        h = self.head
+        return (
+            np.concatenate((self.times[h:], self.times[:h])),
+            np.concatenate((self.flows[h:], self.flows[:h])),
+            np.concatenate((self.pressures[h:], self.pressures[:h])),
+        )
+
+    def _set_ordered(self, times, flows, pressures):
+        n = min(len(times), self.capacity)
+        if n < len(times):
+            self.covered_from = max(self.covered_from, times[-n])
+        self.times[:] = _NAT
+        self.flows[:] = np.nan
+        self.pressures[:] = np.nan
+        self.times[:n], self.flows[:n], self.pressures[:n] = times[-n:], flows[-n:], pressures[-n:]
+        self.size = n
+        self.head = n % self.capacity
+
+    def extend(self, times, flows, pressures):
+        """Thêm reading; nhanh khi đúng thứ tự thời gian, còn lại thì sắp xếp lại và bỏ trùng"""
+        last = self.times[(self.head - 1) % self.capacity] if self.size else None
+        if last is None or (times[0] > last and np.all(times[1:] > times[:-1])):
+            for t, f, p in zip(times, flows, pressures):
+                if self.size == self.capacity:
+                    # Ghi đè reading cũ nhất; cache không còn đủ dữ liệu trước mốc kế tiếp
+                    self.covered_from = max(self.covered_from, self.times[(self.head + 1) % self.capacity])
+                self.times[self.head], self.flows[self.head], self.pressures[self.head] = t, f, p
+                self.head = (self.head + 1) % self.capacity
+                self.size = min(self.size + 1, self.capacity)
+            return
+
+        old_t, old_f, old_p = self.ordered()
+        all_t = np.concatenate((old_t, times))
+        all_f = np.concatenate((old_f, flows))
+        all_p = np.concatenate((old_p, pressures))
+        # Trùng thời gian thì giữ reading mới nhất
+        order = np.argsort(all_t, kind="stable")
+        all_t, all_f, all_p = all_t[order], all_f[order], all_p[order]
+        keep = np.append(all_t[1:] != all_t[:-1], True)
+        self._set_ordered(all_t[keep], all_f[keep], all_p[keep])
+
+    def slice(self, start, end, end_exclusive=False):
+        times, flows, pressures = self.ordered()
+        i = np.searchsorted(times, start, side="left")
+        j = np.searchsorted(times, end, side="left" if end_exclusive else "right")
+        return times[i:j], flows[i:j], pressures[i:j]
+
+
+class MeasurementCache:
+    """
+    Cache trong process các reading gần đây (mặc định MEASUREMENT_CACHE_DAYS ngày) của từng meter.
+
+    Warm bằng một query lớn lúc khởi động, nhận reading mới từ đường ingest của crawler và
+    định kỳ đọc bù reading do process khác ghi theo ingested_at (nên reading về muộn hay
+    backfill cũng được nạp, không chỉ reading có measurement_time mới nhất). Query chỉ được phục vụ từ cache khi cache có
+    đủ dữ liệu của khoảng đó (covered_from), ngược lại trả None để caller đọc MongoDB.
+    Bộ nhớ bị giới hạn theo số meter / MB; meter lâu không được dùng bị loại (LRU).
+    """
+
+    def __init__(self, days=None, max_meters=None, max_mb=None, idle_hours=None,
+                 refresh_seconds=None, points_per_day=144):
+        self.days = days or MLConfig.MEASUREMENT_CACHE_DAYS
+        self.window = timedelta(days=self.days)
+        # Dư 25% cho reading lệch nhịp 10 phút
+        self.capacity = int(self.days * points_per_day * 1.25)
+        ring_bytes = self.capacity * 3 * 8
+        max_mb = max_mb if max_mb is not None else MLConfig.MEASUREMENT_CACHE_MAX_MB
+        max_meters = max_meters if max_meters is not None else MLConfig.MEASUREMENT_CACHE_MAX_METERS
+        self.max_meters = max(1, min(max_meters, int(max_mb * 2**20 // ring_bytes)))
+        self.idle_seconds = (idle_hours if idle_hours is not None else MLConfig.MEASUREMENT_CACHE_IDLE_HOURS) * 3600
+        self.refresh_seconds = (
+            refresh_seconds if refresh_seconds is not None else MLConfig.MEASUREMENT_CACHE_REFRESH_SECONDS
+        )
+
+        self._lock = threading.RLock()
+        self._rings = OrderedDict()     # meter_id -> _Ring, thứ tự LRU
+        self._evicted = set()           # meter bị loại: không thể trả "không có dữ liệu" từ cache
+        self._warm_from = None          # mọi meter có đủ dữ liệu từ mốc này (sau warm)
+        self._high_water = None         # measurement_time lớn nhất đã nạp
+        self._ingested_since = None     # lần đọc bù kế tiếp lấy reading ghi từ mốc này
+        self._refreshed_at = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def warmed(self):
+        return self._warm_from is not None
+
+    # ----- nạp dữ liệu -----
+
+    def warm(self, store):
+        """Nạp cửa sổ gần đây của mọi meter bằng một query"""
+        now = datetime.now(timezone.utc)
+        since = utc_naive(now - self.window)
+        rows = store.find(None, since, now)
+        self._ingested_since = now - _INGEST_OVERLAP
+
+        with self._lock:
+            self._rings.clear()
+            self._evicted.clear()
+            self._warm_from = np.datetime64(since, "ms")
+            self._append_rows(rows)
+            self._refreshed_at = time.monotonic()
+        return len(rows)
+
+    def append(self, rows):
+        """Thêm reading vừa ingest (không cần theo thứ tự)"""
+        if not rows or not self.warmed:
+            return
+        with self._lock:
+            self._append_rows(rows)
+
+    def catch_up(self, store):
+        """Đọc bù reading do process khác ghi từ lần đọc trước, tối đa mỗi refresh_seconds"""
+        if not self.warmed or time.monotonic() - self._refreshed_at < self.refresh_seconds:
+            return
+        with self._lock:
+            if time.monotonic() - self._refreshed_at < self.refresh_seconds:
+                return
+            self._refreshed_at = time.monotonic()
+            now = datetime.now(timezone.utc)
+            since, self._ingested_since = self._ingested_since, now - _INGEST_OVERLAP
+        try:
+            rows = store.find_ingested(since, utc_naive(now - self.window))
+        except Exception:
+            self._ingested_since = since
+            raise
+        self.append(rows)
+
+    def _append_rows(self, rows):
+        grouped = defaultdict(list)
+        for r in rows:
+            grouped[r["meter_id"]].append((_to_ms(r["measurement_time"]), _value(r.get("instant_flow")), _value(r.get("instant_pressure"))))
+
+        for meter_id, items in grouped.items():
+            items.sort(key=lambda x: x[0])
+            times = np.array([t for t, _, _ in items], dtype="datetime64[ms]")
+            flows = np.array([f for _, f, _ in items])
+            pressures = np.array([p for _, _, p in items])
+
+            ring = self._rings.get(meter_id)
+            if ring is None:
+                # Meter mới hoặc đã bị loại: chỉ đảm bảo dữ liệu từ reading đầu tiên nhận được
+                covered_from = self._warm_from if meter_id not in self._evicted else times[0]
+                ring = self._rings[meter_id] = _Ring(self.capacity, covered_from)
+            ring.extend(times, flows, pressures)
+            ring.last_access = time.monotonic()
+            self._rings.move_to_end(meter_id)
+
+            if self._high_water is None or times[-1] > self._high_water:
+                self._high_water = times[-1]
+
+        self._evict()
+
+    def _evict(self):
+        idle_before = time.monotonic() - self.idle_seconds
+        while self._rings:
+            meter_id, ring = next(iter(self._rings.items()))
+            if len(self._rings) <= self.max_meters and ring.last_access >= idle_before:
+                break
+            del self._rings[meter_id]
+            self._evicted.add(meter_id)
+            self.evictions += 1
+
+    # ----- truy vấn -----
+
+    def _ring_for(self, meter_id, start):
+        """(hit, ring): ring có thể None khi cache biết chắc meter không có dữ liệu"""
+        ring = self._rings.get(meter_id)
+        if ring is not None:
+            if start < ring.covered_from:
+                return False, None
+            ring.last_access = time.monotonic()
+            self._rings.move_to_end(meter_id)
+            return True, ring
+        if meter_id in self._evicted or start < self._warm_from:
+            return False, None
+        return True, None
+
+    def find(self, meter_ids, start, end, end_exclusive=False):
+        """Row dạng document gốc, hoặc None nếu cache không đủ dữ liệu cho khoảng này"""
+        if not self.warmed or meter_ids is None:
+            return None
+
+        start_ms, end_ms = _to_ms(start), _to_ms(end)
+        with self._lock:
+            rows = []
+            for meter_id in sorted(meter_ids):
+                hit, ring = self._ring_for(meter_id, start_ms)
+                if not hit:
+                    self.misses += 1
+                    return None
+                if ring is None:
+                    continue
+                times, flows, pressures = ring.slice(start_ms, end_ms, end_exclusive)
+                rows.extend(
+                    {
+                        "meter_id": meter_id,
+                        "measurement_time": t,
+                        "instant_flow": None if np.isnan(f) else float(f),
+                        "instant_pressure": None if np.isnan(p) else float(p),
+                    }
+                    for t, f, p in zip(times.astype(datetime), flows, pressures)
+                )
+            self.hits += 1
+            return rows
+
+    def latest(self, meter_id):
+        if not self.warmed:
+            return None
+        with self._lock:
+            ring = self._rings.get(meter_id)
+            if ring is None or ring.size == 0:
+                # Reading mới nhất có thể nằm ngoài cửa sổ cache
+                self.misses += 1
+                return None
+            ring.last_access = time.monotonic()
+            self._rings.move_to_end(meter_id)
+            i = (ring.head - 1) % ring.capacity
+            self.hits += 1
+            return {
+                "meter_id": meter_id,
+                "measurement_time": ring.times[i].astype(datetime),
+                "instant_flow": None if np.isnan(ring.flows[i]) else float(ring.flows[i]),
+                "instant_pressure": None if np.isnan(ring.pressures[i]) else float(ring.pressures[i]),
+            }
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "warmed": self.warmed,
+                "days": self.days,
+                "meters": len(self._rings),
+                "max_meters": self.max_meters,
+                "readings": int(sum(r.size for r in self._rings.values())),
+                "bytes": int(sum(r.nbytes for r in self._rings.values())),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "high_water": self._high_water.astype(datetime).isoformat() if self._high_water is not None else None,
+            }
+
+
+class CachedStore:
+    """Bọc measurement store: đọc từ MeasurementCache khi được, ghi xuyên qua cả hai"""
+
+    def __init__(self, store, cache):
+        self.store = store
+        self.cache = cache
+
+    def __getattr__(self, name):
+        # aggregate_rows, flow_stats, coverage, name, collection... đi thẳng xuống store
+        return getattr(self.store, name)
+
+    def insert(self, docs):
+        count = self.store.insert(docs)
+        self.cache.append(docs)
+        return count
+
+    def find(self, meter_ids, start, end, end_exclusive=False):
+        self.cache.catch_up(self.store)
+        rows = self.cache.find(meter_ids, start, end, end_exclusive)
+        if rows is None:
+            rows = self.store.find(meter_ids, start, end, end_exclusive)
+        return rows
+
+    def latest(self, meter_id):
+        self.cache.catch_up(self.store)
+        row = self.cache.latest(meter_id)
+        return row if row is not None else self.store.latest(meter_id)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_measurement_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MeasurementCache()
+    return _cache
+
+
+def start_cache_warmup(app):
+    """Warm cache ở background khi khởi động; trước khi warm xong mọi query đọc MongoDB"""
+    from .measurement_store import get_measurement_store
+
+    def _run():
+        with app.app_context():
+            try:
+                count = get_measurement_cache().warm(get_measurement_store(cached=False))
+                print(f"Measurement cache: đã nạp {count} reading")
+            except Exception as e:
+                print(f"Measurement cache warm-up thất bại: {e}")
+
+    thread = threading.Thread(target=_run, name="measurement-cache-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,268 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+
+from ..extensions import get_db
+from ..config import MLConfig
+
+ROW_FIELDS = ("meter_id", "measurement_time", "instant_flow", "instant_pressure")
+
+
+def utc_naive(t):
+    """MongoDB lưu UTC và trả về datetime naive; đưa mọi mốc thời gian về cùng dạng đó"""
+    if t.tzinfo is not None:
+        return t.astimezone(timezone.utc).replace(tzinfo=None)
+    return t
+
+
+def _day_start(t):
+    return t.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class _MeasurementStore(ABC):
+    """
+    Interface chung cho layout lưu meter_measurements.
+
+    Mọi hàm đọc trả về row dạng document gốc {meter_id, measurement_time, instant_flow,
+    instant_pressure} nên code phía trên không cần biết layout lưu trữ.
+    """
+    name = None
+    collection = None
+
+    @abstractmethod
+    def insert(self, docs):
+        """Ghi các document dạng gốc; trả về số measurement đã ghi"""
+
+    @abstractmethod
+    def find(self, meter_ids, start, end, end_exclusive=False):
+        """Row của các meter trong [start, end] (hoặc [start, end) ), sắp theo (meter_id, measurement_time)"""
+
+    @abstractmethod
+    def latest(self, meter_id):
+        """Row mới nhất của meter, None nếu chưa có"""
+
+    @abstractmethod
+    def find_ingested(self, since, start):
+        """Row được ghi từ mốc since (theo ingested_at, kể cả reading về muộn) có measurement_time >= start"""
+
+    @abstractmethod
+    def _rows_pipeline(self, meter_ids, start, end):
+        """Các stage aggregation sinh row dạng document gốc trong [start, end]"""
+
+    def aggregate_rows(self, meter_ids, start, end, stages):
+        """Chạy thêm các stage aggregation trên luồng row dạng document gốc"""
+        return get_db()[self.collection].aggregate(
+            self._rows_pipeline(meter_ids, start, end) + list(stages), allowDiskUse=True
+        )
+
+    def flow_stats(self, meter_ids, start, end):
+        stats = list(self.aggregate_rows(meter_ids, start, end, [
+            {"$match": {"instant_flow": {"$ne": None}}},
+            {"$group": {
+                "_id": None,
+                "min": {"$min": "$instant_flow"},
+                "max": {"$max": "$instant_flow"},
+                "count": {"$sum": 1},
+            }},
+        ]))
+        return stats[0] if stats else None
+
+    def coverage(self, start, end, min_points_per_day):
+        """{meter_id: {points, days}}: số điểm instant_flow và số ngày có >= min_points_per_day điểm"""
+        docs = self.aggregate_rows(None, start, end, [
+            {"$match": {"instant_flow": {"$ne": None}}},
+            {"$group": {
+                "_id": {
+                    "meter_id": "$meter_id",
+                    "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$measurement_time"}},
+                },
+                "points": {"$sum": 1},
+            }},
+            {"$group": {
+                "_id": "$_id.meter_id",
+                "points": {"$sum": "$points"},
+                "days": {"$sum": {"$cond": [{"$gte": ["$points", min_points_per_day]}, 1, 0]}},
+            }},
+        ])
+        return {doc["_id"]: doc for doc in docs}
+
+
+class DocumentStore(_MeasurementStore):
+    """Layout gốc: mỗi measurement 10 phút là một document"""
+    name = "documents"
+    collection = "meter_measurements"
+
+    def insert(self, docs):
+        if not docs:
+            return 0
+        now = datetime.now(timezone.utc)
+        docs = [{**doc, "ingested_at": now} for doc in docs]
+        return len(get_db()[self.collection].insert_many(docs, ordered=False).inserted_ids)
+
+    def _match(self, meter_ids, start, end, end_exclusive=False):
+        match = {"measurement_time": {"$gte": start, "$lt" if end_exclusive else "$lte": end}}
+        if meter_ids is not None:
+            match["meter_id"] = {"$in": list(meter_ids)}
+        return match
+
+    def find(self, meter_ids, start, end, end_exclusive=False):
+        return list(get_db()[self.collection].find(
+            self._match(meter_ids, start, end, end_exclusive),
+            {field: 1 for field in ROW_FIELDS},
+        ).sort([("meter_id", 1), ("measurement_time", 1)]))
+
+    def latest(self, meter_id):
+        return get_db()[self.collection].find_one({"meter_id": meter_id}, sort=[("measurement_time", -1)])
+
+    def find_ingested(self, since, start):
+        return list(get_db()[self.collection].find(
+            {"ingested_at": {"$gte": since}, "measurement_time": {"$gte": start}},
+            {field: 1 for field in ROW_FIELDS},
+        ))
+
+    def _rows_pipeline(self, meter_ids, start, end):
+        return [{"$match": self._match(meter_ids, start, end)}]
+
+
+class BucketStore(_MeasurementStore):
+    """
+    Bucket pattern: một document cho mỗi (meter, ngày) chứa các mảng song song
+    t (giây tính từ 00:00), f (instant_flow), p (instant_pressure).
+
+    ~144 reading/ngày gom vào một document nên số document và kích thước index giảm
+    khoảng 144 lần; đọc một khoảng thời gian chỉ cần quét các bucket của những ngày liên quan.
+    """
+    name = "buckets"
+    collection = "meter_measurement_buckets"
+
+    def insert(self, docs):
+        grouped = defaultdict(list)
+        for doc in docs:
+            t = utc_naive(doc["measurement_time"])
+            grouped[(doc["meter_id"], _day_start(t))].append((t, doc))
+
+        now = datetime.now(timezone.utc)
+        ops = []
+        for (meter_id, day), items in grouped.items():
+            items.sort(key=lambda x: x[0])
+            ops.append(UpdateOne(
+                {"meter_id": meter_id, "day": day},
+                {
+                    "$push": {
+                        "t": {"$each": [int((t - day).total_seconds()) for t, _ in items]},
+                        "f": {"$each": [d.get("instant_flow") for _, d in items]},
+                        "p": {"$each": [d.get("instant_pressure") for _, d in items]},
+                    },
+                    "$inc": {"n": len(items)},
+                    "$min": {"first": items[0][0]},
+                    "$max": {"last": items[-1][0]},
+                    "$set": {"ingested_at": now},
+                },
+                upsert=True,
+            ))
+
+        if ops:
+            get_db()[self.collection].bulk_write(ops, ordered=False)
+        return len(docs)
+
+    @staticmethod
+    def bucket_doc(meter_id, day, rows):
+        """Bucket đầy đủ của một (meter, ngày) từ các row; dùng khi migrate"""
+        rows = sorted(rows, key=lambda r: r["measurement_time"])
+        return {
+            "meter_id": meter_id,
+            "day": day,
+            "t": [int((utc_naive(r["measurement_time"]) - day).total_seconds()) for r in rows],
+            "f": [r.get("instant_flow") for r in rows],
+            "p": [r.get("instant_pressure") for r in rows],
+            "n": len(rows),
+            "first": utc_naive(rows[0]["measurement_time"]),
+            "last": utc_naive(rows[-1]["measurement_time"]),
+            "ingested_at": datetime.now(timezone.utc),
+        }
+
+    @staticmethod
+    def _expand(bucket):
+        day = bucket["day"]
+        rows = [
+            {
+                "_id": bucket.get("_id"),
+                "meter_id": bucket["meter_id"],
+                "measurement_time": day + timedelta(seconds=offset),
+                "instant_flow": flow,
+                "instant_pressure": pressure,
+            }
+            for offset, flow, pressure in zip(bucket.get("t", []), bucket.get("f", []), bucket.get("p", []))
+        ]
+        rows.sort(key=lambda r: r["measurement_time"])
+        return rows
+
+    def find_ingested(self, since, start):
+        """Bucket có ghi mới từ since được trả nguyên cả ngày; cache bỏ trùng theo measurement_time"""
+        lo = utc_naive(start)
+        cursor = get_db()[self.collection].find({"ingested_at": {"$gte": since}, "day": {"$gte": _day_start(lo)}})
+        return [row for bucket in cursor for row in self._expand(bucket) if row["measurement_time"] >= lo]
+
+    def _bucket_match(self, meter_ids, start, end):
+        match = {"day": {"$gte": _day_start(utc_naive(start)), "$lte": end}}
+        if meter_ids is not None:
+            match["meter_id"] = {"$in": list(meter_ids)}
+        return match
+
+    def find(self, meter_ids, start, end, end_exclusive=False):
+        lo, hi = utc_naive(start), utc_naive(end)
+        rows = []
+        cursor = get_db()[self.collection].find(self._bucket_match(meter_ids, start, end)).sort([("meter_id", 1), ("day", 1)])
+        for bucket in cursor:
+            for row in self._expand(bucket):
+                t = row["measurement_time"]
+                if t >= lo and (t < hi if end_exclusive else t <= hi):
+                    rows.append(row)
+        return rows
+
+    def latest(self, meter_id):
+        bucket = get_db()[self.collection].find_one({"meter_id": meter_id}, sort=[("day", -1)])
+        if not bucket:
+            return None
+        rows = self._expand(bucket)
+        return rows[-1] if rows else None
+
+    def _rows_pipeline(self, meter_ids, start, end):
+        return [
+            {"$match": self._bucket_match(meter_ids, start, end)},
+            {"$project": {"meter_id": 1, "day": 1, "m": {"$zip": {"inputs": ["$t", "$f", "$p"]}}}},
+            {"$unwind": "$m"},
+            {"$project": {
+                "meter_id": 1,
+                "measurement_time": {"$add": ["$day", {"$multiply": [{"$arrayElemAt": ["$m", 0]}, 1000]}]},
+                "instant_flow": {"$arrayElemAt": ["$m", 1]},
+                "instant_pressure": {"$arrayElemAt": ["$m", 2]},
+            }},
+            {"$match": {"measurement_time": {"$gte": start, "$lte": end}}},
+        ]
+
+
+STORES = {
+    DocumentStore.name: DocumentStore,
+    BucketStore.name: BucketStore,
+}
+
+
+def get_measurement_store(name=None, cached=None):
+    """
+    Store theo MEASUREMENT_STORE; mặc định bọc thêm MeasurementCache khi
+    MEASUREMENT_CACHE_ENABLED và dùng layout đang cấu hình.
+    """
+    name = name or MLConfig.MEASUREMENT_STORE
+    if name not in STORES:
+        raise ValueError(f"MEASUREMENT_STORE không hợp lệ: {name} (chọn {', '.join(STORES)})")
+    store = STORES[name]()
+
+    if cached is None:
+        cached = MLConfig.MEASUREMENT_CACHE_ENABLED and name == MLConfig.MEASUREMENT_STORE
+    if cached:
+        from .measurement_cache import CachedStore, get_measurement_cache
+        return CachedStore(store, get_measurement_cache())
+    return store
@@ -1,27 +1,40 @@
-import torch
-import numpy as np
-import pandas as pd
+from __future__ import annotations
+
+import sys
 from datetime import datetime
-from sklearn.preprocessing import MinMaxScaler
+from typing import TYPE_CHECKING
+
+import numpy as np
 
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
+# torch / pandas / sklearn chỉ import khi dùng tới để web process không phải nạp stack ML lúc khởi động
+if TYPE_CHECKING:
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler
 
 def preprocess_data_lstm(data, scaler: MinMaxScaler = None, fit_scaler: bool = True): 
     cleaned = []
     
     # Khởi tạo scaler nếu chưa có
     if scaler is None:
+        from sklearn.preprocessing import MinMaxScaler
         scaler = MinMaxScaler()
     
     for item in data:
         try:
-            if isinstance(item['measurement_time'], str):
-                t = datetime.strptime(item['measurement_time'], '%Y-%m-%dT%H:%M:%S')
+            if 'flow_sum' in item:
+                # Rollup giờ/ngày (utils.rollups): cộng sum/count để trung bình ngày khớp dữ liệu thô
+                t = item['day'] if 'day' in item else item['hour']
+                flow_sum, count = float(item['flow_sum']), int(item['flow_count'])
+                if count == 0:
+                    continue
             else:
-                t = item['measurement_time'] 
+                if isinstance(item['measurement_time'], str):
+                    t = datetime.strptime(item['measurement_time'], '%Y-%m-%dT%H:%M:%S')
+                else:
+                    t = item['measurement_time']
+                flow_sum, count = float(item['instant_flow']), 1
 
-            flow = float(item['instant_flow'])
-            cleaned.append({'Ngày tháng': t, 'instant_flow': flow})
+            cleaned.append({'Ngày tháng': t, 'flow_sum': flow_sum, 'count': count})
         except (KeyError, ValueError, TypeError):
             continue
 
@@ -31,15 +44,17 @@ def preprocess_data_lstm(data, scaler: MinMaxScaler = None, fit_scaler: bool = T
     for item in cleaned:
         date = item['Ngày tháng'].date()
         if date not in daily_data:
-            daily_data[date] = []
-        daily_data[date].append(item['instant_flow'])
+            daily_data[date] = [0.0, 0]
+        daily_data[date][0] += item['flow_sum']
+        daily_data[date][1] += item['count']
     
     dates = []
     daily_averages = []
     
     for date in sorted(daily_data.keys()):
         dates.append(date.strftime('%Y-%m-%d'))
-        daily_averages.append(np.mean(daily_data[date]))
+        flow_sum, count = daily_data[date]
+        daily_averages.append(flow_sum / count)
     
     daily_averages_array = np.array(daily_averages).reshape(-1, 1)
     
@@ -56,6 +71,7 @@ def preprocess_data_with_dates_json(data, scaler: MinMaxScaler = None, seq_len=6
     cleaned = [] 
     
     if scaler is None:
+        from sklearn.preprocessing import MinMaxScaler
         scaler = MinMaxScaler()
         
     for item in data:
@@ -113,28 +129,39 @@ def calculate_mnf(
     end_hour: int = 4,
     min_data_ratio: float = 0.5
 ) -> dict:
+    import pandas as pd
+
     df = df.copy()
-    df[timestamp_col] = pd.to_datetime(df[timestamp_col])
 
-    if date is not None:
-        df = df[df[timestamp_col].dt.strftime('%Y-%m-%d') == date]
+    if 'night_flows' in df.columns:
+        # Rollup ngày (utils.rollups): night_flows là lưu lượng 01:00-04:00 của từng ngày
+        df['day'] = pd.to_datetime(df['day'])
+        if date is not None:
+            df = df[df['day'].dt.strftime('%Y-%m-%d') == date]
+        flow_vals = np.array([v for vals in df['night_flows'] for v in (vals or []) if v is not None])
+        if len(flow_vals) == 0:
+            return {}
+    else:
+        df[timestamp_col] = pd.to_datetime(df[timestamp_col])
+
+        if date is not None:
+            df = df[df[timestamp_col].dt.strftime('%Y-%m-%d') == date]
+
+        df['hour'] = df[timestamp_col].dt.hour
 
-    df['hour'] = df[timestamp_col].dt.hour
+        night_mask = (df['hour'] >= start_hour) & (df['hour'] < end_hour)
+        night_df = df[night_mask].copy()
 
-    night_mask = (df['hour'] >= start_hour) & (df['hour'] < end_hour)
-    night_df = df[night_mask].copy()
+        if night_df.empty:
+            return {}
 
-    if night_df.empty:
-        return {}
+        # MNF là median lưu lượng 01:00-04:00 (min_points cũng tính theo số điểm đêm), giống nhánh rollup
+        flow_vals = night_df[flow_col].dropna().values
 
     freq_minutes = 10
     expected_points = int((end_hour - start_hour) * 60 / freq_minutes)
     min_points = max(1, int(expected_points * min_data_ratio))
 
-    mnf_results = {}
-
-    flow_vals = df[flow_col].dropna().values
-
     if len(flow_vals) < min_points:
         mnf = np.nan
     else:
@@ -145,6 +172,9 @@ def fit_global_scaler_with_data(all_meter_data):
     if not all_meter_data:
         return None
         
+    import pandas as pd
+    from sklearn.preprocessing import MinMaxScaler
+
     df = pd.DataFrame(all_meter_data)
     flow_data = df['instant_flow'].values.reshape(-1, 1)
     
@@ -153,23 +183,44 @@ def fit_global_scaler_with_data(all_meter_data):
     
     return scaler
 
-def get_mae_threshold(model, scaler, sequences):
-    model.eval()
+def reconstruct(model, sequences, batch_size=1024):
+    """
+    Reconstruct các window theo batch.
+
+    model có thể là nn.Module (eager) hoặc backend callable numpy -> numpy
+    (TorchScript / ONNX Runtime, xem ml/lstm_autoencoder/backends.py).
+    """
+    sequences = np.asarray(sequences, dtype=np.float32)
+    if len(sequences) == 0:
+        return np.empty_like(sequences)
+
+    outputs = []
+    # Model là nn.Module thì torch đã được import; backend numpy không cần torch
+    torch = sys.modules.get("torch")
+    if torch is not None and isinstance(model, torch.nn.Module):
+        model.eval()
+        model_device = next(model.parameters()).device
+        with torch.inference_mode():
+            for i in range(0, len(sequences), batch_size):
+                batch = torch.from_numpy(sequences[i:i + batch_size]).to(model_device)
+                outputs.append(model(batch).cpu().numpy())
+    else:
+        for i in range(0, len(sequences), batch_size):
+            outputs.append(model(sequences[i:i + batch_size]))
+
+    return np.concatenate(outputs)
 
-    mae_seq = []
-    with torch.inference_mode():
+def _inverse_windows(scaler, windows):
+    windows = np.asarray(windows)
+    return scaler.inverse_transform(windows.reshape(-1, windows.shape[-1])).reshape(windows.shape)
 
-        for seq in sequences:
-            torch_seq = torch.from_numpy(seq).unsqueeze(0).to(device).float()
-            torch_seq = torch_seq.to(device)
-            output = model(torch_seq)
+def get_mae_threshold(model, scaler, sequences):
+    reconstructed = reconstruct(model, sequences)
 
-            output_np = output.squeeze(0).cpu().numpy()
-            _reconstructed = scaler.inverse_transform(output_np)
-            _original = scaler.inverse_transform(seq)
+    _reconstructed = _inverse_windows(scaler, reconstructed)
+    _original = _inverse_windows(scaler, sequences)
 
-            mae = np.max(np.abs(_original - _reconstructed))
-            mae_seq.append(mae)
+    mae_seq = np.max(np.abs(_original - _reconstructed), axis=tuple(range(1, _original.ndim)))
 
     return {
         'mae_low_threshold': np.percentile(mae_seq, 20),
@@ -177,15 +228,26 @@ def get_mae_threshold(model, scaler, sequences):
     }
 
 def predict_lstmae(model, smp, mnf, mnf_threshold, scaler, mae_low_threshold=0.02, mae_high_threshold=0.1):
-    model.eval()
-    smp_tensor = torch.from_numpy(smp).unsqueeze(0).to(device).float()
-    with torch.no_grad():
-        output = model(smp_tensor)
-
-    output_np = output.squeeze(0).cpu().numpy()
-    _reconstructed = scaler.inverse_transform(output_np)
-    _original = scaler.inverse_transform(smp)
-
+    return predict_lstmae_batch(
+        model, np.asarray(smp)[np.newaxis], mnf, mnf_threshold, scaler,
+        mae_low_threshold=mae_low_threshold, mae_high_threshold=mae_high_threshold
+    )[0]
+
+def predict_lstmae_batch(model, sequences, mnf, mnf_threshold, scaler, mae_low_threshold=0.02, mae_high_threshold=0.1):
+    """Như predict_lstmae nhưng chạy một forward pass cho toàn bộ window của meter"""
+    if len(sequences) == 0:
+        return []
+
+    reconstructed = reconstruct(model, sequences)
+    originals = _inverse_windows(scaler, sequences)
+    reconstructions = _inverse_windows(scaler, reconstructed)
+
+    return [
+        classify_lstmae(_original, _reconstructed, mnf, mnf_threshold, mae_low_threshold, mae_high_threshold)
+        for _original, _reconstructed in zip(originals, reconstructions)
+    ]
+
+def classify_lstmae(_original, _reconstructed, mnf, mnf_threshold, mae_low_threshold=0.02, mae_high_threshold=0.1):
     max_mae = np.max(np.abs(_original - _reconstructed))
 
     mnf_excess_pct = ((mnf - mnf_threshold) / mnf_threshold * 100) if mnf > mnf_threshold else 0.0
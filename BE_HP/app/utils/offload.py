@@ -0,0 +1,41 @@
+import sys
+
+from ..config import MLConfig
+
+
+def gevent_patched():
+    """True khi process chạy ở chế độ gevent đã monkey patch (run.py với GEVENT_PATCH=true)"""
+    if "gevent" not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched("threading")
+
+
+def _hub_threadpool():
+    from gevent.hub import get_hub_if_exists
+
+    hub = get_hub_if_exists()
+    if hub is None:
+        # Native thread không có hub (vd thread của chính pool): chạy trực tiếp không chặn greenlet nào
+        return None
+    pool = hub.threadpool
+    if pool.maxsize != MLConfig.CPU_POOL_SIZE:
+        pool.maxsize = MLConfig.CPU_POOL_SIZE
+    return pool
+
+
+def run_cpu_bound(fn, *args, **kwargs):
+    """
+    Chạy fn (inference torch/numpy) trên native thread pool của gevent hub khi đã monkey patch,
+    greenlet gọi chỉ chờ kết quả nên hub vẫn phục vụ request/websocket khác. Ngoài gevent thì gọi trực tiếp.
+
+    Dùng thread pool thay vì process pool vì torch/numpy nhả GIL trong phần tính toán và
+    model đã nạp sẵn trong process.
+    """
+    if not gevent_patched():
+        return fn(*args, **kwargs)
+    pool = _hub_threadpool()
+    if pool is None:
+        return fn(*args, **kwargs)
+    return pool.apply(fn, args, kwargs)
+
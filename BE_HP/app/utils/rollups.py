@@ -0,0 +1,182 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from statistics import median
+
+from pymongo import UpdateOne
+
+from ..extensions import get_db
+from .measurement_store import get_measurement_store, utc_naive
+
+HOURLY_COLLECTION = "meter_measurements_hourly"
+DAILY_COLLECTION = "meter_measurements_daily"
+
+RESOLUTIONS = ("raw", "hourly", "daily")
+
+# Khung giờ đêm lưu trong rollup ngày (night_flows), giống mặc định của calculate_mnf
+NIGHT_START_HOUR = 1
+NIGHT_END_HOUR = 4
+MNF_MIN_POINTS = max(1, int((NIGHT_END_HOUR - NIGHT_START_HOUR) * 60 / 10 * 0.5))
+
+
+def hour_start(t):
+    return t.replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(t):
+    return t.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _stats(values, prefix):
+    if not values:
+        return {f"{prefix}_count": 0, f"{prefix}_sum": 0.0,
+                f"{prefix}_min": None, f"{prefix}_max": None, f"{prefix}_avg": None}
+    total = float(sum(values))
+    return {
+        f"{prefix}_count": len(values),
+        f"{prefix}_sum": total,
+        f"{prefix}_min": float(min(values)),
+        f"{prefix}_max": float(max(values)),
+        f"{prefix}_avg": total / len(values),
+    }
+
+
+def build_rollups(rows):
+    """
+    Gom measurements thô thành rollup giờ và ngày.
+
+    Rollup lưu count/sum/min/max/avg của instant_flow và instant_pressure; rollup ngày lưu
+    thêm night_flows (lưu lượng 01:00-04:00) và mnf để tính MNF không cần đọc dữ liệu thô.
+
+    Returns:
+        tuple: (hourly_docs, daily_docs)
+    """
+    hourly = defaultdict(lambda: {"flows": [], "pressures": []})
+    daily = defaultdict(lambda: {"flows": [], "pressures": [], "night": [], "hours": set()})
+
+    for r in rows:
+        t = r["measurement_time"]
+        flow = r.get("instant_flow")
+        pressure = r.get("instant_pressure")
+
+        h = hourly[(r["meter_id"], hour_start(t))]
+        d = daily[(r["meter_id"], day_start(t))]
+        d["hours"].add(t.hour)
+        if flow is not None:
+            h["flows"].append(flow)
+            d["flows"].append(flow)
+            if NIGHT_START_HOUR <= t.hour < NIGHT_END_HOUR:
+                d["night"].append(flow)
+        if pressure is not None:
+            h["pressures"].append(pressure)
+            d["pressures"].append(pressure)
+
+    hourly_docs = [
+        {"meter_id": meter_id, "hour": hour, **_stats(b["flows"], "flow"), **_stats(b["pressures"], "pressure")}
+        for (meter_id, hour), b in hourly.items()
+    ]
+    daily_docs = [
+        {
+            "meter_id": meter_id,
+            "day": day,
+            **_stats(b["flows"], "flow"),
+            **_stats(b["pressures"], "pressure"),
+            "hours": len(b["hours"]),
+            "night_flows": [float(v) for v in b["night"]],
+            "mnf": float(median(b["night"])) if len(b["night"]) >= MNF_MIN_POINTS else None,
+        }
+        for (meter_id, day), b in daily.items()
+    ]
+    return hourly_docs, daily_docs
+
+
+def refresh_rollups(meter_ids, start, end):
+    """
+    Tính lại rollup của các meter cho những ngày chứa [start, end] từ dữ liệu thô.
+
+    Luôn tính lại trọn ngày nên gọi lại nhiều lần vẫn cho cùng kết quả; bucket không còn
+    dữ liệu thô trong khoảng (đã bị xoá) cũng bị xoá khỏi rollup.
+
+    Returns:
+        dict: points, hourly, daily
+    """
+    if not meter_ids:
+        return {"points": 0, "hourly": 0, "daily": 0}
+
+    db = get_db()
+    range_start = day_start(start)
+    range_end = day_start(end) + timedelta(days=1)
+    meter_ids = list(meter_ids)
+
+    rows = get_measurement_store().find(meter_ids, range_start, range_end, end_exclusive=True)
+    hourly_docs, daily_docs = build_rollups(rows)
+
+    now = datetime.now(timezone.utc)
+    for collection, key, docs in ((HOURLY_COLLECTION, "hour", hourly_docs), (DAILY_COLLECTION, "day", daily_docs)):
+        if docs:
+            db[collection].bulk_write([
+                UpdateOne(
+                    {"meter_id": doc["meter_id"], key: doc[key]},
+                    {"$set": {**doc, "updated_at": now}},
+                    upsert=True,
+                )
+                for doc in docs
+            ], ordered=False)
+        db[collection].delete_many({
+            "meter_id": {"$in": meter_ids},
+            key: {"$gte": range_start, "$lt": range_end},
+            "updated_at": {"$lt": now},
+        })
+
+    return {"points": len(rows), "hourly": len(hourly_docs), "daily": len(daily_docs)}
+
+
+def update_rollups_for_measurements(docs):
+    """Cập nhật rollup cho đúng các (meter, ngày) vừa được ingest"""
+    meters_by_day = defaultdict(set)
+    for doc in docs:
+        # MongoDB lưu UTC, bucket phải tính theo cùng mốc với dữ liệu đọc lại
+        meters_by_day[day_start(utc_naive(doc["measurement_time"]))].add(doc["meter_id"])
+
+    totals = {"points": 0, "hourly": 0, "daily": 0}
+    for day, meter_ids in sorted(meters_by_day.items()):
+        result = refresh_rollups(meter_ids, day, day)
+        for k in totals:
+            totals[k] += result[k]
+    return totals
+
+
+def rebuild_rollups(start, end, meter_ids=None, shard_size=200, progress=None):
+    """
+    Dựng lại rollup cho khoảng ngày [start, end], từng ngày và từng shard meter
+    để giới hạn lượng dữ liệu thô đọc vào bộ nhớ mỗi lần.
+    """
+    db = get_db()
+    if meter_ids is None:
+        meter_ids = [m["_id"] for m in db.meters.find({}, {"_id": 1}).sort("_id", 1)]
+
+    totals = {"points": 0, "hourly": 0, "daily": 0}
+    day = day_start(start)
+    while day <= end:
+        for i in range(0, len(meter_ids), shard_size):
+            result = refresh_rollups(meter_ids[i:i + shard_size], day, day)
+            for k in totals:
+                totals[k] += result[k]
+        if progress:
+            progress(day, totals)
+        day += timedelta(days=1)
+    return totals
+
+
+def find_hourly(meter_id, start, end):
+    return list(get_db()[HOURLY_COLLECTION].find(
+        {"meter_id": meter_id, "hour": {"$gte": hour_start(start), "$lte": end}},
+        {"_id": 0, "updated_at": 0},
+    ).sort("hour", 1))
+
+
+def find_daily(meter_ids, start, end, projection=None):
+    """Rollup ngày có mốc 00:00 nằm trong [start, end] (ngày dở dang ở đầu khoảng bị bỏ qua)"""
+    return list(get_db()[DAILY_COLLECTION].find(
+        {"meter_id": {"$in": list(meter_ids)}, "day": {"$gte": start, "$lte": end}},
+        projection or {"_id": 0, "updated_at": 0},
+    ).sort([("meter_id", 1), ("day", 1)]))
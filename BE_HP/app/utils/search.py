@@ -0,0 +1,91 @@
+"""
+Tìm kiếm không dấu cho meter và repair: mỗi document lưu search_words (các từ đã bỏ dấu, chữ
+thường) và search_terms (edge n-gram của từng từ, có index multikey). Truy vấn "tan vi" thành
+{"search_terms": {"$all": ["tan", "vi"]}} nên khớp "TÂN VIÊN" bằng index thay vì $regex quét
+toàn collection; kết quả xếp theo số từ khớp trọn vẹn.
+"""
+import re
+import unicodedata
+
+from pymongo import UpdateOne
+
+from ..config import Config
+
+# Tăng khi đổi cách tách từ để backfill_search_fields tính lại mọi document
+SEARCH_VERSION = 1
+# Prefix dài hơn mức này chỉ so khớp MAX_GRAM ký tự đầu (giới hạn kích thước index)
+MAX_GRAM = 10
+SEARCH_FIELDS = {
+    "meters": ("meter_name",),
+    "meter_repairs": ("leak_reason", "leak_fix", "replacement_location", "replacement_type"),
+}
+# Loại các field tìm kiếm khỏi kết quả trả cho client
+SEARCH_PROJECTION = {"search_words": 0, "search_terms": 0, "search_v": 0}
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def fold(text) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt ("TÂN VIÊN" -> "tan vien")"""
+    text = unicodedata.normalize("NFD", str(text).lower().replace("đ", "d"))
+    return "".join(c for c in text if unicodedata.category(c) != "Mn")
+
+
+def words(*texts) -> list:
+    """Các từ (không trùng, giữ thứ tự) của texts sau khi fold"""
+    out = {}
+    for text in texts:
+        if text:
+            out.update(dict.fromkeys(_WORD.findall(fold(text))))
+    return list(out)
+
+
+def search_fields(*texts) -> dict:
+    """Field tìm kiếm cần $set vào document từ giá trị các field nguồn"""
+    ws = words(*texts)
+    terms = {w[:n] for w in ws for n in range(1, min(len(w), MAX_GRAM) + 1)}
+    return {"search_words": ws, "search_terms": sorted(terms), "search_v": SEARCH_VERSION}
+
+
+def document_search_fields(collection: str, doc: dict) -> dict:
+    return search_fields(*(doc.get(field) for field in SEARCH_FIELDS[collection]))
+
+
+def search_filter(q):
+    """Filter Mongo cho chuỗi tìm kiếm; None nếu q không có từ nào"""
+    terms = list(dict.fromkeys(w[:MAX_GRAM] for w in words(q)))
+    return {"search_terms": {"$all": terms}} if terms else None
+
+
+def ranked_pipeline(flt: dict, q: str, skip: int, limit: int) -> list:
+    """
+    Aggregate pipeline: document khớp flt, xếp theo số từ của q khớp trọn vẹn, rồi theo _id.
+
+    Chỉ SEARCH_MAX_CANDIDATES document khớp đầu tiên (theo index search_terms) được chấm điểm, nên
+    truy vấn ngắn khớp rất nhiều document không phải sort toàn bộ trong bộ nhớ.
+    """
+    candidates = max(Config.SEARCH_MAX_CANDIDATES, skip + limit)
+    return [
+        {"$match": flt},
+        {"$limit": candidates},
+        {"$addFields": {"_score": {"$size": {"$setIntersection": [{"$ifNull": ["$search_words", []]}, words(q)]}}}},
+        {"$sort": {"_score": -1, "_id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {"_score": 0, **SEARCH_PROJECTION}},
+    ]
+
+
+def backfill_search_fields(db, batch_size=1000):
+    """Tính field tìm kiếm cho document chưa có hoặc có SEARCH_VERSION cũ; trả về số document đã cập nhật"""
+    updated = 0
+    for collection, fields in SEARCH_FIELDS.items():
+        ops = []
+        for doc in db[collection].find({"search_v": {"$ne": SEARCH_VERSION}}, {field: 1 for field in fields}):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": document_search_fields(collection, doc)}))
+            if len(ops) >= batch_size:
+                updated += db[collection].bulk_write(ops, ordered=False).modified_count
+                ops = []
+        if ops:
+            updated += db[collection].bulk_write(ops, ordered=False).modified_count
+    return updated
@@ -0,0 +1,94 @@
+"""
+Danh sách JWT bị thu hồi dùng chung mọi worker: lưu ở collection revoked_tokens (TTL theo exp
+của token), mỗi process giữ bản sao {jti: exp} trong bộ nhớ và đọc thêm các bản ghi mới theo
+watermark revoked_at tối đa mỗi TOKEN_REVOCATION_REFRESH_SECONDS, nên kiểm tra token trên
+mỗi request không chạm DB.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from ..config import Config
+
+COLLECTION = "revoked_tokens"
+# Đọc lùi watermark một khoảng để không sót bản ghi do lệch đồng hồ giữa các worker
+_OVERLAP = timedelta(seconds=30)
+
+
+def _utc(t):
+    return t.replace(tzinfo=timezone.utc) if t.tzinfo is None else t
+
+
+class RevokedTokens:
+    def __init__(self, refresh_seconds=None):
+        self.refresh_seconds = Config.TOKEN_REVOCATION_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._jtis = {}            # jti -> exp (epoch giây)
+        self._watermark = None     # revoked_at lớn nhất đã đọc
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def revoke(self, jwt_payload):
+        """Thu hồi token (payload đã decode); có hiệu lực ngay ở process này, ở worker khác sau lần refresh kế tiếp"""
+        from ..extensions import get_db
+
+        jti = jwt_payload.get("jti")
+        if not jti:
+            return
+        exp = jwt_payload.get("exp") or time.time() + Config.JWT_REFRESH_TOKEN_EXPIRES.total_seconds()
+        now = datetime.now(timezone.utc)
+        get_db()[COLLECTION].update_one(
+            {"_id": jti},
+            {"$setOnInsert": {
+                "revoked_at": now,
+                "expires_at": datetime.fromtimestamp(exp, timezone.utc),
+                "type": jwt_payload.get("type"),
+                "sub": jwt_payload.get("sub"),
+            }},
+            upsert=True,
+        )
+        self._jtis[jti] = exp
+
+    def is_revoked(self, jti):
+        if not jti:
+            return False
+        self._maybe_refresh()
+        exp = self._jtis.get(jti)
+        return exp is not None and exp > time.time()
+
+    def _maybe_refresh(self):
+        if time.monotonic() < self._next_refresh:
+            return
+        # Chỉ một request refresh; request khác dùng bản hiện có thay vì chờ
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Không đọc được revoked_tokens: {e}")
+        finally:
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+            self._lock.release()
+
+    def refresh(self):
+        """Đọc các token bị thu hồi sau watermark (lần đầu: mọi token chưa hết hạn) và bỏ jti đã hết hạn"""
+        from ..extensions import get_db
+
+        now = datetime.now(timezone.utc)
+        query = {"expires_at": {"$gt": now}}
+        if self._watermark is not None:
+            query["revoked_at"] = {"$gte": self._watermark - _OVERLAP}
+
+        for doc in get_db()[COLLECTION].find(query, {"revoked_at": 1, "expires_at": 1}):
+            self._jtis[doc["_id"]] = _utc(doc["expires_at"]).timestamp()
+            revoked_at = _utc(doc["revoked_at"])
+            if self._watermark is None or revoked_at > self._watermark:
+                self._watermark = revoked_at
+        if self._watermark is None:
+            self._watermark = now
+
+        cutoff = time.time()
+        for jti in [jti for jti, exp in list(self._jtis.items()) if exp <= cutoff]:
+            self._jtis.pop(jti, None)
+
+
+revoked_tokens = RevokedTokens()
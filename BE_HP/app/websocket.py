@@ -1,33 +1,27 @@
-from .extensions import socketio, TOKEN_BLOCKLIST
+from .extensions import socketio, get_db
 from flask import request
 from flask_socketio import join_room, leave_room
 from flask_jwt_extended import decode_token
 from .require import load_user_for_role_check
+from .realtime import realtime_hub, LOG_ROOM, METERS_ROOM, branch_room
+from .utils.token_revocation import revoked_tokens
+from bson import ObjectId
 
+# sid -> {"user_id", "role", "branch_id"} của socket đã xác thực
+_clients = {}
+# sid -> room meter:<id> đang theo dõi (để trả lại listener khi disconnect)
+_meter_rooms = {}
 
-@socketio.on("connect")
-def handle_connect():
-    print("Client connected", request.sid)
-
-    token = None
-    auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ", 1)[1].strip()
-    if not token:
-        token = request.args.get("token") or request.args.get("access_token")
-
-    if not token:
-        socketio.emit("auth_info", {"msg": "no token provided; connected as guest"}, room=request.sid)
-        return
 
+def _authenticate(token):
+    """Xác thực token, join room mặc định theo role và gửi auth_ok/auth_error"""
     try:
         decoded = decode_token(token)
     except Exception:
         socketio.emit("auth_error", {"msg": "invalid token"}, room=request.sid)
         return
 
-    jti = decoded.get("jti")
-    if jti and jti in TOKEN_BLOCKLIST:
+    if revoked_tokens.is_revoked(decoded.get("jti")):
         socketio.emit("auth_error", {"msg": "token revoked"}, room=request.sid)
         return
 
@@ -38,33 +32,78 @@ def handle_connect():
 
     user = load_user_for_role_check(identity)
     role = user.get("role_name") if user else None
+    branch_id = str(user["branch_id"]) if user and user.get("branch_id") else None
+    _clients[request.sid] = {"user_id": identity, "role": role, "branch_id": branch_id}
+
+    rooms = []
     if role == "admin":
-        join_room("admins")
-        socketio.emit("auth_ok", {"role": "admin"}, room=request.sid)
-        print(f"Socket {request.sid} authenticated as admin (user {identity})")
-    else:
-        socketio.emit("auth_ok", {"role": role}, room=request.sid)
+        rooms = [LOG_ROOM, METERS_ROOM]
+    elif role == "company_manager":
+        rooms = [METERS_ROOM]
+    elif role == "branch_manager" and branch_id:
+        rooms = [branch_room(branch_id)]
+    for room in rooms:
+        join_room(room)
+
+    socketio.emit("auth_ok", {"role": role, "rooms": rooms}, room=request.sid)
+    print(f"Socket {request.sid} authenticated as {role} (user {identity})")
+
+
+def _can_join(room):
+    """Quyền vào room: admins (admin), meters (admin, company_manager), branch:<id>, meter:<id> theo phạm vi user"""
+    client = _clients.get(request.sid)
+    if not client or not room:
+        return False
+    role = client["role"]
+    if room == LOG_ROOM:
+        return role == "admin"
+    if room == METERS_ROOM:
+        return role in ("admin", "company_manager")
+    if room.startswith("branch:"):
+        return role in ("admin", "company_manager") or room == branch_room(client["branch_id"])
+    if room.startswith("meter:"):
+        meter_id = room.split(":", 1)[1]
+        if not ObjectId.is_valid(meter_id):
+            return False
+        meter = get_db().meters.find_one({"_id": ObjectId(meter_id)}, {"branch_id": 1})
+        if not meter:
+            return False
+        return role in ("admin", "company_manager") or str(meter.get("branch_id")) == client["branch_id"]
+    return False
+
+
+def _room_from(data):
+    if isinstance(data, dict):
+        return data.get("room")
+    return None
+
+
+@socketio.on("connect")
+def handle_connect():
+    print("Client connected", request.sid)
+
+    token = None
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ", 1)[1].strip()
+    if not token:
+        token = request.args.get("token") or request.args.get("access_token") or request.cookies.get("access_token")
+
+    if not token:
+        socketio.emit("auth_info", {"msg": "no token provided; connected as guest"}, room=request.sid)
+        return
+
+    _authenticate(token)
 
 
 @socketio.on("disconnect")
 def handle_disconnect():
+    _clients.pop(request.sid, None)
+    for room in _meter_rooms.pop(request.sid, set()):
+        realtime_hub.unlisten(room)
     print("Client disconnected", request.sid)
 
 
-@socketio.on("subscribe_logs")
-def handle_subscribe_logs(data):
-    room = None
-    if isinstance(data, dict):
-        room = data.get("room")
-    if room:
-        join_room(room)
-        print(f"Client {request.sid} joined room {room}")
-        socketio.emit("subscribed", {"room": room}, room=request.sid)
-    else:
-        # no room -> client will receive broadcasts
-        socketio.emit("subscribed", {"room": None}, room=request.sid)
-
-
 @socketio.on("authenticate")
 def handle_authenticate(payload):
     token = None
@@ -74,40 +113,40 @@ def handle_authenticate(payload):
         socketio.emit("auth_error", {"msg": "missing token"}, room=request.sid)
         return
 
-    try:
-        decoded = decode_token(token)
-    except Exception as e:
-        socketio.emit("auth_error", {"msg": "invalid token"}, room=request.sid)
-        return
+    _authenticate(token)
 
-    jti = decoded.get("jti")
-    if jti and jti in TOKEN_BLOCKLIST:
-        socketio.emit("auth_error", {"msg": "token revoked"}, room=request.sid)
-        return
 
-    identity = decoded.get("sub") or decoded.get("identity")
-    if not identity:
-        socketio.emit("auth_error", {"msg": "invalid token identity"}, room=request.sid)
+@socketio.on("subscribe")
+def handle_subscribe(data):
+    room = _room_from(data)
+    if not _can_join(room):
+        socketio.emit("subscribe_error", {"room": room, "msg": "forbidden"}, room=request.sid)
         return
 
-    user = load_user_for_role_check(identity)
-    role = user.get("role_name") if user else None
-    if role == "admin":
-        join_room("admins")
-        socketio.emit("auth_ok", {"role": "admin"}, room=request.sid)
-        print(f"Socket {request.sid} authenticated as admin (user {identity})")
-    else:
-        socketio.emit("auth_ok", {"role": role}, room=request.sid)
+    join_room(room)
+    if room.startswith("meter:"):
+        rooms = _meter_rooms.setdefault(request.sid, set())
+        if room not in rooms:
+            rooms.add(room)
+            realtime_hub.listen(room)
+    socketio.emit("subscribed", {"room": room}, room=request.sid)
 
 
-@socketio.on("unsubscribe_logs")
-def handle_unsubscribe_logs(data):
-    room = None
-    if isinstance(data, dict):
-        room = data.get("room")
-    if room:
-        leave_room(room)
-        print(f"Client {request.sid} left room {room}")
-        socketio.emit("unsubscribed", {"room": room}, room=request.sid)
-    else:
+@socketio.on("unsubscribe")
+def handle_unsubscribe(data):
+    room = _room_from(data)
+    if not room:
         socketio.emit("unsubscribed", {"room": None}, room=request.sid)
+        return
+
+    leave_room(room)
+    rooms = _meter_rooms.get(request.sid, set())
+    if room in rooms:
+        rooms.discard(room)
+        realtime_hub.unlisten(room)
+    socketio.emit("unsubscribed", {"room": room}, room=request.sid)
+
+
+# Tên event cũ, giữ cho client đang dùng
+socketio.on_event("subscribe_logs", handle_subscribe)
+socketio.on_event("unsubscribe_logs", handle_unsubscribe)
@@ -1,24 +1,51 @@
+import os
+
+# Chế độ production I/O cộng tác: patch stdlib trước mọi import khác để pymongo, requests,
+# threading nhường hub của gevent thay vì chặn toàn bộ server
+GEVENT_PATCH = os.getenv("GEVENT_PATCH", "false").lower() == "true"
+if GEVENT_PATCH:
+    from gevent import monkey
+    monkey.patch_all()
+
 from app import create_app
+from app.config import Config
 from app.extensions import socketio
-from scripts.seed_data import main
 from gevent import pywsgi
+from gevent.pool import Pool
 from geventwebsocket.handler import WebSocketHandler
 import sys
-import os
 
-app = create_app()
+role = None
+if GEVENT_PATCH and Config.APP_ROLE == "all":
+    # Fine-tune/inference của job worker sẽ chặn hub nếu chạy trong process đã patch
+    print("GEVENT_PATCH=true: chạy APP_ROLE=web, job worker chạy riêng bằng `python -m app.jobs.worker`")
+    role = "web"
+
+app = create_app(role)
 
 if __name__ == "__main__":
+    # Import ở đây: seed kéo theo pandas; bỏ qua nếu data version đã được seed
+    from scripts.seed_data import main
     main()
+    # Bổ sung field tìm kiếm cho dữ liệu seed và document có SEARCH_VERSION cũ, một lần mỗi lần khởi động
+    from app.extensions import get_db
+    from app.utils.search import backfill_search_fields
+    with app.app_context():
+        updated = backfill_search_fields(get_db())
+    if updated:
+        print(f"Search: đã cập nhật {updated} document")
 
     host = os.getenv('HOST', '0.0.0.0')
     port = int(os.getenv('PORT', 5000))
+    # Số connection đồng thời tối đa (greenlet) của server; 0 = không giới hạn
+    max_connections = int(os.getenv('GEVENT_MAX_CONNECTIONS', 0))
 
-    print(f"Starting server on {host}:{port}")
+    print(f"Starting server on {host}:{port} (gevent patch: {GEVENT_PATCH})")
     server = pywsgi.WSGIServer(
         (host, port),
         app,
         handler_class=WebSocketHandler,
+        spawn=Pool(max_connections) if max_connections > 0 else 'default',
         log=sys.stdout
     )
     server.serve_forever()
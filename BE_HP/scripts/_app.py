@@ -0,0 +1,15 @@
+"""Helper dùng chung cho các script chạy ngoài web process (seed, migrate, rebuild, benchmark)"""
+
+
+def app_context(mongo_db=None, mongo_uri=None):
+    """App context tối thiểu để dùng get_db() trong script (không khởi động scheduler)"""
+    from flask import Flask
+    from app.config import Config
+
+    app = Flask("scripts")
+    app.config.from_object(Config)
+    if mongo_db:
+        app.config["MONGO_DB"] = mongo_db
+    if mongo_uri:
+        app.config["MONGO_URI"] = mongo_uri
+    return app.app_context()
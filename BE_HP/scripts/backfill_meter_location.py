@@ -0,0 +1,42 @@
+"""
+Bổ sung location (GeoJSON Point cho index 2dsphere của /meters/viewport) cho meter cũ chỉ có
+longitude/latitude. Chạy một lần sau khi nâng cấp; meter tạo/sửa qua API đã có location.
+
+    python -m scripts.backfill_meter_location --dry-run     # chỉ đếm
+    python -m scripts.backfill_meter_location
+"""
+import time
+import argparse
+
+from app.extensions import get_db
+from scripts._app import app_context
+
+MISSING_LOCATION = {
+    "location": {"$exists": False},
+    "longitude": {"$gte": -180, "$lte": 180},
+    "latitude": {"$gte": -90, "$lte": 90},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bổ sung location cho meter chỉ có longitude/latitude")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm, không ghi")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with app_context():
+        db = get_db()
+        missing = db.meters.count_documents(MISSING_LOCATION)
+        print(f"meters: {missing} meter thiếu location / {db.meters.estimated_document_count()}")
+        if not args.dry_run and missing:
+            res = db.meters.update_many(
+                MISSING_LOCATION,
+                [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}],
+            )
+            print(f"  đã cập nhật {res.modified_count} meter")
+
+    print(f"Xong trong {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
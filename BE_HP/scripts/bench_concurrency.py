@@ -0,0 +1,153 @@
+"""
+Benchmark tải hỗn hợp đồng thời lên server đang chạy: requests/s và p50/p99 theo loại request.
+
+So sánh trước/sau chế độ gevent patch (chạy server hai lần, mỗi lần một lượt benchmark):
+
+    GEVENT_PATCH=false python run.py
+    python -m scripts.bench_concurrency --meter-id <id> --token <jwt> --label unpatched --json before.json
+
+    APP_ROLE=web GEVENT_PATCH=true python run.py
+    python -m scripts.bench_concurrency --meter-id <id> --token <jwt> --label patched --json after.json
+
+    python -m scripts.bench_concurrency --compare before.json after.json
+"""
+import json
+import time
+import random
+import argparse
+import threading
+
+import numpy as np
+import requests
+
+from scripts.bench_utils import print_table
+
+# name: (method, path, cần JWT)
+SCENARIOS = {
+    "spec": ("GET", "/apispec_1.json", False),
+    "latest": ("GET", "/api/v1/measurements/{meter_id}/instant-flow", True),
+    "range": ("GET", "/api/v1/measurements/{meter_id}/range?hours={hours}", True),
+    "predict": ("POST", "/api/v1/predictions/make_prediction", False),
+}
+
+
+def _parse_mix(items):
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Scenario không hợp lệ: {name} (chọn {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _request(session, args, name):
+    method, path, _ = SCENARIOS[name]
+    url = args.url.rstrip("/") + path.format(meter_id=args.meter_id, hours=args.range_hours)
+    if name == "predict":
+        body = {"meter_id": args.meter_id, "flow_rate": round(random.uniform(5, 50), 2)}
+        return session.request(method, url, json=body, timeout=args.timeout)
+    return session.request(method, url, timeout=args.timeout)
+
+
+def run_load(args, mix):
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        if args.token:
+            session.headers["Authorization"] = f"Bearer {args.token}"
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                ok = _request(session, args, name).status_code < 500
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    rows = []
+    for name in names + ["all"]:
+        values = np.array(sum(samples.values(), []) if name == "all" else samples[name])
+        if not len(values):
+            continue
+        rows.append({
+            "label": args.label,
+            "scenario": name,
+            "requests": len(values),
+            "errors": sum(errors.values()) if name == "all" else errors[name],
+            "req/s": round(len(values) / wall, 1),
+            "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p99_ms": round(float(np.percentile(values, 99)), 1),
+        })
+    return rows
+
+
+def compare(paths):
+    rows = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            rows.extend(json.load(f)["results"])
+    rows.sort(key=lambda r: (r["scenario"], r["label"]))
+    print_table(rows, ["scenario", "label", "requests", "errors", "req/s", "p50_ms", "p99_ms"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tải hỗn hợp đồng thời")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--meter-id", default=None, help="Meter dùng cho latest/range/predict")
+    parser.add_argument("--token", default=None, help="JWT cho các endpoint cần đăng nhập")
+    parser.add_argument("--mix", nargs="+", default=["spec=1", "latest=2", "range=1", "predict=2"],
+                        help="Tỉ trọng scenario dạng name=weight")
+    parser.add_argument("--range-hours", type=int, default=168)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="Thời gian chạy (giây)")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--json", dest="json_path", default=None)
+    parser.add_argument("--compare", nargs="+", default=None, help="In bảng so sánh các file --json")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    mix = _parse_mix(args.mix)
+    for name in list(mix):
+        path_needs_meter = "{meter_id}" in SCENARIOS[name][1] or name == "predict"
+        if (SCENARIOS[name][2] and not args.token) or (path_needs_meter and not args.meter_id):
+            print(f"Bỏ scenario {name}: thiếu --token/--meter-id")
+            del mix[name]
+    if not mix:
+        raise SystemExit("Không còn scenario nào để chạy")
+
+    print(f"{args.concurrency} client đồng thời trong {args.duration:.0f}s, mix: {mix}")
+    rows = run_load(args, mix)
+    print_table(rows, ["label", "scenario", "requests", "errors", "req/s", "p50_ms", "p99_ms"])
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"label": args.label, "concurrency": args.concurrency, "duration": args.duration,
+                       "mix": mix, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
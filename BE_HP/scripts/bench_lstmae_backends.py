@@ -0,0 +1,75 @@
+"""
+So sánh latency / throughput của LSTMAE theo backend (eager, eager int8, TorchScript, ONNX Runtime).
+
+    python -m scripts.export_lstmae          # cần export artifact trước
+    python -m scripts.bench_lstmae_backends --batch-sizes 1 64 1024 --json out.json
+"""
+import os
+import json
+import argparse
+import torch
+
+from app.config import MLConfig
+from app.ml.registry import get_lstmae_model
+from app.ml.lstm_autoencoder.backends import EagerBackend, TorchScriptBackend, OnnxBackend, artifact_path
+from scripts.bench_utils import synthetic_windows, time_call, print_table
+
+
+def build_backends(model_path, names):
+    backends = {}
+    if "eager" in names:
+        backends["eager"] = EagerBackend(get_lstmae_model(model_path, MLConfig.LSTM_AE_CONFIG, quantize=False))
+    if "int8" in names:
+        backends["int8"] = EagerBackend(get_lstmae_model(model_path, MLConfig.LSTM_AE_CONFIG, quantize=True))
+    for name, cls in (("torchscript", TorchScriptBackend), ("onnx", OnnxBackend)):
+        if name not in names:
+            continue
+        path = artifact_path(model_path, name)
+        if not os.path.exists(path):
+            print(f"Bỏ qua {name}: chưa có {path} (chạy python -m scripts.export_lstmae)")
+            continue
+        try:
+            backends[name] = cls(path)
+        except ImportError as e:
+            print(f"Bỏ qua {name}: {e}")
+    return backends
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend inference LSTMAE")
+    parser.add_argument("--model-path", default=MLConfig.LSTM_AE_MODEL_PATH)
+    parser.add_argument("--backends", nargs="+", default=["eager", "int8", "torchscript", "onnx"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 64, 1024])
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads cho eager/TorchScript")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    seq_len = MLConfig.LSTM_AE_CONFIG["seq_len"]
+    backends = build_backends(args.model_path, args.backends)
+
+    rows = []
+    for batch_size in args.batch_sizes:
+        batch = synthetic_windows(batch_size, seq_len=seq_len, seed=batch_size)
+        for name, backend in backends.items():
+            stats = time_call(lambda: backend(batch), args.repeats)
+            rows.append({
+                "backend": name,
+                "batch": batch_size,
+                "p50_ms": round(stats["p50_ms"], 3),
+                "p95_ms": round(stats["p95_ms"], 3),
+                "windows_per_s": round(batch_size / (stats["mean_ms"] / 1000), 1),
+            })
+
+    print_table(rows, ["backend", "batch", "p50_ms", "p95_ms", "windows_per_s"])
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"torch_threads": torch.get_num_threads(), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+So sánh layout documents và buckets: dung lượng lưu trữ / index và latency đọc theo khoảng thời gian.
+
+Cần có dữ liệu ở cả hai layout (python -m scripts.migrate_measurement_store --to buckets).
+
+    python -m scripts.bench_measurement_store --meters 20 --ranges 4 24 168 720
+"""
+import json
+import random
+import argparse
+from datetime import timedelta
+
+from app.extensions import get_db
+from app.utils.measurement_store import STORES
+from scripts._app import app_context
+from scripts.bench_utils import time_call, print_table
+
+
+def _storage_row(store):
+    stats = get_db().command("collStats", store.collection)
+    return {
+        "store": store.name,
+        "collection": store.collection,
+        "documents": stats.get("count", 0),
+        "data_mb": round(stats.get("size", 0) / 2**20, 2),
+        "storage_mb": round(stats.get("storageSize", 0) / 2**20, 2),
+        "index_mb": round(stats.get("totalIndexSize", 0) / 2**20, 2),
+        "avg_doc_bytes": int(stats.get("avgObjSize", 0)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark layout lưu meter measurements")
+    parser.add_argument("--meters", type=int, default=20, help="Số meter lấy mẫu cho range query")
+    parser.add_argument("--ranges", nargs="+", type=int, default=[4, 24, 168, 720], help="Độ dài khoảng (giờ)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    stores = [cls() for cls in STORES.values()]
+    storage_rows = []
+    latency_rows = []
+
+    with app_context():
+        db = get_db()
+        for store in stores:
+            storage_rows.append(_storage_row(store))
+
+        reference = STORES["documents"]()
+        meter_ids = db[reference.collection].distinct("meter_id")
+        random.Random(args.seed).shuffle(meter_ids)
+        sample = []
+        for meter_id in meter_ids[:args.meters]:
+            latest = reference.latest(meter_id)
+            if latest:
+                sample.append((meter_id, latest["measurement_time"]))
+
+        if not sample:
+            print("Không có measurement để benchmark range query")
+        for hours in (args.ranges if sample else []):
+            for store in stores:
+                rows_read = []
+
+                def run():
+                    for meter_id, end in sample:
+                        rows_read.append(len(store.find([meter_id], end - timedelta(hours=hours), end)))
+
+                stats = time_call(run, args.repeats, warmup=1)
+                latency_rows.append({
+                    "store": store.name,
+                    "range_h": hours,
+                    "rows/meter": round(sum(rows_read) / len(rows_read), 1),
+                    "p50_ms/meter": round(stats["p50_ms"] / len(sample), 3),
+                    "p95_ms/meter": round(stats["p95_ms"] / len(sample), 3),
+                })
+
+    print_table(storage_rows, ["store", "collection", "documents", "data_mb", "storage_mb", "index_mb", "avg_doc_bytes"])
+    print()
+    print_table(latency_rows, ["store", "range_h", "rows/meter", "p50_ms/meter", "p95_ms/meter"])
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"storage": storage_rows, "range_queries": latency_rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Benchmark preprocessing, scoring và pipeline ML trên dữ liệu measurement giả lập
+(số meter, số ngày và chu kỳ đo cấu hình được): latency, throughput và peak memory.
+
+    python -m scripts.bench_ml --days 41 --json baseline.json
+    python -m scripts.bench_ml --days 41 --baseline baseline.json --fail-on-regression
+    python -m scripts.bench_ml --only preprocess_lstmae calculate_mnf
+
+Pipeline LSTM-AE end-to-end (LSTMAEPredictor.predict) cần MongoDB: mongomock trong bộ nhớ
+hoặc một database riêng trên MongoDB local (bị xoá và seed lại mỗi lần chạy):
+
+    python -m scripts.bench_ml --only e2e_lstmae --mongo memory --meters 50
+    python -m scripts.bench_ml --only e2e_lstmae --mongo local --db bench_ml --meters 200
+"""
+import sys
+import json
+import platform
+import argparse
+import tracemalloc
+
+import numpy as np
+
+from app.config import Config, MLConfig
+from app.jobs.pipeline_runs import max_rss_mb
+from scripts._app import app_context
+from scripts.bench_utils import memory_mongo_client, synthetic_measurements, time_call, print_table
+
+BENCHMARKS = (
+    "preprocess_lstm",
+    "preprocess_lstmae",
+    "calculate_mnf",
+    "mae_threshold",
+    "predict_lstmae",
+    "predict_lstmae_batch",
+    "fine_tune_lstm",
+    "e2e_lstmae",
+)
+COLUMNS = ["benchmark", "items", "p50_ms", "p95_ms", "items_per_s", "peak_mb"]
+
+
+def _peak_mb(fn):
+    """Peak bộ nhớ Python/NumPy cấp phát trong một lần gọi (tracemalloc; không tính tensor torch/TF)"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def _lstmae_model():
+    import os
+    import torch
+    from app.ml.registry import get_lstmae_model
+    from app.ml.lstm_autoencoder.lstm_autoencoder import LSTMAE
+
+    if os.path.exists(MLConfig.LSTM_AE_MODEL_PATH):
+        return get_lstmae_model(MLConfig.LSTM_AE_MODEL_PATH, MLConfig.LSTM_AE_CONFIG, quantize=False)
+    # Không có weights: latency không phụ thuộc giá trị weights
+    print(f"Không có {MLConfig.LSTM_AE_MODEL_PATH}, dùng LSTMAE khởi tạo ngẫu nhiên")
+    torch.manual_seed(0)
+    return LSTMAE(**MLConfig.LSTM_AE_CONFIG).eval()
+
+
+class MeterFixture:
+    """Dữ liệu một meter (cửa sổ lịch sử) và các đầu vào dựng sẵn cho từng benchmark"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rows = synthetic_measurements(
+            ["bench-meter"], args.days, cadence_minutes=args.cadence, seed=args.seed
+        )
+        self._model = None
+        self._lstmae_inputs = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = _lstmae_model()
+        return self._model
+
+    def lstmae_inputs(self):
+        if self._lstmae_inputs is None:
+            from app.utils.ml_utils import preprocess_data_with_dates_json
+
+            seqs, _, scaler = preprocess_data_with_dates_json(
+                self.rows, seq_len=MLConfig.LSTM_AE_CONFIG["seq_len"], fit_scaler=True
+            )
+            self._lstmae_inputs = (seqs.astype(np.float32), scaler)
+        return self._lstmae_inputs
+
+
+def bench_preprocess_lstm(fx):
+    from sklearn.preprocessing import MinMaxScaler
+    from app.utils.ml_utils import preprocess_data_lstm
+
+    return (lambda: preprocess_data_lstm(fx.rows, MinMaxScaler(), fit_scaler=True)), len(fx.rows)
+
+
+def bench_preprocess_lstmae(fx):
+    from app.utils.ml_utils import preprocess_data_with_dates_json
+
+    _, scaler = fx.lstmae_inputs()
+    seq_len = MLConfig.LSTM_AE_CONFIG["seq_len"]
+    return (lambda: preprocess_data_with_dates_json(fx.rows, scaler=scaler, seq_len=seq_len, fit_scaler=False)), len(fx.rows)
+
+
+def bench_calculate_mnf(fx):
+    import pandas as pd
+    from app.utils.ml_utils import calculate_mnf
+
+    df = pd.DataFrame(fx.rows)
+    return (lambda: calculate_mnf(df, timestamp_col="measurement_time")), len(fx.rows)
+
+
+def bench_mae_threshold(fx):
+    from app.utils.ml_utils import get_mae_threshold
+
+    seqs, scaler = fx.lstmae_inputs()
+    model = fx.model
+    return (lambda: get_mae_threshold(model, scaler, seqs)), len(seqs)
+
+
+def _classify_args(fx):
+    seqs, scaler = fx.lstmae_inputs()
+    return dict(model=fx.model, mnf=10.0, mnf_threshold=12.0, scaler=scaler), seqs
+
+
+def bench_predict_lstmae(fx):
+    from app.utils.ml_utils import predict_lstmae
+
+    kwargs, seqs = _classify_args(fx)
+    # Một window mỗi lần gọi như luồng cũ trước khi có predict_lstmae_batch
+    windows = seqs[:fx.args.single_windows]
+
+    def run():
+        for smp in windows:
+            predict_lstmae(smp=smp, **kwargs)
+
+    return run, len(windows)
+
+
+def bench_predict_lstmae_batch(fx):
+    from app.utils.ml_utils import predict_lstmae_batch
+
+    kwargs, seqs = _classify_args(fx)
+    return (lambda: predict_lstmae_batch(sequences=seqs, **kwargs)), len(seqs)
+
+
+def bench_fine_tune_lstm(fx):
+    import os
+    from sklearn.preprocessing import MinMaxScaler
+    from app.ml.lstm.predict import LSTM_Predictor
+
+    if not os.path.exists(MLConfig.LSTM_MODEL_PATH):
+        print(f"Bỏ qua fine_tune_lstm: không có {MLConfig.LSTM_MODEL_PATH}")
+        return None
+    predictor = LSTM_Predictor(
+        historical_context=MLConfig.LSTM_WINDOW_CONTEXT,
+        model_path=MLConfig.LSTM_MODEL_PATH,
+        debug=False,
+    )
+    return (lambda: predictor.fine_tune_model(fx.rows, MinMaxScaler())), len(fx.rows)
+
+
+BENCH_FUNCS = {
+    "preprocess_lstm": bench_preprocess_lstm,
+    "preprocess_lstmae": bench_preprocess_lstmae,
+    "calculate_mnf": bench_calculate_mnf,
+    "mae_threshold": bench_mae_threshold,
+    "predict_lstmae": bench_predict_lstmae,
+    "predict_lstmae_batch": bench_predict_lstmae_batch,
+    "fine_tune_lstm": bench_fine_tune_lstm,
+}
+
+
+def run_micro(args, names):
+    fx = MeterFixture(args)
+    print(f"1 meter, {args.days} ngày, {args.cadence} phút/điểm: {len(fx.rows)} reading")
+
+    rows = []
+    for name in names:
+        built = BENCH_FUNCS[name](fx)
+        if built is None:
+            continue
+        fn, items = built
+        repeats = args.fine_tune_repeats if name == "fine_tune_lstm" else args.repeats
+        stats = time_call(fn, repeats, warmup=1 if name == "fine_tune_lstm" else args.warmup)
+        rows.append({
+            "benchmark": name,
+            "items": items,
+            "p50_ms": round(stats["p50_ms"], 3),
+            "p95_ms": round(stats["p95_ms"], 3),
+            "items_per_s": round(items / (stats["mean_ms"] / 1000), 1) if stats["mean_ms"] else None,
+            "peak_mb": round(_peak_mb(fn), 2),
+        })
+        print(f"  {name}: p50 {stats['p50_ms']:.2f} ms")
+    return rows
+
+
+def _seed_pipeline_db(args, db):
+    from app.extensions import init_indexes
+    from app.utils.measurement_store import get_measurement_store
+
+    if args.mongo == "local":
+        init_indexes(db)
+    meter_ids = db.meters.insert_many([
+        {"meter_name": f"BENCH {i:04d}"} for i in range(args.meters)
+    ]).inserted_ids
+    rows = synthetic_measurements(meter_ids, args.days, cadence_minutes=args.cadence, seed=args.seed)
+    store = get_measurement_store(cached=False)
+    for i in range(0, len(rows), 50_000):
+        store.insert(rows[i:i + 50_000])
+    return len(rows)
+
+
+def run_e2e(args):
+    """Một lượt LSTMAEPredictor.predict trên fleet giả lập (không lặp: lượt sau đọc ngưỡng đã lưu)"""
+    import time
+    from flask import g
+    from app.extensions import get_mongo_client, get_db
+    from app.ml.lstm_autoencoder.predict import get_predictor
+
+    if args.mongo == "local" and args.db == Config.MONGO_DB:
+        raise SystemExit(f"--db không được trùng database của app ({Config.MONGO_DB}): database sẽ bị xoá")
+
+    with app_context(mongo_db=args.db):
+        if args.mongo == "memory":
+            g.mongo_client = memory_mongo_client()
+        else:
+            get_mongo_client().drop_database(args.db)
+
+        started = time.perf_counter()
+        readings = _seed_pipeline_db(args, get_db())
+        print(f"Seed {args.meters} meter / {readings} reading ({args.mongo}): {time.perf_counter() - started:.1f}s")
+
+        rss_before = max_rss_mb()
+        started = time.perf_counter()
+        result = get_predictor().predict()
+        elapsed = time.perf_counter() - started
+
+    if not result:
+        print("LSTMAEPredictor.predict không trả về kết quả")
+        return []
+    return [{
+        "benchmark": "e2e_lstmae",
+        "items": readings,
+        "p50_ms": round(elapsed * 1000, 1),
+        "p95_ms": round(elapsed * 1000, 1),
+        "items_per_s": round(readings / elapsed, 1),
+        # tracemalloc làm chậm cả pipeline nên ở đây đo mức tăng max RSS của process
+        "peak_mb": round(max(max_rss_mb() - rss_before, 0), 1),
+        "meters": result.get("meters_processed", 0),
+        "predictions": result.get("predictions_count", 0),
+    }]
+
+
+def compare(rows, baseline_path, tolerance):
+    """So p50 và peak memory với baseline; trả về danh sách benchmark bị chậm hơn ngưỡng"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["benchmark"]: r for r in json.load(f)["results"]}
+
+    table, regressed = [], []
+    for row in rows:
+        base = baseline.get(row["benchmark"])
+        if base is None or not base.get("p50_ms"):
+            continue
+        ratio = row["p50_ms"] / base["p50_ms"]
+        status = "ok"
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressed.append(row["benchmark"])
+        elif ratio < 1 - tolerance:
+            status = "faster"
+        table.append({
+            "benchmark": row["benchmark"],
+            "base_p50_ms": base["p50_ms"],
+            "p50_ms": row["p50_ms"],
+            "ratio": round(ratio, 3),
+            "base_peak_mb": base.get("peak_mb"),
+            "peak_mb": row.get("peak_mb"),
+            "status": status,
+        })
+
+    print()
+    print(f"So với baseline {baseline_path} (ngưỡng ±{tolerance:.0%}):")
+    print_table(table, ["benchmark", "base_p50_ms", "p50_ms", "ratio", "base_peak_mb", "peak_mb", "status"])
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing / scoring / pipeline ML")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=None,
+                        help="Chỉ chạy các benchmark này (mặc định: tất cả, e2e khi có --mongo)")
+    parser.add_argument("--meters", type=int, default=20, help="Số meter giả lập cho e2e")
+    parser.add_argument("--days", type=int, default=MLConfig.HISTORICAL_DATA_DAYS + 1)
+    parser.add_argument("--cadence", type=int, default=10, help="Chu kỳ đo (phút)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--fine-tune-repeats", type=int, default=3)
+    parser.add_argument("--single-windows", type=int, default=144, help="Số window cho predict_lstmae từng window")
+    parser.add_argument("--mongo", choices=["none", "memory", "local"], default="none")
+    parser.add_argument("--db", default="bench_ml", help="Database dùng cho e2e (bị xoá trước khi seed)")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--json", dest="json_path", default=None)
+    parser.add_argument("--baseline", default=None, help="File --json của lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Chậm hơn baseline quá tỉ lệ này là regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    names = list(args.only or BENCHMARKS)
+    if "e2e_lstmae" in names and args.mongo == "none":
+        if args.only:
+            raise SystemExit("e2e_lstmae cần --mongo memory hoặc --mongo local")
+        names.remove("e2e_lstmae")
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    micro = [n for n in names if n != "e2e_lstmae"]
+    rows = run_micro(args, micro) if micro else []
+    if "e2e_lstmae" in names:
+        rows += run_e2e(args)
+
+    print()
+    print_table(rows, COLUMNS)
+    print(f"max RSS: {max_rss_mb():.0f} MB")
+
+    if args.json_path:
+        torch = sys.modules.get("torch")
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": {k: getattr(args, k) for k in ("meters", "days", "cadence", "seed", "repeats", "mongo")},
+                "environment": {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "numpy": np.__version__,
+                    "torch_threads": torch.get_num_threads() if torch else None,
+                    "measurement_store": MLConfig.MEASUREMENT_STORE,
+                },
+                "max_rss_mb": round(max_rss_mb(), 1),
+                "results": rows,
+            }, f, indent=2)
+
+    if args.baseline:
+        regressed = compare(rows, args.baseline, args.tolerance)
+        if regressed and args.fail_on_regression:
+            raise SystemExit(f"Regression: {', '.join(regressed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+def memory_mongo_client():
+    """MongoClient trong bộ nhớ (mongomock) để chạy benchmark không cần MongoDB; gán vào g.mongo_client"""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("Cần cài mongomock cho --mongo memory (pip install mongomock)")
+    return mongomock.MongoClient(tz_aware=False)
+
+
+def synthetic_measurements(meter_ids, days, end=None, cadence_minutes=10, leak_ratio=0.2, seed=0):
+    """
+    Reading lưu lượng/áp lực giả lập cho meter_measurements (scripts.synthetic): dạng ngày/đêm
+    theo từng meter, nhiễu, một phần meter có rò rỉ trong nửa sau cửa sổ.
+
+    Returns:
+        list[dict]: {meter_id, measurement_time, instant_flow, instant_pressure}, theo meter rồi thời gian
+    """
+    from scripts.synthetic import meter_readings, measurement_docs
+
+    rng = np.random.default_rng(seed)
+    # Mặc định tới hiện tại (UTC naive như MongoDB trả về) để khớp cửa sổ thời gian của predictor
+    end = (end or datetime.now(timezone.utc).replace(tzinfo=None)).replace(second=0, microsecond=0)
+    end -= timedelta(minutes=end.minute % cadence_minutes)
+    steps = int(days * 24 * 60 / cadence_minutes)
+    start = end - timedelta(minutes=cadence_minutes * (steps - 1))
+
+    rows = []
+    for meter_id in meter_ids:
+        times, flow, pressure, _ = meter_readings(rng, start, steps, cadence_minutes, leak_ratio=leak_ratio)
+        rows.extend(measurement_docs(meter_id, times, flow, pressure))
+    return rows
+
+
+def synthetic_windows(n, seq_len=6, seed=0):
+    """Window lưu lượng đã chuẩn hoá [0, 1] có dạng ngày/đêm + nhiễu, shape (n, seq_len, 1)"""
+    rng = np.random.default_rng(seed)
+    start_hour = rng.uniform(0, 24, size=(n, 1))
+    steps = np.arange(seq_len)[np.newaxis, :] / 6.0  # 10 phút/điểm
+    hours = (start_hour + steps) % 24
+    base = 0.45 + 0.3 * np.sin((hours - 6) / 24 * 2 * np.pi)
+    noise = rng.normal(0, 0.03, size=(n, seq_len))
+    return np.clip(base + noise, 0, 1).astype(np.float32)[:, :, np.newaxis]
+
+
+def time_call(fn, repeats, warmup=3):
+    """Chạy fn() nhiều lần, trả về thống kê latency (ms)"""
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples = np.array(samples)
+    return {
+        "repeats": repeats,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": float(samples.mean()),
+    }
+
+
+def print_table(rows, columns):
+    widths = [max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
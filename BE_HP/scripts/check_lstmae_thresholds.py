@@ -0,0 +1,86 @@
+"""
+So sánh ngưỡng LSTM-AE tăng dần (lstmae_thresholds) với cách tính lại toàn bộ cửa sổ.
+
+Sai lệch được tài liệu hoá (LSTMAE_THRESHOLD_TOL, mặc định 5% tương đối):
+- Quantile summary là chính xác khi một meter có <= LSTMAE_SKETCH_MAX_SIZE window trong
+  cửa sổ (thực tế ~24 window/ngày), nên percentile và MNF khớp tuyệt đối trên cùng dữ liệu.
+- Nguồn sai lệch còn lại là scaler toàn cục: error của mỗi ngày được tính với scaler của
+  đêm đó, còn cách tính lại dùng scaler hiện tại. Sai lệch tăng khi min/max toàn cục đổi nhiều.
+
+    python -m scripts.check_lstmae_thresholds --max-meters 50
+"""
+import sys
+import argparse
+import numpy as np
+
+from app.config import MLConfig
+from app.extensions import get_db
+from app.ml.eligibility import iter_eligible_meter_shards, eligible_meter_ids
+from app.ml.lstm_autoencoder.predict import LSTMAEPredictor
+from app.ml.lstm_autoencoder.online import THRESHOLD_COLLECTION
+from scripts._app import app_context
+from scripts.bench_utils import print_table
+
+
+def _rel(a, b):
+    a, b = float(a), float(b)
+    if np.isnan(a) and np.isnan(b):
+        return 0.0
+    return abs(a - b) / max(abs(b), 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra ngưỡng LSTM-AE tăng dần so với tính lại toàn bộ")
+    parser.add_argument("--max-meters", type=int, default=50)
+    parser.add_argument("--tolerance", type=float, default=MLConfig.LSTMAE_THRESHOLD_TOL)
+    args = parser.parse_args()
+
+    predictor = LSTMAEPredictor(
+        historical_context=MLConfig.HISTORICAL_DATA_DAYS,
+        config=MLConfig.LSTM_AE_CONFIG,
+        model_path=MLConfig.LSTM_AE_MODEL_PATH,
+    )
+
+    rows = []
+    with app_context():
+        if not predictor.load_model():
+            sys.exit(2)
+        start_time, end_time = predictor.get_time_range()
+        if not predictor.fit_global_scaler_from_db(eligible_meter_ids('lstm_autoencoder'), start_time, end_time):
+            print("Không có meter đủ điều kiện")
+            sys.exit(2)
+
+        stored = get_db()[THRESHOLD_COLLECTION]
+        for meters in iter_eligible_meter_shards('lstm_autoencoder'):
+            exact = predictor.calculate_threshold(
+                predictor.fetch_meter_data(start_time, end_time, meters), single_meter=False
+            )
+            for m in meters:
+                doc = stored.find_one({"meter_id": m['meter_id']})
+                if doc is None or m['meter_name'] not in exact:
+                    continue
+                ref = exact[m['meter_name']]
+                ref_mnf = ref['mnf'] if not isinstance(ref['mnf'], dict) else np.nan
+                rows.append({
+                    "meter": m['meter_name'],
+                    "low_rel": round(_rel(doc['mae_low_threshold'], ref['mae_thresholds']['mae_low_threshold']), 5),
+                    "high_rel": round(_rel(doc['mae_high_threshold'], ref['mae_thresholds']['mae_high_threshold']), 5),
+                    "mnf_rel": round(_rel(doc['mnf'], ref_mnf), 5),
+                })
+                if len(rows) >= args.max_meters:
+                    break
+            if len(rows) >= args.max_meters:
+                break
+
+    if not rows:
+        print("Chưa có ngưỡng tăng dần nào để so sánh")
+        sys.exit(2)
+
+    print_table(rows, ["meter", "low_rel", "high_rel", "mnf_rel"])
+    worst = max(max(r["low_rel"], r["high_rel"], r["mnf_rel"]) for r in rows)
+    print(f"Sai lệch tương đối lớn nhất: {worst:.4%} (tol {args.tolerance:.2%})")
+    sys.exit(0 if worst <= args.tolerance else 1)
+
+
+if __name__ == "__main__":
+    main()
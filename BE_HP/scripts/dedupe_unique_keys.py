@@ -0,0 +1,74 @@
+"""
+Xoá document trùng khoá upsert rồi tạo unique index tương ứng (init_indexes dừng khởi động khi
+còn dữ liệu trùng). Mỗi khoá giữ document mới nhất (_id lớn nhất).
+
+    python -m scripts.dedupe_unique_keys --dry-run     # chỉ đếm
+    python -m scripts.dedupe_unique_keys
+    python -m scripts.dedupe_unique_keys --only predictions
+"""
+import sys
+import time
+import argparse
+
+from pymongo import ASCENDING
+
+from app.extensions import get_db
+from scripts._app import app_context
+
+# (collection, khoá, tên unique index) — giống init_indexes
+UNIQUE_KEYS = [
+    ("meter_manual_thresholds", [("meter_id", ASCENDING), ("set_time", ASCENDING)], "uniq_thresh_meter_day"),
+    ("predictions", [("meter_id", ASCENDING), ("model_id", ASCENDING), ("prediction_time", ASCENDING)],
+     "uniq_pred_meter_model_time"),
+]
+DELETE_BATCH = 10_000
+
+
+def find_stale(coll, keys):
+    """(số khoá bị trùng, _id các document cũ hơn cần xoá)"""
+    duplicates = coll.aggregate([
+        {"$sort": {"_id": -1}},
+        {"$group": {"_id": {field: f"${field}" for field, _ in keys}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    groups, stale = 0, []
+    for doc in duplicates:
+        groups += 1
+        stale.extend(doc["ids"][1:])
+    return groups, stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Xoá document trùng khoá upsert và tạo unique index")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm, không xoá và không tạo index")
+    parser.add_argument("--only", action="append", default=None, help="Chỉ xử lý collection này (lặp lại được)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    found = 0
+    with app_context():
+        db = get_db()
+        for collection, keys, name in UNIQUE_KEYS:
+            if args.only and collection not in args.only:
+                continue
+            coll = db[collection]
+            groups, stale = find_stale(coll, keys)
+            found += len(stale)
+            print(f"{collection}: {groups} khoá trùng, {len(stale)} document cũ / {coll.estimated_document_count()}")
+            if args.dry_run:
+                continue
+
+            deleted = 0
+            for i in range(0, len(stale), DELETE_BATCH):
+                deleted += coll.delete_many({"_id": {"$in": stale[i:i + DELETE_BATCH]}}).deleted_count
+            coll.create_index(keys, unique=True, name=name)
+            print(f"  đã xoá {deleted} document, đã tạo {name}")
+
+    print(f"Xong trong {time.perf_counter() - started:.1f}s")
+    if args.dry_run and found:
+        # Exit khác 0 để dùng được trong kiểm tra trước deploy
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
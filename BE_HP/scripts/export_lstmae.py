@@ -0,0 +1,71 @@
+"""
+Export LSTMAE sang TorchScript / ONNX, đặt cạnh lstm_ae.pth.
+
+Artifact chỉ được ghi đè khi parity check với eager đạt tolerance, tránh để
+model registry hot-reload một bản export sai.
+
+    python -m scripts.export_lstmae
+    python -m scripts.export_lstmae --formats onnx --tolerance 1e-5
+"""
+import os
+import sys
+import argparse
+
+from app.config import MLConfig
+from app.ml.registry import get_lstmae_model
+from app.ml.lstm_autoencoder.backends import (
+    EXPORTERS, EagerBackend, TorchScriptBackend, OnnxBackend, artifact_path, check_parity,
+)
+from scripts.bench_utils import synthetic_windows
+
+LOADERS = {
+    "torchscript": TorchScriptBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export LSTMAE sang TorchScript/ONNX kèm parity check")
+    parser.add_argument("--model-path", default=MLConfig.LSTM_AE_MODEL_PATH)
+    parser.add_argument("--formats", nargs="+", choices=sorted(EXPORTERS), default=sorted(EXPORTERS))
+    parser.add_argument("--tolerance", type=float, default=MLConfig.LSTM_AE_PARITY_TOL)
+    parser.add_argument("--windows", type=int, default=4096, help="Số window dùng cho parity check")
+    args = parser.parse_args()
+
+    # Export luôn từ bản fp32, kể cả khi LSTMAE_QUANTIZE bật
+    model = get_lstmae_model(args.model_path, MLConfig.LSTM_AE_CONFIG, quantize=False)
+    reference = EagerBackend(model)
+    sequences = synthetic_windows(args.windows, seq_len=MLConfig.LSTM_AE_CONFIG["seq_len"])
+
+    failed = False
+    for fmt in args.formats:
+        final_path = artifact_path(args.model_path, fmt)
+        tmp_path = final_path + ".tmp"
+        try:
+            EXPORTERS[fmt](model, tmp_path)
+            parity = check_parity(reference, LOADERS[fmt](tmp_path), sequences, args.tolerance)
+        except Exception as e:
+            print(f"[{fmt}] export thất bại: {e}")
+            failed = True
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+
+        status = "OK" if parity["passed"] else "FAIL"
+        print(
+            f"[{fmt}] parity {status}: max |Δerr| = {parity['max_abs_diff']:.2e}, "
+            f"mean = {parity['mean_abs_diff']:.2e} trên {parity['windows']} window (tol {parity['tolerance']:.0e})"
+        )
+
+        if parity["passed"]:
+            os.replace(tmp_path, final_path)
+            print(f"[{fmt}] đã ghi {final_path}")
+        else:
+            os.remove(tmp_path)
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
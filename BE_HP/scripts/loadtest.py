@@ -0,0 +1,432 @@
+"""
+Load test API trên một fleet giả lập lớn để capacity planning.
+
+1. Seed dataset vào một database riêng (bị xoá và tạo lại; chỉ ghi vào database do loadtest tạo):
+
+    python -m scripts.loadtest seed --db Nuoc_HP_loadtest --branches 20 --meters 2000 --days 90
+
+2. Chạy server trên database đó, tắt rate limit để đo chính API chứ không đo limiter:
+
+    MONGO_DB=Nuoc_HP_loadtest RATELIMIT_ENABLED=false APP_ROLE=web python run.py
+
+3. Bắn tải hỗn hợp và in p50/p95/p99, tỉ lệ lỗi theo route:
+
+    python -m scripts.loadtest run --db Nuoc_HP_loadtest --concurrency 100 --duration 120 --json after.json
+    python -m scripts.loadtest compare before.json after.json
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.config import MLConfig
+from scripts._app import app_context
+from scripts.bench_utils import synthetic_measurements, print_table
+
+META_COLLECTION = "loadtest_meta"
+PASSWORD = "Loadtest@123"
+
+# name: (method, path, vai trò gọi route, tỉ trọng mặc định)
+ROUTES = {
+    "login": ("POST", "/api/v1/auth/role-based-login", None, 1),
+    "get_all_meters": ("GET", "/api/v1/meters/get_all_meters?page={page}&page_size=20", "company_manager", 3),
+    "get_my_meters": ("GET", "/api/v1/meters/get_my_meters", "branch_manager", 4),
+    "get_all_with_status": ("GET", "/api/v1/meters/get_all_with_status", "company_manager", 2),
+    "measurements_range": ("GET", "/api/v1/measurements/{meter_id}/range?hours={hours}", "branch_manager", 6),
+    "get_all_repairs": ("GET", "/api/v1/repairs/get_all_repairs?page={page}&page_size=20", "company_manager", 1),
+    "viewport": ("GET", "/api/v1/meters/viewport?bbox={bbox}&zoom={zoom}", "company_manager", 2),
+}
+RANGE_HOURS = (4, 24, 168)
+# Khung nhìn bản đồ quanh vùng seed: (zoom, nửa bề rộng độ kinh, nửa chiều cao độ vĩ)
+VIEWPORTS = ((11, 0.2, 0.12), (13, 0.05, 0.03), (15, 0.012, 0.008))
+REPORT_COLUMNS = ["label", "route", "requests", "errors", "error_%", "429", "req/s", "p50_ms", "p95_ms", "p99_ms"]
+
+
+# ======================
+# Seed
+# ======================
+def _check_target(db):
+    """Chỉ xoá database rỗng hoặc database do loadtest seed trước đó"""
+    names = db.list_collection_names()
+    if names and META_COLLECTION not in names:
+        raise SystemExit(f"Database {db.name} đã có dữ liệu không do loadtest tạo, chọn --db khác")
+
+
+def _seed_org(db, args, rng):
+    db.roles.insert_many([{"role_name": name} for name in ("admin", "company_manager", "branch_manager")])
+    roles = {r["role_name"]: r["_id"] for r in db.roles.find()}
+    company_id = db.companies.insert_one({"name": "Loadtest Company", "address": "Hải Phòng"}).inserted_id
+
+    branch_ids = db.branches.insert_many([
+        {"name": f"Chi nhánh {i:03d}", "address": f"Địa chỉ {i:03d}", "company_id": company_id}
+        for i in range(args.branches)
+    ]).inserted_ids
+
+    meters = []
+    for i in range(args.meters):
+        # Quanh Hải Phòng
+        lng, lat = round(106.6 + rng.uniform(-0.15, 0.15), 6), round(20.85 + rng.uniform(-0.1, 0.1), 6)
+        meters.append({
+            "branch_id": branch_ids[i % len(branch_ids)],
+            "meter_name": f"LT {i:05d}",
+            "installation_time": None,
+            "longitude": lng,
+            "latitude": lat,
+            "location": {"type": "Point", "coordinates": [lng, lat]},
+        })
+    meter_ids = db.meters.insert_many(meters).inserted_ids
+
+    from app.utils.security import hash_password
+    # bcrypt chậm có chủ đích: băm một lần cho mọi user loadtest
+    hashed = hash_password(PASSWORD)
+    users = [
+        {"username": "lt_admin", "role_id": roles["admin"], "branch_id": None},
+        {"username": "lt_company", "role_id": roles["company_manager"], "branch_id": None},
+    ] + [
+        {"username": f"lt_branch_{i:03d}", "role_id": roles["branch_manager"], "branch_id": branch_id}
+        for i, branch_id in enumerate(branch_ids)
+    ]
+    for user in users:
+        user.update(password=hashed, is_active=True, last_login=None)
+    user_ids = db.users.insert_many(users).inserted_ids
+
+    links = [{"user_id": user_ids[1], "meter_id": meter_id} for meter_id in meter_ids]
+    for user_id, branch_id in zip(user_ids[2:], branch_ids):
+        links += [{"user_id": user_id, "meter_id": m["_id"]}
+                  for m in meters if m["branch_id"] == branch_id]
+    for i in range(0, len(links), 10_000):
+        db.user_meter.insert_many(links[i:i + 10_000])
+    return meter_ids
+
+
+def _seed_measurements(args, meter_ids):
+    from app.utils.measurement_store import get_measurement_store
+
+    store = get_measurement_store(cached=False)
+    total = 0
+    started = time.perf_counter()
+    # Theo nhóm meter để giới hạn bộ nhớ (mỗi meter ~144 reading/ngày)
+    for i in range(0, len(meter_ids), args.meter_batch):
+        rows = synthetic_measurements(meter_ids[i:i + args.meter_batch], args.days,
+                                      cadence_minutes=args.cadence, seed=args.seed + i)
+        total += store.insert(rows)
+        print(f"  measurements: {min(i + args.meter_batch, len(meter_ids))}/{len(meter_ids)} meter, "
+              f"{total} reading ({time.perf_counter() - started:.0f}s)")
+    return total
+
+
+def _seed_predictions(db, args, meter_ids, rng, today):
+    """LSTM-AE theo giờ trong --prediction-days ngày gần nhất, LSTM mỗi ngày trong toàn bộ cửa sổ"""
+    model_ids = {
+        name: db.ai_models.insert_one({"name": name}).inserted_id
+        for name in ("lstm_autoencoder", "lstm")
+    }
+    confidences = ["NNthap", "NNTB", "NNcao"]
+    total = 0
+    for meter_id in meter_ids:
+        docs = []
+        leaky = rng.random() < 0.1
+        for day in range(args.days):
+            day_start = today - timedelta(days=day)
+            label = "leak" if leaky and rng.random() < 0.5 else "normal"
+            docs.append({
+                "meter_id": meter_id, "model_id": model_ids["lstm"], "prediction_time": day_start,
+                "predicted_label": label,
+                "confidence": rng.choice(confidences[1:]) if label == "leak" else "NNthap",
+                "recorded_instant_flow": round(rng.uniform(5, 50), 3),
+            })
+            if day < args.prediction_days:
+                for hour in range(24):
+                    label = "leak" if leaky and rng.random() < 0.3 else "normal"
+                    docs.append({
+                        "meter_id": meter_id, "model_id": model_ids["lstm_autoencoder"],
+                        "prediction_time": day_start + timedelta(hours=hour),
+                        "predicted_label": label,
+                        "confidence": rng.choice(confidences) if label == "leak" else "none",
+                        "recorded_instant_flow": round(rng.uniform(5, 50), 3),
+                    })
+        db.predictions.insert_many(docs, ordered=False)
+        total += len(docs)
+    return total
+
+
+def _seed_repairs_and_thresholds(db, args, meter_ids, rng, today):
+    reasons = ["Vỡ ống", "Rò rỉ mối nối", "Hỏng van", "Nứt ống do lún"]
+    repairs = []
+    for meter_id in meter_ids:
+        for _ in range(rng.randint(0, args.max_repairs_per_meter)):
+            repair_time = today - timedelta(days=rng.randint(0, args.days), hours=rng.randint(0, 23))
+            repairs.append({
+                "meter_id": meter_id,
+                "recorded_time": repair_time - timedelta(hours=rng.randint(1, 48)),
+                "repair_time": repair_time,
+                "leak_reason": rng.choice(reasons),
+                "replacement_type": rng.choice(["Ống HDPE", "Van", "Not specified"]),
+                "replacement_location": f"Số {rng.randint(1, 300)} đường {rng.randint(1, 50)}",
+            })
+    if repairs:
+        db.meter_repairs.insert_many(repairs, ordered=False)
+
+    thresholds = 0
+    for meter_id in meter_ids:
+        value = round(rng.uniform(1.5, 4.0), 3)
+        # Một threshold mỗi ngày như rollover hằng ngày (uniq_thresh_meter_day)
+        docs = [{
+            "meter_id": meter_id,
+            "set_time": (today - timedelta(days=day)).strftime("%Y-%m-%d"),
+            "threshold_value": value,
+        } for day in range(args.days)]
+        db.meter_manual_thresholds.insert_many(docs, ordered=False)
+        thresholds += len(docs)
+    return len(repairs), thresholds
+
+
+def seed(args):
+    from app.extensions import get_db, get_mongo_client, init_indexes
+
+    rng = random.Random(args.seed)
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    started = time.perf_counter()
+
+    with app_context(mongo_db=args.db):
+        db = get_db()
+        _check_target(db)
+        get_mongo_client().drop_database(args.db)
+        db[META_COLLECTION].insert_one({"created_at": datetime.now(timezone.utc), "args": {k: v for k, v in vars(args).items() if k != "func"}})
+        init_indexes(db)
+
+        meter_ids = _seed_org(db, args, rng)
+        print(f"{args.branches} chi nhánh, {len(meter_ids)} meter, {args.branches + 2} user (mật khẩu {PASSWORD})")
+        readings = _seed_measurements(args, meter_ids)
+        predictions = _seed_predictions(db, args, meter_ids, rng, today)
+        repairs, thresholds = _seed_repairs_and_thresholds(db, args, meter_ids, rng, today)
+        print(f"{readings} reading, {predictions} prediction, {repairs} repair, {thresholds} threshold")
+
+        from app.utils.search import backfill_search_fields
+        print(f"Search: {backfill_search_fields(db)} document")
+
+        if MLConfig.MEASUREMENT_ROLLUPS_ENABLED and not args.skip_rollups:
+            from app.utils.rollups import rebuild_rollups
+            totals = rebuild_rollups(today - timedelta(days=args.days), today)
+            print(f"Rollup: {totals['hourly']} giờ, {totals['daily']} ngày")
+
+    print(f"Seed xong trong {time.perf_counter() - started:.0f}s")
+
+
+# ======================
+# Run
+# ======================
+def _users(args):
+    """(username, meter_ids) theo vai trò, đọc từ database đã seed"""
+    from app.extensions import get_db
+
+    with app_context(mongo_db=args.db):
+        db = get_db()
+        roles = {r["_id"]: r["role_name"] for r in db.roles.find()}
+        by_role = {"admin": [], "company_manager": [], "branch_manager": []}
+        for user in db.users.find({"username": {"$regex": "^lt_"}}, {"username": 1, "role_id": 1}):
+            meter_ids = [str(link["meter_id"]) for link in db.user_meter.find({"user_id": user["_id"]}, {"meter_id": 1})]
+            by_role[roles[user["role_id"]]].append((user["username"], meter_ids))
+        meter_count = db.meters.estimated_document_count()
+    if not by_role["company_manager"] or not by_role["branch_manager"]:
+        raise SystemExit(f"Database {args.db} chưa được seed (python -m scripts.loadtest seed --db {args.db})")
+    return by_role, meter_count
+
+
+def _parse_mix(items):
+    mix = {name: spec[3] for name, spec in ROUTES.items()}
+    for item in items or []:
+        name, _, weight = item.partition("=")
+        if name not in ROUTES:
+            raise SystemExit(f"Route không hợp lệ: {name} (chọn {', '.join(ROUTES)})")
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+class Client:
+    """Một người dùng ảo: mỗi vai trò một session đã đăng nhập (JWT nằm trong cookie)"""
+
+    def __init__(self, args, by_role, meter_count, rng):
+        import requests
+
+        self.args = args
+        self.rng = rng
+        self.base = args.url.rstrip("/")
+        self.meter_pages = max(1, meter_count // 20)
+        self.accounts = {role: rng.choice(users) for role, users in by_role.items() if users}
+        self.sessions = {}
+        self._requests = requests
+
+    def login(self, role):
+        username, _ = self.accounts[role]
+        session = self._requests.Session()
+        response = session.post(f"{self.base}{ROUTES['login'][1]}",
+                                json={"username": username, "password": PASSWORD}, timeout=self.args.timeout)
+        return session, response
+
+    def session(self, role):
+        if role not in self.sessions:
+            session, response = self.login(role)
+            if response.status_code != 200:
+                raise RuntimeError(f"Đăng nhập {role} thất bại: {response.status_code}")
+            self.sessions[role] = session
+        return self.sessions[role]
+
+    def request(self, name):
+        method, path, role, _ = ROUTES[name]
+        if name == "login":
+            return self.login(self.rng.choice(["company_manager", "branch_manager"]))[1]
+
+        _, meter_ids = self.accounts[role]
+        zoom, half_lng, half_lat = self.rng.choice(VIEWPORTS)
+        lng, lat = 106.6 + self.rng.uniform(-0.15, 0.15), 20.85 + self.rng.uniform(-0.1, 0.1)
+        url = self.base + path.format(
+            page=self.rng.randint(1, self.meter_pages),
+            meter_id=self.rng.choice(meter_ids) if meter_ids else "",
+            hours=self.rng.choice(RANGE_HOURS),
+            bbox=f"{lng - half_lng:.5f},{lat - half_lat:.5f},{lng + half_lng:.5f},{lat + half_lat:.5f}",
+            zoom=zoom,
+        )
+        return self.session(role).request(method, url, timeout=self.args.timeout)
+
+
+def run_load(args, by_role, meter_count, mix):
+    import requests
+
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    throttled = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = [None]
+
+    def start_clock():
+        deadline[0] = time.perf_counter() + args.duration
+
+    # Action của barrier chạy trước khi mọi thread được thả nên deadline luôn có giá trị
+    ready = threading.Barrier(args.concurrency + 1, action=start_clock)
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = Client(args, by_role, meter_count, rng)
+        # Đăng nhập trước khi đo để login ban đầu không lẫn vào các route khác
+        try:
+            for role in ("company_manager", "branch_manager"):
+                client.session(role)
+        finally:
+            ready.wait()
+        while time.perf_counter() < deadline[0]:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            status = None
+            try:
+                status = client.request(name).status_code
+            except (requests.RequestException, RuntimeError):
+                pass
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                samples[name].append(elapsed)
+                if status == 429:
+                    throttled[name] += 1
+                if status is None or status >= 400:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(args.seed + i,), daemon=True) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    started = deadline[0] - args.duration
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    rows = []
+    for name in names + ["all"]:
+        values = np.array(sum(samples.values(), []) if name == "all" else samples[name])
+        if not len(values):
+            continue
+        n_errors = sum(errors.values()) if name == "all" else errors[name]
+        rows.append({
+            "label": args.label,
+            "route": name,
+            "requests": len(values),
+            "errors": n_errors,
+            "error_%": round(n_errors * 100 / len(values), 2),
+            "429": sum(throttled.values()) if name == "all" else throttled[name],
+            "req/s": round(len(values) / wall, 1),
+            "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p95_ms": round(float(np.percentile(values, 95)), 1),
+            "p99_ms": round(float(np.percentile(values, 99)), 1),
+        })
+    return rows
+
+
+def run(args):
+    mix = _parse_mix(args.mix)
+    by_role, meter_count = _users(args)
+    print(f"{args.concurrency} người dùng ảo trong {args.duration:.0f}s trên {meter_count} meter, mix: {mix}")
+
+    rows = run_load(args, by_role, meter_count, mix)
+    print_table(rows, REPORT_COLUMNS)
+    if any(row["429"] for row in rows):
+        print("Có response 429: chạy server với RATELIMIT_ENABLED=false để đo API thay vì rate limit")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"label": args.label, "db": args.db, "meters": meter_count, "concurrency": args.concurrency,
+                       "duration": args.duration, "mix": mix, "results": rows}, f, indent=2)
+
+
+def compare(args):
+    rows = []
+    for path in args.paths:
+        with open(path, encoding="utf-8") as f:
+            rows.extend(json.load(f)["results"])
+    rows.sort(key=lambda r: (r["route"], r["label"]))
+    print_table(rows, REPORT_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test API trên fleet giả lập")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_seed = sub.add_parser("seed", help="Seed fleet giả lập vào một database riêng")
+    p_seed.add_argument("--db", required=True, help="Database loadtest (bị xoá và tạo lại)")
+    p_seed.add_argument("--branches", type=int, default=20)
+    p_seed.add_argument("--meters", type=int, default=2000)
+    p_seed.add_argument("--days", type=int, default=90)
+    p_seed.add_argument("--cadence", type=int, default=10, help="Chu kỳ đo (phút)")
+    p_seed.add_argument("--prediction-days", type=int, default=30, help="Số ngày gần nhất có prediction LSTM-AE theo giờ")
+    p_seed.add_argument("--max-repairs-per-meter", type=int, default=2)
+    p_seed.add_argument("--meter-batch", type=int, default=50, help="Số meter sinh measurement mỗi lượt")
+    p_seed.add_argument("--skip-rollups", action="store_true")
+    p_seed.add_argument("--seed", type=int, default=0)
+    p_seed.set_defaults(func=seed)
+
+    p_run = sub.add_parser("run", help="Bắn tải hỗn hợp vào server đang chạy trên database loadtest")
+    p_run.add_argument("--db", required=True, help="Database đã seed (để lấy user/meter)")
+    p_run.add_argument("--url", default="http://localhost:5000")
+    p_run.add_argument("--mix", nargs="+", default=None, help=f"Tỉ trọng dạng route=weight ({', '.join(ROUTES)})")
+    p_run.add_argument("--concurrency", type=int, default=50)
+    p_run.add_argument("--duration", type=float, default=60, help="Thời gian chạy (giây)")
+    p_run.add_argument("--timeout", type=float, default=30)
+    p_run.add_argument("--label", default="run")
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--json", dest="json_path", default=None)
+    p_run.set_defaults(func=run)
+
+    p_compare = sub.add_parser("compare", help="In bảng so sánh các file --json")
+    p_compare.add_argument("paths", nargs="+")
+    p_compare.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
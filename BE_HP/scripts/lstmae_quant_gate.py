@@ -0,0 +1,146 @@
+"""
+Accuracy gate cho LSTMAE int8 (dynamic quantization) trước khi bật LSTMAE_QUANTIZE=true.
+
+Replay các window của N ngày gần nhất (meter đủ điều kiện lstm_autoencoder), gán nhãn
+bằng fp32 và int8 với cùng ngưỡng (MNF + percentile MAE tính từ fp32), rồi báo cáo tỉ lệ
+trùng nhãn, sai lệch reconstruction error, kích thước model và thời gian chạy.
+
+    python -m scripts.lstmae_quant_gate --days 3 --min-agreement 0.99
+"""
+import io
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import torch
+from datetime import datetime, timedelta, timezone
+
+from app.config import MLConfig
+from app.ml.registry import get_lstmae_model
+from app.ml.eligibility import iter_eligible_meter_shards, eligible_meter_ids
+from app.ml.lstm_autoencoder.predict import LSTMAEPredictor
+from app.utils.ml_utils import calculate_mnf, reconstruct, predict_lstmae_batch
+from scripts._app import app_context
+
+
+def _state_bytes(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def _label(result):
+    return (result['status'], result['confidence'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh nhãn LSTMAE fp32 và int8 trên dữ liệu gần đây")
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--max-meters", type=int, default=0, help="0 = mọi meter đủ điều kiện")
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    fp32 = get_lstmae_model(MLConfig.LSTM_AE_MODEL_PATH, MLConfig.LSTM_AE_CONFIG, quantize=False)
+    int8 = get_lstmae_model(MLConfig.LSTM_AE_MODEL_PATH, MLConfig.LSTM_AE_CONFIG, quantize=True)
+
+    end_time = datetime.now(timezone.utc)
+    start_time = end_time - timedelta(days=args.days)
+    seq_len = MLConfig.LSTM_AE_CONFIG['seq_len']
+
+    predictor = LSTMAEPredictor(historical_context=args.days, config=MLConfig.LSTM_AE_CONFIG)
+
+    windows = 0
+    status_agree = 0
+    label_agree = 0
+    err_diffs = []
+    fp32_seconds = 0.0
+    int8_seconds = 0.0
+    meters_done = 0
+
+    with app_context():
+        if not predictor.fit_global_scaler_from_db(eligible_meter_ids('lstm_autoencoder'), start_time, end_time):
+            print("Không có dữ liệu / meter đủ điều kiện để replay (chạy predict LSTM-AE ít nhất một lần)")
+            sys.exit(2)
+
+        for meters in iter_eligible_meter_shards('lstm_autoencoder'):
+            data = predictor.fetch_meter_data(start_time, end_time, meters)
+            if not data:
+                continue
+            df = pd.DataFrame(data)
+
+            for meter_name, meter_df in df.groupby('meter_name'):
+                seqs, _ = predictor.prepare_data(meter_df.to_dict('records'), seq_len=seq_len)
+                if len(seqs) < 5:
+                    continue
+
+                started = time.perf_counter()
+                recon_fp32 = reconstruct(fp32, seqs)
+                fp32_seconds += time.perf_counter() - started
+                started = time.perf_counter()
+                recon_int8 = reconstruct(int8, seqs)
+                int8_seconds += time.perf_counter() - started
+
+                err_fp32 = np.max(np.abs(seqs - recon_fp32), axis=(1, 2))
+                err_int8 = np.max(np.abs(seqs - recon_int8), axis=(1, 2))
+                err_diffs.append(np.abs(err_fp32 - err_int8))
+
+                # Ngưỡng chung lấy từ fp32 để so sánh thuần tuý ảnh hưởng của quantization
+                mnf = calculate_mnf(meter_df, timestamp_col='measurement_time')
+                mnf = float(mnf) if not isinstance(mnf, dict) else np.nan
+                scale = predictor.scaler.data_max_[0] - predictor.scaler.data_min_[0]
+                low, high = np.percentile(err_fp32, [20, 80]) * scale
+                kwargs = dict(mnf=mnf, mnf_threshold=mnf * 1.2, scaler=predictor.scaler,
+                              mae_low_threshold=low, mae_high_threshold=high)
+
+                labels_fp32 = predict_lstmae_batch(fp32, seqs, **kwargs)
+                labels_int8 = predict_lstmae_batch(int8, seqs, **kwargs)
+
+                windows += len(seqs)
+                status_agree += sum(a['status'] == b['status'] for a, b in zip(labels_fp32, labels_int8))
+                label_agree += sum(_label(a) == _label(b) for a, b in zip(labels_fp32, labels_int8))
+
+                meters_done += 1
+                if args.max_meters and meters_done >= args.max_meters:
+                    break
+            if args.max_meters and meters_done >= args.max_meters:
+                break
+
+    if windows == 0:
+        print("Không có window nào để so sánh")
+        sys.exit(2)
+
+    err_diffs = np.concatenate(err_diffs)
+    report = {
+        "meters": meters_done,
+        "windows": windows,
+        "status_agreement": status_agree / windows,
+        "label_agreement": label_agree / windows,
+        "max_abs_err_diff": float(err_diffs.max()),
+        "mean_abs_err_diff": float(err_diffs.mean()),
+        "fp32_us_per_window": fp32_seconds / windows * 1e6,
+        "int8_us_per_window": int8_seconds / windows * 1e6,
+        "fp32_model_bytes": _state_bytes(fp32),
+        "int8_model_bytes": _state_bytes(int8),
+        "min_agreement": args.min_agreement,
+    }
+    report["passed"] = report["label_agreement"] >= args.min_agreement
+
+    print(f"Meters: {report['meters']}, windows: {report['windows']}")
+    print(f"Trùng status: {report['status_agreement']:.4%}, trùng status+confidence: {report['label_agreement']:.4%}")
+    print(f"|Δ reconstruction error| max {report['max_abs_err_diff']:.2e}, mean {report['mean_abs_err_diff']:.2e}")
+    print(f"CPU / window: fp32 {report['fp32_us_per_window']:.1f} µs, int8 {report['int8_us_per_window']:.1f} µs")
+    print(f"Model: fp32 {report['fp32_model_bytes']} B, int8 {report['int8_model_bytes']} B")
+    print("PASS" if report["passed"] else f"FAIL (< {args.min_agreement:.2%})")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
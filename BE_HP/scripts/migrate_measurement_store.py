@@ -0,0 +1,112 @@
+"""
+Chuyển dữ liệu measurements giữa hai layout lưu trữ (documents <-> buckets).
+
+Chạy lại nhiều lần vẫn an toàn: dữ liệu đích của từng meter trong khoảng thời gian được
+ghi đè toàn bộ, sau đó số reading ở nguồn và đích được so khớp. Collection nguồn được giữ
+nguyên; sau khi đặt MEASUREMENT_STORE sang layout mới và kiểm tra xong mới xoá thủ công.
+
+    python -m scripts.migrate_measurement_store --to buckets
+    python -m scripts.migrate_measurement_store --to buckets --start 2025-01-01 --meter-name "DH 01"
+"""
+import sys
+import time
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from app.extensions import get_db
+from app.utils.measurement_store import STORES, BucketStore, utc_naive
+from scripts._app import app_context
+
+
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def _write_buckets(target, meter_id, rows, start, end):
+    db = get_db()
+    by_day = defaultdict(list)
+    for row in rows:
+        t = utc_naive(row["measurement_time"])
+        by_day[t.replace(hour=0, minute=0, second=0, microsecond=0)].append(row)
+
+    ops = [
+        UpdateOne({"meter_id": meter_id, "day": day}, {"$set": BucketStore.bucket_doc(meter_id, day, day_rows)}, upsert=True)
+        for day, day_rows in by_day.items()
+    ]
+    if ops:
+        db[target.collection].bulk_write(ops, ordered=False)
+    # Bucket của những ngày không còn dữ liệu nguồn
+    db[target.collection].delete_many({
+        "meter_id": meter_id,
+        "day": {"$gte": start, "$lte": end, "$nin": list(by_day.keys())},
+    })
+
+
+def _write_documents(target, meter_id, rows, start, end):
+    db = get_db()
+    db[target.collection].delete_many({"meter_id": meter_id, "measurement_time": {"$gte": start, "$lt": end}})
+    target.insert([
+        {
+            "meter_id": meter_id,
+            "measurement_time": row["measurement_time"],
+            "instant_flow": row.get("instant_flow"),
+            "instant_pressure": row.get("instant_pressure"),
+        }
+        for row in rows
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate meter measurements giữa layout documents và buckets")
+    parser.add_argument("--to", dest="target", choices=sorted(STORES), required=True)
+    parser.add_argument("--start", type=_parse_day, default=datetime(2000, 1, 1), help="Ngày bắt đầu YYYY-MM-DD")
+    parser.add_argument("--end", type=_parse_day, default=None, help="Ngày kết thúc YYYY-MM-DD (mặc định hôm nay)")
+    parser.add_argument("--meter-name", action="append", default=None, help="Chỉ migrate meter này (lặp lại được)")
+    args = parser.parse_args()
+
+    source = STORES["documents" if args.target == "buckets" else "buckets"]()
+    target = STORES[args.target]()
+    writer = _write_buckets if args.target == "buckets" else _write_documents
+
+    start = args.start
+    # Khoảng [start, end) theo trọn ngày
+    end = (args.end or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    started = time.perf_counter()
+    total = 0
+    mismatched = []
+
+    with app_context():
+        db = get_db()
+        query = {"meter_name": {"$in": args.meter_name}} if args.meter_name else {}
+        meters = list(db.meters.find(query, {"_id": 1, "meter_name": 1}).sort("_id", 1))
+        if not meters:
+            print("Không có meter nào để migrate")
+            sys.exit(2)
+
+        for i, meter in enumerate(meters, 1):
+            rows = source.find([meter["_id"]], start, end, end_exclusive=True)
+            if rows:
+                writer(target, meter["_id"], rows, start, end - timedelta(microseconds=1))
+
+            migrated = len(target.find([meter["_id"]], start, end, end_exclusive=True))
+            if migrated != len(rows):
+                mismatched.append((meter.get("meter_name"), len(rows), migrated))
+            total += len(rows)
+
+            if i % 50 == 0 or i == len(meters):
+                print(f"{i}/{len(meters)} meter, {total} reading ({time.perf_counter() - started:.1f}s)")
+
+    print(f"Đã migrate {total} reading {source.name} -> {target.name} cho {len(meters)} meter")
+    if mismatched:
+        for name, expected, actual in mismatched:
+            print(f"  Lệch số reading: {name}: nguồn {expected}, đích {actual}")
+        sys.exit(1)
+    print(f"Đặt MEASUREMENT_STORE={target.name} để API và ML đọc từ {target.collection}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Dựng lại rollup giờ/ngày (meter_measurements_hourly / meter_measurements_daily) từ dữ liệu thô.
+
+Dùng khi bật rollup lần đầu (trước khi đặt ML_USE_ROLLUPS=true), sau khi import/seed dữ liệu
+trực tiếp vào meter_measurements, hoặc khi dữ liệu thô của một khoảng ngày bị sửa.
+
+    python -m scripts.rebuild_rollups --days 40
+    python -m scripts.rebuild_rollups --start 2025-01-01 --end 2025-01-31 --meter-name "DH 01"
+"""
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from app.extensions import get_db
+from app.utils.rollups import rebuild_rollups
+from scripts._app import app_context
+
+
+def _parse_day(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dựng lại rollup giờ/ngày của meter_measurements")
+    parser.add_argument("--start", type=_parse_day, help="Ngày bắt đầu YYYY-MM-DD")
+    parser.add_argument("--end", type=_parse_day, help="Ngày kết thúc YYYY-MM-DD (mặc định hôm nay)")
+    parser.add_argument("--days", type=int, default=None, help="Số ngày gần nhất (thay cho --start)")
+    parser.add_argument("--meter-name", action="append", default=None, help="Chỉ dựng lại cho meter này (lặp lại được)")
+    parser.add_argument("--shard-size", type=int, default=200)
+    args = parser.parse_args()
+
+    end = args.end or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    if args.start:
+        start = args.start
+    elif args.days:
+        start = end - timedelta(days=args.days - 1)
+    else:
+        parser.error("Cần --start hoặc --days")
+    if start > end:
+        parser.error("--start phải trước --end")
+
+    started = time.perf_counter()
+
+    def progress(day, totals):
+        print(f"{day:%Y-%m-%d}: {totals['points']} measurement, "
+              f"{totals['hourly']} rollup giờ, {totals['daily']} rollup ngày (cộng dồn)")
+
+    with app_context():
+        meter_ids = None
+        if args.meter_name:
+            meters = list(get_db().meters.find({"meter_name": {"$in": args.meter_name}}, {"_id": 1, "meter_name": 1}))
+            missing = set(args.meter_name) - {m["meter_name"] for m in meters}
+            if missing:
+                print(f"Không tìm thấy meter: {', '.join(sorted(missing))}")
+                sys.exit(2)
+            meter_ids = [m["_id"] for m in meters]
+
+        totals = rebuild_rollups(start, end, meter_ids=meter_ids, shard_size=args.shard_size, progress=progress)
+
+    elapsed = time.perf_counter() - started
+    print(f"Hoàn tất {start:%Y-%m-%d} -> {end:%Y-%m-%d} trong {elapsed:.1f}s: "
+          f"{totals['points']} measurement -> {totals['hourly']} rollup giờ, {totals['daily']} rollup ngày")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,26 @@
+"""
+Seed dữ liệu mẫu từ scripts/datafiles và sinh measurement giả lập cho benchmark.
+
+    python -m scripts.seed_data                 # seed CSV; bỏ qua nếu data version đã có
+    python -m scripts.seed_data --force         # xoá và seed lại
+    python -m scripts.seed_data generate --db gen_bench --meters 20000 --days 365 --workers 8
+    python -m scripts.seed_data generate --meters 2000 --days 30 --dry-run   # chỉ đo tốc độ sinh
+
+run.py gọi main() mỗi lần khởi động: khi data version (hash CSV + SEED_VERSION) đã được ghi
+trong seed_meta thì chỉ tốn một query.
+"""
 import os
-import random
+import time
+import hashlib
+import argparse
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
-import re
-from datetime import datetime, timezone, timedelta, time
 import bcrypt as bc
 from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument
-from typing import Optional, Dict, Any, List
+from pymongo.errors import BulkWriteError
 
 # ======================
 # Cấu hình kết nối MongoDB
@@ -13,8 +28,24 @@ from typing import Optional, Dict, Any, List
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017")
 MONGO_DB  = os.getenv("MONGO_DB", "Nuoc_HP")
 
-client = MongoClient(MONGO_URI)
-db = client[MONGO_DB]
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datafiles")
+# Tăng khi đổi cách dựng document để các máy đã seed bản cũ seed lại
+SEED_VERSION = 3
+META_COLLECTION = "seed_meta"
+CHUNK_SIZE = 10_000
+
+SEEDED_COLLECTIONS = [
+    "companies", "branches", "meters",
+    "users", "roles", "user_meter",
+    "meter_manual_thresholds", "meter_consumptions",
+    "meter_repairs", "meter_measurements",
+    # Dữ liệu dẫn xuất từ measurements/predictions: phải xoá cùng để không lệch với dữ liệu seed mới
+    "meter_measurement_buckets", "meter_measurements_hourly", "meter_measurements_daily",
+    "lstmae_thresholds", "lstmae_daily_stats", "ml_meter_eligibility",
+    "ai_models", "predictions", "logs", META_COLLECTION,
+]
+
+COMPANY_NAME = "Công ty Cổ phần Cấp nước Hà Nội"
 
 
 # ======================
@@ -40,19 +71,15 @@ def remove_vietnamese(text):
         '[đ]': 'd',
         '[Đ]': 'D'
     }
+    import re
     for pattern, repl in patterns.items():
         text = re.sub(pattern, repl, text)
     text = re.sub(r'\s+', '_', text)
     return text.lower()
 
-def upsert(collection: str, query: Dict[str, Any], doc: Dict[str, Any]):
-    return db[collection].find_one_and_update(
-        query, {"$setOnInsert": doc}, upsert=True, return_document=ReturnDocument.AFTER
-    )
-
 
 def _norm_keys(keys):
-    return tuple((k, int(v)) for k, v in keys)
+    return tuple((k, v if isinstance(v, str) else int(v)) for k, v in keys)
 
 
 def ensure_index(coll, keys, name: str, **opts):
@@ -65,445 +92,448 @@ def ensure_index(coll, keys, name: str, **opts):
     return coll.create_index(keys, name=name, **opts)
 
 
+def insert_chunks(coll, docs, chunk_size=CHUNK_SIZE):
+    """insert_many không thứ tự theo từng chunk; trả về số document đã ghi"""
+    inserted = 0
+    for i in range(0, len(docs), chunk_size):
+        try:
+            inserted += len(coll.insert_many(docs[i:i + chunk_size], ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            print(f"{coll.name}: {len(e.details.get('writeErrors', []))} document lỗi khi ghi")
+    return inserted
+
+
+def _read_csv(name, **kwargs):
+    path = os.path.join(DATA_DIR, name)
+    if not os.path.exists(path):
+        print(f"Không có {name}, bỏ qua")
+        return None
+    return pd.read_csv(path, **kwargs)
+
+
+def _records(df):
+    """DataFrame -> list dict; NaN/NaT thành None"""
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _datetimes(series, fmt=None):
+    parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+    return parsed.astype(object).where(parsed.notna(), None)
+
+
+def _text(series, default):
+    return series.fillna("").astype(str).str.strip().replace("", default)
+
+
+def data_version():
+    """Hash nội dung datafiles + SEED_VERSION"""
+    digest = hashlib.sha256(f"v{SEED_VERSION}".encode())
+    for name in sorted(os.listdir(DATA_DIR)):
+        if name.endswith(".csv"):
+            digest.update(name.encode())
+            with open(os.path.join(DATA_DIR, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
 # ======================
 # Reset & Indexing
 # ======================
-def reset_collections():
+def reset_collections(db):
     print("Resetting collections...")
-    collections = [
-        "companies", "branches", "meters",
-        "users", "roles", "user_meter",
-        "meter_manual_thresholds", "meter_consumptions",
-        "meter_repairs", "meter_measurements",
-        "ai_models", "predictions", "logs"
-    ]
-    for col in collections:
+    # drop() xoá luôn index của collection; index của collection khác (jobs, ...) giữ nguyên
+    for col in SEEDED_COLLECTIONS:
         db[col].drop()
 
-    for col_name in db.list_collection_names():
-        for idx_name in list(db[col_name].index_information().keys()):
-            if idx_name != "_id_":
-                db[col_name].drop_index(idx_name)
-
-
-def init_indexes(db):
-    # Users / Roles
-    ensure_index(db.users, [("username", ASCENDING)], unique=True, name="uniq_user_username")
-    ensure_index(db.roles, [("role_name", ASCENDING)], unique=True, name="uniq_role_name")
-
-    # Company–Branch–Meter
-    ensure_index(db.companies, [("name", ASCENDING)], unique=True, name="uniq_company_name")
-    ensure_index(db.branches,  [("company_id", ASCENDING)], name="idx_branch_company")
-    ensure_index(db.branches,  [("name", ASCENDING)], name="idx_branch_name")
-    ensure_index(db.meters,    [("branch_id", ASCENDING)], name="idx_meter_branch")
-    ensure_index(db.meters,    [("meter_name", ASCENDING)], name="idx_meter_name")
-
-    # User–Meter
-    ensure_index(db.user_meter, [("user_id", ASCENDING)], name="idx_um_user")
-    ensure_index(db.user_meter, [("meter_id", ASCENDING)], name="idx_um_meter")
-    ensure_index(db.user_meter,
-                 [("user_id", ASCENDING), ("meter_id", ASCENDING)],
-                 unique=True, name="uniq_um")
-
-    # Meter data
-    ensure_index(db.meter_manual_thresholds,
-                 [("meter_id", ASCENDING), ("set_time", DESCENDING)],
-                 name="idx_thresh_meter_time")
-    ensure_index(db.meter_consumptions,
-                 [("meter_id", ASCENDING), ("recording_date", DESCENDING)],
-                 name="idx_consume_meter_month")
-    ensure_index(db.meter_repairs,
-                 [("meter_id", ASCENDING), ("repair_time", DESCENDING)],
-                 name="idx_repair_meter_time")
-    ensure_index(db.meter_measurements,
-                 [("meter_id", ASCENDING), ("measurement_time", DESCENDING)],
-                 name="idx_meas_meter_time")
-
-    # AI & Prediction
-    ensure_index(db.ai_models,   [("name", ASCENDING)], unique=True, name="uniq_model_name")
-    ensure_index(db.predictions, [("meter_id", ASCENDING), ("prediction_time", DESCENDING)],
-                 name="idx_pred_meter_time")
-    ensure_index(db.predictions, [("model_id", ASCENDING)], name="idx_pred_model")
-
 
 # ======================
-# Seed: Roles
+# Seed: Roles & Organization
 # ======================
-def seed_roles():
-    roles = [
-        {"role_name": "admin"},
-        {"role_name": "company_manager"},
-        {"role_name": "branch_manager"},
-    ]
-    for r in roles:
-        upsert("roles", {"role_name": r["role_name"]}, r)
+def seed_roles(db):
+    db.roles.insert_many([{"role_name": name} for name in ("admin", "company_manager", "branch_manager")])
 
 
-# ======================
-# Seed: Organization
-# ======================
-def seed_companies():
-    company = upsert("companies", {"name": "Công ty Cổ phần Cấp nước Hà Nội"}, {"name": "Công ty Cổ phần Cấp nước Hà Nội", "address": "Hà Nội"})
-    return company["_id"]
-
-def update_branches_company_id():
-    company = db["companies"].find_one({"name": "Công ty Cổ phần Cấp nước Hà Nội"})
-    if not company:
-        company_id = seed_companies()
-    else:
-        company_id = company["_id"]
-    
-    db["branches"].update_many(
-        {"company_id": {"$exists": False}},
-        {"$set": {"company_id": company_id}}
-    )
+def seed_org(db):
+    company_id = db.companies.insert_one({"name": COMPANY_NAME, "address": "Hà Nội"}).inserted_id
 
-def seed_org():
-
-    branches_df = pd.read_csv('./scripts/datafiles/branches.csv')
-    branches_df.fillna('')
+    branches_df = _read_csv("branches.csv").fillna("")
+    branches_df["company_id"] = company_id
     branches = branches_df.to_dict(orient="records")
-   
-    branch_ids = {}
-    for b in branches:
-        doc = upsert("branches", {"name": b["name"], "address": b["address"]}, b)
-        branch_ids[b["name"]] = doc["_id"]
-
-    meters_df = pd.read_csv('./scripts/datafiles/meters.csv')
-    meters_df = meters_df.fillna('')  
-    meters = meters_df.to_dict(orient="records")
-
-    meter_ids = {}
-    for m in meters:
-        branch_id = branch_ids[m["branch"]] if m["branch"] else None
-    
-        meter = {
-            "branch_id": branch_id,
-            "meter_name": m["meter_name"],
-            "installation_time": m["installation_time"] if m["installation_time"] else None,
-            "longitude": float(m["longitude"]) if m["longitude"] else None,
-            "latitude": float(m["latitude"]) if m["latitude"] else None
-        }
-
-        doc = upsert("meters", {"branch_id": meter["branch_id"], "meter_name": meter["meter_name"], "longitude": meter["longitude"], "latitude": meter["latitude"]}, meter)
-        meter_ids[m["meter_name"]] = doc["_id"]
+    inserted = db.branches.insert_many(branches).inserted_ids
+    branch_ids = dict(zip(branches_df["name"], inserted))
+
+    meters_df = _read_csv("meters.csv")
+    meters_df = pd.DataFrame({
+        "branch_id": meters_df["branch"].map(branch_ids),
+        "meter_name": meters_df["meter_name"],
+        "installation_time": meters_df["installation_time"].where(meters_df["installation_time"].notna(), None),
+        "longitude": pd.to_numeric(meters_df["longitude"], errors="coerce"),
+        "latitude": pd.to_numeric(meters_df["latitude"], errors="coerce"),
+    }).drop_duplicates("meter_name")
+    meters = _records(meters_df)
+    for meter in meters:
+        if meter["longitude"] is not None and meter["latitude"] is not None:
+            meter["location"] = {"type": "Point", "coordinates": [meter["longitude"], meter["latitude"]]}
+    inserted = db.meters.insert_many(meters).inserted_ids
+    meter_ids = dict(zip(meters_df["meter_name"], inserted))
 
     return branch_ids, meter_ids
+
+
 # ======================
 # Seed: Users
 # ======================
-
-def seed_users(branch_ids: Dict[str, Any]):
+def seed_users(db, branch_ids: dict):
     role_map = {r["role_name"]: r["_id"] for r in db.roles.find({}, {"role_name": 1})}
-    
+
     users = [
         {"username": "admin",          "password": hash_password("Admin@123"),   "role_id": role_map["admin"],            "branch_id": None},
         {"username": "tongcongty",     "password": hash_password("Company@123"), "role_id": role_map["company_manager"],  "branch_id": None},
     ]
-    
-    branch_df = pd.read_csv('./scripts/datafiles/branches.csv')
-    branch_df.fillna('')
-    branch_list = branch_df.to_dict(orient="records") 
-
-    for b in branch_list:
-        user = {
-            "username": remove_vietnamese(b['name']),
-            "password": hash_password("Branch@123"),
-            "role_id": role_map["branch_manager"],
-            "branch_id": branch_ids.get(b["name"])
-        }
-
-        users.append(user)
-
+    # Mọi branch manager dùng chung mật khẩu: băm bcrypt một lần thay vì mỗi user một lần
+    branch_password = hash_password("Branch@123")
+    users += [
+        {"username": remove_vietnamese(name), "password": branch_password,
+         "role_id": role_map["branch_manager"], "branch_id": branch_id}
+        for name, branch_id in branch_ids.items()
+    ]
     for u in users:
-        upsert("users", {"username": u["username"]}, {**u, "is_active": True, "last_login": None})
+        u.update(is_active=True, last_login=None)
+    db.users.insert_many(users)
 
 
-# ======================
-# Seed: User-Meter Relationships
-# ======================
-def seed_user_meter():
-
-    users = list(db.users.find({}, {"_id": 1, "username": 1, "role_id": 1, "branch_id": 1}))
-    meters = list(db.meters.find({}, {"_id": 1, "branch_id": 1}))
+def seed_user_meter(db):
+    users = list(db.users.find({}, {"_id": 1, "role_id": 1, "branch_id": 1}))
+    meters = pd.DataFrame(list(db.meters.find({}, {"_id": 1, "branch_id": 1})))
     roles = {r["_id"]: r["role_name"] for r in db.roles.find({}, {"_id": 1, "role_name": 1})}
 
-    db.user_meter.delete_many({})
-    user_meter_docs = []
-
+    docs = []
     for user in users:
         role_name = roles.get(user["role_id"])
         if role_name == "company_manager":
-            for meter in meters:
-                user_meter_docs.append({"user_id": user["_id"], "meter_id": meter["_id"]})
-        elif role_name == "branch_manager":
-            user_branch_id = user.get("branch_id")
-            if user_branch_id:
-                for meter in meters:
-                    if meter["branch_id"] == user_branch_id:
-                        user_meter_docs.append({"user_id": user["_id"], "meter_id": meter["_id"]})
+            meter_ids = meters["_id"]
+        elif role_name == "branch_manager" and user.get("branch_id"):
+            meter_ids = meters.loc[meters["branch_id"] == user["branch_id"], "_id"]
+        else:
+            continue
+        docs += [{"user_id": user["_id"], "meter_id": meter_id} for meter_id in meter_ids]
 
-    if user_meter_docs:
-        db.user_meter.insert_many(user_meter_docs)
-        print(f"✅ Đã tạo {len(user_meter_docs)} quan hệ user-meter")
+    inserted = insert_chunks(db.user_meter, docs)
+    print(f"✅ Đã tạo {inserted} quan hệ user-meter")
 
 
 # ======================
-# Seed: Domain Data
+# Seed: Domain Data (chạy song song, mỗi hàm một collection)
 # ======================
-def seed_meter_measurements(meter_ids: Dict[str, Any]):
-    docs = []
-    measurement_df = pd.read_csv('./scripts/datafiles/measurements.csv')
-    measurement_df.fillna('')
-    measurement_data = measurement_df.to_dict(orient="records")
-
-    for measurement in measurement_data: 
-        meter_id = meter_ids.get(measurement["meter_name"])
-        measurement_time = datetime.fromisoformat(measurement["measurement_time"])
-        instant_flow = measurement["instant_flow"] if measurement["instant_flow"] != '' else None
-        instant_pressure = measurement["instant_pressure"] if measurement["instant_pressure"] != '' else None
-
-        doc = {
-            "meter_id": meter_id,
-            "measurement_time": measurement_time,
-            "instant_flow": instant_flow,
-            "instant_pressure": instant_pressure
-        }
-        docs.append(doc)
-
-    if docs:
-        db.meter_measurements.insert_many(docs)
-
-
-def seed_meter_repairs(meter_ids: Dict[str, Any]):
-    docs = []
-    repair_df = pd.read_csv('./scripts/datafiles/repairs.csv')
-    repair_df.fillna('')
-    repair_data = repair_df.to_dict(orient="records")
-
-    for repair in repair_data: 
-        meter_id = meter_ids.get(repair["meter_name"])
-        if not meter_id:
-            continue  
-        recorded_time = datetime.fromisoformat(repair['recorded_time']) if repair['recorded_time'] else None
-        repair_time = datetime.fromisoformat(repair["repair_time"]) if repair["repair_time"] else None
-        leak_reason = repair["leak_reason"] if repair["leak_reason"] != '' else "Unknown"
-        replacement_type = repair["replacement_type"] if repair["replacement_type"] != '' else "Not specified"
-        replacement_location = repair["replacement_location"] if repair["replacement_location"] != '' else "Not specified"
-        
-        doc = {
-            "meter_id": meter_id,
-            "recorded_time": recorded_time,
-            "repair_time": repair_time,
-            "leak_reason": leak_reason,
-            "replacement_type": replacement_type,
-            "replacement_location": replacement_location
-        }
-        docs.append(doc)
-
-    if docs:
-        db.meter_repairs.insert_many(docs)
-
-
-def seed_predictions(meter_ids: Dict[str, Any]):
-    print("Seeding predictions from CSV files...")
-    
-    # Tạo các AI models
-    lstm_ae_model = upsert("ai_models", {"name": "lstm_autoencoder"}, {"name": "lstm_autoencoder"})
-    lstm_model = upsert("ai_models", {"name": "lstm"}, {"name": "lstm"})
-    
-    lstm_ae_model_id = lstm_ae_model["_id"]
-    lstm_model_id = lstm_model["_id"]
-    
-    # Sử dụng meter_ids được truyền vào
-    meter_name_to_id = meter_ids
-    
-    all_docs = []
-    
-    # ========== Xử lý LSTM AutoEncoder (predictions_lstm_ae.csv) ==========
-    try:
-        print("Processing LSTM AutoEncoder predictions...")
-        lstm_ae_df = pd.read_csv('./scripts/datafiles/predictions_lstm_ae.csv')
-        lstm_ae_df.fillna('')
-        lstm_ae_data = lstm_ae_df.to_dict(orient="records")
-        
-        for pred in lstm_ae_data:
-            meter_name = pred.get("meter", "").strip()
-            date_str = pred.get("date", "").strip()
-            status = pred.get("status", "").strip().lower()
-            confidence_raw = pred.get("confidence", "")
-            confidence_str = str(confidence_raw).strip() if confidence_raw is not None else ""
-            avg_instant_flow = pred.get("avg_instant_flow", 0)
-            
-            # Skip nếu thiếu thông tin
-            if not meter_name or not date_str or not status:
-                continue
-                
-            # Lấy meter_id từ meter_name
-            meter_id = meter_name_to_id.get(meter_name)
-            if not meter_id:
-                print(f"Warning: Meter '{meter_name}' not found for LSTM AE")
-                continue
-            
-            # Parse datetime
-            try:
-                prediction_time = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                print(f"Warning: Invalid date format '{date_str}' for LSTM AE")
-                continue
-            
-            # Giữ confidence dưới dạng string
-            confidence = confidence_str if confidence_str else "Unknown"
-            
-            # predicted_label từ status (LSTM AE)
-            predicted_label = status if status in ["normal", "leak"] else "normal"
-            
-            all_docs.append({
-                "meter_id": meter_id,
-                "model_id": lstm_ae_model_id,
-                "prediction_time": prediction_time,
-                "predicted_label": predicted_label,
-                "confidence": confidence,
-                "recorded_instant_flow": float(avg_instant_flow) if avg_instant_flow else 0.0
-            })
-            
-    except FileNotFoundError:
-        print("File predictions_lstm_ae.csv not found, skipping LSTM AE predictions")
-    
-    # ========== Xử lý LSTM (lstm_predictions.csv) ==========
-    try:
-        print("Processing LSTM predictions...")
-        lstm_df = pd.read_csv('./scripts/datafiles/lstm_predictions.csv')
-        lstm_df.fillna('')
-        lstm_data = lstm_df.to_dict(orient="records")
-        
-        for pred in lstm_data:
-            meter_name = pred.get("meter_name", "").strip()
-            date_str = pred.get("date", "").strip()
-            confidence_raw = pred.get("confidence", "")
-            confidence_str = str(confidence_raw).strip() if confidence_raw is not None else ""
-            avg_instant_flow = pred.get("avg_instant_flow", 0)
-            
-            # Skip nếu thiếu thông tin
-            if not meter_name or not date_str:
-                continue
-                
-            # Lấy meter_id từ meter_name
-            meter_id = meter_name_to_id.get(meter_name)
-            if not meter_id:
-                print(f"Warning: Meter '{meter_name}' not found for LSTM")
-                continue
-            
-            # Parse datetime - LSTM file chỉ có date, thêm thời gian mặc định
-            try:
-                prediction_time = datetime.strptime(date_str, "%Y-%m-%d")
-            except ValueError:
-                print(f"Warning: Invalid date format '{date_str}' for LSTM")
-                continue
-            
-            # Giữ confidence dưới dạng string
-            confidence = confidence_str if confidence_str else "Unknown"
-            
-            # predicted_label từ confidence (LSTM): NNthap -> normal, khác -> leak
-            if confidence_str == "NNthap":
-                predicted_label = "normal"
-            else:
-                predicted_label = "leak"
-            
-            all_docs.append({
-                "meter_id": meter_id,
-                "model_id": lstm_model_id,
-                "prediction_time": prediction_time,
-                "predicted_label": predicted_label,
-                "confidence": confidence,
-                "recorded_instant_flow": float(avg_instant_flow) if avg_instant_flow else 0.0
-            })
-            
-    except FileNotFoundError:
-        print("File lstm_predictions.csv not found, skipping LSTM predictions")
-    
-    # ========== Insert tất cả predictions ==========
-    if all_docs:
-        print(f"Inserting {len(all_docs)} prediction records from both models...")
-        # Insert in batches
-        batch_size = 1000
-        for i in range(0, len(all_docs), batch_size):
-            batch = all_docs[i:i+batch_size]
-            db.predictions.insert_many(batch)
-            print(f"Inserted batch {i//batch_size + 1}/{(len(all_docs)-1)//batch_size + 1}")
-    else:
+def seed_meter_measurements(db, meter_ids: dict):
+    """Ghi qua measurement store đang cấu hình (MEASUREMENT_STORE) rồi dựng rollup cho khoảng đã seed"""
+    from scripts._app import app_context
+    from app.utils.measurement_store import get_measurement_store
+    from app.utils.rollups import rebuild_rollups
+
+    df = _read_csv("measurements.csv")
+    if df is None:
+        return 0
+    out = pd.DataFrame({
+        "meter_id": df["meter_name"].map(meter_ids),
+        "measurement_time": _datetimes(df["measurement_time"]),
+        "instant_flow": pd.to_numeric(df["instant_flow"], errors="coerce"),
+        "instant_pressure": pd.to_numeric(df["instant_pressure"], errors="coerce"),
+    })
+    out = out[out["meter_id"].notna() & out["measurement_time"].notna()]
+    if out.empty:
+        return 0
+    docs = _records(out)
+
+    inserted = 0
+    with app_context(mongo_db=db.name, mongo_uri=MONGO_URI):
+        store = get_measurement_store(cached=False)
+        for i in range(0, len(docs), CHUNK_SIZE):
+            inserted += store.insert(docs[i:i + CHUNK_SIZE])
+        times = pd.to_datetime(out["measurement_time"])
+        totals = rebuild_rollups(times.min().to_pydatetime(), times.max().to_pydatetime(),
+                                 meter_ids=sorted(set(out["meter_id"])))
+    print(f"  rollups: {totals['hourly']} giờ, {totals['daily']} ngày")
+    return inserted
+
+
+def seed_meter_repairs(db, meter_ids: dict):
+    df = _read_csv("repairs.csv")
+    if df is None:
+        return 0
+    out = pd.DataFrame({
+        "meter_id": df["meter_name"].map(meter_ids),
+        "recorded_time": _datetimes(df["recorded_time"]),
+        "repair_time": _datetimes(df["repair_time"]),
+        "leak_reason": _text(df["leak_reason"], "Unknown"),
+        "replacement_type": _text(df["replacement_type"], "Not specified"),
+        "replacement_location": _text(df["replacement_location"], "Not specified"),
+    })
+    out = out[out["meter_id"].notna()]
+    return insert_chunks(db.meter_repairs, _records(out))
+
+
+def _prediction_frame(df, meter_ids, meter_col, time_fmt, model_id, labels):
+    meter_names = df[meter_col].fillna("").astype(str).str.strip()
+    confidence = df["confidence"].fillna("").astype(str).str.strip()
+    out = pd.DataFrame({
+        "meter_id": meter_names.map(meter_ids),
+        "model_id": model_id,
+        "prediction_time": _datetimes(df["date"].astype(str).str.strip(), fmt=time_fmt),
+        "predicted_label": labels,
+        "confidence": confidence.replace("", "Unknown"),
+        "recorded_instant_flow": pd.to_numeric(df["avg_instant_flow"], errors="coerce").fillna(0.0).astype(float),
+    })
+    missing = meter_names[out["meter_id"].isna() & (meter_names != "")].unique()
+    if len(missing):
+        print(f"Warning: {len(missing)} meter không tồn tại trong predictions: {', '.join(missing[:5])}...")
+    out = out[out["meter_id"].notna() & out["prediction_time"].notna()]
+    # CSV có dòng trùng (meter, ngày): giữ dòng cuối, khớp unique index uniq_pred_meter_model_time
+    return out.drop_duplicates(["meter_id", "model_id", "prediction_time"], keep="last")
+
+
+def seed_predictions(db, meter_ids: dict):
+    model_ids = {
+        name: db.ai_models.find_one_and_update(
+            {"name": name}, {"$setOnInsert": {"name": name}}, upsert=True, return_document=ReturnDocument.AFTER
+        )["_id"]
+        for name in ("lstm_autoencoder", "lstm")
+    }
+    frames = []
+
+    lstm_ae_df = _read_csv("predictions_lstm_ae.csv")
+    if lstm_ae_df is not None:
+        status = lstm_ae_df["status"].fillna("").astype(str).str.strip().str.lower()
+        lstm_ae_df = lstm_ae_df[status != ""]
+        status = status[status != ""]
+        # predicted_label từ status (LSTM AE)
+        labels = status.where(status.isin(["normal", "leak"]), "normal")
+        frames.append(_prediction_frame(lstm_ae_df, meter_ids, "meter", "%Y-%m-%d %H:%M:%S", model_ids["lstm_autoencoder"], labels))
+
+    lstm_df = _read_csv("lstm_predictions.csv")
+    if lstm_df is not None:
+        # predicted_label từ confidence (LSTM): NNthap -> normal, khác -> leak
+        confidence = lstm_df["confidence"].fillna("").astype(str).str.strip()
+        labels = np.where(confidence == "NNthap", "normal", "leak")
+        frames.append(_prediction_frame(lstm_df, meter_ids, "meter_name", "%Y-%m-%d", model_ids["lstm"], labels))
+
+    if not frames:
         print("No valid prediction data to insert")
-
-
-def seed_meter_consumptions(meter_ids: Dict[str, Any]):
-    docs = []
-    c_df = pd.read_csv('./scripts/datafiles/consumption.csv')
-    c_df.fillna('')
-    c_data = c_df.to_dict(orient="records")
-
-    for c in c_data:
-        meter_id = meter_ids.get(c["meter_name"])
-        recording_date = c["date"]
-        month = c["month"]
-        consumption_value = c["monthly_consumption"] if c["monthly_consumption"] != '' else None
-
-        doc = {
-            "meter_id": meter_id,
-            "recording_date": recording_date,
-            "monthly_consumption": consumption_value, 
-            "month": month
-        }
-        docs.append(doc)
-
-    if docs:
-        db.meter_consumptions.insert_many(docs)
-
-
-def seed_meter_manual_thresholds():
-    print("Seeding meter_manual_thresholds ...")
-    meters = list(db.meters.find({}, {"_id": 1}))
-    docs = []
-    now = datetime.now(timezone.utc)
-
-    for m in meters:
-        num_thresholds = random.randint(1, 3)
-        for _ in range(num_thresholds):
-            days_ago = random.randint(0, 90)
-            set_time = (now - timedelta(days=days_ago)).date().strftime('%Y-%m-%d')
-
-            threshold_value = round(random.uniform(1.5, 4.0), 3)
-            docs.append({
-                "meter_id": m["_id"],
-                "set_time": set_time,
-                "threshold_value": threshold_value
-            })
-
-    if docs:
-        db.meter_manual_thresholds.insert_many(docs)
+        return 0
+    return insert_chunks(db.predictions, _records(pd.concat(frames, ignore_index=True)))
+
+
+def seed_meter_consumptions(db, meter_ids: dict):
+    df = _read_csv("consumption.csv")
+    if df is None:
+        return 0
+    out = pd.DataFrame({
+        "meter_id": df["meter_name"].map(meter_ids),
+        "recording_date": df["date"],
+        "monthly_consumption": pd.to_numeric(df["monthly_consumption"], errors="coerce"),
+        "month": df["month"],
+    })
+    return insert_chunks(db.meter_consumptions, _records(out))
+
+
+def seed_meter_manual_thresholds(db, meter_ids: dict, seed=None):
+    """1-3 threshold mỗi meter vào các ngày khác nhau trong 90 ngày gần nhất (vector hoá cho mọi meter)"""
+    ids = list(meter_ids.values())
+    if not ids:
+        return 0
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(1, 4, size=len(ids))
+    # Mỗi (meter, ngày) chỉ một threshold (unique index uniq_thresh_meter_day): lấy các cột đầu của hoán vị
+    days_ago = np.argsort(rng.random((len(ids), 91)), axis=1)[:, :3]
+    values = rng.uniform(1.5, 4.0, size=(len(ids), 3)).round(3)
+
+    today = datetime.now(timezone.utc).date()
+    day_labels = [(today - timedelta(days=d)).strftime('%Y-%m-%d') for d in range(91)]
+    docs = [
+        {"meter_id": meter_id, "set_time": day_labels[days_ago[i, k]], "threshold_value": float(values[i, k])}
+        for i, meter_id in enumerate(ids)
+        for k in range(counts[i])
+    ]
+    return insert_chunks(db.meter_manual_thresholds, docs)
 
 
 # ======================
 # Main Execution
 # ======================
-def main():
-    print(f"Connecting to {MONGO_URI}, DB={MONGO_DB}")
-    reset_collections()
-    seed_roles()
-    branch_ids, meter_ids = seed_org()
-    update_branches_company_id()  
-    seed_users(branch_ids)
-    seed_user_meter()
+def main(force=False):
+    client = MongoClient(MONGO_URI)
+    db = client[MONGO_DB]
+    version = data_version()
+
+    meta = db[META_COLLECTION].find_one({"_id": "csv"})
+    if meta and meta.get("version") == version and not force:
+        print(f"DB={MONGO_DB} đã có dữ liệu seed version {version}, bỏ qua (--force để seed lại)")
+        return False
+
+    started = time.perf_counter()
+    print(f"Connecting to {MONGO_URI}, DB={MONGO_DB} (seed version {version})")
+    reset_collections(db)
+    seed_roles(db)
+    branch_ids, meter_ids = seed_org(db)
+    seed_users(db, branch_ids)
+    seed_user_meter(db)
+
+    loaders = {
+        "meter_measurements": seed_meter_measurements,
+        "meter_repairs": seed_meter_repairs,
+        "predictions": seed_predictions,
+        "meter_consumptions": seed_meter_consumptions,
+        "meter_manual_thresholds": seed_meter_manual_thresholds,
+    }
+    counts = {}
+    # Các collection độc lập nhau: ghi song song, MongoClient dùng chung pool
+    with ThreadPoolExecutor(max_workers=len(loaders)) as pool:
+        futures = {pool.submit(fn, db, meter_ids): name for name, fn in loaders.items()}
+        for future in as_completed(futures):
+            counts[futures[future]] = future.result()
+            print(f"  {futures[future]}: {counts[futures[future]]} document")
+
+    # Tạo index sau khi nạp dữ liệu nhanh hơn duy trì index trong lúc insert; dùng đúng danh sách
+    # index của app vì reset đã drop các collection seed (kể cả index app tạo lúc create_app)
+    from app.extensions import init_indexes
     init_indexes(db)
 
-    seed_meter_measurements(meter_ids)
-    seed_meter_repairs(meter_ids)
-    seed_predictions(meter_ids)
-    seed_meter_consumptions(meter_ids)
+    db[META_COLLECTION].replace_one(
+        {"_id": "csv"},
+        {"version": version, "seeded_at": datetime.now(timezone.utc), "counts": counts},
+        upsert=True,
+    )
+    print(f"\nSeeding completed in {time.perf_counter() - started:.1f}s.")
+    return True
 
-    seed_meter_manual_thresholds()
 
-    print("\nSeeding completed.")
+# ======================
+# Generator: measurement giả lập quy mô lớn
+# ======================
+def _generate_meters(args, meter_ids, start, steps):
+    """Chạy trong process con: sinh và ghi measurement cho một nhóm meter"""
+    from scripts.synthetic import meter_readings, measurement_docs, bucket_docs
+
+    db = None if args.dry_run else MongoClient(MONGO_URI)[args.db]
+    collection = "meter_measurement_buckets" if args.layout == "buckets" else "meter_measurements"
+    rng = np.random.default_rng([args.seed, int(str(meter_ids[0])[-6:], 16)])
+
+    written, leaks, pending = 0, [], []
+    for meter_id in meter_ids:
+        times, flow, pressure, leak = meter_readings(
+            rng, start, steps, args.cadence, leak_ratio=args.leak_ratio, missing_ratio=args.missing_ratio
+        )
+        if args.layout == "buckets":
+            pending += bucket_docs(meter_id, times, flow, pressure, args.cadence)
+        else:
+            pending += measurement_docs(meter_id, times, flow, pressure)
+        if leak:
+            leaks.append({
+                "meter_id": meter_id,
+                "start": start + timedelta(minutes=leak["start_index"] * args.cadence),
+                "rate": leak["rate"],
+            })
+        if len(pending) >= args.batch:
+            written += len(pending) if db is None else insert_chunks(db[collection], pending, args.batch)
+            pending = []
+    if pending:
+        written += len(pending) if db is None else insert_chunks(db[collection], pending, args.batch)
+    if leaks and db is not None:
+        db.synthetic_leaks.insert_many(leaks, ordered=False)
+    return written, len(meter_ids) * steps
+
+
+def generate(args):
+    from bson import ObjectId
+    from scripts.synthetic import day_aligned_window
+
+    if not args.dry_run and args.db == MONGO_DB and not args.force:
+        raise SystemExit(f"--db trùng database của app ({MONGO_DB}); dùng database riêng hoặc --force")
+
+    params = {k: getattr(args, k) for k in ("meters", "days", "cadence", "layout", "leak_ratio", "missing_ratio", "seed")}
+    db = None if args.dry_run else MongoClient(MONGO_URI)[args.db]
+    if db is not None:
+        meta = db[META_COLLECTION].find_one({"_id": "generate"})
+        if meta and meta.get("params") == params and not args.force:
+            print(f"DB={args.db} đã có dữ liệu generate cùng tham số, bỏ qua (--force để sinh lại)")
+            return
+
+    start, steps = day_aligned_window(args.days, args.cadence)
+    if db is not None:
+        db[META_COLLECTION].delete_one({"_id": "generate"})
+        branch_id = db.branches.find_one_and_update(
+            {"name": "Synthetic"}, {"$setOnInsert": {"name": "Synthetic", "address": ""}},
+            upsert=True, return_document=ReturnDocument.AFTER,
+        )["_id"]
+        meter_ids = [ObjectId() for _ in range(args.meters)]
+        insert_chunks(db.meters, [
+            {"_id": meter_id, "branch_id": branch_id, "meter_name": f"GEN {i:06d}"}
+            for i, meter_id in enumerate(meter_ids)
+        ])
+    else:
+        meter_ids = [ObjectId() for _ in range(args.meters)]
+
+    total = args.meters * steps
+    print(f"Sinh {total:,} reading ({args.meters} meter x {args.days} ngày, {args.cadence} phút/điểm, "
+          f"layout {args.layout}) với {args.workers} process{' (dry run)' if args.dry_run else ''}")
+
+    started = time.perf_counter()
+    done_readings = 0
+    groups = [meter_ids[i:i + args.meters_per_task] for i in range(0, len(meter_ids), args.meters_per_task)]
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(_generate_meters, args, group, start, steps) for group in groups]
+        for future in as_completed(futures):
+            _, readings = future.result()
+            done_readings += readings
+            elapsed = time.perf_counter() - started
+            print(f"  {done_readings:,}/{total:,} reading, {done_readings / elapsed:,.0f} reading/s", flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"Xong {total:,} reading trong {elapsed:.1f}s ({total / elapsed:,.0f} reading/s)")
+
+    if db is not None:
+        if args.layout == "buckets":
+            ensure_index(db.meter_measurement_buckets, [("meter_id", ASCENDING), ("day", ASCENDING)],
+                         unique=True, name="uniq_meas_bucket_meter_day")
+        else:
+            ensure_index(db.meter_measurements, [("meter_id", ASCENDING), ("measurement_time", DESCENDING)],
+                         name="idx_meas_meter_time")
+        db[META_COLLECTION].replace_one(
+            {"_id": "generate"},
+            {"params": params, "generated_at": datetime.now(timezone.utc), "readings": total},
+            upsert=True,
+        )
+
+
+def cli():
+    parser = argparse.ArgumentParser(description="Seed dữ liệu mẫu / sinh measurement giả lập")
+    parser.add_argument("--force", action="store_true", help="Seed lại kể cả khi data version đã có")
+    sub = parser.add_subparsers(dest="command")
+
+    gen = sub.add_parser("generate", help="Sinh measurement giả lập quy mô lớn")
+    gen.add_argument("--db", default=MONGO_DB, help="Database đích (nên dùng database riêng)")
+    gen.add_argument("--meters", type=int, default=1000)
+    gen.add_argument("--days", type=int, default=90)
+    gen.add_argument("--cadence", type=int, default=10, help="Chu kỳ đo (phút), phải chia hết 1440")
+    gen.add_argument("--layout", choices=["documents", "buckets"], default="documents")
+    gen.add_argument("--leak-ratio", type=float, default=0.1, help="Tỉ lệ meter được chèn rò rỉ")
+    gen.add_argument("--missing-ratio", type=float, default=0.0, help="Tỉ lệ reading mất instant_flow")
+    gen.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    gen.add_argument("--meters-per-task", type=int, default=50)
+    gen.add_argument("--batch", type=int, default=CHUNK_SIZE, help="Số document mỗi insert_many")
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--dry-run", action="store_true", help="Chỉ sinh document, không ghi MongoDB")
+    gen.add_argument("--force", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        if 1440 % args.cadence:
+            parser.error("--cadence phải chia hết 1440")
+        generate(args)
+    else:
+        main(force=args.force)
 
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,100 @@
+"""
+Báo cáo thời gian khởi động web process: import time theo package (python -X importtime),
+RSS sau khi import và các stack ML nặng đã bị nạp sớm hay chưa.
+
+    python -m scripts.startup_report
+    python -m scripts.startup_report --create-app --role web   # cần MongoDB cho init_indexes
+    python -m scripts.startup_report --fail-on-heavy            # exit 1 nếu torch/TF... bị import
+"""
+import sys
+import json
+import argparse
+import subprocess
+from collections import defaultdict
+
+from scripts.bench_utils import print_table
+
+HEAVY_MODULES = ("torch", "tensorflow", "keras", "sklearn", "pandas", "onnxruntime", "joblib")
+
+_PROBE = """
+import json, sys, time, resource
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+created = None
+if {create_app!r}:
+    create_app({role!r})
+    created = time.perf_counter()
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_s": imported - started,
+    "create_app_s": (created - imported) if created else None,
+    "max_rss_mb": rss_kb / 1024 if sys.platform != "darwin" else rss_kb / 2**20,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Cộng self time (µs) theo package gốc từ output của -X importtime"""
+    self_us = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        try:
+            self_time = int(fields[0])
+        except ValueError:
+            # Dòng tiêu đề "self [us] | cumulative | imported package"
+            continue
+        self_us[fields[2].strip().split(".")[0]] += self_time
+    return self_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time breakdown khi khởi động app")
+    parser.add_argument("--create-app", action="store_true", help="Đo thêm create_app() (kết nối MongoDB)")
+    parser.add_argument("--role", default="web", choices=["all", "web", "worker"])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--fail-on-heavy", action="store_true", help="Exit 1 nếu stack ML bị import khi khởi động")
+    parser.add_argument("--json", dest="json_path", default=None)
+    args = parser.parse_args()
+
+    code = _PROBE.format(create_app=args.create_app, role=args.role, heavy=HEAVY_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr[-4000:])
+        raise SystemExit(f"Probe thất bại (exit {proc.returncode})")
+
+    summary = json.loads(proc.stdout.strip().splitlines()[-1])
+    self_us = parse_importtime(proc.stderr)
+    total_us = sum(self_us.values()) or 1
+    rows = [
+        {"package": name, "self_ms": round(us / 1000, 1), "share_%": round(us * 100 / total_us, 1)}
+        for name, us in sorted(self_us.items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+    ]
+
+    print_table(rows, ["package", "self_ms", "share_%"])
+    print()
+    print(f"import app:       {summary['import_s'] * 1000:.0f} ms")
+    if summary["create_app_s"] is not None:
+        print(f"create_app({args.role}): {summary['create_app_s'] * 1000:.0f} ms")
+    print(f"max RSS:          {summary['max_rss_mb']:.0f} MB")
+    heavy = summary["heavy_loaded"]
+    print(f"ML stack đã nạp:  {', '.join(heavy) if heavy else 'không'}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({**summary, "packages": rows}, f, indent=2)
+
+    if args.fail_on_heavy and heavy:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
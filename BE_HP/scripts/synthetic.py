@@ -0,0 +1,94 @@
+"""
+Sinh measurement giả lập bằng NumPy (vector hoá theo meter) cho seed/benchmark/load test:
+lưu lượng theo dạng ngày/đêm (đỉnh sáng/tối, lưu lượng đêm tối thiểu 01:00-04:00), nhiễu,
+cuối tuần cao hơn, và rò rỉ được chèn vào một phần meter (lưu lượng tăng dần trong ~2 ngày).
+"""
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+def meter_readings(rng, start, steps, cadence_minutes=10, leak_ratio=0.1, missing_ratio=0.0):
+    """
+    Chuỗi reading của một meter từ `start`, mỗi `cadence_minutes` phút.
+
+    Returns:
+        tuple: (times datetime64[m], flow, pressure, leak) với leak = None hoặc
+        {start_index, rate} (lưu lượng rò rỉ cộng thêm khi đã ổn định)
+    """
+    minutes = np.arange(steps, dtype=np.int64) * cadence_minutes
+    times = np.datetime64(start.replace(second=0, microsecond=0), "m") + minutes.astype("timedelta64[m]")
+    offset = start.hour * 60 + start.minute + minutes
+    hours = (offset % 1440) / 60
+    weekday = (start.weekday() + offset // 1440) % 7
+
+    base = rng.lognormal(np.log(15), 0.6)
+    night_floor = rng.uniform(0.15, 0.35)
+    daytime = 0.25 * (1 + np.tanh((hours - 5.5) * 1.5)) * (1 + np.tanh((22.5 - hours) * 1.5))
+    peaks = 0.6 * np.exp(-((hours - 7.5) / 1.8) ** 2) + 0.8 * np.exp(-((hours - 19) / 2.2) ** 2)
+    shape = night_floor + (1 - night_floor) * (0.4 * daytime + peaks)
+    flow = base * shape * np.where(weekday >= 5, 1.05, 1.0) * (1 + rng.normal(0, 0.05, steps))
+
+    leak = None
+    if steps > 1 and rng.random() < leak_ratio:
+        at = int(rng.integers(steps // 2, steps))
+        rate = base * rng.uniform(0.1, 0.5)
+        ramp = min(steps - at, max(1, 2 * 1440 // cadence_minutes))
+        added = np.full(steps - at, rate)
+        added[:ramp] *= np.linspace(0, 1, ramp)
+        flow[at:] += added
+        leak = {"start_index": at, "rate": float(rate)}
+
+    flow = np.clip(flow, 0, None).round(3)
+    pressure = (2.8 - 0.6 * flow / (base * 1.5) + rng.normal(0, 0.04, steps)).round(3)
+    if missing_ratio:
+        flow[rng.random(steps) < missing_ratio] = np.nan
+    return times, flow, pressure, leak
+
+
+def _values(array):
+    values = array.tolist()
+    if np.isnan(array).any():
+        return [None if v != v else v for v in values]
+    return values
+
+
+def measurement_docs(meter_id, times, flow, pressure):
+    """Document layout `documents` (meter_measurements)"""
+    return [
+        {"meter_id": meter_id, "measurement_time": t, "instant_flow": f, "instant_pressure": p}
+        for t, f, p in zip(times.astype("datetime64[ms]").tolist(), _values(flow), _values(pressure))
+    ]
+
+
+def bucket_docs(meter_id, times, flow, pressure, cadence_minutes=10):
+    """Document layout `buckets` (một document/meter/ngày); times phải bắt đầu lúc 00:00, ngày cuối có thể dở dang"""
+    per_day = 1440 // cadence_minutes
+    offsets = (np.arange(per_day) * cadence_minutes * 60).tolist()
+    day_starts = times[::per_day].astype("datetime64[ms]").tolist()
+    docs = []
+    for i, day in enumerate(day_starts):
+        f = flow[i * per_day:(i + 1) * per_day]
+        p = pressure[i * per_day:(i + 1) * per_day]
+        docs.append({
+            "meter_id": meter_id,
+            "day": day,
+            "t": offsets[:len(f)],
+            "f": _values(f),
+            "p": _values(p),
+            "n": len(f),
+            "first": day,
+            "last": day + timedelta(minutes=(len(f) - 1) * cadence_minutes),
+        })
+    return docs
+
+
+def day_aligned_window(days, cadence_minutes=10, end=None):
+    """
+    (start, steps): start là 00:00 (UTC naive) của ngày đầu cửa sổ `days` ngày kết thúc hôm nay,
+    reading cuối là mốc cadence gần nhất không vượt quá end (mặc định hiện tại).
+    """
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None)
+    start = end.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days - 1)
+    steps = int((end - start).total_seconds() // (cadence_minutes * 60)) + 1
+    return start, steps
@@ -0,0 +1,24 @@
+"""Fixture dùng chung: MongoDB trong bộ nhớ (mongomock) gắn vào app context để get_db() dùng được"""
+import pytest
+from flask import Flask, g
+
+from app.config import Config, MLConfig
+from app.extensions import get_db
+
+
+@pytest.fixture
+def mongo_client():
+    mongomock = pytest.importorskip("mongomock")
+    return mongomock.MongoClient(tz_aware=False)
+
+
+@pytest.fixture
+def db(mongo_client, monkeypatch):
+    # Cache measurement là state cấp process: test đọc thẳng từ store
+    monkeypatch.setattr(MLConfig, "MEASUREMENT_CACHE_ENABLED", False)
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["MONGO_DB"] = "test"
+    with app.app_context():
+        g.mongo_client = mongo_client
+        yield get_db()
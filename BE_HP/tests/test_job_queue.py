@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.config import Config
+from app.jobs.queue import JobQueue, QUEUED, RUNNING, SUCCEEDED, FAILED
+
+TASK = "crawl_repairs"
+
+
+@pytest.fixture
+def queue(db):
+    db.jobs.create_index("active_key", unique=True, sparse=True)
+    return JobQueue(db=db)
+
+
+def _expire_lease(db, job):
+    db.jobs.update_one({"_id": job["_id"]}, {"$set": {"lease_until": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+
+def test_claim_takes_earliest_due_job_once(queue):
+    now = datetime.now(timezone.utc)
+    later = queue.enqueue(TASK, run_at=now - timedelta(minutes=1))
+    first = queue.enqueue(TASK, run_at=now - timedelta(minutes=5))
+    queue.enqueue(TASK, run_at=now + timedelta(hours=1))
+
+    job = queue.claim("w1")
+    assert job["_id"] == first
+    assert job["status"] == RUNNING
+    assert job["worker_id"] == "w1"
+    assert job["attempts"] == 1
+    assert job["lease_until"] > now
+
+    assert queue.claim("w2")["_id"] == later
+    # Job còn lại chưa tới run_at
+    assert queue.claim("w3") is None
+
+
+def test_claim_filters_by_task(queue):
+    queue.enqueue(TASK)
+    assert queue.claim("w1", tasks=["crawl_measurements"]) is None
+    assert queue.claim("w1", tasks=[TASK]) is not None
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue, db):
+    queue.enqueue(TASK)
+    job = queue.claim("w1")
+    # Lease còn hạn: không ai claim lại được
+    assert queue.claim("w2") is None
+
+    _expire_lease(db, job)
+    again = queue.claim("w2")
+    assert again["_id"] == job["_id"]
+    assert again["worker_id"] == "w2"
+    assert again["attempts"] == 2
+
+    # Worker cũ mất job: heartbeat và complete đều thất bại
+    assert queue.heartbeat(job, "w1") is False
+    assert queue.complete(job, "w1") is False
+    assert queue.heartbeat(again, "w2") is True
+    assert queue.complete(again, "w2", result={"records": 1}) is True
+    assert queue.get(job["_id"])["status"] == SUCCEEDED
+
+
+def test_dedupe_key_allows_one_active_job(queue):
+    first = queue.enqueue(TASK, dedupe_key="repairs:2024-01-01")
+    assert first is not None
+    assert queue.enqueue(TASK, dedupe_key="repairs:2024-01-01") is None
+
+    job = queue.claim("w1")
+    assert queue.enqueue(TASK, dedupe_key="repairs:2024-01-01") is None
+
+    # Kết thúc thì active_key bị gỡ, enqueue lại được
+    queue.complete(job, "w1")
+    assert queue.enqueue(TASK, dedupe_key="repairs:2024-01-01") is not None
+
+
+def test_fail_retries_with_backoff_then_marks_failed(queue, db):
+    job_id = queue.enqueue(TASK, max_attempts=2, dedupe_key="repairs")
+    job = queue.claim("w1")
+    before = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    assert queue.fail(job, "w1", "boom") is True
+    retried = queue.get(job_id)
+    assert retried["status"] == QUEUED
+    assert "worker_id" not in retried
+    assert retried["run_at"] >= before + timedelta(seconds=Config.JOB_RETRY_BASE_SECONDS - 1)
+
+    db.jobs.update_one({"_id": job_id}, {"$set": {"run_at": datetime.now(timezone.utc)}})
+    job = queue.claim("w1")
+    assert job["attempts"] == 2
+    assert queue.fail(job, "w1", "boom") is True
+    failed = queue.get(job_id)
+    assert failed["status"] == FAILED
+    assert "active_key" not in failed
+
+
+def test_release_does_not_count_as_attempt(queue):
+    job_id = queue.enqueue(TASK)
+    job = queue.claim("w1")
+    assert queue.release(job, "w1") is True
+
+    released = queue.get(job_id)
+    assert released["status"] == QUEUED
+    assert released["attempts"] == 0
+    assert queue.claim("w2")["attempts"] == 1
+
+
+def test_unknown_task_is_rejected(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue("no_such_task")
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.ml.quantile_sketch import QuantileSummary
+
+QS = (0, 1, 25, 50, 90, 95, 99, 100)
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(7)
+
+
+def test_exact_summary_matches_percentile(rng):
+    values = rng.lognormal(size=500)
+    summary = QuantileSummary(values)
+    assert summary.exact
+    for q in QS:
+        assert summary.quantile(q) == pytest.approx(np.percentile(values, q))
+
+
+def test_merge_of_exact_summaries_equals_concatenation(rng):
+    parts = [rng.normal(size=n) for n in (10, 200, 37)]
+    merged = QuantileSummary(parts[0]).merge(QuantileSummary(parts[1])).merge(QuantileSummary(parts[2]))
+    everything = np.concatenate(parts)
+
+    assert merged.count == len(everything)
+    for q in QS:
+        assert merged.quantile(q) == pytest.approx(np.percentile(everything, q))
+
+
+def test_merge_is_order_independent(rng):
+    a = QuantileSummary(rng.normal(size=700), max_size=256)
+    b = QuantileSummary(rng.normal(loc=3, size=900), max_size=256)
+    ab, ba = a.merge(b), b.merge(a)
+
+    assert ab.count == ba.count == a.count + b.count
+    np.testing.assert_allclose(ab.values, ba.values)
+    np.testing.assert_allclose(ab.weights, ba.weights)
+    np.testing.assert_allclose(QuantileSummary.merge_all([a, b], max_size=256).values, ab.values)
+
+
+def test_compressed_merge_stays_within_rank_error(rng):
+    parts = [rng.exponential(size=4000) for _ in range(4)]
+    merged = QuantileSummary.merge_all([QuantileSummary(p, max_size=128) for p in parts], max_size=128)
+    everything = np.sort(np.concatenate(parts))
+
+    assert not merged.exact
+    assert len(merged.values) <= 128
+    assert merged.count == len(everything)
+    rank_error = merged.weights.max() / merged.count
+    for q in (5, 25, 50, 75, 95):
+        # Rank thực của giá trị ước lượng lệch khỏi q không quá max_weight / total
+        rank = np.searchsorted(everything, merged.quantile(q)) / len(everything)
+        assert abs(rank - q / 100) <= rank_error + 1e-9
+
+
+def test_nan_dropped_and_empty_summary():
+    summary = QuantileSummary([1.0, float("nan"), 3.0])
+    assert summary.count == 2
+    assert summary.quantile(50) == 2.0
+    assert np.isnan(QuantileSummary().quantile(50))
+    assert QuantileSummary.merge_all([]).count == 0
+
+
+def test_doc_round_trip_keeps_weights(rng):
+    summary = QuantileSummary(rng.normal(size=1000), max_size=64)
+    restored = QuantileSummary.from_doc(summary.to_doc(), max_size=64)
+    np.testing.assert_allclose(restored.values, summary.values)
+    np.testing.assert_allclose(restored.weights, summary.weights)
+    assert "w" not in QuantileSummary([1.0, 2.0]).to_doc()
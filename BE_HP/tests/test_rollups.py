@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.utils.measurement_store import get_measurement_store
+from app.utils.rollups import DAILY_COLLECTION, HOURLY_COLLECTION, rebuild_rollups
+
+DAY = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def meters(db):
+    ids = [ObjectId(), ObjectId()]
+    db.meters.insert_many([{"_id": meter_id, "meter_name": f"m{i}"} for i, meter_id in enumerate(ids)])
+    store = get_measurement_store("documents", cached=False)
+    rows = []
+    for i, meter_id in enumerate(ids):
+        for step in range(2 * 24 * 6):
+            t = DAY + timedelta(minutes=10 * step)
+            rows.append({"meter_id": meter_id, "measurement_time": t,
+                         "instant_flow": float(i + step % 7), "instant_pressure": 2.0})
+    store.insert(rows)
+    return ids
+
+
+def _snapshot(db, collection, key):
+    return sorted(
+        ({k: v for k, v in doc.items() if k not in ("_id", "updated_at")}
+         for doc in db[collection].find()),
+        key=lambda doc: (str(doc["meter_id"]), doc[key]),
+    )
+
+
+def test_rebuild_is_idempotent(db, meters):
+    first = rebuild_rollups(DAY, DAY + timedelta(days=1), shard_size=1)
+    hourly, daily = _snapshot(db, HOURLY_COLLECTION, "hour"), _snapshot(db, DAILY_COLLECTION, "day")
+    assert first == {"points": 2 * 288, "hourly": 2 * 48, "daily": 4}
+
+    second = rebuild_rollups(DAY, DAY + timedelta(days=1))
+    assert second == first
+    assert _snapshot(db, HOURLY_COLLECTION, "hour") == hourly
+    assert _snapshot(db, DAILY_COLLECTION, "day") == daily
+
+    day = next(d for d in daily if d["meter_id"] == meters[0] and d["day"] == DAY)
+    assert day["flow_count"] == 144
+    assert day["hours"] == 24
+    assert len(day["night_flows"]) == 18
+    assert day["mnf"] is not None
+
+
+def test_rebuild_drops_buckets_without_raw_data(db, meters):
+    rebuild_rollups(DAY, DAY + timedelta(days=1))
+    db.meter_measurements.delete_many({"meter_id": meters[0], "measurement_time": {"$gte": DAY + timedelta(days=1)}})
+
+    rebuild_rollups(DAY, DAY + timedelta(days=1), meter_ids=[meters[0]])
+    days = [doc["day"] for doc in db[DAILY_COLLECTION].find({"meter_id": meters[0]})]
+    assert days == [DAY]
+    assert db[HOURLY_COLLECTION].count_documents({"meter_id": meters[0]}) == 24
+    # Meter không nằm trong meter_ids giữ nguyên rollup
+    assert db[DAILY_COLLECTION].count_documents({"meter_id": meters[1]}) == 2
@@ -0,0 +1,51 @@
+from app.utils.search import (
+    MAX_GRAM, SEARCH_VERSION, backfill_search_fields, fold, search_fields, search_filter, words,
+)
+
+
+def test_fold_strips_vietnamese_diacritics():
+    assert fold("TÂN VIÊN") == "tan vien"
+    assert fold("Đường Nguyễn Trãi") == "duong nguyen trai"
+    assert fold("Ống nước bị rò rỉ") == "ong nuoc bi ro ri"
+
+
+def test_words_are_unique_and_ordered():
+    assert words("Tân Viên 12", None, "tan-vien, KHU 3") == ["tan", "vien", "12", "khu", "3"]
+    assert words("", "!!!") == []
+
+
+def test_edge_ngrams_cover_every_prefix_up_to_max_gram():
+    fields = search_fields("Tân", "abcdefghijklmno")
+    assert fields["search_words"] == ["tan", "abcdefghijklmno"]
+    assert {"t", "ta", "tan"} <= set(fields["search_terms"])
+    assert "abcdefghij" in fields["search_terms"]
+    assert max(len(t) for t in fields["search_terms"]) == MAX_GRAM
+    assert fields["search_v"] == SEARCH_VERSION
+
+
+def test_search_filter_truncates_long_words_and_rejects_empty_query():
+    assert search_filter("tan VI") == {"search_terms": {"$all": ["tan", "vi"]}}
+    assert search_filter("abcdefghijklmno") == {"search_terms": {"$all": ["abcdefghij"]}}
+    assert search_filter(" - ") is None
+
+
+def test_filter_matches_folded_prefixes(db):
+    db.meters.insert_many([
+        {"meter_name": "TÂN VIÊN 01", **search_fields("TÂN VIÊN 01")},
+        {"meter_name": "Tân Hưng", **search_fields("Tân Hưng")},
+    ])
+    names = {d["meter_name"] for d in db.meters.find(search_filter("tan vi"))}
+    assert names == {"TÂN VIÊN 01"}
+    assert db.meters.count_documents(search_filter("tân")) == 2
+
+
+def test_backfill_updates_only_stale_documents(db):
+    db.meters.insert_many([
+        {"meter_name": "Cầu Giấy"},
+        {"meter_name": "Old", "search_v": SEARCH_VERSION - 1},
+        {"meter_name": "Fresh", **search_fields("Fresh")},
+    ])
+    assert backfill_search_fields(db) == 2
+    assert db.meters.count_documents({"search_v": SEARCH_VERSION}) == 3
+    assert db.meters.find_one({"meter_name": "Cầu Giấy"})["search_words"] == ["cau", "giay"]
+    assert backfill_search_fields(db) == 0
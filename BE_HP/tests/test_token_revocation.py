@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.utils.token_revocation import COLLECTION, RevokedTokens
+
+
+def _revoked(db, jti, revoked_at, expires_in=timedelta(hours=1)):
+    db[COLLECTION].insert_one({"_id": jti, "revoked_at": revoked_at, "expires_at": revoked_at + expires_in})
+
+
+@pytest.fixture
+def now():
+    return datetime.now(timezone.utc)
+
+
+def test_first_refresh_loads_unexpired_tokens(db, now):
+    _revoked(db, "a", now - timedelta(minutes=10))
+    _revoked(db, "b", now - timedelta(minutes=5))
+    _revoked(db, "gone", now - timedelta(hours=2))
+
+    tokens = RevokedTokens(refresh_seconds=0)
+    tokens.refresh()
+    assert tokens.is_revoked("a") and tokens.is_revoked("b")
+    assert not tokens.is_revoked("gone")
+    # Watermark là revoked_at lớn nhất đã đọc (MongoDB trả về UTC naive)
+    assert tokens._watermark.replace(tzinfo=None) == db[COLLECTION].find_one({"_id": "b"})["revoked_at"]
+
+
+def test_refresh_reads_only_after_watermark(db, now):
+    _revoked(db, "a", now - timedelta(minutes=1))
+    tokens = RevokedTokens(refresh_seconds=0)
+    tokens.refresh()
+
+    # Ghi muộn nhưng revoked_at vẫn trong khoảng đọc lùi: không bị sót
+    _revoked(db, "late", now - timedelta(minutes=1, seconds=20))
+    # Cũ hơn watermark quá khoảng đọc lùi: đã phải có ở lần đọc trước nên bị bỏ qua
+    _revoked(db, "old", now - timedelta(minutes=30))
+    _revoked(db, "new", now)
+    tokens.refresh()
+
+    assert tokens.is_revoked("late")
+    assert tokens.is_revoked("new")
+    assert not tokens.is_revoked("old")
+
+
+def test_watermark_starts_at_now_when_collection_is_empty(db, now):
+    tokens = RevokedTokens(refresh_seconds=0)
+    tokens.refresh()
+    assert tokens._watermark >= now
+
+    _revoked(db, "a", datetime.now(timezone.utc))
+    assert tokens.is_revoked("a")
+
+
+def test_refresh_is_throttled(db, now):
+    tokens = RevokedTokens(refresh_seconds=3600)
+    assert not tokens.is_revoked("a")
+    _revoked(db, "a", now)
+    # Chưa tới lần refresh kế tiếp
+    assert not tokens.is_revoked("a")
+    tokens.refresh()
+    assert tokens.is_revoked("a")
+
+
+def test_expired_jtis_are_dropped_from_memory(db, now):
+    tokens = RevokedTokens(refresh_seconds=0)
+    tokens._jtis["expired"] = (now - timedelta(seconds=1)).timestamp()
+    tokens.refresh()
+    assert "expired" not in tokens._jtis
+    assert not tokens.is_revoked("expired")
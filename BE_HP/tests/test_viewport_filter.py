@@ -0,0 +1,41 @@
+import pytest
+
+from app.routes.meter.meter_utils import _viewport_location_filter
+
+
+def _rings(flt):
+    polygons = flt["$or"] if "$or" in flt else [flt]
+    return [p["location"]["$geoWithin"]["$geometry"]["coordinates"][0] for p in polygons]
+
+
+def test_small_bbox_is_one_closed_polygon():
+    [ring] = _rings(_viewport_location_filter(106.5, 20.7, 106.8, 20.95))
+    assert ring[0] == ring[-1] == [106.5, 20.7]
+    assert {lng for lng, _ in ring} == {106.5, 106.8}
+    assert {lat for _, lat in ring} == {20.7, 20.95}
+
+
+def test_whole_world_is_split_into_strips_under_180_degrees():
+    rings = _rings(_viewport_location_filter(-180, -90, 180, 90))
+    assert len(rings) == 4
+
+    bounds = [(min(lng for lng, _ in r), max(lng for lng, _ in r)) for r in rings]
+    # Các dải nối liền nhau từ -180 tới 180, mỗi dải hẹp hơn 180° để cạnh không bị hiểu ngược vòng
+    assert bounds[0][0] == -180 and bounds[-1][1] == 180
+    assert all(east - west <= 90 for west, east in bounds)
+    assert all(bounds[i][1] == bounds[i + 1][0] for i in range(len(bounds) - 1))
+
+
+def test_edges_follow_parallels_and_poles_are_clipped():
+    for ring in _rings(_viewport_location_filter(-170, -90, 170, 90)):
+        lats = {lat for _, lat in ring}
+        assert lats == {-89.5, 89.5}
+        # Cạnh trên/dưới có đỉnh cách nhau tối đa 1° kinh độ
+        bottom = [lng for lng, lat in ring if lat == -89.5]
+        assert max(b - a for a, b in zip(bottom, bottom[1:])) <= 1.0 + 1e-9
+        assert len({tuple(p) for p in ring[:-1]}) == len(ring) - 1
+
+
+@pytest.mark.parametrize("bbox", [(0, 89.6, 10, 90), (0, -90, 10, -89.7)])
+def test_bbox_entirely_beyond_clipped_latitude_is_empty(bbox):
+    assert _viewport_location_filter(*bbox) is None
@@ -1,7 +1,7 @@
 import { Injectable, inject } from '@angular/core';
 import { LogMetaData } from '../../../modules/admin/log/models';
 import { io, Socket } from 'socket.io-client';
-import { Observable as RxObservable  } from 'rxjs';
+import { Observable as RxObservable, Subject } from 'rxjs';
 import { environment } from 'my-lib'
 
 @Injectable({
@@ -13,6 +13,9 @@ export class WebsocketService {
   private urlAPI = environment.wsUrl;
   private logObservable: RxObservable<LogMetaData> | null = null;
   private socket: Socket | null = null;
+  // Frame delta status meter (room meters / branch:<id>) và reading live (room meter:<id>)
+  private meterStatusSubject = new Subject<any>();
+  private meterFlowSubject = new Subject<any>();
   constructor() { }
 
   connectSocket(): void {
@@ -25,6 +28,9 @@ export class WebsocketService {
       withCredentials: true
     });
 
+    this.socket.on('meter_status', (frame: any) => this.meterStatusSubject.next(frame));
+    this.socket.on('meter_flow', (frame: any) => this.meterFlowSubject.next(frame));
+
     this.logObservable = new RxObservable<LogMetaData>((subscriber) => {
       if (!this.socket) {
         subscriber.complete();
@@ -43,12 +49,14 @@ export class WebsocketService {
         console.error('socket auth_error', err);
       });
 
-      this.socket.on('log', (data: any) => {
-        try {
-          const mapped = this.mapFromApi(data);
-          subscriber.next(mapped);
-        } catch (e) {
-          console.error('Failed parsing log event', e);
+      // Server gom log thành frame { items, dropped } mỗi chu kỳ flush
+      this.socket.on('logs', (frame: any) => {
+        for (const data of frame?.items ?? []) {
+          try {
+            subscriber.next(this.mapFromApi(data));
+          } catch (e) {
+            console.error('Failed parsing log event', e);
+          }
         }
       });
 
@@ -69,6 +77,22 @@ export class WebsocketService {
     return this.logObservable;
   }
 
+  onMeterStatus(): RxObservable<any> {
+    return this.meterStatusSubject.asObservable();
+  }
+
+  onMeterFlow(): RxObservable<any> {
+    return this.meterFlowSubject.asObservable();
+  }
+
+  subscribeRoom(room: string): void {
+    this.socket?.emit('subscribe', { room });
+  }
+
+  unsubscribeRoom(room: string): void {
+    this.socket?.emit('unsubscribe', { room });
+  }
+
   mapFromApi(data: any): LogMetaData {
     return {
       id: data.id,
@@ -1,9 +1,12 @@
-import { Component, OnInit, inject, signal, computed } from '@angular/core';
+import { Component, DestroyRef, OnInit, inject, signal, computed } from '@angular/core';
 import { CommonModule } from '@angular/common';
 import { FormsModule } from '@angular/forms';
 import { Router } from '@angular/router';
+import { takeUntilDestroyed } from '@angular/core/rxjs-interop';
+import { debounceTime, filter } from 'rxjs';
 import { DashboardService } from '../services/dashboard.service';
 import { ConclusionService } from '../../../../core/services/branches/conclusion.service';
+import { WebsocketService } from '../../../../core/services/websocket_services/websocket.service';
 import { Dashboard } from '../models/dasboard.interface';
 import * as L from 'leaflet';
 
@@ -18,6 +21,8 @@ export class DashboardComponent implements OnInit {
   private router = inject(Router);
   private dashboardService = inject(DashboardService);
   private conclusionService = inject(ConclusionService);
+  private websocketService = inject(WebsocketService);
+  private destroyRef = inject(DestroyRef);
 
   dashboardData = signal<Dashboard[]>([]);
   searchTerm = signal<string>('');
@@ -60,6 +65,22 @@ export class DashboardComponent implements OnInit {
       const meterIds = processedData.map(item => item._id).filter(id => id);
       this.loadConclusionsForMeters(meterIds, processedData);
     });
+
+    this.listenStatusChanges();
+  }
+
+  // Server đẩy delta status (room branch:<id>) khi có prediction mới; kết luận AI lấy từ nhiều
+  // prediction nên tải lại dữ liệu dashboard, gom các frame liền nhau thành một lần tải
+  private listenStatusChanges(): void {
+    this.websocketService.connectSocket();
+    this.websocketService.onMeterStatus().pipe(
+      filter(frame => {
+        const changed = Object.keys(frame?.changes ?? {});
+        return changed.length > 0 && this.dashboardData().some(item => changed.includes(item._id));
+      }),
+      debounceTime(2000),
+      takeUntilDestroyed(this.destroyRef)
+    ).subscribe(() => this.dashboardService.getDashboardData(true));
   }
 
   private loadConclusionsForMeters(meterIds: string[], processedData: Dashboard[]): void {
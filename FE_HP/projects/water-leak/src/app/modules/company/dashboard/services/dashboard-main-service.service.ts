@@ -1,8 +1,9 @@
-import { Injectable } from '@angular/core';
+import { Injectable, inject } from '@angular/core';
 import { DashBoardData, DashBoardDataStatus } from '../models';
 import { HttpClient } from '@angular/common/http';
-import { BehaviorSubject, catchError, map, Observable, of } from 'rxjs';
+import { BehaviorSubject, catchError, map, Observable, of, Subscription } from 'rxjs';
 import { environment } from 'my-lib'
+import { WebsocketService } from '../../../../core/services/websocket_services/websocket.service';
 
 @Injectable({
   providedIn: 'root'
@@ -10,6 +11,8 @@ import { environment } from 'my-lib'
 export class DashboardMainServiceService {
   private meters$ = new BehaviorSubject<DashBoardData[] | null>(null);
     private readonly API_BASE = environment.apiUrl;
+    private websocketService = inject(WebsocketService);
+    private statusSubscription: Subscription | null = null;
 
     constructor(private http: HttpClient) { }
 
@@ -23,30 +26,54 @@ export class DashboardMainServiceService {
                 }))
           .subscribe(data => this.meters$.next(data));
       }
+      this.listenStatusChanges();
       return this.meters$.asObservable();
     }
 
+    // Server đẩy delta status (room meters) khi có prediction mới: cập nhật tại chỗ thay vì tải lại danh sách
+    private listenStatusChanges(): void {
+      if (this.statusSubscription) {
+        return;
+      }
+      this.websocketService.connectSocket();
+      this.statusSubscription = this.websocketService.onMeterStatus()
+        .subscribe(frame => this.applyStatusChanges(frame?.changes ?? {}));
+    }
 
- private mapFromApi(apiMeter: any): DashBoardData {
-      let status: DashBoardDataStatus = DashBoardDataStatus.NO_DATA;
-      if (apiMeter.status) {
-        switch (apiMeter.status) {
-          case 'normal':
-            status = DashBoardDataStatus.NORMAL;
-            break;
-          case 'anomaly':
-          case 'leak':
-            status = DashBoardDataStatus.ANOMALY;
-            break;
-          case 'lost':
-          case 'lost_connection':
-            status = DashBoardDataStatus.LOST_CONNECTION;
-            break;
-          case 'unknown':
-          default:
-            status = DashBoardDataStatus.NO_DATA;
+    private applyStatusChanges(changes: Record<string, { status: string }>): void {
+      const meters = this.meters$.value;
+      if (!meters || Object.keys(changes).length === 0) {
+        return;
+      }
+      this.meters$.next(meters.map(meter => {
+        const change = changes[String(meter.id)];
+        if (!change) {
+          return meter;
         }
+        const status = this.mapStatus(change.status);
+        return { ...meter, status, meter_data: { ...meter.meter_data, status } };
+      }));
+    }
+
+
+ private mapStatus(apiStatus: string | null | undefined): DashBoardDataStatus {
+      switch (apiStatus) {
+        case 'normal':
+          return DashBoardDataStatus.NORMAL;
+        case 'anomaly':
+        case 'leak':
+          return DashBoardDataStatus.ANOMALY;
+        case 'lost':
+        case 'lost_connection':
+          return DashBoardDataStatus.LOST_CONNECTION;
+        case 'unknown':
+        default:
+          return DashBoardDataStatus.NO_DATA;
       }
+  }
+
+ private mapFromApi(apiMeter: any): DashBoardData {
+      const status = this.mapStatus(apiMeter.status);
 
       return {
         id: String(apiMeter.id),